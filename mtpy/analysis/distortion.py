@@ -27,6 +27,8 @@ constraints depend on the application, the actual place for further functions
 """
 
 #=================================================================
+import multiprocessing
+
 import numpy as np
 
 import mtpy.core.z as MTz 
@@ -67,240 +69,309 @@ def find_distortion(z_object, lo_dims = None):
 
     automatically determine the dimensionality over all frequencies, then find
     the appropriate distortion tensor D
+
+    (see find_distortion_array for the calculation)
     """
 
     z_obj = z_object
 
     if lo_dims is None :
-        lo_dims = MTge.dimensionality(z_object = z_obj)
+        lo_dims = MTge.dimensionality_array(z_array = z_obj.z)
     try:
         if len(lo_dims) != len(z_obj.z):
-            lo_dims = MTge.dimensionality(z_object = z_obj)
+            lo_dims = MTge.dimensionality_array(z_array = z_obj.z)
     except:
         pass
-    
-    #dictionary of values that should be no distortion in case distortion
-    #cannot be calculated for that component
-    dis_dict = {(0,0):1, (0,1):0, (1,0):0, (1,1):1}
 
-    lo_dis = []
-    lo_diserr = []
+    zerr = None
+    if z_obj.zerr is not None:
+        zerr = z_obj.zerr[np.newaxis]
 
-    if 1 in lo_dims:
-        idx_1 = np.where(np.array(lo_dims) == 1)[0]
+    dis, diserr = find_distortion_array(z_obj.z[np.newaxis], zerr, 
+                                        dims = np.array([lo_dims]))
 
-        for idx in idx_1:
+    return dis[0], diserr[0]
 
-            realz = np.real(z_obj.z[idx])
-            imagz = np.imag(z_obj.z[idx])
 
-            mat1 = np.matrix([[0, -1],[1, 0]])
+def find_distortion_array(z_array, zerr_array = None, dims = None, 
+                          n_processes = 1):
+    """
+    find optimal distortion tensors for a stack of stations
 
-            gr = np.sqrt(np.linalg.det(realz))
-            gi = np.sqrt(np.linalg.det(imagz))
+    Same method as find_distortion: if a station has 1D frequencies, D is
+    the weighted mean over these, otherwise over its 2D frequencies (with 
+    P = 1), for only 3D frequencies D is the identity.  All stations are 
+    computed at once, the dimensionality is determined once for the whole 
+    stack (or given as dims).
 
-            lo_dis.append(1./gr*np.dot(realz,mat1))  
-            lo_dis.append(1./gi*np.dot(imagz,mat1))  
+    If the weights of an entry of D sum up to 0, the entry is set to 
+    identity with error 1e-6 (in the 2D case as well).
 
-            if z_obj.zerr is not None:
-                #find errors of entries for calculating weights
+    **Input:**
 
-                lo_diserr.append(1./gr*\
-                                np.array([[np.abs(z_obj.zerr[idx][0,1]),
-                                           np.abs(z_obj.zerr[idx][0,0])],
-                                           [np.abs(z_obj.zerr[idx][1,1]),
-                                           np.abs(z_obj.zerr[idx][1,0])]])) 
+        **z_array** : np.ndarray (n_station, n_freq, 2, 2)
+                      impedance tensors
 
-                lo_diserr.append(1./gi*\
-                                 np.array([[np.abs(z_obj.zerr[idx][0,1]),
-                                            np.abs(z_obj.zerr[idx][0,0])],
-                                            [np.abs(z_obj.zerr[idx][1,1]),
-                                             np.abs(z_obj.zerr[idx][1,0])]])) 
+        **zerr_array** : np.ndarray (n_station, n_freq, 2, 2)
+                         errors of the impedance tensors, if None all 
+                         estimates are weighted evenly
 
-            else:
-                #otherwise go for evenly weighted average
-                lo_diserr.append(np.ones((2, 2)))
-                lo_diserr.append(np.ones((2, 2)))
+        **dims** : np.ndarray (n_station, n_freq)
+                   dimensionality of the tensors (values other than 1 and 2
+                   are ignored), *default* is None (computed)
 
-        
-        dis = np.identity(2)
-        diserr = np.identity(2)
-        for i in range(2):
-            for j in range(2):
-                try:
-                    dis[i,j], dummy = np.average(np.array([k[i, j] 
-                                                          for k in lo_dis]), 
-                                                 weights=np.array([1./(k[i,j])**2 
-                                                          for k in lo_diserr]),
-                                                 returned=True)
-                    diserr[i,j] = np.sqrt(1./dummy)
-                    
-                    #if the distortion came out as nan set it to an appropriate
-                    #value 
-                    if np.nan_to_num(dis[i,j]) == 0:
-                        dis[i, j] = dis_dict[i, j]
-                        diserr[i, j] = dis_dict[i, j]
-
-                except ZeroDivisionError:
-                    
-                    print ('Could not get distortion for dis[{0}, {1}]'.format(
-                           i, j)+' setting value to {0}'.format(dis_dict[i,j]))
-                    dis[i, j] = dis_dict[i, j]
-                    diserr[i, j] = dis_dict[i, j]*1e-6
-    
-        return dis, diserr
-
-    if 2 in lo_dims:
-        idx_2 = np.where(np.array(lo_dims) == 2)[0]
-        #follow bibby et al. 2005 first alternative: P = 1
-        P = 1
-
-        lo_strikes = MTge.strike_angle(z_object = z_obj)
-        lo_tetms = []
-        lo_t = []
-        lo_tetm_errs =[]
-
-        for idx in idx_2:
-
-            mat = z_obj.z[idx]
-            ang = -lo_strikes[idx][0]
-            if np.isnan(ang):
-                ang = 0.
-
-            errmat = None
-            if z_obj.zerr is not None:
-                errmat = z_obj.zerr[idx]
-            tetm_mat, tetm_err = MTcc.rotatematrix_incl_errors(mat, 
-                                                               ang, 
-                                                               inmatrix_err=errmat)
-
-            lo_tetms.append(tetm_mat)
-         
-            lo_tetm_errs.append(tetm_err)
-
-            realz = np.real(tetm_mat)
-            imagz = np.imag(tetm_mat)
-            lo_t.append(-4*P*realz[0,1]*realz[1,0]/np.linalg.det(realz) )
-            lo_t.append(-4*P*imagz[0,1]*imagz[1,0]/np.linalg.det(imagz) )
-
-        #since there is no 'wrong' solution by a different value of T, no 
-        #error is given/calculated for T !
-        try:
-            #just add 0.1% for avoiding numerical issues in the squareroots
-            #later on
-            T = np.sqrt(max(lo_t))+0.001
-        except:
-            T = 2
-
-
-        for idx in range(len(lo_tetms)):
-
-            realz = np.real(lo_tetms[idx])
-            imagz = np.imag(lo_tetms[idx])
-            errmat = lo_tetm_errs[idx]
-            
-            sr = np.sqrt(T**2+4*P*realz[0, 1]*realz[1, 0]/np.linalg.det(realz))
-            si = np.sqrt(T**2+4*P*imagz[0, 1]*imagz[1, 0]/np.linalg.det(imagz))
-
-            par_r = 2*realz[0, 1]/(T-sr)
-            orth_r = 2*realz[1, 0]/(T+sr)
-            par_i = 2*imagz[0, 1]/(T-si)
-            orth_i = 2*imagz[1, 0]/(T+si)
-
-            mat2_r = np.matrix([[0, 1./orth_r], [1./par_r, 0]])
-            mat2_i = np.matrix([[0, 1./orth_i], [1./par_i ,0]])
-
-            lo_dis.append(np.dot(realz,mat2_r))
-            lo_dis.append(np.dot(imagz,mat2_i))
-
-            if z_obj.zerr is not None:
-                #find errors of entries for calculating weights
-                sigma_sr = np.sqrt((-(2*P*realz[0,1]*realz[1,0]*\
-                                      realz[1,1]*errmat[0,0])/\
-                                      (np.linalg.det(realz)**2*sr))**2+\
-                                    ((2*P*realz[0,0]*realz[1,0]*\
-                                     realz[1,1]*errmat[0,1])/\
-                                    (np.linalg.det(realz)**2*sr))**2+\
-                                    ((2*P*realz[0,0]* realz[0,1]*\
-                                      realz[1,1]*errmat[1,0])/\
-                                      (np.linalg.det(realz)**2*sr))**2 +\
-                                    (-(2*P*realz[0,1]* realz[1,0]*\
-                                     realz[0,0]*errmat[1,1])/\
-                                     (np.linalg.det(realz)**2*sr))**2)
-
-                sigma_dr_11 = 0.5*sigma_sr
-                sigma_dr_22 = 0.5*sigma_sr
-
-                sigma_dr_12 = np.sqrt((mat2_r[0,1]/realz[0,0]*errmat[0,0])**2+\
-                                      (mat2_r[0,1]/realz[1,0]*errmat[1,0])**2+\
-                                      (0.5*realz[0,0]/realz[1,0]*sigma_sr)**2)
-                sigma_dr_21 = np.sqrt((mat2_r[1,0]/realz[1,1]*errmat[1,1])**2+\
-                                      (mat2_r[1,0]/realz[0,1]*errmat[0,1])**2+\
-                                      (0.5*realz[1,1]/realz[0,1]*sigma_sr)**2)
-
-                lo_diserr.append(np.array([[sigma_dr_11, sigma_dr_12],
-                                           [sigma_dr_21, sigma_dr_22]]))
-
-                sigma_si = np.sqrt((-(2*P*imagz[0,1]*imagz[1,0]*\
-                                      imagz[1,1]*errmat[0,0])/\
-                                      (np.linalg.det(imagz)**2*sr))**2+\
-                                     ((2*P*imagz[0,0]*imagz[1,0]*\
-                                      imagz[1,1]*errmat[0,1])/\
-                                      (np.linalg.det(imagz)**2*sr))**2+\
-                                     ((2*P*imagz[0,0]*imagz[0,1]*\
-                                      imagz[1,1]*errmat[1,0])/\
-                                      (np.linalg.det(imagz)**2*sr))**2+\
-                                     (-(2*P*imagz[0,1]*imagz[1,0]*\
-                                      imagz[0,0]*errmat[1,1])/\
-                                      (np.linalg.det(imagz)**2*sr))**2)
-
-                sigma_di_11 = 0.5*sigma_si
-                sigma_di_22 = 0.5*sigma_si
-                sigma_di_12 = np.sqrt((mat2_i[0,1]/imagz[0,0]*errmat[0,0])**2+\
-                                      (mat2_i[0,1]/imagz[1,0]*errmat[1,0])**2+\
-                                      (0.5*imagz[0,0]/imagz[1,0]*sigma_si)**2)
-                sigma_di_21 = np.sqrt((mat2_i[1,0]/imagz[1,1]*errmat[1,1])**2+\
-                                      (mat2_i[1,0]/imagz[0,1]*errmat[0,1])**2+\
-                                      (0.5*imagz[1,1]/imagz[0,1]*sigma_si)**2)
-
-                lo_diserr.append(np.array([[sigma_di_11, sigma_di_12],
-                                           [sigma_di_21, sigma_di_22]]))
-
-            else:
-                #otherwise go for evenly weighted average
-                lo_diserr.append(np.ones((2, 2)))
-                lo_diserr.append(np.ones((2, 2)))
-
-
-        dis = np.zeros((2, 2))
-        diserr = np.zeros((2, 2))
-        for i in range(2):
-            for j in range(2):
-
-                dis[i, j], dummy = np.average(np.array([k[i, j] 
-                                                       for k in lo_dis]), 
-                                              weights=np.array([1./(k[i,j])**2
-                                                       for k in lo_diserr]),
-                                              returned=True )
-                diserr[i, j] = np.sqrt(1./dummy)
-
-        return dis, diserr
+        **n_processes** : int
+                          number of processes, None for the number of CPUs.
+                          *default* is 1 (no pool)
+
+    **Output:**
+
+        **dis** : np.ndarray (n_station, 2, 2) distortion tensors
+
+        **diserr** : np.ndarray (n_station, 2, 2) errors of the distortion
+                     tensors
+    """
+
+    z_array = np.asarray(z_array)
+    if z_array.ndim != 4 or z_array.shape[-2:] != (2, 2):
+        raise MTex.MTpyError_inputarguments('Z array must have shape '
+                        '(n_station, n_freq, 2, 2): {0}'.format(z_array.shape))
+    if zerr_array is not None:
+        zerr_array = np.real(zerr_array)
+        if zerr_array.shape != z_array.shape:
+            raise MTex.MTpyError_inputarguments('Z array and Z error array '
+                         'shapes do not match: {0} - {1}'.format(
+                                          z_array.shape, zerr_array.shape))
+
+    if dims is None:
+        dims = MTge.dimensionality_array(z_array = z_array)
+    dims = np.asarray(dims)
+    if dims.shape != z_array.shape[:2]:
+        raise MTex.MTpyError_inputarguments('dims must have shape '
+                        '(n_station, n_freq): {0}'.format(dims.shape))
+
+    n_station = len(z_array)
+    if (n_processes == 1) or (n_station < 2):
+        return _find_distortion_worker((z_array, zerr_array, dims))
+
+    if n_processes is None:
+        n_processes = multiprocessing.cpu_count()
+    chunk_size = max(1, n_station/(4*n_processes))
+    lo_args = []
+    for start in range(0, n_station, chunk_size):
+        chunk = slice(start, start+chunk_size)
+        zerr = None
+        if zerr_array is not None:
+            zerr = zerr_array[chunk]
+        lo_args.append((z_array[chunk], zerr, dims[chunk]))
+
+    pool = multiprocessing.Pool(processes=n_processes)
+    try:
+        lo_results = pool.map(_find_distortion_worker, lo_args)
+    finally:
+        pool.close()
+        pool.join()
+
+    return np.concatenate([dis for dis, diserr in lo_results]), \
+           np.concatenate([diserr for dis, diserr in lo_results])
+
+
+def _find_distortion_worker(args):
+    """
+    distortion tensors of a chunk of stations - args are (z, zerr, dims)
+    """
+
+    z_array, zerr_array, dims = args
 
     #if only 3D, use identity matrix - no distortion calculated
-    dis = np.identity(2)
-    diserr = diserr = np.zeros((2, 2))
+    dis = np.zeros(z_array.shape[:1] + (2, 2))
+    dis[:] = np.identity(2)
+    diserr = np.zeros(z_array.shape[:1] + (2, 2))
+
+    has_1d = (dims == 1).any(axis=1)
+    has_2d = (dims == 2).any(axis=1) & ~has_1d
+
+    for idx, distortion in [(has_1d, _distortion_1d), 
+                            (has_2d, _distortion_2d)]:
+        if not idx.any():
+            continue
+        zerr = None
+        if zerr_array is not None:
+            zerr = zerr_array[idx]
+        dis[idx], diserr[idx] = distortion(z_array[idx], zerr, dims[idx])
+
+    return dis, diserr
+
+
+#values that should be no distortion in case distortion cannot be 
+#calculated for that component
+_no_distortion = np.identity(2)
+
+
+def _split_real_imag(z_array):
+    """
+    real and imaginary part of Z (n, n_freq, 2, 2) as (n, n_freq, 2, 2, 2)
+    """
+
+    return np.concatenate((np.real(z_array)[:, :, np.newaxis], 
+                           np.imag(z_array)[:, :, np.newaxis]), axis=2)
+
+
+def _weighted_mean(lo_dis, lo_diserr, mask):
+    """
+    weighted mean of the estimates lo_dis (n, n_freq, 2, 2, 2) over the 
+    frequencies in mask (n, n_freq) and the real/imaginary part, weights are
+    1/lo_diserr**2.  Returns the mean, the error and a mask of the entries 
+    with zero sum of weights.
+    """
+
+    mask = mask[:, :, np.newaxis, np.newaxis, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weights = np.where(mask, 1./lo_diserr**2, 0.)
+        weighted = np.where(mask, weights*lo_dis, 0.)
+        sum_weights = weights.sum(axis=2).sum(axis=1)
+        dis = weighted.sum(axis=2).sum(axis=1)/sum_weights
+        diserr = np.sqrt(1./sum_weights)
+
+    zero_weights = sum_weights == 0
+    dis[zero_weights] = np.broadcast_to(_no_distortion, 
+                                        dis.shape)[zero_weights]
+    diserr[zero_weights] = 1e-6*np.broadcast_to(_no_distortion, 
+                                                dis.shape)[zero_weights]
+
+    return dis, diserr, zero_weights
+
+
+def _distortion_1d(z_array, zerr_array, dims):
+    """
+    distortion from the 1D frequencies: D = 1/g * Z * [[0, -1], [1, 0]] for 
+    real and imaginary part, with g = det^0.5
+    """
+
+    z_parts = _split_real_imag(z_array)
+    with np.errstate(invalid='ignore'):
+        g = np.sqrt(z_parts[..., 0, 0]*z_parts[..., 1, 1] - 
+                    z_parts[..., 0, 1]*z_parts[..., 1, 0])
+    g = g[..., np.newaxis, np.newaxis]
+
+    lo_dis = np.empty(z_parts.shape)
+    lo_dis[..., 0, 0] = z_parts[..., 0, 1]
+    lo_dis[..., 0, 1] = -z_parts[..., 0, 0]
+    lo_dis[..., 1, 0] = z_parts[..., 1, 1]
+    lo_dis[..., 1, 1] = -z_parts[..., 1, 0]
+    lo_dis /= g
+
+    if zerr_array is not None:
+        #errors of the entries for calculating the weights
+        zerr = np.abs(zerr_array)[:, :, np.newaxis]
+        lo_diserr = np.empty(z_parts.shape)
+        lo_diserr[..., 0, 0] = zerr[..., 0, 1]
+        lo_diserr[..., 0, 1] = zerr[..., 0, 0]
+        lo_diserr[..., 1, 0] = zerr[..., 1, 1]
+        lo_diserr[..., 1, 1] = zerr[..., 1, 0]
+        lo_diserr /= g
+    else:
+        #otherwise go for evenly weighted average
+        lo_diserr = np.ones(z_parts.shape)
+
+    dis, diserr, zero_weights = _weighted_mean(lo_dis, lo_diserr, dims == 1)
+
+    #if the distortion came out as nan set it to an appropriate value
+    not_found = (np.nan_to_num(dis) == 0) & ~zero_weights
+    no_dis = np.broadcast_to(_no_distortion, dis.shape)
+    dis[not_found] = no_dis[not_found]
+    diserr[not_found] = no_dis[not_found]
+
+    return dis, diserr
+
+
+def _distortion_2d(z_array, zerr_array, dims):
+    """
+    distortion from the 2D frequencies, following Bibby et al. 2005 first 
+    alternative: P = 1, T from the largest value over all frequencies
+    """
+
+    P = 1
+    is_2d = dims == 2
+
+    #rotate to the strike direction
+    angles = -MTge.strike_angle_array(z_array = z_array)[..., 0]
+    angles[np.isnan(angles)] = 0.
+    tetms, tetm_errs = MTcc.rotatematrices_incl_errors(z_array, angles, 
+                                                       zerr_array)
+
+    z_parts = _split_real_imag(tetms)
+    z00 = z_parts[..., 0, 0]
+    z01 = z_parts[..., 0, 1]
+    z10 = z_parts[..., 1, 0]
+    z11 = z_parts[..., 1, 1]
+    det = z00*z11 - z01*z10
+
+    #since there is no 'wrong' solution by a different value of T, no 
+    #error is given/calculated for T !
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lo_t = -4*P*z01*z10/det
+        #maximum as by max() over the frequencies in order, real part 
+        #first: nan if the first value is nan, otherwise nan are ignored
+        first = np.argmax(is_2d, axis=1)
+        t_first = lo_t[np.arange(len(lo_t)), first, 0]
+        t_max = np.where(is_2d[..., np.newaxis] & ~np.isnan(lo_t), lo_t, 
+                         -np.inf).max(axis=2).max(axis=1)
+        t_max[np.isnan(t_first)] = np.nan
+        #just add 0.1% for avoiding numerical issues in the squareroots 
+        #later on
+        T = (np.sqrt(t_max)+0.001)[:, np.newaxis, np.newaxis]
+
+        s = np.sqrt(T**2+4*P*z01*z10/det)
+        par = 2*z01/(T-s)
+        orth = 2*z10/(T+s)
+
+        #D = Z * [[0, 1/orth], [1/par, 0]]
+        lo_dis = np.empty(z_parts.shape)
+        lo_dis[..., 0, 0] = z01/par
+        lo_dis[..., 0, 1] = z00/orth
+        lo_dis[..., 1, 0] = z11/par
+        lo_dis[..., 1, 1] = z10/orth
+
+        if zerr_array is not None:
+            #find errors of entries for calculating weights
+            err = np.real(tetm_errs)[:, :, np.newaxis]
+            e00 = err[..., 0, 0]
+            e01 = err[..., 0, 1]
+            e10 = err[..., 1, 0]
+            e11 = err[..., 1, 1]
+            sigma_s = np.abs(2*P/(det**2*s))*np.sqrt((z01*z10*z11*e00)**2+
+                                                     (z00*z10*z11*e01)**2+
+                                                     (z00*z01*z11*e10)**2+
+                                                     (z01*z10*z00*e11)**2)
+
+            lo_diserr = np.empty(z_parts.shape)
+            lo_diserr[..., 0, 0] = 0.5*sigma_s
+            lo_diserr[..., 1, 1] = 0.5*sigma_s
+            lo_diserr[..., 0, 1] = np.sqrt((1./orth/z00*e00)**2+
+                                           (1./orth/z10*e10)**2+
+                                           (0.5*z00/z10*sigma_s)**2)
+            lo_diserr[..., 1, 0] = np.sqrt((1./par/z11*e11)**2+
+                                           (1./par/z01*e01)**2+
+                                           (0.5*z11/z01*sigma_s)**2)
+        else:
+            #otherwise go for evenly weighted average
+            lo_diserr = np.ones(z_parts.shape)
+
+    dis, diserr, zero_weights = _weighted_mean(lo_dis, lo_diserr, is_2d)
+
     return dis, diserr
 
 
 
-def find_1d_distortion(z_object, include_non1d = False):
+def find_1d_distortion(z_object, include_non1d = False, lo_dims = None):
     """
     find 1D distortion tensor from z object
 
     ONly use the 1D part of the Z to determine D. 
     Treat all frequencies as 1D, if  "include_non1d = True".
 
-    
+    lo_dims can be given to re-use a dimensionality computed before.
     """
 
     if not isinstance(z_object, MTz.Z):
@@ -309,7 +380,8 @@ def find_1d_distortion(z_object, include_non1d = False):
 
     z_obj = z_object
 
-    lo_dims = MTge.dimensionality(z_object=z_obj)
+    if lo_dims is None:
+        lo_dims = MTge.dimensionality_array(z_array = z_obj.z)
 
     if include_non1d is True:
         lo_dims = [1 for i in lo_dims]
@@ -324,13 +396,14 @@ def find_1d_distortion(z_object, include_non1d = False):
 
 
 
-def find_2d_distortion(z_object, include_non2d=False):
+def find_2d_distortion(z_object, include_non2d=False, lo_dims = None):
     """
     find 2D distortion tensor from z object
 
     ONly use the 2D part of the Z to determine D. 
     Treat all frequencies as 2D, if  "include_non2d = True".
-    
+
+    lo_dims can be given to re-use a dimensionality computed before.
     """
 
     if not isinstance(z_object, MTz.Z):
@@ -339,7 +412,8 @@ def find_2d_distortion(z_object, include_non2d=False):
 
     z_obj = z_object
 
-    lo_dims = MTge.dimensionality(z_object = z_obj)
+    if lo_dims is None:
+        lo_dims = MTge.dimensionality_array(z_array = z_obj.z)
 
     #avoid the (standard) 1D distortion call -> remove all 1
     lo_dims = [ 4 if i == 1 else i for i in lo_dims ]
@@ -172,4 +172,74 @@ def eccentricity(z_array = None, z_object = None, pt_array= None, pt_object = No
 
         lo_eccerr.append(ecc_err)
 
-    return np.array(lo_ecc), np.array(lo_eccerr) 
\ No newline at end of file
+    return np.array(lo_ecc), np.array(lo_eccerr) 
+
+
+def dimensionality_array(z_array = None, pt_array = None, beta_threshold = 5, 
+                         eccentricity_threshold = 0.1):
+    """
+    Dimensionality for a stack of Z or PT arrays, e.g. an impedance cube of 
+    shape (n_station, n_freq, 2, 2), in one array operation.
+
+    Same criteria (Bibby et al. 2005) and thresholds as 'dimensionality'.
+
+    Input:
+    - Z : (..., 2, 2) complex valued Numpy array
+    or 
+    - PT : (..., 2, 2) real valued Numpy array
+
+    Output:
+    - (...) integer array with values 1, 2 or 3
+
+    """
+
+    if z_array is not None:
+        pt_array = MTpt.z2pt_array(z_array)[0]
+    elif pt_array is None:
+        raise MTex.MTpyError_inputarguments('Need Z or PT array as input')
+
+    #singular phase tensors give nan - they are 1D, as in 'dimensionality'
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = MTpt.pt_beta(pt_array)[0]
+        ecc = MTpt._pt_pi1(pt_array)[0] / MTpt._pt_pi2(pt_array)[0]
+
+        dimensions = np.ones(beta.shape, dtype=np.int)
+        dimensions[ecc > eccentricity_threshold] = 2
+        dimensions[beta > beta_threshold] = 3
+
+    return dimensions
+
+
+def strike_angle_array(z_array = None, pt_array = None, beta_threshold = 5, 
+                       eccentricity_threshold = 0.1):
+    """
+    Strike angles for a stack of Z or PT arrays, e.g. an impedance cube of 
+    shape (n_station, n_freq, 2, 2), in one array operation.
+
+    Same definition as 'strike_angle': both angles (90 degrees ambiguity), 
+    smaller one first, nan for 1D.
+
+    Output:
+    - (..., 2) array of strike angles in degrees
+
+    """
+
+    if z_array is not None:
+        pt_array = MTpt.z2pt_array(z_array)[0]
+    elif pt_array is None:
+        raise MTex.MTpyError_inputarguments('Need Z or PT array as input')
+
+    dimensions = dimensionality_array(pt_array = pt_array, 
+                                      beta_threshold = beta_threshold, 
+                                      eccentricity_threshold = eccentricity_threshold)
+
+    strike1 = (MTpt.pt_alpha(pt_array)[0] - MTpt.pt_beta(pt_array)[0]) % 90
+    strike2 = np.where((strike1 > 0) & (strike1 < 45), strike1 + 90, 
+                       strike1 - 90)
+
+    strikes = np.empty(strike1.shape + (2,))
+    strikes[..., 0] = np.minimum(strike1, strike2)
+    strikes[..., 1] = np.maximum(strike1, strike2)
+    strikes[dimensions == 1] = np.nan
+
+    return strikes
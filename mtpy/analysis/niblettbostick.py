@@ -99,52 +99,12 @@ def calculate_znb(z_object = None, z_array = None, periods = None):
 	"""
 
 
-	#deal with inputs
-	#if zobject:
-	#z = z_object.z
-	#periods = 1./z_object.freq
-	#else:
-	z = z_array 
-	periods = periods
+	z, periods = _read_z_input(z_object, z_array, periods)
 
+	nb_max, nb_min = znb_array(z, periods)
+	not3d = MTge.dimensionality_array(z_array = z) != 3
 
-	dimensions = MTge.dimensionality(z)
-	angles = MTge.strike_angle(z)
-
-	#reduce actual Z by the 3D layers:
-	z2 = z[np.where(dimensions != 3)[0]]
-	angles2 = angles[np.where(dimensions != 3)[0]]
-	periods2 = periods[np.where(dimensions != 3)[0]]
-
-	angles_incl1D = interpolate_strike_angles(angles2[:,0],periods2)
-	
-	z3 = MTz.rotate_z(z2,-angles_incl1D)[0]
-
-	#at this point we assume that the two modes are the off-diagonal elements!!
-	#TE is element (1,2), TM at (2,1)
-	lo_nb_max = []
-	lo_nb_min = []
-
-	app_res = MTz.z2resphi(z3,periods2)[0]
-	phase = MTz.z2resphi(z3,periods2)[1]
-
-
-	for i,per in enumerate(periods):
-		
-		te_rho, te_depth = rhophi2rhodepth(app_res[i][0,1], phase[i][0,1], per)
-		tm_rho, tm_depth = rhophi2rhodepth(app_res[i][1,0], phase[i][1,0], per)
-		
-		if te_rho > tm_rho:
-			lo_nb_max.append([te_depth, te_rho])
-			lo_nb_min.append([tm_depth, tm_rho])
-		else:
-			lo_nb_min.append([te_depth, te_rho])
-			lo_nb_max.append([tm_depth, tm_rho])
-
-
-
-
-	return np.array(lo_nb_max), np.array(lo_nb_min)
+	return nb_max[not3d], nb_min[not3d]
 
 
 def calculate_rho_minmax(z_object = None, z_array = None, periods = None):
@@ -165,7 +125,7 @@ def calculate_rho_minmax(z_object = None, z_array = None, periods = None):
 	The calculation is carried out by :
 	
 	1) Determine the dimensionality of the Z(T), discard all 3D parts
-	2) loop over periods 
+	2) for all periods at once (see 'rho_minmax_array')
        * rotate Z and calculate app_res_NB for off-diagonal elements
        * find maximum and minimum values
        * write out respective depths and rho values  
@@ -176,75 +136,12 @@ def calculate_rho_minmax(z_object = None, z_array = None, periods = None):
 
 	"""
 
-	#deal with inputs
-	#if zobject:
-	#z = z_object.z
-	#periods = 1./z_object.freq
-	#else:
-	z = z_array 
-	periods = periods
+	z, periods = _read_z_input(z_object, z_array, periods)
 
+	nb_max, nb_min = rho_minmax_array(z, periods)
+	not3d = MTge.dimensionality_array(z_array = z) != 3
 
-	dimensions = MTge.dimensionality(z)
-	angles = MTge.strike_angle(z)
-
-	#reduce actual Z by the 3D layers:
-	z2 = z[np.where(dimensions != 3)[0]]
-	angles2 = angles[np.where(dimensions != 3)[0]]
-	periods2 = periods[np.where(dimensions != 3)[0]]
-
-	lo_nb_max = []
-	lo_nb_min = []
-
-	rotsteps = 360
-	rotangles = np.arange(rotsteps)*180./rotsteps
-
-
-	for i,per in enumerate(periods2):
-		z_curr = z2[i]
-		temp_vals = np.zeros((rotsteps,4))
-
-		for j,d in enumerate(rotangles):
-			new_z = MTcc.rotatematrix_incl_errors(z_curr, d)[0]
-			#print i,per,j,d
-
-			res = MTz.z2resphi(new_z,per)[0]
-			phs = MTz.z2resphi(new_z,per)[1]
-
-			te_rho, te_depth = rhophi2rhodepth(res[0,1], phs[0,1], per)
-			tm_rho, tm_depth = rhophi2rhodepth(res[1,0], phs[1,0], per)
-
-			temp_vals[j,0] = te_depth
-			temp_vals[j,1] = te_rho
-			temp_vals[j,2] = tm_depth
-			temp_vals[j,3] = tm_rho
-		
-		column = (np.argmax([ np.max(temp_vals[:,1]),
-								np.max(temp_vals[:,3])]))*2 + 1
-
-		maxidx = np.argmax(temp_vals[:,column])
-		max_rho = temp_vals[maxidx,column]
-		max_depth = temp_vals[maxidx,column-1]
-		max_ang = rotangles[maxidx]
-		
-		#alternative 1
-		min_column = (np.argmin([ np.max(temp_vals[:,1]),
-								np.max(temp_vals[:,3])]))*2 + 1
-		if max_ang <= 90:
-			min_ang = max_ang + 90
-		else:
-			min_ang = max_ang - 90
-		minidx = np.argmin(np.abs(rotangles-min_ang))
-
-		min_rho = temp_vals[minidx,min_column]
-		min_depth = temp_vals[minidx,min_column-1]
-
-
-		lo_nb_max.append([max_depth, max_rho, max_ang])
-		lo_nb_min.append([min_depth, min_rho])
-		
-
-	return np.array(lo_nb_max), np.array(lo_nb_min)
+	return nb_max[not3d], nb_min[not3d]
 
 
 def interpolate_strike_angles(angles,in_periods):
@@ -304,4 +201,351 @@ def interpolate_strike_angles(angles,in_periods):
 		in_line += 1
 
 	#asserting correct order (same as input) of the angles:
-	return new_angles[back_sorting]
\ No newline at end of file
+	return new_angles[back_sorting]
+
+#=================================================================
+# array versions for whole surveys, Z of shape (n_station, n_freq, 2, 2)
+
+#maximum number of rotated impedances held at once in 'rho_minmax_array'
+_rotation_chunk_size = 2**22
+
+
+def _read_z_input(z_object, z_array, periods):
+	"""
+	return Z array and periods from a Z object or a Z array and periods
+	"""
+
+	if z_object is not None:
+		if not isinstance(z_object, MTz.Z):
+			raise MTex.MTpyError_Z('Input argument is not an instance of the Z class')
+		return z_object.z, 1./z_object.freq
+
+	if z_array is None or periods is None:
+		raise MTex.MTpyError_inputarguments('Need Z object or Z array and periods')
+
+	return np.asarray(z_array), np.asarray(periods)
+
+
+def _read_z_periods(z_array, periods, beta_threshold, eccentricity_threshold):
+	"""
+	check inputs of the array functions, return Z (missing values set to 0), 
+	periods and a mask of the excluded (3D or missing) values
+	"""
+
+	z = np.asarray(z_array)
+	periods = np.asarray(periods, dtype=np.float)
+	if z.ndim < 3 or z.shape[-2:] != (2,2) or \
+	   z.shape[-3] != periods.shape[-1]:
+		raise MTex.MTpyError_inputarguments('Z array must have shape '+
+					'(..., n_freq, 2, 2) with n_freq = len(periods): '+
+					'%s - %s'%(str(z.shape), str(periods.shape)))
+
+	missing = ~np.isfinite(z).all(axis=-1).all(axis=-1)
+	if missing.any():
+		z = np.where(missing[..., np.newaxis, np.newaxis], 0., z)
+
+	dimensions = MTge.dimensionality_array(z_array = z, 
+							beta_threshold = beta_threshold,
+							eccentricity_threshold = eccentricity_threshold)
+
+	return z, periods, missing | (dimensions == 3)
+
+
+def interpolate_strike_angles_array(angles, periods, excluded = None):
+	"""
+	Array version of 'interpolate_strike_angles' for angles of shape 
+	(..., n_freq).
+
+	nan values (1D) are linearly interpolated w.r.t. the periods between 
+	the bounding angles, if 1D on top or bottom, the angle is set to 0.
+	Excluded values (e.g. 3D) are skipped and returned as nan.
+	"""
+
+	angles = np.array(angles, dtype=np.float)
+	periods = np.asarray(periods, dtype=np.float)
+	if excluded is None:
+		excluded = np.zeros(angles.shape, dtype=bool)
+	excluded = np.broadcast_to(excluded, angles.shape)
+
+	#sort in ascending order of periods, one row per station:
+	orig_sorting = np.argsort(periods)
+	back_sorting = np.argsort(orig_sorting)
+	periods = periods[orig_sorting]
+	n_freq = len(periods)
+	ang = angles[..., orig_sorting].reshape(-1, n_freq)
+	excl = excluded[..., orig_sorting].reshape(-1, n_freq)
+	ang[excl] = np.nan
+
+	#1D on top or bottom -> 0 degrees
+	rows = np.arange(len(ang))
+	first = np.argmax(~excl, axis=1)
+	last = n_freq - 1 - np.argmax(~excl[:, ::-1], axis=1)
+	for idx in [first, last]:
+		top_bottom = np.isnan(ang[rows, idx]) & ~excl[rows, idx]
+		ang[rows[top_bottom], idx[top_bottom]] = 0.
+
+	#bounding angles of the nan values
+	valid = ~np.isnan(ang)
+	columns = np.arange(n_freq)
+	idx_before = np.maximum.accumulate(np.where(valid, columns, 0), axis=1)
+	idx_after = np.minimum.accumulate(np.where(valid, columns, 
+									n_freq-1)[:, ::-1], axis=1)[:, ::-1]
+	fill = ~valid & ~excl
+
+	ang1 = ang[rows[:, np.newaxis], idx_before]
+	ang2 = ang[rows[:, np.newaxis], idx_after]
+	per1 = periods[idx_before]
+	per2 = periods[idx_after]
+	with np.errstate(divide='ignore', invalid='ignore'):
+		interpolated = ang1 + (ang2 - ang1)/(per2 - per1) * (periods - per1)
+	ang[fill] = interpolated[fill]
+
+	#asserting correct order (same as input) of the angles:
+	return ang.reshape(angles.shape)[..., back_sorting]
+
+
+def znb_array(z_array, periods, beta_threshold = 5, 
+			  eccentricity_threshold = 0.1):
+	"""
+	Array version of 'calculate_znb' for a whole survey.
+
+	input:
+	- Z array of shape (..., n_freq, 2, 2), e.g. (n_station, n_freq, 2, 2), 
+	  missing values as nan
+	- periods (n_freq)
+
+	output:
+	- (..., n_freq, 2) array, depth/rho_nb for the larger of TE_nb/TM_nb 
+	- (..., n_freq, 2) array, depth/rho_nb for the smaller of TE_nb/TM_nb
+
+	3D and missing values are nan. 
+
+	"""
+
+	z, periods, excluded = _read_z_periods(z_array, periods, beta_threshold,
+										   eccentricity_threshold)
+
+	angles = MTge.strike_angle_array(z_array = z, 
+							beta_threshold = beta_threshold,
+							eccentricity_threshold = eccentricity_threshold)
+	angles = interpolate_strike_angles_array(angles[..., 0], periods, 
+											 excluded)
+	angles[excluded] = 0.
+
+	z_rot = MTcc.rotatematrices_incl_errors(z, -angles)[0]
+
+	#TE is element (1,2), TM at (2,1)
+	app_res = 0.2 * periods[..., np.newaxis, np.newaxis] * np.abs(z_rot)**2
+	phase = np.degrees(np.angle(z_rot)) % 360
+	with np.errstate(divide='ignore', invalid='ignore'):
+		te_rho, te_depth = rhophi2rhodepth(app_res[..., 0, 1], 
+										   phase[..., 0, 1], periods)
+		tm_rho, tm_depth = rhophi2rhodepth(app_res[..., 1, 0], 
+										   phase[..., 1, 0], periods)
+		te_max = te_rho > tm_rho
+	nb_max = np.empty(te_rho.shape + (2,))
+	nb_min = np.empty(te_rho.shape + (2,))
+	nb_max[..., 0] = np.where(te_max, te_depth, tm_depth)
+	nb_max[..., 1] = np.where(te_max, te_rho, tm_rho)
+	nb_min[..., 0] = np.where(te_max, tm_depth, te_depth)
+	nb_min[..., 1] = np.where(te_max, tm_rho, te_rho)
+	nb_max[excluded] = np.nan
+	nb_min[excluded] = np.nan
+
+	return nb_max, nb_min
+
+
+def rho_minmax_array(z_array, periods, rotsteps = 360, beta_threshold = 5,
+					 eccentricity_threshold = 0.1):
+	"""
+	Array version of 'calculate_rho_minmax' for a whole survey.
+
+	The off-diagonal elements of Z are rotated through all angles at once, 
+	in chunks of at most '_rotation_chunk_size' values.
+
+	input:
+	- Z array of shape (..., n_freq, 2, 2), e.g. (n_station, n_freq, 2, 2), 
+	  missing values as nan
+	- periods (n_freq)
+
+	output:
+	- (..., n_freq, 3) array, depth/rho_nb/angle for rho_nb max
+	- (..., n_freq, 2) array, depth/rho_nb for rho_nb min
+
+	3D and missing values are nan. 
+
+	"""
+
+	z, periods, excluded = _read_z_periods(z_array, periods, beta_threshold,
+										   eccentricity_threshold)
+
+	rotangles = np.arange(rotsteps)*180./rotsteps
+	cos2phi = np.cos(np.radians(2*rotangles))
+	sin2phi = np.sin(np.radians(2*rotangles))
+
+	lo_z = z.reshape(-1, 2, 2)
+	lo_periods = np.broadcast_to(periods, z.shape[:-2]).reshape(-1)
+	lo_nb_max = np.zeros((len(lo_z), 3))
+	lo_nb_min = np.zeros((len(lo_z), 2))
+
+	chunk_size = max(1, _rotation_chunk_size / rotsteps)
+	for start in range(0, len(lo_z), chunk_size):
+		z_curr = lo_z[start:start+chunk_size]
+		per = lo_periods[start:start+chunk_size]
+		rows = np.arange(len(z_curr))
+
+		#off-diagonal elements of R * Z * R^T for all angles, with double
+		#angles: Z'xy = a + w, Z'yx = -a + w, w = b*cos(2phi) + c*sin(2phi)
+		a = 0.5*(z_curr[:, 0, 1] - z_curr[:, 1, 0])[:, np.newaxis]
+		b = 0.5*(z_curr[:, 0, 1] + z_curr[:, 1, 0])[:, np.newaxis]
+		c = 0.5*(z_curr[:, 1, 1] - z_curr[:, 0, 0])[:, np.newaxis]
+		w_real = b.real*cos2phi + c.real*sin2phi
+		w_imag = b.imag*cos2phi + c.imag*sin2phi
+
+		#for an even number of steps TM is TE shifted by 90 degrees, the 
+		#maxima are equal and only TE is needed
+		lo_res = []
+		lo_rho = []
+		for sign in [1, -1][:2 - (rotsteps % 2 == 0)]:
+			z_real = w_real + sign*a.real
+			z_imag = w_imag + sign*a.imag
+			res = z_real**2 
+			res += z_imag**2
+			res *= 0.2*per[:, np.newaxis]
+			#rho_nb as in 'rhophi2rhodepth', phase modulo 90 degrees
+			phase = np.arctan2(z_imag, z_real) % (np.pi/2)
+			with np.errstate(divide='ignore', invalid='ignore'):
+				rho = res*(np.pi/2/phase - 1)
+			lo_res.append(res)
+			lo_rho.append(rho)
+		if len(lo_rho) == 1:
+			max_tm = np.zeros(len(z_curr), dtype=np.int)
+			min_tm = max_tm
+			maxidx = np.argmax(lo_rho[0], axis=1)
+		else:
+			#the maxima are equal up to the rounding and the angle steps -
+			#then both are taken from TE
+			te_rho, tm_rho = lo_rho
+			te_rho_max = np.max(te_rho, axis=1)
+			tm_rho_max = np.max(tm_rho, axis=1)
+			max_tm = (tm_rho_max > te_rho_max*(1+1e-10)).astype(np.int)
+			min_tm = (tm_rho_max < te_rho_max*(1-1e-10)).astype(np.int)
+			maxidx = np.argmax(np.where(max_tm[:, np.newaxis], tm_rho, 
+										te_rho), axis=1)
+		max_ang = rotangles[maxidx]
+		min_ang = np.where(max_ang <= 90, max_ang + 90, max_ang - 90)
+		minidx = np.argmin(np.abs(rotangles - min_ang[:, np.newaxis]), axis=1)
+
+		lo_res = np.array(lo_res)
+		lo_rho = np.array(lo_rho)
+		nb_max = lo_nb_max[start:start+chunk_size]
+		nb_max[:, 0] = np.sqrt(lo_res[max_tm, rows, maxidx]*per/2/np.pi/MTcc.mu0)
+		nb_max[:, 1] = lo_rho[max_tm, rows, maxidx]
+		nb_max[:, 2] = max_ang
+		nb_min = lo_nb_min[start:start+chunk_size]
+		nb_min[:, 0] = np.sqrt(lo_res[min_tm, rows, minidx]*per/2/np.pi/MTcc.mu0)
+		nb_min[:, 1] = lo_rho[min_tm, rows, minidx]
+
+	lo_nb_max = lo_nb_max.reshape(z.shape[:-2] + (3,))
+	lo_nb_min = lo_nb_min.reshape(z.shape[:-2] + (2,))
+	lo_nb_max[excluded] = np.nan
+	lo_nb_min[excluded] = np.nan
+
+	return lo_nb_max, lo_nb_min
+
+
+def resample_depth(nb_array, depths):
+	"""
+	Resample Niblett-Bostick resistivities onto a common depth grid.
+
+	Interpolation is linear in log10(depth) and log10(rho_nb), depths 
+	outside of the range of a station are nan.
+
+	input:
+	- (..., n_freq, 2+) array, depth/rho_nb (e.g. output of 'znb_array')
+	- depths (n_depths) in meters
+
+	output:
+	- (..., n_depths) array of rho_nb
+	"""
+
+	nb_array = np.asarray(nb_array, dtype=np.float)
+	depths = np.asarray(depths, dtype=np.float)
+	n_freq = nb_array.shape[-2]
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		log_depth = np.log10(nb_array[..., 0]).reshape(-1, n_freq)
+		log_rho = np.log10(nb_array[..., 1]).reshape(-1, n_freq)
+		log_depth[~np.isfinite(log_rho)] = np.nan
+		log_grid = np.log10(depths)
+
+	#sort depths of every station, nan values go to the end
+	rows = np.arange(len(log_depth))[:, np.newaxis]
+	sorting = np.argsort(log_depth, axis=1)
+	log_depth = log_depth[rows, sorting]
+	log_rho = log_rho[rows, sorting]
+	n_valid = np.sum(np.isfinite(log_depth), axis=1)[:, np.newaxis]
+
+	with np.errstate(invalid='ignore'):
+		idx_after = np.sum(log_depth[:, np.newaxis, :] <= 
+						   log_grid[np.newaxis, :, np.newaxis], axis=2)
+	idx_after = np.minimum(idx_after, n_valid - 1)
+	idx_before = np.maximum(idx_after - 1, 0)
+
+	d1 = log_depth[rows, idx_before]
+	d2 = log_depth[rows, idx_after]
+	r1 = log_rho[rows, idx_before]
+	r2 = log_rho[rows, idx_after]
+	with np.errstate(divide='ignore', invalid='ignore'):
+		weight = np.where(d2 > d1, (log_grid - d1)/(d2 - d1), 0.)
+		rho = 10**(r1 + weight*(r2 - r1))
+
+	outside = (n_valid == 0) | (log_grid < log_depth[:, :1]) | \
+			  (log_grid > log_depth[rows, np.maximum(n_valid - 1, 0)])
+	rho[outside] = np.nan
+
+	return rho.reshape(nb_array.shape[:-2] + (len(depths),))
+
+
+def depth_sections(z_array, periods, depths = None, n_depths = 50, 
+				   rotsteps = 360, beta_threshold = 5, 
+				   eccentricity_threshold = 0.1):
+	"""
+	Niblett-Bostick depth sections for all stations at once.
+
+	input:
+	- Z array of shape (n_station, n_freq, 2, 2), missing values as nan
+	- periods (n_freq)
+
+	optional:
+	- depths : common depth grid in meters, if None n_depths 
+	           logarithmically spaced depths over the range of all stations
+	- rotsteps : number of rotation angles for rho min/max
+
+	output:
+	- depths (n_depths)
+	- Z_nb max (n_station, n_depths)
+	- Z_nb min (n_station, n_depths)
+	- rho_nb max (n_station, n_depths)
+	- rho_nb min (n_station, n_depths)
+
+	"""
+
+	znb_max, znb_min = znb_array(z_array, periods, beta_threshold, 
+								 eccentricity_threshold)
+	rho_max, rho_min = rho_minmax_array(z_array, periods, rotsteps, 
+										beta_threshold, eccentricity_threshold)
+
+	if depths is None:
+		all_depths = np.concatenate([nb[..., 0].ravel() for nb in 
+								[znb_max, znb_min, rho_max, rho_min]])
+		all_depths = all_depths[np.isfinite(all_depths)]
+		all_depths = all_depths[all_depths > 0]
+		if len(all_depths) == 0:
+			raise MTex.MTpyError_value('No 1D or 2D values in Z array')
+		depths = np.logspace(np.log10(all_depths.min()), 
+							 np.log10(all_depths.max()), n_depths)
+
+	return depths, resample_depth(znb_max, depths), \
+		   resample_depth(znb_min, depths), \
+		   resample_depth(rho_max, depths), resample_depth(rho_min, depths)
@@ -45,6 +45,10 @@ Contains classes and functions for handling Phase Tensor analysis of given imped
     Functions:
 
     - z2pt
+    - z2pt_array
+    - z2pt_invariants
+    - pt_trace, pt_skew, pt_det, pt_alpha, pt_beta, pt_azimuth,
+      pt_phimin, pt_phimax, pt_ellipticity
     - z_object2pt
     - edi_object2pt
     - edi_file2pt
@@ -300,6 +304,34 @@ class PhaseTensor(object):
     
     freq = property(_get_freq, _set_freq,doc="freq array")
 
+    def _compute_pt(self):
+        """
+            Compute pt (and pterr, if Z-errors are given) from the Z array for 
+            all frequencies at once.
+
+            Singular matrices give pt = np.zeros((2,2)).
+        """
+
+        if self._z is None:
+            return
+
+        self._pt, pterr = z2pt_array(self._z, self._z_err)
+        if pterr is None:
+            pterr = np.zeros_like(self._pt)
+        self._pterr = pterr
+
+        #report singular matrices, that are not just zero
+        realz = np.real(self._z)
+        detreal = realz[:,0,0] * realz[:,1,1] - realz[:,0,1] * realz[:,1,0]
+        singular = (detreal == 0) & (np.abs(self._z).sum(axis=(1,2)) != 0)
+        for idx_f in np.where(singular)[0]:
+            try:
+                print 'Singular Matrix at {0:.5g} Hz'.format(
+                                               self._freq[idx_f])
+            except (TypeError, IndexError, ValueError):
+                print 'Computed singular matrix'
+                print '  --> pt[{0}]=np.zeros((2,2))'.format(idx_f)
+
     #---z_object---------------------------------------------------------------
     
     def set_z_object(self, z_object):
@@ -311,34 +343,7 @@ class PhaseTensor(object):
         self._z = z_object.z
         self._z_err = z_object.zerr
         self._freq = z_object.freq
-        self._pt = np.zeros_like(self._z, dtype=np.float)
-        self._pterr = np.zeros_like(self._z, dtype=np.float)
- 
-        if self._z_err is not None:
-            for idx_f in range(len(self._z)):
-                try:
-                    self._pt[idx_f], self._pterr[idx_f] = z2pt(self._z[idx_f], 
-                                                             self._z_err[idx_f])
-                except MTex.MTpyError_PT:
-                    try:
-                        print 'Singular Matrix at {0:.5g} Hz'.format(
-                                                       self._freq[idx_f])
-                    except AttributeError:
-                        print 'Computed singular matrix'
-                        print '  --> pt[{0}]=np.zeros((2,2))'.format(idx_f)
-            
-            #--> if there is not error to the impedance tensor
-            else:
-                for idx_f in range(len(self._z)):
-                    try:
-                        self._pt[idx_f] = z2pt(self._z[idx_f])[0]
-                    except MTex.MTpyError_PT:
-                        try:
-                            print 'Singular Matrix at {0:.5g}'.format(
-                                                       self._freq[idx_f])
-                        except AttributeError:
-                            print 'Computed singular matrix'
-                            print '  --> pt[{0}]=np.zeros((2,2))'.format(idx_f)
+        self._compute_pt()
 
         self.rotation_angle = z_object.rotation_angle
         
@@ -360,37 +365,8 @@ class PhaseTensor(object):
         """
 
         self._z = z_array
-        self._pt = np.zeros_like(self._z, dtype=np.float)
-        self._pterr = np.zeros_like(self._z, dtype=np.float)
-
-        if self._z_err is not None and self._z is not None:
-            for idx_f in range(len(self._z)):
-                try:
-                    self._pt[idx_f], self._pterr[idx_f] = z2pt(self._z[idx_f], 
-                                                             self._z_err[idx_f])
-                except MTex.MTpyError_PT:
-                    try:
-                        print 'Singular Matrix at {0:.5g} Hz'.format(
-                                                       self._freq[idx_f])
-                    except AttributeError:
-                        print 'Computed singular matrix'
-                        print '  --> pt[{0}]=np.zeros((2,2))'.format(idx_f)
-            
-        #--> if there is not error to the impedance tensor
-        elif self._z is not None:
-            for idx_f in range(len(self._z)):
-                try:
-                    self._pt[idx_f] = z2pt(self._z[idx_f])[0]
-                except MTex.MTpyError_PT:
-                    try:
-                        print 'Singular Matrix at {0:.5g}'.format(
-                                                   self._freq[idx_f])
-                    except AttributeError:
-                        print 'Computed singular matrix'
-                        print '  --> pt[{0}]=np.zeros((2,2))'.format(idx_f)
-                
+        self._compute_pt()
 
-                
     # def _get_z(self):
     #     return self._z
         
@@ -408,34 +384,7 @@ class PhaseTensor(object):
             print 'z and z_err are not the not the same shape, setting '+\
                   'z_err to None'
 
-        self._pt = np.zeros_like(self._z, dtype=np.float)
-        self._pterr = np.zeros_like(self._z, dtype=np.float)
- 
-        if self._z_err is not None:
-            for idx_f in range(len(self._z)):
-                try:
-                    self.pt[idx_f], self.pterr[idx_f] = z2pt(self._z[idx_f], 
-                                                             self._z_err[idx_f])
-                except MTex.MTpyError_PT:
-                    try:
-                        print 'Singular Matrix at {0:.5g} Hz'.format(
-                                                       self._freq[idx_f])
-                    except AttributeError:
-                        print 'Computed singular matrix'
-                        print '  --> pt[{0}]=np.zeros((2,2))'.format(idx_f)
-            
-            #--> if there is not error to the impedance tensor
-            else:
-                for idx_f in range(len(self.z)):
-                    try:
-                        self._pt[idx_f] = z2pt(self._z[idx_f])[0]
-                    except MTex.MTpyError_PT:
-                        try:
-                            print 'Singular Matrix at {0:.5g}'.format(
-                                                       self._freq[idx_f])
-                        except AttributeError:
-                            print 'Computed singular matrix'
-                            print '  --> pt[{0}]=np.zeros((2,2))'.format(idx_f)
+        self._compute_pt()
 
     # def _get_z_err(self):
     #     return self._z_err
@@ -482,18 +431,11 @@ class PhaseTensor(object):
             - Error of Trace(PT) - Numpy array
 
         """
+
         if self.pt is None:
             return None, None
-        
-        tr = np.array( [np.trace(i) for i in self.pt])
-
-        tr_err = None
-        if self.pterr is not None:
-            tr_err = np.zeros_like(tr)
-            tr_err[:] = self.pterr[:,0,0] + self.pterr[:,1,1]
-
 
-        return [tr, tr_err]
+        return pt_trace(self.pt, self.pterr)
 
     trace = property(_get_trace, doc= "")
 
@@ -512,22 +454,8 @@ class PhaseTensor(object):
         if self.pt is None:
             return None, None
 
-        alpha = np.degrees(0.5 * np.arctan2( self.pt[:,0,1] + self.pt[:,1,0],
-                                            self.pt[:,0,0] - self.pt[:,1,1]))
-        
-        alphaerr = None
-        if self.pterr is not None:
-            alphaerr = np.zeros_like(alpha)
-            y = self.pt[:,0,1] + self.pt[:,1,0]
-            yerr = np.sqrt( self.pterr[:,0,1]**2 + self.pterr[:,1,0]**2  )
-            x = self.pt[:,0,0] - self.pt[:,1,1] 
-            xerr = np.sqrt( self.pterr[:,0,0]**2 + self.pterr[:,1,1]**2  )
-
-            alphaerr[:] = 0.5 / ( x**2 + y**2) * np.sqrt(y**2 * xerr**2 + \
-                                                         x**2 * yerr**2 )
-
-        return [alpha, alphaerr]
-        
+        return pt_alpha(self.pt, self.pterr)
+
     alpha = property(_get_alpha, doc = "")
 
     #---beta-------------------------------------------------------------
@@ -544,22 +472,8 @@ class PhaseTensor(object):
 
         if self.pt is None:
             return None, None
-        
-        beta = np.degrees(0.5 * np.arctan2( self.skew[0], self.trace[0])  )
-        betaerr = None
-
-        if self.pterr is not None:
-            betaerr = np.zeros_like(beta)
-
-            y = self.skew[0]
-            yerr = self.skew[1]
-            x = self.trace[0]
-            xerr = self.trace[1]
 
-            betaerr[:] = 0.5 / ( x**2 + y**2) * np.sqrt( y**2 * xerr**2 +\
-                                                         x**2 * yerr**2 )
-
-        return [beta, betaerr]
+        return pt_beta(self.pt, self.pterr)
 
     beta = property(_get_beta, doc="")
 
@@ -573,17 +487,11 @@ class PhaseTensor(object):
             - Error of Skew(PT) - Numpy array
 
         """
+
         if self.pt is None:
             return None, None
-       
-        skew = np.array([i[0,1] - i[1,0] for i in self.pt])
-        
-        skewerr = None
-        if self.pterr is not None:
-            skewerr = np.zeros_like(skew)
-            skewerr[:] = self.pterr[:,0,1] + self.pterr[:,1,0]
 
-        return [skew, skewerr]
+        return pt_skew(self.pt, self.pterr)
 
     skew = property(_get_skew, doc="Skew angle in degrees")
 
@@ -606,16 +514,9 @@ class PhaseTensor(object):
 
         if self.pt is None:
             return None, None
-            
-        az = self.alpha[0] - self.beta[0]
-        
-        if self.pterr is not None:
-            az_err = np.sqrt(self.alpha[1]+self.beta[1])
-        else:
-            az_err = None
-            
-        return [az, az_err]
-        
+
+        return pt_azimuth(self.pt, self.pterr)
+
     azimuth = property(_get_azimuth, 
                        doc="Azimuth angle (deg) related to geoelectric strike")
                        
@@ -633,21 +534,12 @@ class PhaseTensor(object):
                                   ellipticity errors
                                   
         """
-        
+
         if self.pt is None:
             return None, None
-            
-        ellip = (self.phimax[0]-self.phimin[0])/(self.phimax[0]+self.phimin[0])
-        
-        if self.pterr is not None:
-            ellip_err = ellip * np.sqrt(self.phimax[1]+self.phimin[1])*\
-                        np.sqrt((1/(self.phimax[0]-self.phimin[0]))**2+\
-                        (1/(self.phimax[0]+self.phimin[0]))**2)
-        else:
-            ellip_err = None
-            
-        return [ellip, ellip_err]
-        
+
+        return pt_ellipticity(self.pt, self.pterr)
+
     ellipticity = property(_get_ellipticity,
                            doc="Ellipticity of phase tensor related to "+\
                                "dimensionality")
@@ -661,20 +553,11 @@ class PhaseTensor(object):
             - Error of Det(PT) - Numpy array
 
         """
+
         if self.pt is None:
             return None, None
 
-        det_phi = np.array( [np.linalg.det(i) for i in self.pt])
-        
-        det_phi_err = None
-        if self.pterr is not None:
-            det_phi_err = np.zeros_like(det_phi)
-            det_phi_err[:] = np.abs(self.pt[:,1,1] * self.pterr[:,0,0]) +\
-                             np.abs(self.pt[:,0,0] * self.pterr[:,1,1]) +\
-                             np.abs(self.pt[:,0,1] * self.pterr[:,1,0]) +\
-                             np.abs(self.pt[:,1,0] * self.pterr[:,0,1])
-
-        return [det_phi, det_phi_err]
+        return pt_det(self.pt, self.pterr)
 
     det = property(_get_det, doc = "")
 
@@ -693,16 +576,7 @@ class PhaseTensor(object):
         """
         #after bibby et al. 2005
 
-        pi1 = 0.5 * np.sqrt((self.pt[:,0,0] - self.pt[:,1,1])**2 +\
-                             (self.pt[:,0,1] + self.pt[:,1,0])**2)
-        pi1err = None
-
-        if self.pterr is not None:
-            pi1err = 1./ pi1 * np.sqrt( (self.pt[:,0,0] - self.pt[:,1,1] )**2 *\
-                              (self.pterr[:,0,0]**2 + self.pterr[:,1,1]**2)  +\
-                              (self.pt[:,0,1] + self.pt[:,1,0] )**2 * \
-                              (self.pterr[:,0,1]**2 + self.pterr[:,1,0]**2) )
-        return pi1, pi1err
+        return _pt_pi1(self.pt, self.pterr)
         
     #---principle component 2----------------------------------------------
     def _pi2(self):
@@ -719,20 +593,8 @@ class PhaseTensor(object):
         """
         #after bibby et al. 2005
 
-        pi2 = 0.5 * np.sqrt((self.pt[:,0,0] + self.pt[:,1,1])**2 +\
-                              (self.pt[:,0,1] - self.pt[:,1,0])**2)
-        pi2err = None
-
-        if self.pterr is not None:
-            pi2err = 1./ pi2 * np.sqrt( (self.pt[:,0,0] + self.pt[:,1,1] )**2 *
-                    (self.pterr[:,0,0]**2 + self.pterr[:,1,1]**2)  +\
-                    (self.pt[:,0,1] - self.pt[:,1,0] )**2 *\
-                    (self.pterr[:,0,1]**2 + self.pterr[:,1,0]**2) )
-
-
-        return pi2, pi2err
-   
-
+        return _pt_pi2(self.pt, self.pterr)
+        
     #---phimin----------------------------------------------
     def _get_phimin(self):
         """
@@ -750,15 +612,7 @@ class PhaseTensor(object):
         if self.pt is None:
             return None, None
 
-        phimin = self._pi2()[0] - self._pi1()[0]
-
-        phiminerr = None
-        if self.pterr is not None:
-            phiminerr = np.sqrt(self._pi2()[1]**2+self._pi1()[1]**2)
- 
-            return [np.degrees(np.arctan(phimin)), np.degrees(np.arctan(phiminerr))]
-        else:
-            return [np.degrees(np.arctan(phimin)),None]
+        return pt_phimin(self.pt, self.pterr)
 
     phimin = property(_get_phimin, doc =" Minimum phase in degrees")
 
@@ -774,20 +628,11 @@ class PhaseTensor(object):
             - Error of Phi_max - Numpy array
 
         """
-        
 
         if self.pt is None:
             return None, None
 
-        phimax = self._pi2()[0] + self._pi1()[0]
-
-        phimaxerr = None
-        if self.pterr is not None:
-            phimaxerr = np.sqrt(self._pi2()[1]**2+self._pi1()[1]**2)
- 
-            return [np.degrees(np.arctan(phimax)), np.degrees(np.arctan(phimaxerr))]
-        else:
-            return [np.degrees(np.arctan(phimax)),None]
+        return pt_phimax(self.pt, self.pterr)
 
     phimax = property(_get_phimax, doc = "Maximum phase in degrees")
 
@@ -1279,56 +1124,367 @@ def z2pt(z_array, zerr_array = None):
         return pt_array, pterr_array
 
     #else:
-    pt_array = np.zeros((z_array.shape[0],2,2))
+    singular = np.where(np.linalg.det(np.real(z_array)) == 0)[0]
+    if len(singular) > 0:
+        raise MTex.MTpyError_Z('Warning - z-array no. {0} contains a singular matrix,'\
+        ' thus it cannot be converted into a PT!'.format(singular[0]))
 
-    for idx_f in range(len(z_array)):       
-        
-        realz = np.real(z_array[idx_f])
-        imagz = np.imag(z_array[idx_f])
+    return z2pt_array(z_array, zerr_array)
 
-        detreal = np.linalg.det(realz)
-        if detreal == 0 :
-            raise MTex.MTpyError_Z('Warning - z-array no. {0} contains a singular matrix,'\
-            ' thus it cannot be converted into a PT!'.format(idx_f))            
 
-        pt_array[idx_f,0,0] =  realz[1,1] * imagz[0,0] - realz[0,1] * imagz[1,0] 
-        pt_array[idx_f,0,1] =  realz[1,1] * imagz[0,1] - realz[0,1] * imagz[1,1] 
-        pt_array[idx_f,1,0] =  realz[0,0] * imagz[1,0] - realz[1,0] * imagz[0,0] 
-        pt_array[idx_f,1,1] =  realz[0,0] * imagz[1,1] - realz[1,0] * imagz[0,1] 
+def z2pt_array(z_array, zerr_array = None):
+    """
+        Calculate Phase Tensors from a stack of Z arrays (incl. uncertainties)
+        in one array operation.
 
-        pt_array /= detreal
+        The stack can have any number of leading dimensions, e.g. 
+        (n_freq, 2, 2) or (n_station, n_freq, 2, 2). The error propagation is
+        the same as for a single matrix in 'z2pt'.
 
-        if zerr_array is None:
-            return pt_array, pterr_array
+        Singular matrices (det(Re(Z)) == 0) give PT = 0 and PT-error = 0, 
+        in the same way as in the PhaseTensor class.
 
-        pterr_array = np.zeros_like(pt_array)
-        pterr_array[idx_f,0,0] = 1/detreal * (np.abs( -pt_array[idx_f,0,0] * realz[1,1] * zerr_array[0,0]) + \
-                                        np.abs(  pt_array[idx_f,0,0] * realz[0,1] * zerr_array[1,0]) + \
-                                        np.abs(  (imagz[0,0] - pt_array[idx_f,0,0] * realz[0,0] ) * zerr_array[1,1]) +\
-                                        np.abs(  (-imagz[1,0]+ pt_array[idx_f,0,0] * realz[1,0] ) * zerr_array[0,1]) + \
-                                        np.abs(  realz[1,1] * zerr_array[0,0]) + np.abs( realz[0,1] * zerr_array[1,0]) )
-
-        pterr_array[idx_f,0,1] = 1/detreal * (np.abs( -pt_array[idx_f,0,1] * realz[1,1] * zerr_array[0,0]) + \
-                                        np.abs(  pt_array[idx_f,0,1] * realz[0,1] * zerr_array[1,0]) + \
-                                        np.abs(  (imagz[0,1] - pt_array[idx_f,0,1] * realz[0,0] ) * zerr_array[1,1]) +\
-                                        np.abs(  (-imagz[1,1]+ pt_array[idx_f,0,1] * realz[1,0] ) * zerr_array[0,1]) + \
-                                        np.abs(  realz[1,1] * zerr_array[0,1]) + np.abs( realz[0,1] * zerr_array[1,1]) )
-
-        pterr_array[idx_f,1,0] = 1/detreal * (np.abs(  (imagz[1,0] - pt_array[idx_f,1,0] * realz[1,1] ) * zerr_array[0,0]) +\
-                                        np.abs( pt_array[idx_f,1,0] * realz[1,0] * zerr_array[0,1]) + \
-                                        np.abs(  (-imagz[0,0] + pt_array[idx_f,1,0] * realz[0,1] ) * zerr_array[1,0]) + \
-                                        np.abs( -pt_array[idx_f,1,0] * realz[0,0] * zerr_array[1,1]) + \
-                                        np.abs(  realz[0,0] * zerr_array[1,0]) + np.abs( -realz[1,0] * zerr_array[0,0]) )
-
-        pterr_array[idx_f,1,1] = 1/detreal * (np.abs(  (imagz[1,1] - pt_array[idx_f,1,1] * realz[1,1] ) * zerr_array[0,0]) +\
-                                        np.abs( pt_array[idx_f,1,1] * realz[1,0] * zerr_array[0,1]) + \
-                                        np.abs(  (-imagz[0,1] + pt_array[idx_f,1,1] * realz[0,1] ) * zerr_array[1,0]) + \
-                                        np.abs( -pt_array[idx_f,1,1] * realz[0,0] * zerr_array[1,1]) + \
-                                        np.abs(  realz[0,0] * zerr_array[1,1]) + np.abs( -realz[1,0] * zerr_array[0,1]) )
+        Input:
+        - Z : (..., 2, 2) complex valued Numpy array
+
+        Optional:
+        - Z-error : (..., 2, 2) real valued Numpy array
+
+        Return:
+        - PT : (..., 2, 2) real valued Numpy array
+        - PT-error : (..., 2, 2) real valued Numpy array (or None)
+
+    """
+
+    try:
+        z_array = np.asarray(z_array)
+        if z_array.shape[-2:] != (2,2):
+            raise
+    except:
+        raise MTex.MTpyError_PT('Error - incorrect z array: %s instead of (...,2,2)'%(str(np.shape(z_array))))
+
+    if zerr_array is not None:
+        zerr_array = np.asarray(zerr_array)
+        if not z_array.shape == zerr_array.shape:
+            raise MTex.MTpyError_PT('Error - z-array and z-err-array have different shape: %s;%s'%(str(z_array.shape), str(zerr_array.shape)))
+
+    realz = np.real(z_array)
+    imagz = np.imag(z_array)
+
+    r00 = realz[..., 0, 0]
+    r01 = realz[..., 0, 1]
+    r10 = realz[..., 1, 0]
+    r11 = realz[..., 1, 1]
+    i00 = imagz[..., 0, 0]
+    i01 = imagz[..., 0, 1]
+    i10 = imagz[..., 1, 0]
+    i11 = imagz[..., 1, 1]
+
+    detreal = r00 * r11 - r01 * r10
+    singular = detreal == 0
+    #avoid division by zero - singular entries are zeroed at the end
+    detreal = np.where(singular, 1., detreal)
+
+    pt_array = np.zeros(realz.shape)
+    pt_array[..., 0, 0] = (r11 * i00 - r01 * i10) / detreal
+    pt_array[..., 0, 1] = (r11 * i01 - r01 * i11) / detreal
+    pt_array[..., 1, 0] = (r00 * i10 - r10 * i00) / detreal
+    pt_array[..., 1, 1] = (r00 * i11 - r10 * i01) / detreal
+    pt_array[singular] = 0.
+
+    if zerr_array is None:
+        return pt_array, None
+
+    e00 = np.abs(zerr_array[..., 0, 0])
+    e01 = np.abs(zerr_array[..., 0, 1])
+    e10 = np.abs(zerr_array[..., 1, 0])
+    e11 = np.abs(zerr_array[..., 1, 1])
+
+    p00 = pt_array[..., 0, 0]
+    p01 = pt_array[..., 0, 1]
+    p10 = pt_array[..., 1, 0]
+    p11 = pt_array[..., 1, 1]
+
+    absdet = np.abs(detreal)
+
+    #Z entries are independent -> use Gaussian error propagation (squared sums/2-norm)
+    pterr_array = np.zeros(realz.shape)
+    pterr_array[..., 0, 0] = 1 / absdet * np.sqrt((p00 * r11 * e00)**2 + 
+                                (p00 * r01 * e10)**2 + 
+                                ((i00 * r10 - r00 * i10) / absdet * r00 * e01)**2 + 
+                                ((i10 * r00 - r10 * i11) / absdet * r01 * e11)**2 + 
+                                (r11 * e00)**2 + 
+                                (r01 * e10)**2)
+
+    pterr_array[..., 0, 1] = 1 / absdet * np.sqrt((p01 * r11 * e00)**2 + 
+                                (p01 * r01 * e10)**2 + 
+                                ((i01 * r10 - r00 * i11) / absdet * r11 * e01)**2 + 
+                                ((i11 * r00 - r01 * i10) / absdet * r01 * e11)**2 + 
+                                (r11 * e01)**2 + 
+                                (r01 * e11)**2)
+
+    pterr_array[..., 1, 0] = 1 / absdet * np.sqrt((p10 * r10 * e01)**2 + 
+                                (p10 * r00 * e11)**2 + 
+                                ((i00 * r11 - r01 * i11) / absdet * r10 * e00)**2 + 
+                                ((i10 * r01 - r11 * i00) / absdet * r00 * e01)**2 + 
+                                (r10 * e00)**2 + 
+                                (r00 * e10)**2)
+
+    pterr_array[..., 1, 1] = 1 / absdet * np.sqrt((p11 * r10 * e01)**2 + 
+                                (p11 * r00 * e11)**2 + 
+                                ((i01 * r11 - r01 * i11) / absdet * r10 * e00)**2 + 
+                                ((i11 * r01 - r11 * i01) / absdet * r00 * e01)**2 + 
+                                (r10 * e01)**2 + 
+                                (r00 * e11)**2)
+    pterr_array[singular] = 0.
 
     return pt_array, pterr_array
 
 
+#--- invariants of stacks of phase tensors (..., 2, 2) -----------------------
+# All functions return [value, error] (error is None, if pterr is None), with
+# the same definitions as the respective PhaseTensor properties.
+
+def pt_trace(pt_array, pterr_array = None):
+    """
+        Return the trace of PT (incl. uncertainties).
+    """
+
+    tr = pt_array[..., 0, 0] + pt_array[..., 1, 1]
+
+    tr_err = None
+    if pterr_array is not None:
+        tr_err = pterr_array[..., 0, 0] + pterr_array[..., 1, 1]
+
+    return [tr, tr_err]
+
+
+def pt_skew(pt_array, pterr_array = None):
+    """
+        Return the skew of PT (incl. uncertainties).
+    """
+
+    skew = pt_array[..., 0, 1] - pt_array[..., 1, 0]
+
+    skewerr = None
+    if pterr_array is not None:
+        skewerr = pterr_array[..., 0, 1] + pterr_array[..., 1, 0]
+
+    return [skew, skewerr]
+
+
+def pt_det(pt_array, pterr_array = None):
+    """
+        Return the determinant of PT (incl. uncertainties).
+    """
+
+    det_phi = pt_array[..., 0, 0] * pt_array[..., 1, 1] - \
+              pt_array[..., 0, 1] * pt_array[..., 1, 0]
+
+    det_phi_err = None
+    if pterr_array is not None:
+        det_phi_err = np.abs(pt_array[..., 1, 1] * pterr_array[..., 0, 0]) +\
+                      np.abs(pt_array[..., 0, 0] * pterr_array[..., 1, 1]) +\
+                      np.abs(pt_array[..., 0, 1] * pterr_array[..., 1, 0]) +\
+                      np.abs(pt_array[..., 1, 0] * pterr_array[..., 0, 1])
+
+    return [det_phi, det_phi_err]
+
+
+def pt_alpha(pt_array, pterr_array = None):
+    """
+        Return the principal axis angle (strike) of PT in degrees 
+        (incl. uncertainties).
+    """
+
+    y = pt_array[..., 0, 1] + pt_array[..., 1, 0]
+    x = pt_array[..., 0, 0] - pt_array[..., 1, 1]
+
+    alpha = np.degrees(0.5 * np.arctan2(y, x))
+
+    alphaerr = None
+    if pterr_array is not None:
+        yerr = np.sqrt(pterr_array[..., 0, 1]**2 + pterr_array[..., 1, 0]**2)
+        xerr = np.sqrt(pterr_array[..., 0, 0]**2 + pterr_array[..., 1, 1]**2)
+
+        alphaerr = 0.5 / (x**2 + y**2) * np.sqrt(y**2 * xerr**2 + \
+                                                 x**2 * yerr**2)
+
+    return [alpha, alphaerr]
+
+
+def pt_beta(pt_array, pterr_array = None):
+    """
+        Return the 3D-dimensionality angle Beta of PT in degrees 
+        (incl. uncertainties).
+    """
+
+    y, yerr = pt_skew(pt_array, pterr_array)
+    x, xerr = pt_trace(pt_array, pterr_array)
+
+    beta = np.degrees(0.5 * np.arctan2(y, x))
+
+    betaerr = None
+    if pterr_array is not None:
+        betaerr = 0.5 / (x**2 + y**2) * np.sqrt(y**2 * xerr**2 + \
+                                                x**2 * yerr**2)
+
+    return [beta, betaerr]
+
+
+def _pt_pi1(pt_array, pterr_array = None):
+    """
+        Return Pi1 (incl. uncertainties) after Bibby et al. 2005.
+    """
+
+    x = pt_array[..., 0, 0] - pt_array[..., 1, 1]
+    y = pt_array[..., 0, 1] + pt_array[..., 1, 0]
+
+    pi1 = 0.5 * np.sqrt(x**2 + y**2)
+
+    pi1err = None
+    if pterr_array is not None:
+        pi1err = 1. / pi1 * np.sqrt(x**2 * (pterr_array[..., 0, 0]**2 + 
+                                            pterr_array[..., 1, 1]**2) + 
+                                    y**2 * (pterr_array[..., 0, 1]**2 + 
+                                            pterr_array[..., 1, 0]**2))
+
+    return pi1, pi1err
+
+
+def _pt_pi2(pt_array, pterr_array = None):
+    """
+        Return Pi2 (incl. uncertainties) after Bibby et al. 2005.
+    """
+
+    x = pt_array[..., 0, 0] + pt_array[..., 1, 1]
+    y = pt_array[..., 0, 1] - pt_array[..., 1, 0]
+
+    pi2 = 0.5 * np.sqrt(x**2 + y**2)
+
+    pi2err = None
+    if pterr_array is not None:
+        pi2err = 1. / pi2 * np.sqrt(x**2 * (pterr_array[..., 0, 0]**2 + 
+                                            pterr_array[..., 1, 1]**2) + 
+                                    y**2 * (pterr_array[..., 0, 1]**2 + 
+                                            pterr_array[..., 1, 0]**2))
+
+    return pi2, pi2err
+
+
+def pt_phimin(pt_array, pterr_array = None):
+    """
+        Return the angle Phi_min = Pi2 - Pi1 of PT in degrees 
+        (incl. uncertainties).
+    """
+
+    pi1, pi1err = _pt_pi1(pt_array, pterr_array)
+    pi2, pi2err = _pt_pi2(pt_array, pterr_array)
+
+    phimin = np.degrees(np.arctan(pi2 - pi1))
+
+    phiminerr = None
+    if pterr_array is not None:
+        phiminerr = np.degrees(np.arctan(np.sqrt(pi2err**2 + pi1err**2)))
+
+    return [phimin, phiminerr]
+
+
+def pt_phimax(pt_array, pterr_array = None):
+    """
+        Return the angle Phi_max = Pi2 + Pi1 of PT in degrees 
+        (incl. uncertainties).
+    """
+
+    pi1, pi1err = _pt_pi1(pt_array, pterr_array)
+    pi2, pi2err = _pt_pi2(pt_array, pterr_array)
+
+    phimax = np.degrees(np.arctan(pi2 + pi1))
+
+    phimaxerr = None
+    if pterr_array is not None:
+        phimaxerr = np.degrees(np.arctan(np.sqrt(pi2err**2 + pi1err**2)))
+
+    return [phimax, phimaxerr]
+
+
+def pt_azimuth(pt_array, pterr_array = None):
+    """
+        Return the azimuth angle alpha - beta (related to geoelectric strike)
+        in degrees (incl. uncertainties).
+    """
+
+    alpha, alphaerr = pt_alpha(pt_array, pterr_array)
+    beta, betaerr = pt_beta(pt_array, pterr_array)
+
+    az_err = None
+    if pterr_array is not None:
+        az_err = np.sqrt(alphaerr + betaerr)
+
+    return [alpha - beta, az_err]
+
+
+def pt_ellipticity(pt_array, pterr_array = None):
+    """
+        Return the ellipticity (phimax-phimin)/(phimax+phimin) of PT 
+        (incl. uncertainties).
+    """
+
+    phimax, phimaxerr = pt_phimax(pt_array, pterr_array)
+    phimin, phiminerr = pt_phimin(pt_array, pterr_array)
+
+    ellip = (phimax - phimin) / (phimax + phimin)
+
+    ellip_err = None
+    if pterr_array is not None:
+        ellip_err = ellip * np.sqrt(phimaxerr + phiminerr) *\
+                    np.sqrt((1 / (phimax - phimin))**2 + \
+                            (1 / (phimax + phimin))**2)
+
+    return [ellip, ellip_err]
+
+
+def z2pt_invariants(z_array, zerr_array = None):
+    """
+        Calculate Phase Tensors and all their invariants (incl. uncertainties) 
+        for a stack of Z arrays, e.g. an impedance cube of shape 
+        (n_station, n_freq, 2, 2), in one go.
+
+        Input:
+        - Z : (..., 2, 2) complex valued Numpy array
+
+        Optional:
+        - Z-error : (..., 2, 2) real valued Numpy array
+
+        Return:
+        - dictionary with keys 'pt', 'pterr' ((..., 2, 2) arrays) and 
+          'trace', 'skew', 'det', 'alpha', 'beta', 'azimuth', 'phimin', 
+          'phimax', 'ellipticity' ([value, error] pairs of (...) arrays, 
+          error is None if no Z-error is given)
+
+    """
+
+    pt_array, pterr_array = z2pt_array(z_array, zerr_array)
+
+    pt_dict = {}
+    pt_dict['pt'] = pt_array
+    pt_dict['pterr'] = pterr_array
+
+    #suppress warnings from singular (zero) phase tensors 
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pt_dict['trace'] = pt_trace(pt_array, pterr_array)
+        pt_dict['skew'] = pt_skew(pt_array, pterr_array)
+        pt_dict['det'] = pt_det(pt_array, pterr_array)
+        pt_dict['alpha'] = pt_alpha(pt_array, pterr_array)
+        pt_dict['beta'] = pt_beta(pt_array, pterr_array)
+        pt_dict['azimuth'] = pt_azimuth(pt_array, pterr_array)
+        pt_dict['phimin'] = pt_phimin(pt_array, pterr_array)
+        pt_dict['phimax'] = pt_phimax(pt_array, pterr_array)
+        pt_dict['ellipticity'] = pt_ellipticity(pt_array, pterr_array)
+
+    return pt_dict
+
+
 
 def z_object2pt(z_object):
     """
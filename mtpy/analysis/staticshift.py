@@ -6,6 +6,9 @@ Static Shift
 
     * module for estimating static shift
     
+    * compute_survey_median_ss estimates the static shift of all stations
+      of a survey in one pass, using a KD-tree for the neighbour search
+    
 Created on Mon Aug 19 10:06:21 2013
 
 @author: jpeacock
@@ -14,9 +17,23 @@ Created on Mon Aug 19 10:06:21 2013
 #==============================================================================
 import mtpy.core.edi as mtedi
 import os
+import multiprocessing
+import warnings
 import numpy as np
+from scipy.spatial import cKDTree
+
+import mtpy.utils.exceptions as MTex
 #==============================================================================
 
+#conversion of meters to decimal degrees, so we don't have to deal with zone
+#changes
+_m2deg = 8.994423457456377e-06
+
+#maximum number of values in the neighbour array of one block of stations
+#in median_ss_array
+_block_size = 2**22
+
+
 def compute_spatial_median_ss(edi_file, ss_tol=0.2, freq_tol=0.15, 
                               distance_radius=1000, n_freq=20, 
                               write_new_edi='y'):
@@ -81,9 +98,7 @@ def compute_spatial_median_ss(edi_file, ss_tol=0.2, freq_tol=0.15,
               
     """
     
-    #convert meters to decimal degrees so we don't have to deal with zone 
-    #changes
-    dm_deg = distance_radius*8.994423457456377e-06
+    edi_file = os.path.abspath(edi_file)
     
     #get path to all the other edi_files
     edi_path = os.path.dirname(edi_file)
@@ -91,89 +106,21 @@ def compute_spatial_median_ss(edi_file, ss_tol=0.2, freq_tol=0.15,
     #make a list of edi files in the directory
     edi_list = [os.path.join(edi_path, edi) for edi in os.listdir(edi_path)
                 if edi.find('.edi') > 0]
-   
-   #remove the edi_file to be estimated for
-    edi_list.remove(edi_file)
-    n_edi = len(edi_list)
+    edi_index = edi_list.index(edi_file)
     
-    #read the edi file
-    edi1 = mtedi.Edi(filename=edi_file)
-
-    #check to make sure the first frequency is the highest, if not flip 
-    #things around    
-    if edi1.freq[0] < edi1.freq[-1]:
-        edi1.freq = edi1.freq[::-1]
-        edi1.Z.z = edi1.Z.z[::-1]
-    
-    #make a dictionary of frequencies
-    freq_dict = dict([('{:.6g}'.format(ff), ii) 
-                        for ii, ff in enumerate(edi1.freq[0:n_freq])])                
-    
-    #get resistivity and phase
-    res1, phase1, reserr1, phaseerr1 = edi1.Z.res_phase
-    
-    #make a resistivity array invovling all stations that are within dm
-    res_array = np.zeros((n_edi, n_freq, 2, 2))
-    
-    kk = 0
-    for kedi in edi_list:
-        edi2 = mtedi.Edi(kedi)
-        
-        #check to make sure the first frequency is the highest, if not flip 
-        #things around    
-        if edi2.freq[0] < edi2.freq[-1]:
-            edi2.freq = edi2.freq[::-1]
-            edi2.Z.z = edi2.Z.z[::-1]
-            
-        delta_d = np.sqrt((edi1.lat-edi2.lat)**2+(edi1.lon-edi2.lon)**2)
-        if delta_d <= dm_deg:
-            print 'Station {0} is within dm'.format(edi2.station)
-            res2, phase2, reserr2, phaseerr2 = edi2.Z.res_phase
-            for jj, ff in enumerate(edi2.freq[0:n_freq]):
-                try:
-                    ii = freq_dict['{0:.6g}'.format(ff)]
-                    res_array[kk, ii, :, :] = res2[jj, :, :]
-                except KeyError:
-                    freq_find = False
-                    for fkey in freq_dict.keys():
-                        if float(fkey)*(1-freq_tol) < ff < float(fkey)*(1+freq_tol):
-                            ii = freq_dict[fkey]
-                            res_array[kk, ii, :, :] = res2[jj, :, :]
-                            freq_find = True
-                            break
-                        else:
-                            pass
-                    if freq_find == False:
-                        print 'Did not find frequency {0:.6g} for {1}'.format(
-                                ff, edi2.station)
-            kk += 1 
-    
-    if kk == 0:
+    #read all edi files once and estimate the static shift of all of them
+    lo_edi_objects = mtedi.read_edifiles(edi_list)
+    ss_x, ss_y, n_neighbours = median_ss_array(lo_edi_objects, 
+                                        ss_tol=ss_tol, freq_tol=freq_tol, 
+                                        distance_radius=distance_radius, 
+                                        n_freq=n_freq)
+    
+    if n_neighbours[edi_index] == 0:
         print '**** No stations with in {0} m'.format(distance_radius)
         return 1.0, 1.0, None
 
-    #convert the res array into a masked array for averaging
-    res_array = np.ma.masked_equal(res_array,0)
-    
-    #compute the static shift of x-components
-    
-    static_shift_x = res1[0:n_freq, 0, 1]/np.ma.extras.median(res_array[:, :, 0, 1], 
-                                                    axis=0)                                
-    static_shift_x = np.median(static_shift_x[np.where(static_shift_x!=np.inf)])
-    
-    #check to see if the estimated static shift is within given tolerance
-    if 1.0-ss_tol < static_shift_x < 1.0+ss_tol:
-        static_shift_x = 1.0
-    
-    #compute the static shift of y-components
-    static_shift_y = res1[0:n_freq, 1, 0]/np.ma.extras.median(res_array[:, :, 1, 0], 
-                                                    axis=0)
-    static_shift_y = np.median(static_shift_y[np.where(static_shift_y!=np.inf)])
-  
-    #check to see if the estimated static shift is within given tolerance
-    if 1.0-ss_tol < static_shift_y < 1.0+ss_tol:
-        static_shift_y = 1.0
-    
+    static_shift_x = ss_x[edi_index]
+    static_shift_y = ss_y[edi_index]
     print 'Static shift in x-direction = {0:.2f}'.format(static_shift_x)
     print 'Static shift in y-direction = {0:.2f}'.format(static_shift_y)
     
@@ -186,23 +133,251 @@ def compute_spatial_median_ss(edi_file, ss_tol=0.2, freq_tol=0.15,
         new_edi_fn = os.path.join(svpath, 
                                   os.path.basename(edi_file)[:-4]+'_ss.edi')
         
-        static_shift, new_z = edi1.Z.no_ss(static_shift_x, 
-                                           static_shift_y)
-        
-        edi1.Z.z = new_z
-
-        edi1.writefile(new_edi_fn)
+        new_edi_fn = _write_ss_edi((lo_edi_objects[edi_index], 
+                                    static_shift_x, static_shift_y, 
+                                    new_edi_fn))
         
         return static_shift_x, static_shift_y, new_edi_fn
     else:
         
         return static_shift_x, static_shift_y, None
-
+        
+def compute_survey_median_ss(edi_list, ss_tol=0.2, freq_tol=0.15, 
+                             distance_radius=1000, n_freq=20, 
+                             write_new_edi='y', save_path=None, 
+                             n_processes=1, cache_dir=None):
+    """
+    Compute the spatial median static shift (see compute_spatial_median_ss)
+    of all stations of a survey in one pass.
+    
+    Every edi file is read only once, the stations within distance_radius 
+    are found with a KD-tree and the corrected edi files are written on a 
+    pool of processes.
+    
+    Arguments:
+    -----------
+        **edi_list** : list of full paths to edi files
+        
+        **ss_tol**, **freq_tol**, **distance_radius**, **n_freq** : 
+                     see compute_spatial_median_ss
+        
+        **write_new_edi** : [ 'y' | 'n' ]
+                            * 'y' will write new edi files
+                            * 'n' will not write new edi_files
+                            
+                            Files will be saved to save_path\station_ss.edi
                             
+        **save_path** : string
+                        directory to save new edi files to, if None they are
+                        saved to edi_path\SS for each edi file
+                        
+        **n_processes** : int
+                          number of processes for reading and writing edi 
+                          files, None for the number of CPUs.
+                          *default* is 1 (no pool)
+                          
+        **cache_dir** : string
+                        directory of the parsed edi file cache, see
+                        mtpy.core.edi.read_edifiles
+                     
+    Returns:
+    --------
+        **static_shift_x** : np.ndarray(n_edi)
+                             estimated median static shift in x direction
+                             
+        **static_shift_y** : np.ndarray(n_edi)
+                             estimated median static shift in y direction
+        
+        **new_edi_list** : list of full paths to new edi files if 
+                           write_new_edi == 'y' otherwise None
+    """
+    
+    edi_list = [os.path.abspath(edi_fn) for edi_fn in edi_list]
+    lo_edi_objects = mtedi.read_edifiles(edi_list, n_processes=n_processes,
+                                         cache_dir=cache_dir)
+    
+    ss_x, ss_y, n_neighbours = median_ss_array(lo_edi_objects, 
+                                        ss_tol=ss_tol, freq_tol=freq_tol, 
+                                        distance_radius=distance_radius, 
+                                        n_freq=n_freq)
+    
+    if (n_neighbours == 0).any():
+        print '**** No stations with in {0} m of {1} stations'.format(
+                                    distance_radius, (n_neighbours == 0).sum())
+    
+    if write_new_edi != 'y':
+        return ss_x, ss_y, None
+        
+    lo_args = []
+    for edi_fn, edi_object, ssx, ssy in zip(edi_list, lo_edi_objects, 
+                                            ss_x, ss_y):
+        svpath = save_path
+        if svpath is None:
+            svpath = os.path.join(os.path.dirname(edi_fn), 'SS')
+        if not os.path.exists(svpath):
+            os.makedirs(svpath)
+        new_edi_fn = os.path.join(svpath, 
+                                  os.path.basename(edi_fn)[:-4]+'_ss.edi')
+        lo_args.append((edi_object, ssx, ssy, new_edi_fn))
+        
+    if (n_processes == 1) or (len(lo_args) < 2):
+        new_edi_list = [_write_ss_edi(args) for args in lo_args]
+    else:
+        if n_processes is None:
+            n_processes = multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(processes=n_processes)
+        try:
+            new_edi_list = pool.map(_write_ss_edi, lo_args,
+                              chunksize=max(1, len(lo_args)/(4*n_processes)))
+        finally:
+            pool.close()
+            pool.join()
             
+    return ss_x, ss_y, new_edi_list
+    
+def _write_ss_edi(args):
+    """
+    remove the static shift from an edi object and write it to a new file,
+    args are (edi_object, static_shift_x, static_shift_y, new_edi_fn)
+    """
+    
+    edi_object, static_shift_x, static_shift_y, new_edi_fn = args
+    
+    static_shift, new_z = edi_object.Z.no_ss(static_shift_x, 
+                                             static_shift_y)
+    edi_object.Z.z = new_z
+    
+    return edi_object.writefile(new_edi_fn)
+    
+def median_ss_array(lo_edi_objects, ss_tol=0.2, freq_tol=0.15, 
+                    distance_radius=1000, n_freq=20):
+    """
+    Estimate the spatial median static shift of all stations at once.
+    
+    For each station the resistivities of all other stations within 
+    distance_radius are matched to its n_freq highest frequencies.  The
+    static shift is the median over the frequencies of the station's 
+    off-diagonal resistivities divided by the median of the matched ones.
+    
+    Arguments:
+    -----------
+        **lo_edi_objects** : list of mtpy.core.edi.Edi objects
+        
+        **ss_tol**, **freq_tol**, **distance_radius**, **n_freq** : 
+                     see compute_spatial_median_ss, frequencies are matched
+                     to the closest frequency within freq_tol
+                     
+    Returns:
+    --------
+        **static_shift_x** : np.ndarray(n_edi)
+                             estimated median static shift in x direction,
+                             1.0 if within ss_tol or no estimate
+                             
+        **static_shift_y** : np.ndarray(n_edi)
+                             estimated median static shift in y direction
+                             
+        **n_neighbours** : np.ndarray(n_edi)
+                           number of stations within distance_radius
+    """
+    
+    n_edi = len(lo_edi_objects)
+    if n_edi == 0:
+        raise MTex.MTpyError_inputarguments('Need at least one edi object')
+    rows = np.arange(n_edi)
+    
+    #--> frequencies and off-diagonal resistivities, highest frequency first
+    freq = np.zeros((n_edi, n_freq))*np.nan
+    res = np.zeros((n_edi, n_freq, 2))*np.nan
+    coords = np.zeros((n_edi, 2))
+    for ii, edi in enumerate(lo_edi_objects):
+        index = np.arange(len(edi.freq))
+        if edi.freq[0] < edi.freq[-1]:
+            index = index[::-1]
+        index = index[0:n_freq]
+        ff = edi.freq[index]
+        freq[ii, 0:len(index)] = ff
+        res[ii, 0:len(index), 0] = 0.2/ff*np.abs(edi.Z.z[index, 0, 1])**2
+        res[ii, 0:len(index), 1] = 0.2/ff*np.abs(edi.Z.z[index, 1, 0])**2
+        coords[ii] = edi.lat, edi.lon
+        
+    #--> all stations within distance_radius, without the station itself
+    tree = cKDTree(coords)
+    lo_neighbours = tree.query_ball_point(coords, 
+                                          distance_radius*_m2deg)
+    lo_neighbours = [[kk for kk in neighbours if kk != ii] 
+                     for ii, neighbours in enumerate(lo_neighbours)]
+    n_neighbours = np.array([len(nn) for nn in lo_neighbours], dtype=np.int)
+    station = np.repeat(rows, n_neighbours)
+    neighbour = np.concatenate([np.asarray(nn, dtype=np.int) 
+                                for nn in lo_neighbours])
+    
+    #--> match the frequencies of the neighbours to those of the station: 
+    #search in one array of the sorted log frequencies of all stations, 
+    #each station shifted by offset
+    log_freq = np.log10(freq)
+    lo_key = np.nanmin(log_freq)
+    span = np.nanmax(log_freq) - lo_key
+    offset = span + 10.
+    keys = np.where(np.isfinite(log_freq), log_freq - lo_key, span + 5.)
+    sorting = np.argsort(keys, axis=1)
+    sorted_keys = keys[rows[:, np.newaxis], sorting] + \
+                  offset*rows[:, np.newaxis]
+    
+    query = log_freq[neighbour] - lo_key + offset*station[:, np.newaxis]
+    query[np.isnan(query)] = offset*n_edi
+    position = np.searchsorted(sorted_keys.ravel(), query) - \
+               n_freq*station[:, np.newaxis]
+    
+    freq_nb = freq[neighbour]
+    match = np.zeros(query.shape, dtype=np.int)
+    rel_diff = np.zeros(query.shape)+np.inf
+    with np.errstate(invalid='ignore'):
+        for candidate in [position-1, position]:
+            candidate = np.clip(candidate, 0, n_freq-1)
+            idx = sorting[station[:, np.newaxis], candidate]
+            freq_st = freq[station[:, np.newaxis], idx]
+            diff = np.abs(freq_nb-freq_st)/freq_st
+            closer = diff < rel_diff
+            match[closer] = idx[closer]
+            rel_diff[closer] = diff[closer]
+        found = rel_diff < max(freq_tol, 1e-6)
+        
+    #resistivities of the neighbours at the frequencies of the station, a
+    #later frequency of a neighbour replaces an earlier one
+    res_nb = np.zeros((len(station), n_freq, 2))*np.nan
+    pair, jj = np.nonzero(found)
+    res_nb[pair, match[pair, jj]] = res[neighbour[pair], jj]
+    res_nb[res_nb == 0] = np.nan
+    
+    #--> median over the neighbours, in blocks of stations
+    median_res = np.zeros((n_edi, n_freq, 2))*np.nan
+    starts = np.concatenate(([0], np.cumsum(n_neighbours)))
+    max_neighbours = max(1, n_neighbours.max())
+    n_block = max(1, _block_size/(max_neighbours*n_freq*2))
+    with warnings.catch_warnings():
+        #stations and frequencies without neighbours give all-nan slices
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for block in range(0, n_edi, n_block):
+            block_rows = rows[block:block+n_block]
+            block_res = np.zeros((len(block_rows), max_neighbours, n_freq, 
+                                  2))*np.nan
+            block_pairs = np.arange(starts[block_rows[0]], 
+                                    starts[block_rows[-1]+1])
+            block_res[station[block_pairs]-block_rows[0], 
+                      block_pairs-starts[station[block_pairs]]] = \
+                                                        res_nb[block_pairs]
+            median_res[block_rows] = np.nanmedian(block_res, axis=1)
+        
+        #--> static shift as median of the ratios over the frequencies
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = res/median_res
+        ratio[~np.isfinite(ratio)] = np.nan
+        static_shift = np.nanmedian(ratio, axis=1)
 
-
-
-
-
-
+    #check to see if the estimated static shift is within given tolerance
+    no_estimate = np.isnan(static_shift) | (n_neighbours == 0)[:, np.newaxis]
+    static_shift[no_estimate] = 1.0
+    static_shift[(1.0-ss_tol < static_shift) & 
+                 (static_shift < 1.0+ss_tol)] = 1.0
+    
+    return static_shift[:, 0], static_shift[:, 1], n_neighbours
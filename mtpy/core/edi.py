@@ -8,17 +8,22 @@ edi module
 Classes
 --------
     * **Edi** reads and writes .edi files
+    * **EdiCache** persistent cache of parsed .edi files
 
 Functions
 ----------
     
     - read_edifile
+    - read_edifiles
     - write_edifile
     - combine_edifiles
     - validate_edifile
     - rotate_edifile
     - _generate_edifile_string
     - _cut_sectionstring
+    - _index_sectionstring
+    - _cut_indexed_sectionstring
+    - _read_data_block
     - _validate_edifile_string 
 
 
@@ -32,6 +37,10 @@ import os
 import os.path as op
 import time, calendar, datetime
 import copy
+import warnings
+import hashlib
+import cPickle
+import multiprocessing
 #required for finding HMEAS and EMEAS at once:
 import re
 
@@ -132,16 +141,21 @@ class Edi(object):
         self.Z = MTz.Z()
         self.Tipper = MTz.Tipper()
         self.station = None
+        #(edistring, list of sections) of the file read in last
+        self._section_index = None
         
         if filename is not None:
             self.readfile(self.filename)
 
-    def readfile(self, fn, datatype = 'z'):
+    def readfile(self, fn, datatype = 'z', header_only = False):
         """
         Read in an EDI file.
 
         Returns an exception, if the file is invalid 
         (following MTpy standards).
+
+        The file is indexed once for all its sections, the data blocks are 
+        parsed directly into numpy arrays.
         
         **Agruments:**
         
@@ -152,6 +166,13 @@ class Edi(object):
                             * 'z' for impedance data *default*
                             * 'resphase' for resistivity and phase data
                             * 'spectra' for spectra data
+
+            **header_only** : [ True | False ]
+                              if True, only the sections HEAD, INFO, 
+                              DEFINEMEAS, HMEAS/EMEAS and MTSECT are read,
+                              the file is read only up to the first data
+                              block (no FREQ, Z, Tipper,...).
+                              *default* is False
             
         """
 
@@ -173,15 +194,19 @@ class Edi(object):
         if not op.isfile(infile):
             raise MTex.MTpyError_edi_file('File is not existing: %s'%infile)
 
-        with open(infile,'r') as F:
-            edistring = F.read()
+        if header_only is True:
+            edistring = _read_edifile_header(infile)
+        else:
+            with open(infile,'r') as F:
+                edistring = F.read()
 
-        #validate edi file string following MTpy standard
-        if not _validate_edifile_string(edistring):
-            raise MTex.MTpyError_edi_file('%s is no proper EDI file'%infile)
+            #validate edi file string following MTpy standard
+            if not _validate_edifile_string(edistring):
+                raise MTex.MTpyError_edi_file('%s is no proper EDI file'%infile)
 
         self.filename = infile
         self.infile_string = edistring
+        self._section_index = (edistring, _index_sectionstring(edistring))
 
         #read out the mandatory EDI file sections from the raw string
         try:
@@ -212,6 +237,9 @@ class Edi(object):
         except:
             print 'Could not read MTSECT section: %s'%infile
 
+        if header_only is True:
+            return
+
         try:
             self._read_freq(edistring)
         except:
@@ -263,6 +291,22 @@ class Edi(object):
                 print 'Could not read Zrot section: %s'%infile
 
 
+    def _cut_section(self, edistring, sectionhead):
+        """
+        Cut the edi-string for the specified section.
+
+        Uses the section index of the file read in last, if it belongs to
+        the given string - otherwise the string is searched.
+        """
+
+        if (self._section_index is not None) and \
+           (self._section_index[0] is edistring) and \
+           (sectionhead.upper() != 'HMEAS_EMEAS'):
+            return _cut_indexed_sectionstring(edistring, sectionhead,
+                                              self._section_index[1])
+
+        return _cut_sectionstring(edistring, sectionhead)
+
     def edi_dict(self):
         """
         Collect sections of the EDI file and return them as a dictionary.
@@ -440,7 +484,7 @@ class Edi(object):
         """
 
         try:
-            temp_string = _cut_sectionstring(edistring,'HEAD')
+            temp_string = self._cut_section(edistring,'HEAD')
         except:
             raise
 
@@ -484,7 +528,7 @@ class Edi(object):
         """
 
         try:
-            temp_string = _cut_sectionstring(edistring,'INFO')
+            temp_string = self._cut_section(edistring,'INFO')
         except:
             raise
 
@@ -538,7 +582,7 @@ class Edi(object):
         """
 
         try:
-            temp_string = _cut_sectionstring(edistring,'DEFINEMEAS')
+            temp_string = self._cut_section(edistring,'DEFINEMEAS')
         except:
             raise
 
@@ -572,7 +616,7 @@ class Edi(object):
         Read in the HMEAS/EMEAS  section from the raw edi-string.
         """
         try:
-            temp_string = _cut_sectionstring(edistring,'HMEAS_EMEAS')
+            temp_string = self._cut_section(edistring,'HMEAS_EMEAS')
         except:
             raise
 
@@ -598,7 +642,7 @@ class Edi(object):
         """
 
         try:
-            temp_string = _cut_sectionstring(edistring,'MTSECT')
+            temp_string = self._cut_section(edistring,'MTSECT')
         except:
             raise
         m_dict = {}
@@ -626,23 +670,11 @@ class Edi(object):
         """
 
         try:
-            temp_string = _cut_sectionstring(edistring,'FREQ')
+            temp_string = self._cut_section(edistring,'FREQ')
         except:
             raise
 
-        lo_freqs = []
-
-        t1 = temp_string.strip().split('\n')[1:]
-
-        for j in t1:
-            lo_j = j.strip().split()
-            for k in lo_j:
-                try:
-                    lo_freqs.append(float(k))
-                except:
-                    pass
-
-        self._freq = np.array(lo_freqs)
+        self._freq = _read_data_block(temp_string)[1]
 
         #be sure to set tipper freq
         if self.Tipper.tipper is not None:
@@ -670,65 +702,36 @@ class Edi(object):
             for idx_zentry,zentry in enumerate(Z_entries):
                 sectionhead = comp + zentry
                 try:
-                    temp_string = _cut_sectionstring(edistring,sectionhead)
+                    temp_string = self._cut_section(edistring,sectionhead)
                 except:
                     continue
 
-                lo_z_vals = []
+                n_dummy, z_vals = _read_data_block(temp_string)
 
                 #check, if correct number of entries are given in the block
-                t0 = temp_string.strip().split('\n')[0]
-                n_dummy = int(float(t0.split('//')[1].strip()))
                 if not n_dummy == self.n_freq():
                     raise MTex.MTpyError_edi_file("Error - number of entries"+\
                                                   " does not equal number of"+\
                                                   " freq")
 
-
-                t1 = temp_string.strip().split('\n')[1:]
-                for j in t1:
-                    lo_j = j.strip().split()
-                    for k in lo_j:
-                        try:
-                            lo_z_vals.append(float(k))
-                        except:
-                            pass
-
-                z_dict[sectionhead] = lo_z_vals
+                z_dict[sectionhead] = z_vals
 
         if len(z_dict) == 0 :
             raise MTex.MTpyError_inputarguments("ERROR - Could not find "+\
                                                 "any Z component")
 
 
-        for idx_freq  in range( self.n_freq()):
-            try:
-                z_array[idx_freq,0,0] = np.complex(z_dict['ZXXR'][idx_freq], 
-                                                    z_dict['ZXXI'][idx_freq])
-            except:
-                pass
-            try:
-                z_array[idx_freq,0,1] = np.complex(z_dict['ZXYR'][idx_freq], 
-                                                    z_dict['ZXYI'][idx_freq])
-            except:
-                pass
-            try:
-                z_array[idx_freq,1,0] = np.complex(z_dict['ZYXR'][idx_freq], 
-                                                    z_dict['ZYXI'][idx_freq])
-            except:
-                pass
-            try:
-                z_array[idx_freq,1,1] = np.complex(z_dict['ZYYR'][idx_freq], 
-                                                    z_dict['ZYYI'][idx_freq])
-            except:
-                pass
-
+        for idx_comp,comp in enumerate(compstrings):
+            i, j = idx_comp/2, idx_comp%2
+            if (comp + 'R' in z_dict) and (comp + 'I' in z_dict):
+                n = min(len(z_dict[comp + 'R']), len(z_dict[comp + 'I']),
+                        self.n_freq())
+                z_array[:n, i, j] = z_dict[comp + 'R'][:n] + \
+                                    1j * z_dict[comp + 'I'][:n]
 
-            for idx_comp,comp in enumerate(compstrings):
-                sectionhead = comp + '.VAR'
-                if sectionhead in z_dict:
-                    zerr_array[idx_freq, idx_comp/2, idx_comp%2] = \
-                                                  z_dict[sectionhead][idx_freq]
+            if comp + '.VAR' in z_dict:
+                n = min(len(z_dict[comp + '.VAR']), self.n_freq())
+                zerr_array[:n, i, j] = z_dict[comp + '.VAR'][:n]
 
         self.Z.z = z_array
 
@@ -756,52 +759,38 @@ class Edi(object):
                 temp_string = None
                 try:
                     sectionhead = comp + tentry + '.EXP'
-                    temp_string = _cut_sectionstring(edistring,sectionhead)
+                    temp_string = self._cut_section(edistring,sectionhead)
                 except:
                     try:
                         sectionhead = comp + tentry
-                        temp_string = _cut_sectionstring(edistring,sectionhead)
+                        temp_string = self._cut_section(edistring,sectionhead)
                     except:
                         # if tipper is given with sectionhead "TX.VAR"
                         if (idx_tentry == 2) and (temp_string is None):
                             try:
                                 sectionhead = comp + '.' + tentry
-                                temp_string = _cut_sectionstring(edistring,
+                                temp_string = self._cut_section(edistring,
                                                                  sectionhead)
                             except:
                                 pass
                         pass
 
-                lo_t_vals = []
+                n_dummy, t_vals = _read_data_block(temp_string)
 
                 #check, if correct number of entries are given in the block
-                t0 = temp_string.strip().split('\n')[0]
-                n_dummy = int(float(t0.split('//')[1].strip()))
-
                 if not n_dummy == self.n_freq():
                     raise MTex.MTpyError_edi_file("Error - number of entries"+\
                                                   " does not equal number of"+\
                                                   " freq")
 
-                t1 = temp_string.strip().split('\n')[1:]
-                for j in t1:
-                    lo_j = j.strip().split()
-                    for k in lo_j:
-                        try:
-                            lo_t_vals.append(float(k))
-                        except:
-                            pass
-
-                t_dict[comp + tentry] = lo_t_vals
+                t_dict[comp + tentry] = t_vals
 
 
-        for idx_freq  in range( self.n_freq()):
-            tipper_array[idx_freq,0,0] = np.complex(t_dict['TXR'][idx_freq],
-                                                     t_dict['TXI'][idx_freq])
-            tippererr_array[idx_freq,0,0] = t_dict['TXVAR'][idx_freq]
-            tipper_array[idx_freq,0,1] = np.complex(t_dict['TYR'][idx_freq],
-                                                    t_dict['TYI'][idx_freq])
-            tippererr_array[idx_freq,0,1] = t_dict['TYVAR'][idx_freq]
+        n = self.n_freq()
+        tipper_array[:,0,0] = t_dict['TXR'][:n] + 1j * t_dict['TXI'][:n]
+        tippererr_array[:,0,0] = t_dict['TXVAR'][:n]
+        tipper_array[:,0,1] = t_dict['TYR'][:n] + 1j * t_dict['TYI'][:n]
+        tippererr_array[:,0,1] = t_dict['TYVAR'][:n]
         
         self.Tipper.tipper = tipper_array
         #errors are stddev, not VAR :
@@ -833,27 +822,18 @@ class Edi(object):
                 for entry in entries:
                     sectionhead = rp + comp + entry
                     try:
-                        temp_string = _cut_sectionstring(edistring,sectionhead)
+                        temp_string = self._cut_section(edistring,sectionhead)
                     except:
                         continue
 
-                    lo_vals = []
+                    n_dummy, vals = _read_data_block(temp_string)
                     #check, if correct number of entries are given in the block
-                    t0 = temp_string.strip().split('\n')[0]
-                    n_dummy = int(float(t0.split('//')[1].strip()))
                     if not n_dummy == self.n_freq():
-                        raise
+                        raise MTex.MTpyError_edi_file("Error - number of "+\
+                                                      "entries does not equal"+\
+                                                      " number of freq")
 
-                    t1 = temp_string.strip().split('\n')[1:]
-                    for j in t1:
-                        lo_j = j.strip().split()
-                        for k in lo_j:
-                            try:
-                                lo_vals.append(float(k))
-                            except:
-                                pass
-
-                    rhophi_dict[sectionhead] = lo_vals
+                    rhophi_dict[sectionhead] = vals
         
         if len (rhophi_dict) == 0:
             raise
@@ -920,7 +900,7 @@ class Edi(object):
         """
 
         try:
-            temp_string = _cut_sectionstring(edistring,'RHOROT')
+            temp_string = self._cut_section(edistring,'RHOROT')
         except:
             lo_angles = list( np.zeros((self.n_freq())))
             self.zrot = lo_angles
@@ -931,17 +911,7 @@ class Edi(object):
             return
 
 
-        lo_angles = []
-
-        t1 = temp_string.strip().split('\n')[1:]
-
-        for j in t1:
-            lo_j = j.strip().split()
-            for k in lo_j:
-                try:
-                    lo_angles.append(float(k))
-                except:
-                    pass
+        lo_angles = list(_read_data_block(temp_string)[1])
 
         
         if len(lo_angles) != self.n_freq():
@@ -961,7 +931,7 @@ class Edi(object):
         """
 
         #identify and cut spectrasect part:
-        specset_string = _cut_sectionstring(edistring,'SPECTRASECT')
+        specset_string = self._cut_section(edistring,'SPECTRASECT')
         s_dict = {}
         t1 = specset_string.strip().split('\n')
         tipper_array = None
@@ -1004,7 +974,7 @@ class Edi(object):
                 if dummy3 <0 :
                     raise               
                 # cut the respective sub string
-                tmp_cut_string = _cut_sectionstring(tmp_string,'SPECTRA')
+                tmp_cut_string = self._cut_section(tmp_string,'SPECTRA')
                 
                 #append to the list
                 lo_spectra_strings.append(tmp_cut_string)
@@ -1098,7 +1068,7 @@ class Edi(object):
         """
 
         try:
-            temp_string = _cut_sectionstring(edistring,'ZROT')
+            temp_string = self._cut_section(edistring,'ZROT')
         except:
             lo_angles = list( np.zeros((self.n_freq())) )
             self.zrot = lo_angles
@@ -1106,17 +1076,7 @@ class Edi(object):
             return
 
 
-        lo_angles = []
-
-        t1 = temp_string.strip().split('\n')[1:]
-
-        for j in t1:
-            lo_j = j.strip().split()
-            for k in lo_j:
-                try:
-                    lo_angles.append(float(k))
-                except:
-                    pass
+        lo_angles = list(_read_data_block(temp_string)[1])
 
         if len(lo_angles) != self.n_freq():
             raise
@@ -1483,21 +1443,231 @@ class Edi(object):
 #=========================
 
 
-def read_edifile(fn):
+def read_edifile(fn, header_only=False):
     """
     Read in an EDI file.
 
     Return an instance of the Edi class.
+
+    If header_only is True, only the header sections are read (no data).
     """
 
     edi_object = Edi()
 
-    edi_object.readfile(fn)
+    edi_object.readfile(fn, header_only=header_only)
 
 
     return edi_object
 
 
+def read_edifiles(lo_fn, datatype='z', n_processes=1, cache_dir=None,
+                  max_cache_entries=10000):
+    """
+    Read in a list of EDI files.
+
+    Files are parsed in parallel by a pool of processes. If a cache
+    directory is given, parsed files are stored there and re-used, as long
+    as the EDI file is unchanged (same path, modification time and size).
+
+    **Input:**
+
+        **lo_fn** : list of full paths to EDI files
+
+        **datatype** : [ 'z' | 'resphase' | 'spectra' ]
+                       data type of the EDI files, see Edi.readfile
+
+        **n_processes** : int
+                          number of processes for parsing, None for the
+                          number of CPUs. *default* is 1 (no pool)
+
+        **cache_dir** : string
+                        directory of the parsed-file cache
+                        *default* is None (no caching)
+
+        **max_cache_entries** : int
+                                maximum number of files in the cache, the
+                                least recently used entries are removed
+
+    **Output:**
+
+        list of Edi objects (same order as lo_fn)
+    """
+
+    lo_fn = [op.abspath(fn) for fn in lo_fn]
+    lo_edi_objects = [None for fn in lo_fn]
+
+    cache = None
+    if cache_dir is not None:
+        cache = EdiCache(cache_dir, max_entries=max_cache_entries)
+        for idx, fn in enumerate(lo_fn):
+            lo_edi_objects[idx] = cache.get(fn, datatype)
+
+    lo_missing = [idx for idx, edi_object in enumerate(lo_edi_objects)
+                                                    if edi_object is None]
+    lo_args = [(lo_fn[idx], datatype) for idx in lo_missing]
+
+    if (n_processes == 1) or (len(lo_args) < 2):
+        lo_parsed = [_read_edifile_worker(args) for args in lo_args]
+    else:
+        if n_processes is None:
+            n_processes = multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(processes=n_processes)
+        try:
+            lo_parsed = pool.map(_read_edifile_worker, lo_args,
+                          chunksize=max(1, len(lo_args)/(4*n_processes)))
+        finally:
+            pool.close()
+            pool.join()
+
+    for idx, edi_object in zip(lo_missing, lo_parsed):
+        lo_edi_objects[idx] = edi_object
+        if cache is not None:
+            cache.put(lo_fn[idx], datatype, edi_object)
+
+    if cache is not None:
+        cache.evict()
+
+    return lo_edi_objects
+
+
+def _read_edifile_worker(args):
+    """
+    Read one EDI file (for the process pool of read_edifiles).
+    """
+
+    fn, datatype = args
+    edi_object = Edi()
+    edi_object.readfile(fn, datatype=datatype)
+    #the index is only valid for the string object in this process
+    edi_object._section_index = None
+
+    return edi_object
+
+
+class EdiCache(object):
+    """
+    Persistent cache of parsed EDI files.
+
+    Each entry is a pickled Edi object, stored under a key made of the
+    absolute path, modification time and size of the EDI file and the 
+    data type. Changed files therefore get a new key, their old entries are
+    removed by the eviction of least recently used entries.
+
+    **Arguments:**
+
+        **cache_dir** : string
+                        directory of the cache, created if not existing
+
+        **max_entries** : int
+                          maximum number of entries kept by evict()
+    """
+
+    def __init__(self, cache_dir, max_entries=10000):
+
+        self.cache_dir = op.abspath(cache_dir)
+        self.max_entries = max_entries
+        if not op.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def _key_fn(self, fn, datatype):
+        fn = op.abspath(fn)
+        stat = os.stat(fn)
+        key = '{0}|{1!r}|{2}|{3}'.format(fn, stat.st_mtime, stat.st_size,
+                                         datatype)
+
+        return op.join(self.cache_dir,
+                       hashlib.sha1(key).hexdigest() + '.pkl')
+
+    def get(self, fn, datatype='z'):
+        """
+        Return the cached Edi object of a file or None.
+        """
+
+        try:
+            key_fn = self._key_fn(fn, datatype)
+            with open(key_fn, 'rb') as F:
+                edi_object = cPickle.load(F)
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+            return None
+
+        #mark as recently used
+        try:
+            os.utime(key_fn, None)
+        except OSError:
+            pass
+
+        return edi_object
+
+    def put(self, fn, datatype, edi_object):
+        """
+        Store the Edi object of a file.
+        """
+
+        key_fn = self._key_fn(fn, datatype)
+        #write to a temporary file first, so readers never see half entries
+        tmp_fn = '{0}.{1}.tmp'.format(key_fn, os.getpid())
+        with open(tmp_fn, 'wb') as F:
+            cPickle.dump(edi_object, F, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_fn, key_fn)
+
+    def evict(self, max_entries=None):
+        """
+        Remove least recently used entries beyond max_entries.
+        """
+
+        if max_entries is None:
+            max_entries = self.max_entries
+
+        lo_entries = [op.join(self.cache_dir, i) for i in
+                        os.listdir(self.cache_dir) if i.endswith('.pkl')]
+        if len(lo_entries) <= max_entries:
+            return
+
+        lo_entries.sort(key=lambda i: os.stat(i).st_mtime)
+        for key_fn in lo_entries[:len(lo_entries) - max_entries]:
+            try:
+                os.remove(key_fn)
+            except OSError:
+                pass
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+
+        self.evict(max_entries=0)
+
+
+
+def _read_edifile_header(fn):
+    """
+    Read an EDI file only up to the first data block.
+
+    Returns the raw string of the header sections (HEAD, INFO, DEFINEMEAS,
+    HMEAS/EMEAS, MTSECT/SPECTRASECT), followed by the first line of the 
+    first data block (to keep the section boundaries intact).
+    """
+
+    header_sections = ['HEAD', 'INFO', 'DEFINEMEAS', 'HMEAS', 'EMEAS', 
+                       'MTSECT', 'SPECTRASECT']
+
+    lo_lines = []
+    with open(fn, 'r') as F:
+        for line in F:
+            lo_lines.append(line)
+            match = _section_pattern.match(line.strip())
+            if match is None:
+                continue
+            keyword = match.group(2).upper()
+            #comments
+            if keyword.startswith('!'):
+                continue
+            if keyword not in header_sections:
+                break
+
+    return ''.join(lo_lines)
+
+
 def write_edifile(edi_object, out_fn = None):
     """
     Write an EDI file from an instance of the Edi class.
@@ -2318,6 +2488,123 @@ def _cut_sectionstring(edistring,sectionhead):
     return cutstring
 
 
+
+#every section starts with '>' (data sections with '>='), followed by the 
+#section keyword
+_section_pattern = re.compile(r'>(=?)([^\s>]*)')
+
+
+def _index_sectionstring(edistring):
+    """
+    Index all sections of an edi-string in one pass.
+
+    Input:
+    - raw edi-string
+
+    Output:
+    - list of tuples (KEYWORD, is_equal_section, start_idx, end_idx) in order
+      of appearance. start_idx is the position of the '>' character, end_idx
+      is the position of the next '>' (i.e. the start of the next section).
+    """
+
+    lo_matches = list(_section_pattern.finditer(edistring))
+
+    lo_sections = []
+    for idx, match in enumerate(lo_matches):
+        try:
+            end_idx = lo_matches[idx+1].start()
+        except IndexError:
+            end_idx = len(edistring)
+
+        lo_sections.append((match.group(2).upper(), match.group(1) == '=',
+                            match.start(), end_idx))
+
+    return lo_sections
+
+
+def _cut_indexed_sectionstring(edistring, sectionhead, lo_sections):
+    """
+    Cut an edi-string for the specified section, using the section index 
+    from '_index_sectionstring' instead of searching the string.
+
+    Same matching rules as '_cut_sectionstring': the first section starting
+    with '>'+sectionhead, otherwise the first starting with '>='+sectionhead.
+
+    Input:
+    - raw edi-string
+    - name of the section
+    - list of sections as returned by '_index_sectionstring'
+
+    Output:
+    - string : part of the raw edi-string starting behind the section keyword
+               and ending at the beginning of the next section.
+    """
+
+    head = sectionhead.upper()
+
+    for is_equal in [False, True]:
+        for keyword, is_equal_section, start_idx, end_idx in lo_sections:
+            if is_equal_section != is_equal or not keyword.startswith(head):
+                continue
+
+            #start cut behind the section keyword
+            start_idx += 1 + int(is_equal) + len(head)
+            cutstring = edistring[start_idx:end_idx]
+
+            if len(cutstring) == 0:
+                raise MTex.MTpyError_edi_file('Section {0} is empty'.format(
+                                                                 sectionhead))
+            return cutstring
+
+    raise MTex.MTpyError_edi_file('Section {0} not found'.format(sectionhead))
+
+
+def _read_data_block(block_string):
+    """
+    Read the values of a data block (e.g. FREQ, ZXXR, TXVAR.EXP,...).
+
+    Input:
+    - section string, as returned by '_cut_sectionstring', i.e. the header 
+      line (containing '// n_entries') followed by the values
+
+    Output:
+    - number of entries as given in the header line (None, if not given)
+    - numpy array of values
+
+    The values are parsed in bulk. Only if the block contains non-numeric 
+    tokens, they are parsed one by one (skipping the invalid ones).
+    """
+
+    lo_lines = block_string.strip().split('\n', 1)
+
+    n_entries = None
+    try:
+        n_entries = int(float(lo_lines[0].split('//')[1].strip()))
+    except (IndexError, ValueError):
+        pass
+
+    if len(lo_lines) < 2:
+        return n_entries, np.array([])
+
+    value_string = lo_lines[1]
+    lo_tokens = value_string.split()
+
+    with warnings.catch_warnings():
+        #numpy warns, if a token cannot be parsed - handled below
+        warnings.simplefilter('ignore')
+        values = np.fromstring(value_string, dtype=np.float, sep=' ')
+    if len(values) != len(lo_tokens):
+        lo_values = []
+        for k in lo_tokens:
+            try:
+                lo_values.append(float(k))
+            except ValueError:
+                pass
+        values = np.array(lo_values)
+
+    return n_entries, values
+
+
 def _validate_edifile_string(edistring):
     """
     Read the file as string and check, if blocks 'HEAD,  =DEFINEMEAS,
@@ -2341,35 +2628,38 @@ def _validate_edifile_string(edistring):
     isvalid = False
     found = 1
 
+    #upper case version of the string for all searches (only computed once)
+    edistring_upper = edistring.upper()
+
     #adding 1 to position of find to correct for possible occurrence at 
     #position 0 )
-    found *= np.sign(edistring.upper().find('>HEAD') + 1 )
+    found *= np.sign(edistring_upper.find('>HEAD') + 1 )
     if found == 0:
         print 'Could not find >HEAD block'
-    found *= np.sign(edistring.upper().find('DATAID') + 1 )
+    found *= np.sign(edistring_upper.find('DATAID') + 1 )
     if found == 0:
         print 'Could not find DATAID block'
-    found *= np.sign(edistring.upper().find('>HMEAS') + 1 )
+    found *= np.sign(edistring_upper.find('>HMEAS') + 1 )
     if found == 0:
         print 'Could not find >HMEAS block'
-    found *= np.sign(edistring.upper().find('>EMEAS') + 1 )
+    found *= np.sign(edistring_upper.find('>EMEAS') + 1 )
     if found == 0:
         print 'Could not find >EMEAS block'
-    found *= np.sign(edistring.upper().find('NFREQ') + 1 )
+    found *= np.sign(edistring_upper.find('NFREQ') + 1 )
     if found == 0:
         print 'Could not find NFREQ block'
-    found *= np.sign(edistring.upper().find('>END') + 1 )
+    found *= np.sign(edistring_upper.find('>END') + 1 )
     if found == 0:
         print 'Could not find END block'
-    found *= np.sign(edistring.upper().find('>=DEFINEMEAS') + 1 )
+    found *= np.sign(edistring_upper.find('>=DEFINEMEAS') + 1 )
     if found == 0:
         print 'Could not find >=DEFINEMEAS block'
     #allow spectral information as alternative:
-    if np.sign(edistring.upper().find('>FREQ') + 1 ) == 0:
-        if np.sign(edistring.upper().find('>SPECTRA') + 1 ) == 0 :
+    if np.sign(edistring_upper.find('>FREQ') + 1 ) == 0:
+        if np.sign(edistring_upper.find('>SPECTRA') + 1 ) == 0 :
             found *= 0
-    if np.sign(edistring.upper().find('>=MTSECT') + 1 ) == 0:
-        if np.sign(edistring.upper().find('>=SPECTRASECT') + 1 ) == 0:
+    if np.sign(edistring_upper.find('>=MTSECT') + 1 ) == 0:
+        if np.sign(edistring_upper.find('>=SPECTRASECT') + 1 ) == 0:
             found *= 0
 
 
@@ -2380,18 +2670,11 @@ def _validate_edifile_string(edistring):
         return False
 
     #checking for non empty freq list:
-    freq_start_idx = edistring.upper().find('>FREQ')
-    next_block_start = edistring.upper().find('>',freq_start_idx + 1)
+    freq_start_idx = edistring_upper.find('>FREQ')
+    next_block_start = edistring_upper.find('>',freq_start_idx + 1)
     string_dummy_2 = edistring[freq_start_idx:next_block_start]
-    lo_string_dummy_2 = string_dummy_2.strip().split()
     #check, if there are actually one/some valid numbers:
-    n_numbers = 0
-    for i in lo_string_dummy_2:
-        try:
-            n = float(i)
-            n_numbers +=1
-        except:
-            continue
+    n_numbers = len(_read_data_block(string_dummy_2)[1])
 
     if n_numbers == 0:
         print  MTex.MTpyError_edi_file('Problem in FREQ block: no freq'+\
@@ -2411,21 +2694,14 @@ def _validate_edifile_string(edistring):
 
         for zentry in Z_entries:
             searchstring = '>'+comp+zentry
-            z_comp_start_idx = edistring.upper().find(searchstring)
+            z_comp_start_idx = edistring_upper.find(searchstring)
             if z_comp_start_idx < 0:
                 continue
             #found *= np.sign(z_comp_start_idx + 1 )
             #checking for non empty value list:
-            next_block_start = edistring.upper().find('>',z_comp_start_idx+1)
+            next_block_start = edistring_upper.find('>',z_comp_start_idx+1)
             string_dummy_1 = edistring[z_comp_start_idx:next_block_start]
-            lo_string_dummy_1 = string_dummy_1.strip().split()
-            n_numbers = 0
-            for i in lo_string_dummy_1:
-                try:
-                    n = float(i)
-                    n_numbers +=1
-                except:
-                    continue
+            n_numbers = len(_read_data_block(string_dummy_1)[1])
 
             if n_numbers == 0:
                 print  MTex.MTpyError_edi_file('Error in {0}'.format(comp+\
@@ -2512,7 +2788,7 @@ def _validate_edifile_string(edistring):
         if not len(dummy6.split()) == no_values:
             found *= 0
 
-        if not edistring.upper().count('>SPECTRA') ==  n_freq:
+        if not edistring_upper.count('>SPECTRA') ==  n_freq:
             found *= 0
         if found > 0:
             print 'Found spectra data'
@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+"""
+===============
+Survey
+===============
+
+    * Columnar on-disk container for the impedance, tipper and header
+      information of a whole survey (many stations)
+
+The data of all stations are stored in a directory as plain numpy .npy
+files, which are opened memory-mapped. The per station blocks are
+concatenated along the frequency axis, the start of each station block is
+given by the 'offsets' array. The header information (HEAD, INFO,
+DEFINEMEAS, HMEAS_EMEAS, MTSECT) is stored in a json file.
+
+    ================= =========================================================
+    **File**          Content
+    ================= =========================================================
+    survey.json       station names, EDI header dictionaries, format version
+    offsets.npy       (n_station+1) start index of each station block
+    freq.npy          (n_total) frequencies
+    z.npy             (n_total, 2, 2) complex impedance
+    zerr.npy          (n_total, 2, 2) impedance errors
+    tipper.npy        (n_total, 1, 2) complex tipper (zeros, if missing)
+    tippererr.npy     (n_total, 1, 2) tipper errors
+    zrot.npy          (n_total) rotation angles
+    has_tipper.npy    (n_station) flag for existence of tipper data
+    lat.npy           (n_station) latitude in decimal degrees
+    lon.npy           (n_station) longitude in decimal degrees
+    elev.npy          (n_station) elevation in meters
+    ================= =========================================================
+
+Functions:
+    - edifiles2survey
+    - edis2survey
+    - survey2edifiles
+
+:Example: ::
+
+    >>> import mtpy.core.survey as MTsurvey
+    >>> survey = MTsurvey.edifiles2survey(edi_list, r"/home/MT/survey")
+    >>> survey = MTsurvey.Survey(r"/home/MT/survey")
+    >>> z_obj = survey.get_z('mt01')
+    >>> zxy = survey.z[:, 0, 1]
+
+"""
+
+#=================================================================
+
+import os
+import os.path as op
+import json
+
+import numpy as np
+
+import mtpy.core.edi as MTedi
+import mtpy.core.z as MTz
+import mtpy.utils.exceptions as MTex
+
+#=================================================================
+
+survey_format_version = 1
+
+#names of the arrays concatenated along the frequency axis
+_lo_data_arrays = ['freq', 'z', 'zerr', 'tipper', 'tippererr', 'zrot']
+#names of the arrays with one entry per station
+_lo_station_arrays = ['offsets', 'has_tipper', 'lat', 'lon', 'elev']
+
+#=================================================================
+
+class Survey(object):
+    """
+    Access to a survey directory, as written by 'edis2survey'.
+
+    Arrays are opened memory-mapped on first access, so opening a survey
+    does not read any data. All arrays are available as attributes (e.g.
+    survey.z, survey.freq, survey.lat), data of single stations can be
+    obtained by the get_* methods.
+
+    **Arguments:**
+
+        **survey_dir** : string
+                         full path to the survey directory
+
+        **mmap_mode** : [ 'r' | 'r+' | 'c' | None ]
+                        mode for opening the arrays, see numpy.load
+                        *default* is 'r' (read only)
+
+    ====================== ====================================================
+    **Methods**            Description
+    ====================== ====================================================
+    station_index          index of a station within the survey
+    station_slice          slice of a station within the data arrays
+    get_z                  mtpy.core.z.Z object of a station
+    get_tipper             mtpy.core.z.Tipper object of a station
+    get_edi                mtpy.core.edi.Edi object of a station
+    write_edifiles         write EDI files for (some) stations
+    ====================== ====================================================
+
+    """
+
+    def __init__(self, survey_dir, mmap_mode='r'):
+
+        self.survey_dir = op.abspath(survey_dir)
+        self.mmap_mode = mmap_mode
+        self._arrays = {}
+
+        header_fn = op.join(self.survey_dir, 'survey.json')
+        if not op.isfile(header_fn):
+            raise MTex.MTpyError_file_handling('No survey found in '+\
+                                               '{0}'.format(self.survey_dir))
+
+        with open(header_fn, 'r') as F:
+            header = _to_str(json.load(F))
+
+        if header.get('format_version', None) != survey_format_version:
+            raise MTex.MTpyError_file_handling('Unknown survey format '+\
+                          'version: {0}'.format(header.get('format_version')))
+
+        self.stations = header['stations']
+        self.headers = header['headers']
+        self._station_lookup = dict([(station, idx) for idx, station
+                                                 in enumerate(self.stations)])
+
+    def __getattr__(self, name):
+        #only called, if the attribute is not found the normal way
+        if name in _lo_data_arrays or name in _lo_station_arrays:
+            if name not in self._arrays:
+                self._arrays[name] = np.load(op.join(self.survey_dir,
+                                                     name+'.npy'),
+                                             mmap_mode=self.mmap_mode)
+            return self._arrays[name]
+
+        raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.stations)
+
+    def station_index(self, station):
+        """
+        Return the index of a station (given by name or index).
+        """
+
+        if isinstance(station, (int, np.integer)):
+            if not -len(self.stations) <= station < len(self.stations):
+                raise MTex.MTpyError_inputarguments('Station index out '+\
+                                                'of range: {0}'.format(station))
+            return int(station)%len(self.stations)
+
+        try:
+            return self._station_lookup[station]
+        except KeyError:
+            raise MTex.MTpyError_inputarguments('Station not in survey: '+\
+                                                '{0}'.format(station))
+
+    def station_slice(self, station):
+        """
+        Return the slice of a station within the data arrays.
+        """
+
+        idx = self.station_index(station)
+
+        return slice(int(self.offsets[idx]), int(self.offsets[idx+1]))
+
+    def get_freq(self, station):
+        """
+        Return the frequencies of a station as array.
+        """
+
+        return np.array(self.freq[self.station_slice(station)])
+
+    def get_z(self, station):
+        """
+        Return the impedance of a station as mtpy.core.z.Z object.
+        """
+
+        s = self.station_slice(station)
+        z_object = MTz.Z(z_array=np.array(self.z[s]),
+                         zerr_array=np.array(self.zerr[s]),
+                         freq=np.array(self.freq[s]))
+        z_object.rotation_angle = np.array(self.zrot[s])
+
+        return z_object
+
+    def get_tipper(self, station):
+        """
+        Return the tipper of a station as mtpy.core.z.Tipper object.
+
+        If the station has no tipper data, an empty Tipper object is
+        returned.
+        """
+
+        idx = self.station_index(station)
+        if not self.has_tipper[idx]:
+            return MTz.Tipper()
+
+        s = self.station_slice(idx)
+        #set via the properties, so amplitude and phase are computed
+        tipper_object = MTz.Tipper()
+        tipper_object.tipper = np.array(self.tipper[s])
+        tipper_object.tippererr = np.array(self.tippererr[s])
+        tipper_object.freq = np.array(self.freq[s])
+        tipper_object.rotation_angle = np.array(self.zrot[s])
+
+        return tipper_object
+
+    def get_edi(self, station):
+        """
+        Return a mtpy.core.edi.Edi object of a station.
+        """
+
+        idx = self.station_index(station)
+        header = self.headers[idx]
+
+        edi_object = MTedi.Edi()
+        edi_object.head = header['head']
+        edi_object.info_dict = header['info_dict']
+        edi_object.info_string = header['info_string']
+        edi_object.definemeas = header['definemeas']
+        edi_object.hmeas_emeas = header['hmeas_emeas']
+        edi_object.mtsect = header['mtsect']
+        edi_object.station = self.stations[idx]
+
+        edi_object.Z = self.get_z(idx)
+        edi_object.Tipper = self.get_tipper(idx)
+        edi_object.freq = edi_object.Z.freq
+        edi_object.zrot = edi_object.Z.rotation_angle
+
+        return edi_object
+
+    def write_edifiles(self, out_dir, stations=None):
+        """
+        Write EDI files for the given stations (*default* all).
+
+        Returns the list of written files.
+        """
+
+        if stations is None:
+            stations = range(len(self.stations))
+
+        out_dir = op.abspath(out_dir)
+        if not op.isdir(out_dir):
+            os.makedirs(out_dir)
+
+        lo_fn = []
+        for station in stations:
+            idx = self.station_index(station)
+            edi_object = self.get_edi(idx)
+            lo_fn.append(edi_object.writefile(op.join(out_dir,
+                                                      self.stations[idx])))
+
+        return lo_fn
+
+#=================================================================
+
+def edis2survey(lo_edi_objects, survey_dir):
+    """
+    Write a list of mtpy.core.edi.Edi objects into a survey directory.
+
+    **Input:**
+
+        **lo_edi_objects** : list of mtpy.core.edi.Edi objects
+
+        **survey_dir** : string
+                         full path to the survey directory, is created if
+                         not existing, existing survey files are overwritten
+
+    **Output:**
+
+        mtpy.core.survey.Survey object of the new survey
+
+    """
+
+    if len(lo_edi_objects) == 0:
+        raise MTex.MTpyError_inputarguments('No stations given')
+
+    survey_dir = op.abspath(survey_dir)
+    if not op.isdir(survey_dir):
+        os.makedirs(survey_dir)
+
+    data = dict([(name, []) for name in _lo_data_arrays])
+    stations = []
+    headers = []
+    n_freq = []
+    has_tipper = []
+    lat = []
+    lon = []
+    elev = []
+
+    for edi_object in lo_edi_objects:
+        z_object = edi_object.Z
+        if z_object.z is None:
+            raise MTex.MTpyError_inputarguments('Station without impedance'+\
+                                       ': {0}'.format(edi_object.station))
+        nf = len(z_object.z)
+
+        station = edi_object.station
+        if station is None:
+            station = 'station{0:03}'.format(len(stations))
+        if station in stations:
+            raise MTex.MTpyError_inputarguments('Station name not unique: '+\
+                                                '{0}'.format(station))
+        stations.append(station)
+        n_freq.append(nf)
+
+        data['freq'].append(np.array(edi_object.freq, dtype='float'))
+        data['z'].append(np.array(z_object.z, dtype='complex'))
+        if z_object.zerr is not None:
+            data['zerr'].append(np.array(z_object.zerr, dtype='float'))
+        else:
+            data['zerr'].append(np.zeros((nf, 2, 2)))
+
+        tipper = edi_object.Tipper.tipper
+        has_tipper.append(tipper is not None)
+        if tipper is not None:
+            data['tipper'].append(np.array(tipper, dtype='complex'))
+            tippererr = edi_object.Tipper.tippererr
+            if tippererr is None:
+                tippererr = np.zeros((nf, 1, 2))
+            data['tippererr'].append(np.array(tippererr, dtype='float'))
+        else:
+            data['tipper'].append(np.zeros((nf, 1, 2), dtype='complex'))
+            data['tippererr'].append(np.zeros((nf, 1, 2)))
+
+        zrot = edi_object.zrot
+        if zrot is None:
+            zrot = np.zeros(nf)
+        data['zrot'].append(np.zeros(nf) + np.array(zrot, dtype='float'))
+
+        lat.append(_to_float(edi_object.lat))
+        lon.append(_to_float(edi_object.lon))
+        elev.append(_to_float(edi_object.elev))
+
+        headers.append({'head': edi_object.head,
+                        'info_dict': edi_object.info_dict,
+                        'info_string': edi_object.info_string,
+                        'definemeas': edi_object.definemeas,
+                        'hmeas_emeas': edi_object.hmeas_emeas,
+                        'mtsect': edi_object.mtsect})
+
+    arrays = dict([(name, np.concatenate(data[name]))
+                                                for name in _lo_data_arrays])
+    arrays['offsets'] = np.concatenate([[0], np.cumsum(n_freq)])
+    arrays['has_tipper'] = np.array(has_tipper, dtype='bool')
+    arrays['lat'] = np.array(lat)
+    arrays['lon'] = np.array(lon)
+    arrays['elev'] = np.array(elev)
+
+    for name, array in arrays.items():
+        np.save(op.join(survey_dir, name+'.npy'), array)
+
+    #header last, so an incomplete survey cannot be opened
+    with open(op.join(survey_dir, 'survey.json'), 'w') as F:
+        json.dump({'format_version': survey_format_version,
+                   'stations': stations,
+                   'headers': headers}, F, indent=1, default=_json_default)
+
+    return Survey(survey_dir)
+
+
+def edifiles2survey(lo_edifiles, survey_dir, datatype='z'):
+    """
+    Read a list of EDI files and write them into a survey directory.
+
+    **Input:**
+
+        **lo_edifiles** : list of full paths to EDI files
+
+        **survey_dir** : string
+                         full path to the survey directory
+
+        **datatype** : [ 'z' | 'resphase' | 'spectra' ]
+                       data type of the EDI files, see Edi.readfile
+
+    **Output:**
+
+        mtpy.core.survey.Survey object of the new survey
+
+    """
+
+    lo_edi_objects = []
+    for fn in lo_edifiles:
+        edi_object = MTedi.Edi()
+        edi_object.readfile(fn, datatype=datatype)
+        lo_edi_objects.append(edi_object)
+
+    return edis2survey(lo_edi_objects, survey_dir)
+
+
+def survey2edifiles(survey_dir, out_dir, stations=None):
+    """
+    Write EDI files for the stations of a survey directory.
+
+    **Input:**
+
+        **survey_dir** : string
+                         full path to the survey directory
+
+        **out_dir** : string
+                      directory for the EDI files
+
+        **stations** : list of station names or indices
+                       *default* is all stations
+
+    **Output:**
+
+        list of EDI file names
+
+    """
+
+    return Survey(survey_dir).write_edifiles(out_dir, stations=stations)
+
+#=================================================================
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _json_default(value):
+    #numpy scalars/arrays within the header dictionaries
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _to_str(value):
+    #json returns unicode strings - keep the EDI header in plain strings
+    if isinstance(value, dict):
+        return dict([(_to_str(k), _to_str(v)) for k, v in value.items()])
+    if isinstance(value, list):
+        return [_to_str(i) for i in value]
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
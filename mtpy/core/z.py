@@ -396,38 +396,30 @@ class Z(object):
         
         
 
+        if len(self.freq) < len(self.z):
+            raise IndexError('freq array shorter than Z array')
+
         self._resistivity_err = None
         self._phase_err = None
-        if self.zerr is not None:
-            self._resistivity_err = np.zeros_like(self.zerr)
-            self._phase_err = np.zeros_like(self.zerr)
 
-        self._resistivity = np.zeros_like(self.z, dtype='float')
-        self._phase = np.zeros_like(self.z, dtype='float')
+        #compute all (n_freq, 2, 2) elements at once
+        freq = np.array(self.freq[:len(self.z)], dtype='float')
+        freq = freq[:, np.newaxis, np.newaxis]
+        z_abs = np.abs(self.z)
 
-        #calculate resistivity and phase
-        for idx_f in range(len(self.z)): 
-            for i in range(2):                        
-                for j in range(2):
-                    self._resistivity[idx_f,i,j] = np.abs(self.z[idx_f,i,j])**2/\
-                                                  self.freq[idx_f]*0.2
-                    self._phase[idx_f,i,j] = math.degrees(cmath.phase(
-                                                    self.z[idx_f,i,j]))%360
-                
-                    if self.zerr is not None:
-                        
-                        r_err, phi_err = MTcc.zerror2r_phi_error(
-                                                 np.real(self.z[idx_f,i,j]), 
-                                                 self.zerr[idx_f,i,j], 
-                                                 np.imag(self.z[idx_f,i,j]), 
-                                                 self.zerr[idx_f,i,j])
+        self._resistivity = 0.2 * z_abs**2 / freq
+        self._phase = np.degrees(np.angle(self.z)) % 360
 
-                        
+        if self.zerr is not None:
+            r_err, phi_err = MTcc.zerror2r_phi_error_array(np.real(self.z),
+                                                           self.zerr,
+                                                           np.imag(self.z),
+                                                           self.zerr)
 
-                        self._resistivity_err[idx_f,i,j] = \
-                                               0.4*np.abs(self.z[idx_f,i,j])/\
-                                               self.freq[idx_f]*r_err
-                        self._phase_err[idx_f,i,j] = phi_err
+            self._resistivity_err = np.zeros_like(self.zerr)
+            self._phase_err = np.zeros_like(self.zerr)
+            self._resistivity_err[:] = 0.4 * z_abs / freq * r_err
+            self._phase_err[:] = phi_err
 
     
     def _get_resistivity(self): return self._resistivity
@@ -659,25 +651,12 @@ class Z(object):
             #self.rotation_angle = 0.
             return
 
-        z_rot = copy.copy(self.z)
-        zerr_rot = copy.copy(self.zerr)
-
-        for idx_freq in range(len(self.z)):
-                    
-            angle = lo_angles[idx_freq]
-            if np.isnan(angle):
-                angle = 0.
-
-            if self.zerr is not None:
-                z_rot[idx_freq], zerr_rot[idx_freq] = \
-                        MTcc.rotatematrix_incl_errors(self.z[idx_freq,:,:], 
-                                                      angle, 
-                                                      self.zerr[idx_freq,:,:])
-            else:
-                z_rot[idx_freq], zerr_rot = \
-                            MTcc.rotatematrix_incl_errors(self.z[idx_freq,:,:],
-                                                          angle)
+        #rotate all frequencies at once, nan angles are not applied
+        lo_angles = np.array(lo_angles)
+        lo_angles[np.isnan(lo_angles)] = 0.
 
+        z_rot, zerr_rot = MTcc.rotatematrices_incl_errors(self.z, lo_angles,
+                                                          self.zerr)
 
         self.z = z_rot
         if self.zerr is not None:
@@ -1248,7 +1227,7 @@ class Tipper(object):
             pass
 
         #check to see if the new tipper array is the same shape as the old
-        if (self._tipper!=None) and (self._tipper.shape!=tipper_array.shape):
+        if (self._tipper is not None) and (self._tipper.shape!=tipper_array.shape):
             print 'Error - shape of "tipper" array does not match shape of '+\
                   'tipper-array: %s ; %s'%(str(tipper_array.shape),
                                            str(self.tipper.shape))
@@ -1305,7 +1284,7 @@ class Tipper(object):
             pass
 
         
-        if (self.tippererr!=None) and \
+        if (self.tippererr is not None) and \
                             (self._tippererr.shape!=tippererr_array.shape):
             print 'Error - shape of "tippererr" array does not match shape '+\
                   'of tippererr array: %s ; %s'%(str(tippererr_array.shape),
@@ -1453,25 +1432,18 @@ class Tipper(object):
             self.amplitude_err = np.zeros(self.tippererr.shape)
             self._phase_err = np.zeros(self.tippererr.shape)
 
-        self.amplitude = np.zeros(self.tipper.shape)
-        self._phase = np.zeros(self.tipper.shape)
+        #compute all (n_freq, 1, 2) elements at once
+        self.amplitude = np.abs(self.tipper)
+        self._phase = np.degrees(np.angle(self.tipper))
 
-
-        for idx_f in range(len(self.tipper)):                         
-            for j in range(2):
-                self.amplitude[idx_f,0,j] = np.abs(self.tipper[idx_f,0,j])
-                self._phase[idx_f,0,j] = math.degrees(cmath.phase(
-                                                      self.tipper[idx_f,0,j]))
-                
-                if self.tippererr is not None:
-                    r_err, phi_err = MTcc.propagate_error_rect2polar(
-                                            np.real(self.tipper[idx_f,0,j]), 
-                                            self.tippererr[idx_f,0,j], 
-                                            np.imag(self.tipper[idx_f,0,j]), 
-                                            self.tippererr[idx_f,0,j])
-                                            
-                    self.amplitude_err[idx_f,0,j] = r_err
-                    self._phase_err[idx_f,0,j] = phi_err
+        if self.tippererr is not None:
+            r_err, phi_err = MTcc.propagate_error_rect2polar_array(
+                                                        np.real(self.tipper),
+                                                        self.tippererr,
+                                                        np.imag(self.tipper),
+                                                        self.tippererr)
+            self.amplitude_err[:] = r_err
+            self._phase_err[:] = phi_err
 
     def set_amp_phase(self, r_array, phi_array):
         """
@@ -1644,24 +1616,12 @@ class Tipper(object):
             self.rotation_angle = 0.
             return
 
-        tipper_rot = copy.copy(self.tipper)
-        tippererr_rot = copy.copy(self.tippererr)
+        #rotate all frequencies at once
+        tipper_rot, tippererr_rot = MTcc.rotatevectors_incl_errors(
+                                                            self.tipper,
+                                                            np.array(lo_angles),
+                                                            self.tippererr)
 
-        for idx_freq in range(len(tipper_rot)):
-            angle = lo_angles[idx_freq]
-
-            if self.tippererr is not None:
-                tipper_rot[idx_freq], tippererr_rot[idx_freq] =  \
-                    MTcc.rotatevector_incl_errors(self.tipper[idx_freq,:,:], 
-                                                  angle,
-                                                  self.tippererr[idx_freq,:,:] )
-            else:
-                tipper_rot[idx_freq], tippererr_rot = \
-                    MTcc.rotatevector_incl_errors(self.tipper[idx_freq,:,:], 
-                                                  angle)
-
-
- 
         self.tipper = tipper_rot
         self.tippererr = tippererr_rot
         
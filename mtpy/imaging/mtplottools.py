@@ -660,6 +660,10 @@ class MTplot(object):
                             object of mtpy.core.z. If this is input be sure the
                             attribute z.freq is filled.  
                             *default* is None 
+
+        **edi_object** : class mtpy.core.edi.Edi
+                         already read in .edi file, used instead of reading
+                         fn. *default* is None
     Attributes:
     -----------
         -z             impedance tensor as an np.array((nf, 2, 2))
@@ -730,7 +734,7 @@ class MTplot(object):
                  phase_array=None, res_err_array=None, phase_err_array=None,
                  tipper=None, tippererr=None, station=None, period=None, 
                  lat=None, lon=None, elev=None, rot_z=0, z_object=None, 
-                 tipper_object=None, freq=None):
+                 tipper_object=None, freq=None, edi_object=None):
                      
 
         self._station = station
@@ -768,7 +772,10 @@ class MTplot(object):
                                       freq=freq)
         
         #--> read in the edi file if its given
-        if self._fn is not None:
+        if edi_object is not None:
+            self._fn = edi_object.filename
+            self._read_edi(edi_object)
+        elif self._fn is not None:
             if self._fn[-3:] == 'edi':
                 self._read_edi()
             else:
@@ -800,19 +807,21 @@ class MTplot(object):
             self._set_period(period)
 
             
-    def _read_edi(self):
+    def _read_edi(self, edi1=None):
         """
-        read in an .edi file using mtpy.core.edi
+        read in an .edi file using mtpy.core.edi, or take the attributes
+        from an already read in mtpy.core.edi.Edi object edi1
         """
         
-        edi1 = mtedi.Edi(self._fn)
+        if edi1 is None:
+            edi1 = mtedi.Edi(self._fn)
         
         #--> set the attributes accordingly
         # impedance tensor and error
         self._Z = edi1.Z
         
         # tipper and error
-        if edi1.Tipper.tipper == None:
+        if edi1.Tipper.tipper is None:
             self._set_tipper(np.zeros((self._Z.z.shape[0], 1, 2),
                                      dtype='complex'))
             self._set_tippererr(np.zeros((self._Z.z.shape[0], 1, 2)))
@@ -1305,7 +1314,8 @@ class MTplot_list(object):
 # get list of mt objects     
 #==============================================================================
 def get_mtlist(fn_list=None, res_object_list=None, z_object_list=None, 
-               tipper_object_list=None, mt_object_list=None):
+               tipper_object_list=None, mt_object_list=None, n_processes=1,
+               cache_dir=None):
                  
     """
     gets a list of mt objects from the inputs  
@@ -1314,6 +1324,14 @@ def get_mtlist(fn_list=None, res_object_list=None, z_object_list=None,
     -----------
         **fn_list** : list of strings
                           full paths to .edi files to plot
+
+        **n_processes** : int
+                          number of processes for reading the .edi files,
+                          None for the number of CPUs. *default* is 1
+
+        **cache_dir** : string
+                        directory of a cache for the read in .edi files, 
+                        see mtpy.core.edi.read_edifiles. *default* is None
                           
         **res_object_list** : list of mtplot.ResPhase objects
                              *default* is none
@@ -1335,7 +1353,9 @@ def get_mtlist(fn_list=None, res_object_list=None, z_object_list=None,
     #first need to find something to loop over
     try:
         ns = len(fn_list)
-        mt_list = [MTplot(fn=fn) for fn in fn_list]
+        edi_list = mtedi.read_edifiles(fn_list, n_processes=n_processes,
+                                       cache_dir=cache_dir)
+        mt_list = [MTplot(edi_object=edi) for edi in edi_list]
         print 'Reading {0} stations'.format(ns)
         return mt_list
     except TypeError:
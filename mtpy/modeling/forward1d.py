@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+==================
+Forward1D
+==================
+
+    * Magnetotelluric response of 1D layered earth models, computed by the
+      impedance recursion from the bottom half space upwards
+      (e.g. Ward and Hohmann, 1988).
+
+    * Any number of models is computed for all frequencies at once, the
+      recursion runs over the layers with arrays of shape
+      (n_models, n_frequencies).
+
+    * The derivatives with respect to log10 of the layer resistivities
+      (the parameters of Occam1D) are computed analytically along with the
+      recursion.
+
+    * Models can be taken from Occam1D model and iteration files
+      (see mtpy.modeling.occam1d.Model), which gives predicted responses
+      without running the Fortran code, or from arrays, e.g. for Monte
+      Carlo or Bayesian sampling.
+
+    * Time dependence is exp(i*omega*t), the impedance is in Ohm (E/H), a
+      homogeneous half space has a phase of 45 degrees.
+
+    :Example: ::
+
+        >>> import mtpy.modeling.occam1d as occam1d
+        >>> import mtpy.modeling.forward1d as forward1d
+        >>> m1 = occam1d.Model()
+        >>> m1.read_iter_file(r"/home/occam1d/mt01/TE/TE_7.iter",
+        >>> ...               r"/home/occam1d/mt01/TE/Model1D")
+        >>> freq = np.logspace(-3, 3, 40)
+        >>> res, phase = forward1d.occam1d_model_response(m1, freq)
+
+"""
+#------------------------------------------------------------------------------
+import numpy as np
+
+import mtpy.modeling.occam1d as occam1d
+import mtpy.utils.exceptions as MTex
+
+#------------------------------------------------------------------------------
+mu0 = 4e-7*np.pi
+
+
+def impedance_1d(resistivity, thickness, freq, return_jacobian=False):
+    """
+    compute the surface impedance of layered earth models
+
+    Arguments:
+    ----------
+        **resistivity** : np.ndarray(n_layers) or (n_models, n_layers)
+                          layer resistivities in Ohm-m from the top down,
+                          the last layer is the half space
+
+        **thickness** : np.ndarray(n_layers-1) or (n_models, n_layers-1)
+                        layer thicknesses in meters
+
+        **freq** : np.ndarray(n_freq)
+                   frequencies in Hz
+
+        **return_jacobian** : [ True | False ]
+                              return the derivatives of the impedance with
+                              respect to log10(resistivity) as well
+
+    Returns:
+    --------
+        **z** : np.ndarray(n_freq) or (n_models, n_freq)
+                complex impedance in Ohm
+
+        **dz** : np.ndarray(n_freq, n_layers) or
+                 (n_models, n_freq, n_layers), only if return_jacobian
+                 derivatives of z with respect to log10(resistivity)
+    """
+
+    resistivity = np.asarray(resistivity, dtype=np.float64)
+    single_model = resistivity.ndim == 1
+    resistivity = np.atleast_2d(resistivity)
+    n_models, n_layers = resistivity.shape
+    thickness = np.broadcast_to(np.asarray(thickness, dtype=np.float64),
+                                (n_models, n_layers-1))
+    freq = np.atleast_1d(np.asarray(freq, dtype=np.float64))
+
+    if (resistivity <= 0).any():
+        raise MTex.MTpyError_value('resistivities must be positive')
+
+    #intrinsic impedance zeta = sqrt(i*omega*mu*rho) and wave number 
+    #k = zeta/rho of each layer, as outer products (n_models, n_freq)
+    sqrt_iwmu = np.sqrt(1j*2*np.pi*freq*mu0)[np.newaxis, :]
+    sqrt_res = np.sqrt(resistivity)
+
+    #bottom half space
+    z = sqrt_res[:, -1][:, np.newaxis]*sqrt_iwmu
+    if return_jacobian:
+        #derivative of the impedance at the top of each layer with respect
+        #to the impedance below it, and with respect to its own resistivity
+        dz_dzbelow = np.ones((n_models, len(freq), n_layers), 
+                             dtype=np.complex128)
+        dz_dm = np.zeros((n_models, len(freq), n_layers), dtype=np.complex128)
+        dz_dm[:, :, -1] = 0.5*np.log(10)*z
+
+    for ii in range(n_layers-2, -1, -1):
+        zeta_ii = sqrt_res[:, ii][:, np.newaxis]*sqrt_iwmu
+        kh = (thickness[:, ii]/sqrt_res[:, ii])[:, np.newaxis]*sqrt_iwmu
+        #tanh(kh), stable for thick layers as Re(kh) > 0
+        e2kh = np.exp(-2*kh)
+        t = (1-e2kh)/(1+e2kh)
+
+        numerator = z+zeta_ii*t
+        denominator = zeta_ii+z*t
+        z_top = zeta_ii*numerator
+        z_top /= denominator
+
+        if return_jacobian:
+            denominator2 = denominator**2
+            dz_dzbelow[:, :, ii] = zeta_ii**2*(1-t**2)/denominator2
+            dz_dzeta = (numerator*denominator+zeta_ii*t*denominator-
+                        zeta_ii*numerator)/denominator2
+            dz_dt = zeta_ii*(zeta_ii**2-z**2)/denominator2
+            #dzeta/dlog10(rho) = ln(10)/2*zeta, dk/dlog10(rho) = -ln(10)/2*k
+            dz_dm[:, :, ii] = 0.5*np.log(10)*(dz_dzeta*zeta_ii-
+                                              dz_dt*(1-t**2)*kh)
+        z = z_top
+
+    if not return_jacobian:
+        if single_model:
+            return z[0]
+        return z
+
+    #chain rule up to the surface: product of dz_dzbelow of all layers above
+    transfer = np.cumprod(np.concatenate((np.ones(z.shape+(1,)),
+                                          dz_dzbelow[:, :, :-1]), axis=2),
+                          axis=2)
+    dz = transfer*dz_dm
+
+    if single_model:
+        return z[0], dz[0]
+    return z, dz
+
+def z2resphase(z, freq, dz=None):
+    """
+    convert impedance in Ohm to apparent resistivity and phase
+
+    Arguments:
+    ----------
+        **z** : np.ndarray(..., n_freq)
+                impedance in Ohm
+
+        **freq** : np.ndarray(n_freq)
+                   frequencies in Hz
+
+        **dz** : np.ndarray(..., n_freq, n_params)
+                 derivatives of z, if given the derivatives of
+                 log10(resistivity) and phase are returned as well
+
+    Returns:
+    --------
+        **res** : apparent resistivity in Ohm-m
+
+        **phase** : phase in degrees
+
+        **dlogres** : derivatives of log10(apparent resistivity),
+                      only if dz is given
+
+        **dphase** : derivatives of the phase in degrees, only if dz is given
+    """
+
+    omega_mu = 2*np.pi*np.asarray(freq, dtype=np.float64)*mu0
+    res = abs(z)**2/omega_mu
+    phase = np.angle(z, deg=True)
+
+    if dz is None:
+        return res, phase
+
+    dlnz = dz/z[..., np.newaxis]
+    dlogres = 2*dlnz.real/np.log(10)
+    dphase = np.degrees(dlnz.imag)
+
+    return res, phase, dlogres, dphase
+
+def occam1d_layers(model, mode=1):
+    """
+    get layer resistivities and thicknesses from an Occam1D model
+
+    Arguments:
+    ----------
+        **model** : mtpy.modeling.occam1d.Model or full path to model file
+
+        **mode** : [ 0 | 1 ]
+                   column of model.model_res to use, 0 for the model file
+                   values (linear Ohm-m), 1 (default) for the values read
+                   from an iteration file (log10 Ohm-m), fixed layers keep
+                   their model file values
+
+    Returns:
+    --------
+        **resistivity** : np.ndarray(n_layers) in Ohm-m
+
+        **thickness** : np.ndarray(n_layers-1) in meters
+    """
+
+    if not isinstance(model, occam1d.Model):
+        model_fn = model
+        model = occam1d.Model()
+        model.read_model_file(model_fn)
+
+    if model.model_res is None:
+        raise MTex.MTpyError_inputarguments('Need to read a model file')
+
+    depth = np.asarray(model.model_depth, dtype=np.float64)
+    model_res = np.asarray(model.model_res, dtype=np.float64)
+    resistivity = model_res[:, 0]
+    if mode == 1:
+        #iteration values are log10(resistivity) of the free layers
+        resistivity = np.where(resistivity == -1, 10**model_res[:, 1],
+                               resistivity)
+
+    #skip the air layer
+    ground = depth >= 0
+    depth = depth[ground]
+    resistivity = resistivity[ground]
+
+    if (resistivity <= 0).any():
+        raise MTex.MTpyError_value('Model has free or unset layers, '+
+                                   'read an iteration file first')
+
+    return resistivity, np.diff(depth)
+
+def occam1d_model_response(model, freq, mode=1, return_jacobian=False):
+    """
+    compute the apparent resistivity and phase of an Occam1D model
+
+    Arguments:
+    ----------
+        **model** : mtpy.modeling.occam1d.Model or full path to model file
+
+        **freq** : np.ndarray(n_freq) frequencies in Hz
+
+        **mode** : column of model.model_res to use, see occam1d_layers
+
+        **return_jacobian** : [ True | False ]
+                              return derivatives with respect to
+                              log10(resistivity) of the layers below the air
+
+    Returns:
+    --------
+        **res** : apparent resistivity in Ohm-m
+
+        **phase** : phase in degrees
+
+        **dlogres**, **dphase** : np.ndarray(n_freq, n_layers) if
+                                  return_jacobian
+    """
+
+    resistivity, thickness = occam1d_layers(model, mode=mode)
+
+    if return_jacobian:
+        z, dz = impedance_1d(resistivity, thickness, freq,
+                             return_jacobian=True)
+        return z2resphase(z, freq, dz)
+
+    return z2resphase(impedance_1d(resistivity, thickness, freq), freq)
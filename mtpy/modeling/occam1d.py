@@ -58,6 +58,11 @@ Occam1D
         >>> p1.iter_te_fn = r"/home/occam1d/mt01/TE/TE_7.iter"
         >>> p1.resp_te_fn = r"/home/occam1d/mt01/TE/TE_7.resp"
         >>> p1.plot()
+        >>> #--> or run all stations of a survey on 8 processes
+        >>> rs = occam1d.RunSurvey(edi_list, occam_path, n_processes=8,
+        >>> ...                    save_path=r"/home/occam1d", mode='TE',
+        >>> ...                    data_kwargs={'res_err':10, 'phase_err':2.5})
+        >>> rs.run()
 
 @author: J. Peacock (Oct. 2013)
 """
@@ -70,6 +75,7 @@ import matplotlib.gridspec as gridspec
 import mtpy.core.edi as mtedi
 import matplotlib.pyplot as plt
 import subprocess
+import multiprocessing
 #------------------------------------------------------------------------------
 
 class Data(object):
@@ -1792,13 +1798,306 @@ class Run(object):
         if self.occam_path is None:
             raise IOError('Need to input path to occam1d executable')
             
-        os.chdir(os.path.dirname(self.startup_fn))
-        test = subprocess.call([self.occam_path, 
-                                os.path.basename(self.startup_fn),
-                                self.mode])
+        test = run_occam1d(self.startup_fn, self.occam_path, mode=self.mode)
         if test == 0:
             print '=========== Ran Inversion =========='
             print '  check {0} for files'.format(os.path.dirname(self.startup_fn))
+
+def run_occam1d(startup_fn, occam_path, mode='TE', log_fn=None):
+    """
+    run the Occam1D executable in the directory of the startup file, the
+    working directory of the calling process is not changed.
+    
+    Arguments:
+    ----------
+        **startup_fn** : full path to startup file
+        
+        **occam_path** : full path to Occam1D executable
+        
+        **mode** : root name of the output files, iteration files are
+                   written as mode_#.iter and mode_#.resp
+                   
+        **log_fn** : full path to a file for the screen output of Occam1D
+                     *default* is None (print to screen)
+                     
+    Returns:
+    --------
+        **return code** of the executable
+    """
+    
+    run_path = os.path.dirname(os.path.abspath(startup_fn))
+    command = [occam_path, os.path.basename(startup_fn), mode]
+    if log_fn is None:
+        return subprocess.call(command, cwd=run_path)
+        
+    lfid = open(log_fn, 'w')
+    try:
+        return subprocess.call(command, cwd=run_path, stdout=lfid, 
+                               stderr=subprocess.STDOUT)
+    finally:
+        lfid.close()
+        
+def get_iter_list(dir_path, mode='TE'):
+    """
+    get the iteration and response files written by Occam1D in dir_path
+    
+    Returns:
+    --------
+        **iter_list** : list of (iteration, iter_fn, resp_fn) sorted by 
+                        iteration number, resp_fn is None if missing
+    """
+    
+    iter_list = []
+    for fn in os.listdir(dir_path):
+        root, ext = os.path.splitext(fn)
+        if ext != '.iter' or root.find(mode+'_') != 0:
+            continue
+        try:
+            iteration = int(root[len(mode)+1:])
+        except ValueError:
+            continue
+        resp_fn = os.path.join(dir_path, root+'.resp')
+        if not os.path.isfile(resp_fn):
+            resp_fn = None
+        iter_list.append((iteration, os.path.join(dir_path, fn), resp_fn))
+        
+    iter_list.sort()
+    return iter_list
+        
+def _run_survey_station(job):
+    """
+    worker of RunSurvey: write the input files of one station into its own
+    directory, run Occam1D there and read back the last iteration.
+    
+    Returns (index, result dictionary, None) or (index, None, error message)
+    """
+    
+    (index, edi_fn, station_path, occam_path, mode, data_kwargs, 
+     model_kwargs, startup_kwargs) = job
+    
+    try:
+        if not os.path.isdir(station_path):
+            os.makedirs(station_path)
+            
+        d1 = Data()
+        d1.write_data_file(edi_file=edi_fn, save_path=station_path, 
+                           mode=mode, **data_kwargs)
+        m1 = Model()
+        m1.write_model_file(save_path=station_path, **model_kwargs)
+        s1 = Startup(data_fn=d1.data_fn, model_fn=m1.model_fn, 
+                     **startup_kwargs)
+        s1.write_startup_file(save_path=station_path)
+        
+        test = run_occam1d(s1.startup_fn, occam_path, mode=mode, 
+                           log_fn=os.path.join(station_path, mode+'.log'))
+        if test != 0:
+            return index, None, 'Occam1D returned {0}'.format(test)
+            
+        iter_list = get_iter_list(station_path, mode=mode)
+        if len(iter_list) == 0 or iter_list[-1][2] is None:
+            return index, None, 'no iteration files written'
+        iteration, iter_fn, resp_fn = iter_list[-1]
+        
+        m1.read_iter_file(iter_fn, m1.model_fn)
+        d1.read_resp_file(resp_fn, d1.data_fn)
+    except Exception, e:
+        return index, None, '{0}: {1}'.format(e.__class__.__name__, e)
+        
+    if mode.lower() == 'tm':
+        res, phase = d1.res_tm, d1.phase_tm
+    else:
+        res, phase = d1.res_te, d1.phase_te
+    
+    return index, {'iter_fn':iter_fn,
+                   'resp_fn':resp_fn,
+                   'iteration':iteration,
+                   'rms':float(m1.itdict.get('Misfit Value', np.nan)),
+                   'roughness':float(m1.itdict.get('Roughness Value', np.nan)),
+                   'model_depth':m1.model_depth,
+                   'model_res':m1.model_res[:, 1],
+                   'freq':d1.freq,
+                   'res':res,
+                   'phase':phase}, None
+
+class RunSurvey(object):
+    """
+    run Occam1D for all stations of a survey on a pool of processes
+    
+    Every station gets its own directory save_path/station/mode with data,
+    model and startup file, so the inversions can run at the same time.  
+    The last iteration of each station is read back as soon as its 
+    inversion is finished and put into the survey arrays.  Stations that 
+    failed are listed in failed, their entries in the arrays are nan.
+    
+    ====================== ====================================================
+    Attributes             Description    
+    ====================== ====================================================
+    data_kwargs            keywords for Data.write_data_file, e.g. res_err
+    edi_list               list of full paths to edi files
+    failed                 dictionary of station: error message
+    freq                   array of frequencies (n_stations, n_freq)
+    iter_fn                list of last iteration file of each station
+    iteration              array of last iteration number of each station
+    mode                   mode to invert for [ 'TE' | 'TM' | 'det' ]
+    model_depth            array of model depths (n_stations, n_layers)
+    model_kwargs           keywords for Model.write_model_file
+    model_res              array of model resistivities (n_stations, n_layers)
+                           from the iteration files, log10 scale
+    n_processes            number of processes, None for number of CPUs
+                           *default* is None
+    occam_path             full path to Occam1D executable
+    phase                  array of phase (n_stations, 4, n_freq) for (0) 
+                           data, (1) dataerr, (2) model, (3) modelerr
+    res                    array of resistivity (n_stations, 4, n_freq) 
+                           for (0) data, (1) dataerr, (2) model, (3) modelerr
+    resp_fn                list of last response file of each station
+    rms                    array of misfit of the last iteration
+    roughness              array of roughness of the last iteration
+    save_path              path to save files to
+    startup_kwargs         keywords for Startup, e.g. target_rms
+    station_list           list of station names (edi file basenames)
+    ====================== ====================================================
+    
+    :Example: ::
+        
+        >>> import glob
+        >>> import mtpy.modeling.occam1d as occam1d
+        >>> edi_list = glob.glob(r"/home/MT/edi_files/*.edi")
+        >>> rs = occam1d.RunSurvey(edi_list, r"/home/occam1d/Occam1D", 
+        >>> ...                    save_path=r"/home/occam1d/survey",
+        >>> ...                    mode='TE', n_processes=8,
+        >>> ...                    data_kwargs={'res_err':10, 'phase_err':2.5},
+        >>> ...                    startup_kwargs={'target_rms':1.5})
+        >>> rs.run()
+    """
+    
+    def __init__(self, edi_list, occam_path, **kwargs):
+        self.edi_list = [os.path.abspath(edi_fn) for edi_fn in edi_list]
+        self.occam_path = os.path.abspath(occam_path)
+        
+        self.save_path = kwargs.pop('save_path', os.getcwd())
+        self.mode = kwargs.pop('mode', 'TE')
+        self.n_processes = kwargs.pop('n_processes', None)
+        self.data_kwargs = kwargs.pop('data_kwargs', {})
+        self.model_kwargs = kwargs.pop('model_kwargs', {})
+        self.startup_kwargs = kwargs.pop('startup_kwargs', {})
+        
+        self.station_list = [os.path.splitext(os.path.basename(edi_fn))[0]
+                             for edi_fn in self.edi_list]
+        if len(set(self.station_list)) != len(self.station_list):
+            raise IOError('edi files need unique names, they are used as '
+                          'station directories')
+        
+        self.failed = {}
+        self.iter_fn = None
+        self.resp_fn = None
+        self.iteration = None
+        self.rms = None
+        self.roughness = None
+        self.model_depth = None
+        self.model_res = None
+        self.freq = None
+        self.res = None
+        self.phase = None
+        
+    def get_station_path(self, station):
+        """
+        directory of the input and output files of station
+        """
+        
+        return os.path.join(self.save_path, station, self.mode)
+        
+    def run(self):
+        """
+        write input files and run Occam1D for all stations, fills the 
+        survey arrays as the stations are finished
+        """
+        
+        n_stations = len(self.edi_list)
+        jobs = [(ii, edi_fn, self.get_station_path(station), 
+                 self.occam_path, self.mode, self.data_kwargs, 
+                 self.model_kwargs, self.startup_kwargs)
+                for ii, (edi_fn, station) in enumerate(zip(self.edi_list, 
+                                                           self.station_list))]
+        
+        self.failed = {}
+        self.iter_fn = [None]*n_stations
+        self.resp_fn = [None]*n_stations
+        self.iteration = np.zeros(n_stations, dtype=np.int)
+        self.rms = np.zeros(n_stations)*np.nan
+        self.roughness = np.zeros(n_stations)*np.nan
+        self.model_depth = None
+        self.model_res = None
+        self.freq = None
+        self.res = None
+        self.phase = None
+        
+        t0 = time.time()
+        if self.n_processes == 1 or n_stations < 2:
+            for job in jobs:
+                self._add_result(*_run_survey_station(job))
+        else:
+            n_processes = self.n_processes
+            if n_processes is None:
+                n_processes = multiprocessing.cpu_count()
+            pool = multiprocessing.Pool(processes=n_processes)
+            try:
+                #one station per task, inversions take long and vary a lot
+                for result in pool.imap_unordered(_run_survey_station, jobs):
+                    self._add_result(*result)
+            finally:
+                pool.close()
+                pool.join()
+                
+        print '=========== Ran {0} Inversions in {1:.1f} s =========='.format(
+                                                    n_stations, time.time()-t0)
+        if len(self.failed) > 0:
+            print '  {0} failed: {1}'.format(len(self.failed), 
+                                             ', '.join(sorted(self.failed)))
+            
+    def _add_result(self, index, result, message):
+        """
+        put the result of one station into the survey arrays
+        """
+        
+        station = self.station_list[index]
+        if result is None:
+            self.failed[station] = message
+            print '  {0} failed: {1}'.format(station, message)
+            return
+            
+        self.iter_fn[index] = result['iter_fn']
+        self.resp_fn[index] = result['resp_fn']
+        self.iteration[index] = result['iteration']
+        self.rms[index] = result['rms']
+        self.roughness[index] = result['roughness']
+        
+        self.model_depth = self._put(self.model_depth, index, 
+                                     result['model_depth'])
+        self.model_res = self._put(self.model_res, index, result['model_res'])
+        self.freq = self._put(self.freq, index, result['freq'])
+        self.res = self._put(self.res, index, result['res'])
+        self.phase = self._put(self.phase, index, result['phase'])
+        
+        print '  finished {0}, iteration {1}, rms {2:.2f}'.format(station,
+                                                            result['iteration'],
+                                                            result['rms'])
+        
+    def _put(self, survey_arr, index, arr):
+        """
+        put arr into row index of survey_arr, padded with nan along the 
+        last axis, survey_arr is made or enlarged as necessary
+        """
+        
+        arr = np.asarray(arr, dtype=np.float)
+        if survey_arr is None:
+            survey_arr = np.zeros((len(self.edi_list),)+arr.shape)*np.nan
+        elif survey_arr.shape[-1] < arr.shape[-1]:
+            pad = np.zeros(survey_arr.shape[:-1]+
+                           (arr.shape[-1]-survey_arr.shape[-1],))*np.nan
+            survey_arr = np.concatenate((survey_arr, pad), axis=-1)
+        survey_arr[index, ..., :arr.shape[-1]] = arr
+        return survey_arr
                     
 class PlotL2():
     """
@@ -141,6 +141,8 @@ class WSData(object):
                                * *z_err_map --> error map from data file
     data_fn                full path to data file
     edi_list               list of edi files used to make data file
+    n_processes            number of processes reading the edi files, None
+                           for the number of CPUs. *default* is 1
     n_z                    [ 4 | 8 ] number of impedance tensor elements
                            *default* is 8
     ncol                   number of columns in out file from winglink
@@ -199,6 +201,7 @@ class WSData(object):
         self.n_z = kwargs.pop('n_z', 8)
         self.period_list = kwargs.pop('period_list', None)
         self.edi_list = kwargs.pop('edi_list', None)
+        self.n_processes = kwargs.pop('n_processes', 1)
         self.station_locations = kwargs.pop('station_locations', None)
         
         self.station_east = None
@@ -358,12 +361,12 @@ class WSData(object):
                 self.data['north']= self.station_locations[:, 1]
         
         #--------find frequencies----------------------------------------------
-        for ss, edi in enumerate(self.edi_list):
+        for edi in self.edi_list:
             if not os.path.isfile(edi):
                 raise IOError('Could not find '+edi)
 
-            z1 = mtedi.Edi()
-            z1.readfile(edi)
+        for ss, z1 in enumerate(mtedi.read_edifiles(self.edi_list, 
+                                        n_processes=self.n_processes)):
             print '{0}{1}{0}'.format('-'*20, z1.station) 
             for ff, f1 in enumerate(self.period_list):
                 for kk,f2 in enumerate(z1.period):
@@ -951,8 +954,8 @@ class WSMesh(object):
                                                  ('north_c', np.float)])
         #get station locations in meters
         for ii, edi in enumerate(self.edi_list):
-            zz = mtedi.Edi()
-            zz.readfile(edi)
+            #only the header is needed for the station locations
+            zz = mtedi.read_edifile(edi, header_only=True)
             zone, east, north = ll2utm.LLtoUTM(23, zz.lat, zz.lon)
             self.station_locations[ii]['station'] = zz.station
             self.station_locations[ii]['east'] = east
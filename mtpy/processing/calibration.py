@@ -32,6 +32,7 @@ import os.path as op
 import copy
 
 import  mtpy.utils.exceptions as MTex
+import mtpy.utils.filehandling as MTfh
 
 #=================================================================
 
@@ -194,7 +195,7 @@ def elogger_e_field(data, elogger_gain, dipole, instrument_amplification):
 
 def calibrate_file(filename, outdir, instrument, instrument_amplification, 
                     logger, gain, dipole, stationname, channel, latitude, 
-                    longitude, elevation, offset = 0 ):
+                    longitude, elevation, offset = 0, binary_output = False ):
     """
     Calibrate data from one given file and store the output to another file.
     If the channel is not given explicitly, it's taken from the filename suffix.
@@ -211,6 +212,8 @@ def calibrate_file(filename, outdir, instrument, instrument_amplification,
     - logger gain factor
     - station name
     - channel  
+    - binary_output: write the binary MTpy TS format (input files can be
+      ASCII or binary)
 
     """
     time_axis = None
@@ -229,7 +232,10 @@ def calibrate_file(filename, outdir, instrument, instrument_amplification,
     infile_base = op.basename(filename)
 
     try:
-        data_in = np.loadtxt(filename)
+        if MTfh.is_binary_ts_file(filename):
+            data_in = MTfh.read_ts_file_binary(filename, mmap_mode=None)[-1]
+        else:
+            data_in = MTfh.read_ts_data_ascii(filename)
     except:
         raise MTex.MTpyError_inputarguments('cannot read data file')
 
@@ -239,6 +245,8 @@ def calibrate_file(filename, outdir, instrument, instrument_amplification,
     #read in first line of input file, checking, if header line exists
     FH = open(filename,'r')
     firstline = FH.readline().strip()
+    if firstline.startswith(MTfh.binary_ts_magic):
+        firstline = FH.readline().strip()
     FH.close()
 
 
@@ -381,11 +389,30 @@ def calibrate_file(filename, outdir, instrument, instrument_amplification,
     else:
         data_out = outfile_data
 
-    Fout = open(outfile,'w')
+    if binary_output is True:
+        header_dict = {}
+        if firstline[0][0] == '#':
+            headerlist = firstline.replace('#','').split()[:5]
+            for idx, headerelement in enumerate(headerlist):
+                header_dict[MTfh.lo_headerelements[idx]] = headerelement
+        else:
+            header_dict['station'] = stationname
+            header_dict['channel'] = channel
+        header_dict['unit'] = dataunit
+        header_dict['lat'] = '{0:02.5f}'.format(latitude)
+        header_dict['lon'] = '{0:03.5f}'.format(longitude)
+        header_dict['elev'] = '{0:.1f}'.format(elevation)
+
+        ts_tuple = [header_dict.get(i) for i in MTfh.lo_headerelements]
+        ts_tuple.append(data_out)
+        outfile = MTfh.write_ts_file_binary(outfile, ts_tuple)
+
+    else:
+        Fout = open(outfile,'w')
 
-    Fout.write(newfirstline)
-    np.savetxt(Fout,data_out)
-    Fout.close()
+        Fout.write(newfirstline)
+        np.savetxt(Fout,data_out)
+        Fout.close()
 
     print 'read file',filename ,'  ->  wrote file %s'%(outfile)
     
@@ -27,3 +27,297 @@ import copy
 import  mtpy.utils.exceptions as MTex
 
 #=================================================================
+
+import scipy.signal as sps
+
+#=================================================================
+
+#number of segments transformed at once
+_segments_per_batch = 256
+
+
+def _segment_window(window, nperseg):
+    if isinstance(window, str) or isinstance(window, tuple):
+        return sps.get_window(window, nperseg)
+
+    window = np.asarray(window, dtype=np.float64)
+    if len(window) != nperseg:
+        raise MTex.MTpyError_inputarguments('window must have length '\
+                                            '{0}'.format(nperseg))
+    return window
+
+
+def _segments(data, nperseg, step):
+    """
+    Strided view (n_channels, n_segments, nperseg) onto data.
+    """
+
+    n_channels, n_samples = data.shape
+    n_segments = (n_samples - nperseg) / step + 1
+    stride_ch, stride_t = data.strides
+
+    return np.lib.stride_tricks.as_strided(data,
+                            shape=(n_channels, n_segments, nperseg),
+                            strides=(stride_ch, step * stride_t, stride_t))
+
+
+class CrossSpectra(object):
+    """
+    Welch estimate of the cross-spectral matrix of multi channel data.
+
+    The data are cut into segments of nperseg samples overlapping by
+    noverlap samples, each segment is detrended (mean removed), tapered and
+    Fourier transformed once. The spectral matrix of all channel pairs is
+    accumulated from the same set of transforms. Data can be added in
+    chunks of any length, the segments continue across chunk boundaries.
+
+    The spectral matrix S[f, i, j] is the average of conj(X_i) * X_j with
+    one-sided density scaling, as scipy.signal.csd(x_i, x_j).
+
+    **Arguments:**
+        - n_channels : number of channels (rows of the data), e.g. Ex, Ey,
+                       Hx, Hy, Hz and remote Hx, Hy
+        - samplingrate : in Hz
+        - nperseg : segment length in samples
+        - noverlap : overlap of segments in samples, default nperseg/2
+        - window : window name (see scipy.signal.get_window) or array
+
+    """
+
+    def __init__(self, n_channels, samplingrate, nperseg=256, noverlap=None,
+                 window='hann'):
+
+        self.n_channels = int(n_channels)
+        self.samplingrate = float(samplingrate)
+        self.nperseg = int(nperseg)
+        if noverlap is None:
+            noverlap = self.nperseg / 2
+        if not 0 <= noverlap < self.nperseg:
+            raise MTex.MTpyError_inputarguments('noverlap must be smaller '\
+                                                'than nperseg')
+        self.step = self.nperseg - int(noverlap)
+        self.window = _segment_window(window, self.nperseg)
+
+        self.freqs = np.fft.rfftfreq(self.nperseg, 1. / self.samplingrate)
+        #density scaling, one-sided
+        self.scaling = np.ones(len(self.freqs)) / \
+                       (self.samplingrate * (self.window**2).sum())
+        self.scaling[1:] *= 2
+        if self.nperseg % 2 == 0:
+            self.scaling[-1] /= 2
+
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all segments added so far.
+        """
+
+        self.buffer = np.zeros((self.n_channels, 0))
+        self.csm_sum = np.zeros((len(self.freqs), self.n_channels,
+                                 self.n_channels), dtype='complex128')
+        self.n_segments = 0
+
+    def segment_spectra(self, data):
+        """
+        Return the tapered spectra (n_segments, n_channels, n_freqs) of all
+        complete segments of data, without accumulating them.
+        """
+
+        data = np.atleast_2d(np.asarray(data, dtype=np.float64))
+        if data.shape[1] < self.nperseg:
+            return np.zeros((0, data.shape[0], len(self.freqs)),
+                            dtype='complex128')
+
+        segments = _segments(data, self.nperseg, self.step)
+        segments = segments - segments.mean(axis=-1, keepdims=True)
+        spectra = np.fft.rfft(segments * self.window, axis=-1)
+
+        return spectra.swapaxes(0, 1)
+
+    def add(self, data):
+        """
+        Add the next chunk of data (n_channels, n_samples).
+        """
+
+        data = np.atleast_2d(np.asarray(data, dtype=np.float64))
+        if data.shape[0] != self.n_channels:
+            raise MTex.MTpyError_ts_data('expected {0} channels, got '\
+                            '{1}'.format(self.n_channels, data.shape[0]))
+
+        buf = np.concatenate((self.buffer, data), axis=1)
+        n_new = 0
+        if buf.shape[1] >= self.nperseg:
+            n_new = (buf.shape[1] - self.nperseg) / self.step + 1
+
+        #transform in batches of segments to limit the memory used
+        for idx_seg in range(0, n_new, _segments_per_batch):
+            n_batch = min(_segments_per_batch, n_new - idx_seg)
+            i0 = idx_seg * self.step
+            spectra = self.segment_spectra(
+                    buf[:, i0:i0 + (n_batch - 1) * self.step + self.nperseg])
+            self.csm_sum += np.einsum('sif,sjf->fij', spectra.conj(), spectra)
+
+        self.n_segments += n_new
+        self.buffer = buf[:, n_new * self.step:].copy()
+
+    def get_csm(self):
+        """
+        Return the averaged cross-spectral matrix (n_freqs, n_channels,
+        n_channels).
+        """
+
+        if self.n_segments == 0:
+            raise MTex.MTpyError_ts_data('no complete segment added yet')
+
+        return self.csm_sum * (self.scaling / self.n_segments)[:, np.newaxis,
+                                                               np.newaxis]
+
+    def get_coherence(self, bands=None):
+        """
+        Return the squared coherence of all channel pairs.
+
+        **Input:**
+            - bands : None or list of (fmin, fmax) frequency bands to
+                      average the spectral matrix over before computing
+                      the coherence
+
+        **Output:**
+            - frequencies (or band centres)
+            - coherence array (n_freqs or n_bands, n_channels, n_channels)
+
+        """
+
+        csm = self.get_csm()
+        freqs = self.freqs
+        if bands is not None:
+            freqs, csm = band_average(csm, self.freqs, bands)
+
+        return freqs, coherence_from_csm(csm)
+
+
+def band_average(csm, freqs, bands):
+    """
+    Average spectral matrices (..., n_freqs, n_channels, n_channels) over
+    frequency bands given as list of (fmin, fmax).
+
+    Returns the geometric band centres and the band averages
+    (..., n_bands, n_channels, n_channels).
+
+    """
+
+    csm = np.asarray(csm)
+    lo_averages = []
+    centres = []
+    for fmin, fmax in bands:
+        in_band = (freqs >= fmin) & (freqs <= fmax)
+        if not in_band.any():
+            raise MTex.MTpyError_inputarguments('no frequency in band '\
+                                        '{0} - {1} Hz'.format(fmin, fmax))
+        lo_averages.append(csm[..., in_band, :, :].mean(axis=-3))
+        centres.append(np.sqrt(fmin * fmax))
+
+    return np.array(centres), np.moveaxis(np.array(lo_averages), 0, -3)
+
+
+def coherence_from_csm(csm):
+    """
+    Squared coherence |S_ij|^2/(S_ii S_jj) of all channel pairs from
+    spectral matrices (..., n_channels, n_channels).
+    """
+
+    csm = np.asarray(csm)
+    power = np.real(np.diagonal(csm, axis1=-2, axis2=-1))
+    denominator = power[..., :, np.newaxis] * power[..., np.newaxis, :]
+
+    coherence = np.zeros(denominator.shape)
+    nonzero = denominator > 0
+    coherence[nonzero] = np.abs(csm[nonzero])**2 / denominator[nonzero]
+
+    return coherence
+
+
+def windowed_csm(data, samplingrate, window_length, nperseg=256,
+                 noverlap=None, window='hann'):
+    """
+    Cross-spectral matrices of consecutive time windows.
+
+    All segments of the record are transformed once, the spectral matrix
+    of each window of window_length samples is the average over the segments
+    lying completely inside the window.
+
+    **Input:**
+        - data : array (n_channels, n_samples)
+        - samplingrate : in Hz
+        - window_length : length of the time windows in samples, a multiple
+                          of the segment step (nperseg-noverlap)
+        - nperseg, noverlap, window : see CrossSpectra
+
+    **Output:**
+        - frequencies
+        - window start samples
+        - array (n_windows, n_freqs, n_channels, n_channels)
+
+    """
+
+    data = np.atleast_2d(np.asarray(data, dtype=np.float64))
+    spectra = CrossSpectra(data.shape[0], samplingrate, nperseg, noverlap,
+                           window)
+
+    step = spectra.step
+    if window_length % step != 0 or window_length < nperseg:
+        raise MTex.MTpyError_inputarguments('window length must be a '\
+                    'multiple of {0} and at least {1}'.format(step, nperseg))
+
+    n_windows = data.shape[1] / window_length
+    #window k uses the segments k*nshift ... k*nshift+nseg-1 of the record
+    nshift = window_length / step
+    nseg = (window_length - nperseg) / step + 1
+    idx_seg = np.arange(nseg)[np.newaxis, :]
+
+    csm = np.zeros((n_windows, len(spectra.freqs), data.shape[0],
+                    data.shape[0]), dtype='complex128')
+    nbatch = max(1, _segments_per_batch / nshift)
+    for idx_win in range(0, n_windows, nbatch):
+        nb = min(nbatch, n_windows - idx_win)
+        segment_spectra = spectra.segment_spectra(
+                data[:, idx_win * window_length:(idx_win + nb) * window_length])
+        grouped = segment_spectra[np.arange(nb)[:, np.newaxis] * nshift +
+                                  idx_seg]
+        csm[idx_win:idx_win + nb] = np.einsum('wsif,wsjf->wfij',
+                                              grouped.conj(), grouped)
+
+    csm *= (spectra.scaling / nseg)[np.newaxis, :, np.newaxis, np.newaxis]
+
+    return spectra.freqs, np.arange(n_windows) * window_length, csm
+
+
+def coherence(data, samplingrate, nperseg=256, noverlap=None, window='hann',
+              bands=None, chunk_length=2**20):
+    """
+    Squared coherence of all channel pairs of a record.
+
+    The record is processed in chunks of chunk_length samples, so long
+    records (e.g. memory mapped binary time series files) are never loaded
+    at once.
+
+    **Input:**
+        - data : array (n_channels, n_samples)
+        - samplingrate : in Hz
+        - nperseg, noverlap, window : see CrossSpectra
+        - bands : None or list of (fmin, fmax) to average over
+
+    **Output:**
+        - frequencies (or band centres)
+        - coherence array (n_freqs or n_bands, n_channels, n_channels),
+          e.g. coherence[:, 0, 3] is the coherence of channels 0 and 3
+
+    """
+
+    data = np.atleast_2d(data)
+    spectra = CrossSpectra(data.shape[0], samplingrate, nperseg, noverlap,
+                           window)
+    for idx in range(0, data.shape[1], chunk_length):
+        spectra.add(data[:, idx:idx + chunk_length])
+
+    return spectra.get_coherence(bands)
@@ -25,6 +25,232 @@ import time
 import copy
 
 
+import scipy.signal as sps
+
 import  mtpy.utils.exceptions as MTex
 
-#=================================================================
\ No newline at end of file
+#=================================================================
+
+_filter_cache = {}
+
+#=================================================================
+
+
+def decimation_stages(ratio, max_factor=8):
+    """
+    Split a decimation ratio into a list of integer stages.
+
+    Factors are combined into stages of at most max_factor, largest first,
+    e.g. 4096 -> [8, 8, 8, 8], 1000 -> [8, 5, 5, 5].
+
+    **Input:**
+        - ratio : integer decimation ratio (>= 1)
+        - max_factor : largest decimation of a single stage
+
+    **Output:**
+        - list of stage factors (empty list for ratio 1)
+
+    """
+
+    if int(ratio) != ratio or ratio < 1:
+        raise MTex.MTpyError_inputarguments('decimation ratio must be a '\
+                                    'positive integer: {0}'.format(ratio))
+    ratio = int(ratio)
+
+    #prime factors
+    factors = []
+    divisor = 2
+    while ratio > 1:
+        while ratio % divisor == 0:
+            factors.append(divisor)
+            ratio /= divisor
+        divisor += 1
+
+    if factors and max(factors) > max_factor:
+        raise MTex.MTpyError_inputarguments('decimation ratio has prime '\
+                        'factor {0} > {1}'.format(max(factors), max_factor))
+
+    #greedily pack the largest factors into stages
+    stages = []
+    for factor in sorted(factors, reverse=True):
+        for idx, stage in enumerate(stages):
+            if stage * factor <= max_factor:
+                stages[idx] *= factor
+                break
+        else:
+            stages.append(factor)
+
+    return sorted(stages, reverse=True)
+
+
+def get_decimation_filter(factor, ntaps_per_factor=20, cutoff=0.8):
+    """
+    Return the (cached) anti-alias FIR filter for a decimation by factor.
+
+    A Hamming windowed lowpass with ntaps_per_factor*factor+1 taps and
+    a corner at cutoff times the new Nyquist frequency. The returned array
+    is shared between calls and read-only.
+
+    """
+
+    key = (int(factor), int(ntaps_per_factor), float(cutoff))
+    if key not in _filter_cache:
+        ntaps = int(ntaps_per_factor) * int(factor) + 1
+        coefficients = sps.firwin(ntaps, float(cutoff) / factor,
+                                  window='hamming')
+        coefficients.flags.writeable = False
+        _filter_cache[key] = coefficients
+
+    return _filter_cache[key]
+
+
+class DecimationStage(object):
+    """
+    Streaming polyphase FIR decimation by an integer factor.
+
+    Works on arrays of shape (n_channels, n_samples), all channels in one
+    pass. The filter state (the last input samples) is carried between
+    calls of process(), so that chunked input gives exactly the same output
+    as the whole record. The filter delay is compensated: output sample m
+    belongs to input sample m*factor.
+
+    """
+
+    def __init__(self, factor, n_channels=1, ntaps_per_factor=20, cutoff=0.8):
+
+        self.factor = int(factor)
+        self.coefficients = get_decimation_filter(factor, ntaps_per_factor,
+                                                  cutoff)
+        ntaps = len(self.coefficients)
+        self.delay = (ntaps - 1) / 2
+        #history kept in front of the next output sample, a multiple of the
+        #factor, so that the outputs fall onto the polyphase output grid
+        self.nhistory = int(np.ceil((ntaps - 1.) / self.factor)) * self.factor
+        #zeros before the first input sample
+        self.buffer = np.zeros((n_channels, self.nhistory - self.delay))
+
+    def process(self, data):
+        """
+        Decimate the next chunk of data (n_channels, n_samples).
+
+        Returns the output samples which are complete with this chunk.
+
+        """
+
+        data = np.atleast_2d(data)
+        if data.shape[0] != self.buffer.shape[0]:
+            raise MTex.MTpyError_ts_data('expected {0} channels, got '\
+                      '{1}'.format(self.buffer.shape[0], data.shape[0]))
+
+        buf = np.concatenate((self.buffer, data), axis=1)
+        n_out = (buf.shape[1] - 1 - self.nhistory) / self.factor + 1
+        if buf.shape[1] <= self.nhistory or n_out <= 0:
+            self.buffer = buf
+            return np.zeros((buf.shape[0], 0))
+
+        i0 = self.nhistory / self.factor
+        out = sps.upfirdn(self.coefficients,
+                          buf[:, :self.nhistory + (n_out - 1) * self.factor + 1],
+                          1, self.factor, axis=1)[:, i0:i0 + n_out]
+
+        self.buffer = buf[:, n_out * self.factor:]
+
+        return out
+
+    def flush(self):
+        """
+        Return the output samples up to the end of the input so far, using
+        zeros as future input.
+        """
+
+        return self.process(np.zeros((self.buffer.shape[0], self.delay)))
+
+
+class Decimator(object):
+    """
+    Multi-stage decimation of multi channel data.
+
+    The ratio is split into stages of at most max_factor
+    (see decimation_stages), each applied as polyphase FIR filter
+    (see DecimationStage) to all channels at once. Filters are computed once
+    per factor and cached.
+
+    **Arguments:**
+        - ratio : integer total decimation ratio
+        - n_channels : number of channels (rows of the data)
+        - max_factor : largest decimation per stage
+        - ntaps_per_factor : filter length per unit of stage factor
+        - cutoff : filter corner relative to the Nyquist frequency of
+                   the stage output
+
+    Use process() on consecutive chunks for streaming, and flush() after
+    the last chunk. decimate() does both for a complete record.
+
+    """
+
+    def __init__(self, ratio, n_channels=1, max_factor=8, ntaps_per_factor=20,
+                 cutoff=0.8):
+
+        self.ratio = int(ratio)
+        self.n_channels = n_channels
+        self.stages = [DecimationStage(factor, n_channels, ntaps_per_factor,
+                                       cutoff)
+                       for factor in decimation_stages(ratio, max_factor)]
+
+    def process(self, data):
+        data = np.atleast_2d(np.asarray(data, dtype=np.float64))
+        for stage in self.stages:
+            data = stage.process(data)
+
+        return data
+
+    def flush(self):
+        """
+        Push the remaining samples through all stages.
+        """
+
+        data = None
+        for stage in self.stages:
+            if data is not None:
+                data = np.concatenate((stage.process(data), stage.flush()),
+                                      axis=1)
+            else:
+                data = stage.flush()
+
+        if data is None:
+            data = np.zeros((self.n_channels, 0))
+
+        return data
+
+
+def decimate(data, ratio, max_factor=8, ntaps_per_factor=20, cutoff=0.8):
+    """
+    Decimate data by an integer ratio.
+
+    **Input:**
+        - data : array (n_samples) or (n_channels, n_samples)
+        - ratio : integer decimation ratio
+        - further arguments see Decimator
+
+    **Output:**
+        - decimated data, same number of dimensions as the input and
+          ceil(n_samples/ratio) samples
+
+    """
+
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim not in [1, 2]:
+        raise MTex.MTpyError_ts_data('data must be 1 or 2 dimensional')
+
+    n_samples = data.shape[-1]
+    decimator = Decimator(ratio, np.atleast_2d(data).shape[0], max_factor,
+                          ntaps_per_factor, cutoff)
+    out = np.concatenate((decimator.process(data), decimator.flush()),
+                         axis=1)
+    #the zeros fed by flush may complete more samples than there was input
+    out = out[:, :int(np.ceil(n_samples / float(ratio)))]
+
+    if data.ndim == 1:
+        return out[0]
+
+    return out
@@ -32,6 +32,9 @@ import  mtpy.utils.exceptions as MTex
 
 #=================================================================
 
+_notch_cache = {}
+_max_cache_entries = 64
+
 
 def butter_bandpass(lowcut, highcut, samplingrate, order=4):
     nyq = 0.5 * samplingrate
@@ -150,10 +153,18 @@ def adaptive_notch_filter(bx, df=100, notches=[50,100], notchradius=.5,
     will apply a notch filter to the array bx by finding the nearest peak 
     around the supplied notch locations.  The filter is a zero-phase 
     Chebyshev type 1 bandstop filter with minimal ripples.
+
+    All notches are designed into one cascade of second order sections
+    (cached, see get_notch_sos) and applied in a single forward-backward
+    pass, except for the ends of the record (see notch_filtfilt).  For 
+    several channels (2D input) the peaks are searched in the 
+    summed power of all channels and the same notches are applied to all
+    channels at once.
     
     Arguments:
     -----------
-        **bx** : np.ndarray(len_time_series)
+        **bx** : np.ndarray(len_time_series) or 
+                 np.ndarray(n_channels, len_time_series)
                  time series to filter
                  
         **df** : float
@@ -225,51 +236,260 @@ def adaptive_notch_filter(bx, df=100, notches=[50,100], notchradius=.5,
          
     """
     
-    bx = np.array(bx)
+    bx = np.array(bx, dtype=np.float64)
     
     if type(notches) != list:
         notches = [notches]
     
     df = float(df)         #make sure df is a float
-    dt = 1./df             #sampling rate
 
-
-    # transform data into frequency domain to find notches
-    BX = np.fft.fft(zero_pad(bx))
-    n = len(BX)            #length of array
+    # transform data into frequency domain to find notches, padded to the
+    # next power of 2
+    n = 2**int(np.ceil(np.log2(bx.shape[-1])))
+    BX = np.fft.rfft(bx, n=n, axis=-1)
+    power = abs(BX)**2
+    if power.ndim == 2:
+        power = power.sum(axis=0)
+    nf = len(power)
     dfn = df/n             #frequency step
-    dfnn = freqrad/dfn          #radius of frequency search
-    fn = notchradius               #filter radius
-    freq = np.fft.fftfreq(n,dt)
+    #radius of frequency search, at least one bin for short records
+    dfnn = max(1, int(round(freqrad/dfn)))
+    freq = np.fft.rfftfreq(n, 1./df)
     
     filtlst = []
+    notch_freqs = []
     for notch in notches:
         if notch > freq.max():
             pass
             #print 'Frequency too high, skipping {0}'.format(notch)
         else:
             fspot = int(round(notch/dfn))
-            nspot = np.where(abs(BX)== max(abs(BX[max([fspot-dfnn, 0]):\
-                                                 min([fspot+dfnn, n])])))[0][0]   
+            nspot = max([fspot-dfnn, 0]) + \
+                    np.argmax(power[max([fspot-dfnn, 0]):min([fspot+dfnn, nf])])
 
-            med_bx =np.median(abs(BX[max([nspot-dfnn*10, 0]):\
-                                     min([nspot+dfnn*10, n])])**2)
+            med_bx = np.median(power[max([nspot-dfnn*10, 0]):\
+                                     min([nspot+dfnn*10, nf])])
             
             #calculate difference between peak and surrounding spectra in dB
-            dbstop = 10*np.log10(abs(BX[nspot])**2/med_bx) 
+            dbstop = 10*np.log10(power[nspot]/med_bx) 
             if np.nan_to_num(dbstop) == 0.0 or dbstop < dbstop_limit:
                 filtlst.append('No need to filter \n')
                 pass
             else:
                 filtlst.append([freq[nspot], dbstop])
-                ws = 2*np.array([freq[nspot]-fn, freq[nspot]+fn])/df
-                wp = 2*np.array([freq[nspot]-2*fn, freq[nspot]+2*fn])/df
-                ford, wn = SS.cheb1ord(wp, ws, 1, dbstop)
-                b, a = SS.cheby1(1, .5, wn, btype='bandstop')
-                bx = SS.filtfilt(b, a, bx)
+                notch_freqs.append(freq[nspot])
+
+    if notch_freqs:
+        sos = get_notch_sos(df, notch_freqs, notchradius=notchradius, rp=rp)
+        bx = notch_filtfilt(sos, bx)
     
     return bx, filtlst
 
+
+def notch_filtfilt(sos, bx):
+    """
+    Zero-phase filtering of bx (along the last axis) with the cascade of 
+    notch filters sos, e.g. from get_notch_sos.
+
+    The interior of the record is filtered by the whole cascade in a single
+    forward-backward pass.  At both ends of the record, over the settling 
+    length of the cascade, the transients of the cascade are larger than
+    the ones of filtering notch by notch (each notch padded separately),
+    so the samples there are taken from filtering the end segments notch
+    by notch.  Records shorter than a few settling lengths are filtered 
+    notch by notch.
+
+    Arguments:
+    -----------
+        **sos** : np.ndarray(n_notches, 6)
+
+        **bx** : np.ndarray(len_time_series) or 
+                 np.ndarray(n_channels, len_time_series)
+
+    Outputs:
+    ---------
+        **bx** : np.ndarray, filtered array of the shape of the input
+    """
+
+    n = bx.shape[-1]
+    n_edge = sos_settling_length(sos)
+    #the end segments have to be long enough to settle each notch
+    n_segment = n_edge + sum([sos_settling_length(sos[ii:ii+1]) 
+                              for ii in range(len(sos))])
+    if len(sos) == 1 or 2*n_segment >= n:
+        for ii in range(len(sos)):
+            bx = SS.sosfiltfilt(sos[ii:ii+1], bx, axis=-1)
+        return bx
+
+    head = bx[..., :n_segment]
+    tail = bx[..., n-n_segment:]
+    for ii in range(len(sos)):
+        head = SS.sosfiltfilt(sos[ii:ii+1], head, axis=-1)
+        tail = SS.sosfiltfilt(sos[ii:ii+1], tail, axis=-1)
+
+    bx = SS.sosfiltfilt(sos, bx, axis=-1)
+    bx[..., :n_edge] = head[..., :n_edge]
+    bx[..., n-n_edge:] = tail[..., n_segment-n_edge:]
+    
+    return bx
+
+
+def get_notch_sos(df, notch_freqs, notchradius=.5, rp=.5):
+    """
+    Return the (cached) cascade of notch filters as second order sections.
+
+    Each notch is a first order Chebyshev type 1 bandstop between the pass
+    band edges notch_freq -/+ 2*notchradius and the stop band edges 
+    notch_freq -/+ notchradius, with the natural frequencies of 
+    scipy.signal.cheb1ord (as used by adaptive_notch_filter).  Designs are
+    cached per (df, notch set, notchradius, rp), the returned array is 
+    read-only.
+
+    Arguments:
+    -----------
+        **df** : float
+                 sampling frequency in Hz
+
+        **notch_freqs** : list of notch frequencies in Hz, e.g. the power 
+                          line frequency and its harmonics
+
+        **notchradius** : float
+                          radius of the notch in frequency domain (Hz)
+
+        **rp** : float
+                 maximum ripple in the pass band (dB)
+
+    Outputs:
+    ---------
+        **sos** : np.ndarray(n_notches, 6)
+                  apply with scipy.signal.sosfiltfilt or StreamingNotchFilter
+    """
+
+    key = (float(df), tuple(np.round(notch_freqs, 9)), float(notchradius), 
+           float(rp))
+    if key in _notch_cache:
+        return _notch_cache[key]
+
+    lo_sections = []
+    for notch_freq in notch_freqs:
+        ws = 2*np.array([notch_freq-notchradius, 
+                         notch_freq+notchradius])/float(df)
+        wp = 2*np.array([notch_freq-2*notchradius, 
+                         notch_freq+2*notchradius])/float(df)
+        if wp[0] <= 0 or wp[1] >= 1:
+            raise MTex.MTpyError_inputarguments('notch at {0} Hz too close '\
+                                    'to 0 or the Nyquist frequency'.format(
+                                                                notch_freq))
+        #the natural frequencies do not depend on the stop band attenuation
+        ford, wn = SS.cheb1ord(wp, ws, 1, 40.)
+        lo_sections.append(SS.cheby1(1, rp, wn, btype='bandstop', 
+                                     output='sos'))
+
+    sos = np.vstack(lo_sections)
+    sos.flags.writeable = False
+
+    if len(_notch_cache) >= _max_cache_entries:
+        _notch_cache.clear()
+    _notch_cache[key] = sos
+
+    return sos
+
+
+def sos_settling_length(sos, tol=1e-6):
+    """
+    Number of samples after which the impulse response of the filter sos 
+    has decayed below tol (relative to its maximum).
+    """
+
+    n = 1024
+    while True:
+        impulse = np.zeros(n)
+        impulse[0] = 1.
+        response = abs(SS.sosfilt(sos, impulse))
+        above = np.nonzero(response > tol*response.max())[0]
+        if above[-1] < n/2 or n >= 2**26:
+            return int(above[-1]) + 1
+        n *= 4
+
+
+class StreamingNotchFilter(object):
+    """
+    Zero-phase filtering of long multi channel records in chunks.
+
+    Each chunk is filtered forward-backward (scipy.signal.sosfiltfilt)
+    together with overlap samples of context on both sides, of which only
+    the centre part is returned (overlap-save).  With the overlap longer
+    than the settling length of the filter the result equals filtering the
+    whole record to within the settling tolerance.  The output lags behind
+    the input by overlap samples, call flush() after the last chunk.
+
+    Arguments:
+    -----------
+        **sos** : np.ndarray(n_sections, 6), e.g. from get_notch_sos
+
+        **overlap** : int
+                      samples of context on each side, default is the
+                      settling length of the filter (see sos_settling_length)
+
+    ..Example: ::
+
+        >>> sos = get_notch_sos(4096., np.arange(1, 21)*60.)
+        >>> notch = StreamingNotchFilter(sos)
+        >>> for date_time, ts in zen.iter_time_series(n_blocks=3600):
+        >>>     out.write(notch.process(ts))
+        >>> out.write(notch.flush())
+    """
+
+    def __init__(self, sos, overlap=None):
+
+        self.sos = sos
+        if overlap is None:
+            overlap = sos_settling_length(sos)
+        self.overlap = int(overlap)
+        self.buffer = None
+        #number of samples at the start of the buffer already returned
+        self.n_done = 0
+
+    def process(self, data):
+        """
+        Filter the next chunk (n_samples) or (n_channels, n_samples), return 
+        the filtered samples which have enough context.
+        """
+
+        data = np.asarray(data, dtype=np.float64)
+        if self.buffer is None:
+            self.buffer = np.zeros(data.shape[:-1]+(0,))
+        buf = np.concatenate((self.buffer, data), axis=-1)
+
+        n_end = buf.shape[-1] - self.overlap
+        if n_end <= self.n_done:
+            self.buffer = buf
+            return np.zeros(buf.shape[:-1]+(0,))
+
+        out = SS.sosfiltfilt(self.sos, buf, axis=-1)[..., self.n_done:n_end]
+
+        start = max(0, n_end - self.overlap)
+        self.buffer = buf[..., start:]
+        self.n_done = n_end - start
+
+        return out
+
+    def flush(self):
+        """
+        Return the filtered remaining samples.
+        """
+
+        if self.buffer is None:
+            return np.zeros((0,))
+        if self.buffer.shape[-1] <= self.n_done:
+            return np.zeros(self.buffer.shape[:-1]+(0,))
+        
+        out = SS.sosfiltfilt(self.sos, self.buffer, axis=-1)[..., self.n_done:]
+        self.buffer = None
+        self.n_done = 0
+
+        return out
+
 def remove_periodic_noise(filename, dt, noiseperiods, save='n'):
     """
     removePeriodicNoise will take a window of length noise period and 
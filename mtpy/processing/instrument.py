@@ -6,6 +6,9 @@ Functions for the removal of instrument response from time series data.
 
 Either working on ASCII data or on miniSeed
 
+For long records use correct_for_instrument_response_chunked, which applies
+the inverse response as FIR filter by overlap-add.
+
 
 
 @UofA, 2013
@@ -22,117 +25,238 @@ import sys, os
 import os.path as op
 
 import copy
+import hashlib
 
 import mtpy.processing.filter as MTfi
 import mtpy.utils.exceptions as MTex
 
 #=================================================================
 
+_response_cache = {}
+_max_cache_entries = 32
+
+
 def correct_for_instrument_response(data, samplingrate, responsedata):
     """Correct input time series for instrument response.
         Instr.Resp. is given as 3 column array: frequency, real part, imaginary part
 
-        The given section is demeaned, window tapered, zero padded, (potentially bandpassed with the extreme frequencies of the response frequency axis), FFT-ed, "deconvolved" (straight division by the array values or interpolated values inbetween - in frequency domain), re-transformed, mean-re-added and returned.
+        The given section is demeaned, window tapered, zero padded (to the next length with only factors 2,3,5), FFT-ed, "deconvolved" (straight division by the linearly interpolated response values - in frequency domain), re-transformed, mean-re-added and returned.
+
+        Frequencies outside the range of the response are set to zero. The interpolated response is cached for each (length, samplingrate, response) combination, so repeated calls on sections of equal length only cost the two FFTs.
+
+        For long records use correct_for_instrument_response_chunked.
 
     """
 
-    datamean = np.mean(data)
-    data -= datamean
-    
-    freqmin = responsedata[0,0]
-    freqmax = responsedata[-1,0]
-    #print freqmin,freqmax
-    
+    data = np.asarray(data, dtype=np.float64)
     N = len(data)
     if N < 1:
         raise MTex.MTpyError_ts_data('Error - Length of TS to correct is zero!')
 
+    datamean = np.mean(data)
+
     #use double sided cosine taper function
-    window = MTfi.tukey(N, 0.2)
-
-    tapered_data = data * window
-
-
-    #check, if length is directly equal to power of 2:
-    if np.log2(N)%1 == 0:
-        next2power = int(np.log2(N))
-    else:
-        next2power = int(np.log2(N)) + 1
-
-    #zero pad data for significantly faster fft - NO, Numpy does not do that automatically
-    padded_data = np.zeros((2**next2power))
-    padded_data[:len(tapered_data)] = tapered_data
-
-
-    #bandpass data for excluding all frequencies that are not covered by the known instrument response
-    bp_data = padded_data #butter_bandpass_filter(padded_data, freqmin, freqmax, samplingrate)
-
-    #get the spectrum of the data 
-    data_spectrum = np.fft.rfft(bp_data)
-    data_freqs = np.fft.fftfreq(len(bp_data),1./samplingrate)
-
-    #and the same for the instrument
-    instr_spectrum = responsedata[:,1] + np.complex(0,1) * responsedata[:,2]
-    instr_freqs = responsedata[:,0]
-
-    lo_mags = []
-    lo_freqs = []
-
-    #return data_freqs,data_spectrum,instr_freqs,instr_spectrum
-
-    #now correct for all frequencies on the data_freqs-axis:
-    corrected_spectrum = np.zeros((len(data_spectrum)),'complex')
-    for i in range(len(data_spectrum)):
-        freq = data_freqs[i]
-        spec = data_spectrum[i]
-
-        #this is effectively a boxcar window - maybe to be replaced by proper windowing function ?
-        if not (freqmin <= np.abs(freq) <= freqmax):
-            print 'no instrument response in this frequency range - spectrum set to zero here: ', freq
-            corrected_spectrum[i] = 0#spec
-            #lo_mags.append([np.abs(spec),np.abs(corrected_spectrum[i]), 0 ])
-            #lo_freqs.append([freq,0,0,0,0,0,0])
-            continue
-
-        #find the appropriate frequencies ( since the current freq-value is most likely inbetween two values on the instr_freqs-axis)
-        #get the respective value by linear interpolation
-
-        #find the value closest to the current freq, assume it's lower
-        closest_lower = np.abs(freq-instr_freqs).argmin()
-        
-        #if it coincides with the highest frequency/last entry:
-        if closest_lower == len(instr_freqs)-1:
-            factor = data_spectrum[closest_lower]
-        # or the lowest
-        elif closest_lower == 0:
-            factor = data_spectrum[0]
-        else:
-            #in case the closest frequency value is not lower but higher, take the freq value below as lower bound for the interval:        
-            if instr_freqs[closest_lower] > freq:
-                closest_lower -= 1
-            
-            #define the interval:
-            instrfreq1 = instr_freqs[closest_lower]
-            instrfreq2 = instr_freqs[closest_lower+1]
-            instrfactor1 = instr_spectrum[closest_lower]
-            instrfactor2 = instr_spectrum[closest_lower+1]
-            intervallength = instrfreq2 - instrfreq1
-            weight = (freq-instrfreq1)/intervallength
-
-            factor = weight * instrfactor2 + (1-weight) * instrfactor1
-            #lo_freqs.append([freq,instrfreq1,instrfreq2,weight,instrfactor1,instrfactor2,factor])
-
-        
-        #finally correct the data for the instrument influence by dividing the complex data spectral value by the instrument response value: 
-        corrected_spectrum[i] = spec / factor
-        #lo_mags.append([np.abs(spec),np.abs(corrected_spectrum[i]), factor ])
-    #invert into time domain
-    correctedTS = np.fft.irfft(corrected_spectrum)
-
-    #cut the zero padding
-    correctedTS = correctedTS[:N]
+    tapered_data = (data - datamean) * MTfi.tukey(N, 0.2)
+
+    #zero pad data for significantly faster fft
+    n_fft = next_fft_length(N)
+
+    inverse_response = get_inverse_response(n_fft, samplingrate, responsedata)
+
+    corrected_spectrum = np.fft.rfft(tapered_data, n_fft) * inverse_response
+
+    #invert into time domain and cut the zero padding
+    correctedTS = np.fft.irfft(corrected_spectrum, n_fft)[:N]
 
     #re-attach the mean
     correctedTS += datamean
 
-    return correctedTS#, lo_mags,lo_freqs
\ No newline at end of file
+    return correctedTS
+
+
+def correct_for_instrument_response_chunked(data, samplingrate, responsedata,
+                                            chunk_length=2**18,
+                                            filter_length=2**14):
+    """Correct a long time series for instrument response by overlap-add.
+
+        The inverse response is turned into a linear phase FIR filter of
+        filter_length taps (frequency sampling, tukey windowed), which is 
+        applied to consecutive chunks of chunk_length samples. The filter 
+        delay is removed, so the output is aligned with the input.
+
+        The data are demeaned, but not tapered - the first and last 
+        filter_length/2 samples are affected by the edges of the record.
+        data can be a memory mapped array, only one chunk is held in memory
+        at any time besides the output.
+
+        filter_length sets the frequency resolution of the correction 
+        (samplingrate/filter_length), it has to resolve the lowest frequency
+        of the response.
+
+    """
+
+    data = np.asarray(data)
+    N = len(data)
+    if N < 1:
+        raise MTex.MTpyError_ts_data('Error - Length of TS to correct is zero!')
+
+    filter_length = int(filter_length)
+    chunk_length = int(chunk_length)
+    if filter_length < 2 or chunk_length < 1:
+        raise MTex.MTpyError_inputarguments('Error - chunk and filter length must be positive!')
+
+    datamean = np.mean(data, dtype=np.float64)
+
+    n_fft = next_fft_length(chunk_length + filter_length - 1)
+    filter_spectrum = get_inverse_response_filter(n_fft, samplingrate,
+                                                  responsedata, filter_length)
+
+    delay = filter_length / 2
+    n_tail = filter_length - 1
+    correctedTS = np.zeros(N + n_tail)
+
+    for start in range(0, N, chunk_length):
+        chunk = np.asarray(data[start:start + chunk_length], dtype=np.float64)
+        chunk = chunk - datamean
+        n_out = len(chunk) + n_tail
+        correctedTS[start:start + n_out] += np.fft.irfft(
+                            np.fft.rfft(chunk, n_fft) * filter_spectrum,
+                            n_fft)[:n_out]
+
+    correctedTS = correctedTS[delay:delay + N]
+    correctedTS += datamean
+
+    return correctedTS
+
+
+def next_fft_length(N):
+    """Return the smallest length >= N without prime factors other than 2,3,5.
+    """
+
+    N = int(N)
+    if N <= 6:
+        return max(N, 1)
+
+    best = 2**int(np.ceil(np.log2(N)))
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            #smallest power of 2 that brings p35 up to N
+            quotient = -(-N // p35)
+            p2 = 2**int(np.ceil(np.log2(quotient)))
+            if p2 * p35 < best:
+                best = p2 * p35
+            p35 *= 3
+        p5 *= 5
+
+    return best
+
+
+def get_inverse_response(n_fft, samplingrate, responsedata):
+    """Return the inverse instrument response on the rfft frequency axis.
+
+        **Input:**
+            - n_fft : length of the (padded) time series
+            - samplingrate : sampling rate in Hz
+            - responsedata : 3 column array - frequency, real part, imaginary part
+
+        **Output:**
+            - complex array of length n_fft/2+1, linearly interpolated between
+              the given frequencies, zero outside of the response band and 
+              where the response vanishes
+
+        The result is cached - do not modify it in place.
+
+    """
+
+    key = ('inverse', int(n_fft), float(samplingrate),
+           _response_key(responsedata))
+    try:
+        return _response_cache[key]
+    except KeyError:
+        pass
+
+    instr_freqs, instr_spectrum = _check_response(responsedata)
+    freqmin = instr_freqs[0]
+    freqmax = instr_freqs[-1]
+
+    data_freqs = np.arange(int(n_fft)/2 + 1) * (float(samplingrate)/n_fft)
+
+    factor = np.interp(data_freqs, instr_freqs, instr_spectrum.real) + \
+             1j * np.interp(data_freqs, instr_freqs, instr_spectrum.imag)
+
+    #this is effectively a boxcar window - maybe to be replaced by proper windowing function ?
+    inband = (data_freqs >= freqmin) & (data_freqs <= freqmax) & (factor != 0)
+
+    inverse_response = np.zeros(len(data_freqs), 'complex')
+    inverse_response[inband] = 1. / factor[inband]
+
+    _cache_response(key, inverse_response)
+
+    return inverse_response
+
+
+def get_inverse_response_filter(n_fft, samplingrate, responsedata,
+                                filter_length):
+    """Return the spectrum (length n_fft/2+1) of a linear phase FIR filter 
+        of filter_length taps, approximating the inverse instrument response.
+
+        The filter is delayed by filter_length/2 samples. 
+        The result is cached - do not modify it in place.
+
+    """
+
+    filter_length = int(filter_length)
+    if filter_length > n_fft:
+        raise MTex.MTpyError_inputarguments('Error - filter longer than FFT length!')
+
+    key = ('filter', int(n_fft), float(samplingrate),
+           _response_key(responsedata), filter_length)
+    try:
+        return _response_cache[key]
+    except KeyError:
+        pass
+
+    inverse_response = get_inverse_response(filter_length, samplingrate,
+                                            responsedata)
+    impulse_response = np.fft.irfft(inverse_response, filter_length)
+    impulse_response = np.roll(impulse_response, filter_length/2)
+    impulse_response *= MTfi.tukey(filter_length, 0.5)
+
+    filter_spectrum = np.fft.rfft(impulse_response, n_fft)
+
+    _cache_response(key, filter_spectrum)
+
+    return filter_spectrum
+
+
+def _check_response(responsedata):
+
+    responsedata = np.asarray(responsedata, dtype=np.float64)
+    if responsedata.ndim != 2 or responsedata.shape[1] != 3 or \
+            len(responsedata) < 1:
+        raise MTex.MTpyError_inputarguments('Instrument response must be 3 columns: freq,real,imag')
+
+    sortidx = np.argsort(responsedata[:, 0], kind='mergesort')
+    instr_freqs = responsedata[sortidx, 0]
+    instr_spectrum = responsedata[sortidx, 1] + 1j * responsedata[sortidx, 2]
+
+    return instr_freqs, instr_spectrum
+
+
+def _response_key(responsedata):
+
+    responsedata = np.ascontiguousarray(responsedata, dtype=np.float64)
+
+    return (responsedata.shape, 
+            hashlib.sha1(responsedata.tostring()).hexdigest())
+
+
+def _cache_response(key, value):
+
+    if len(_response_cache) >= _max_cache_entries:
+        _response_cache.clear()
+
+    value.flags.writeable = False
+    _response_cache[key] = value
@@ -4,7 +4,11 @@ import trace, io, util, config
 
 import numpy as num
 import os, logging, time, weakref, copy, re, sys, operator, math
+import multiprocessing
 import cPickle as pickle
+import sqlite3
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
         
 def sl(s):
@@ -116,20 +120,69 @@ class Sorted(object):
     def __len__(self):
         return len(self._avl)
 
+class TimeIndex(object):
+    '''Static index on the time spans of a set of traces.
+    
+    The traces are kept sorted by tmin in arrays, together with the running 
+    maximum of their tmax.  Overlap queries are two bisections plus a 
+    vectorized check of the candidates in between, i.e. O(log n + k).
+    '''
+
+    def __init__(self, traces):
+        '''Create new index.
+
+        :param traces: traces sorted by tmin
+        '''
+
+        self.traces = list(traces)
+        self.tmins = num.array([ float(tr.tmin) for tr in self.traces ], 
+                               dtype=num.float)
+        self.tmaxs = num.array([ float(tr.tmax) for tr in self.traces ], 
+                               dtype=num.float)
+        self.tmaxs_runmax = num.maximum.accumulate(self.tmaxs) \
+                                if self.traces else self.tmaxs
+
+    def overlapping(self, tmin, tmax):
+        '''Get candidate traces overlapping with a time span.
+
+        Rounding of high precision times to float can only add candidates,
+        so the result must still be checked with the exact trace times.
+        '''
+        
+        ihi = num.searchsorted(self.tmins, float(tmax), side='right')
+        ilo = num.searchsorted(self.tmaxs_runmax, float(tmin), side='left')
+        if ilo >= ihi:
+            return []
+
+        iselect = ilo + num.nonzero(self.tmaxs[ilo:ihi] >= float(tmin))[0]
+        return [ self.traces[i] for i in iselect ]
+
+    def __len__(self):
+        return len(self.traces)
+
 class TracesFileCache(object):
     '''Manages trace metainformation cache.
     
-    For each directory with files containing traces, one cache file is 
-    maintained to hold the trace metainformation of all files which are 
-    contained in the directory.
+    The trace metainformation of all files is held in a single SQLite 
+    database in the cache directory, with one row per file and one row per 
+    trace.  Files are looked up by directory, so only the directories 
+    actually visited are read from the database, and modifications are 
+    written incrementally.
+
+    Files which no longer exist are skipped when a directory is read, they
+    are only removed from the database by :py:meth:`clean`.  Modified files
+    are detected by the loader, which compares the cached mtime with the 
+    one of the file.
     '''
 
     caches = {}
+    dbname = 'traces.sqlite'
+    schema_version = 1
 
     def __init__(self, cachedir):
         '''Create new cache.
         
-        :param cachedir: directory to hold the cache files.
+        :param cachedir: directory to hold the cache database.
           
         '''
         
@@ -137,7 +190,22 @@ class TracesFileCache(object):
         self.dircaches = {}
         self.modified = set()
         util.ensuredir(self.cachedir)
+        self.dbpath = pjoin(self.cachedir, self.dbname)
+        self._conn_pid = None
+        self._init_db()
         
+    def _get_conn(self):
+        # a sqlite connection must not be used across a fork, so every 
+        # process opens its own one (the loader workers never use the cache)
+        if self._conn_pid != os.getpid():
+            self._conn_ = sqlite3.connect(self.dbpath, timeout=60.)
+            self._conn_.text_factory = str
+            self._conn_pid = os.getpid()
+
+        return self._conn_
+
+    _conn = property(_get_conn)
+
     def get(self, abspath):
         '''Try to get an item from the cache.
         
@@ -159,100 +227,182 @@ class TracesFileCache(object):
         :param tfile: object to be stored
         '''
         
-        cachepath = self._dircachepath(abspath)
-        # get lock on cachepath here
-        dircache = self._get_dircache(cachepath)
+        dircache = self._get_dircache_for(abspath)
         dircache[abspath] = tfile
-        self.modified.add(cachepath)
+        self.modified.add(abspath)
 
     def dump_modified(self):
         '''Save any modifications to disk.'''
 
-        for cachepath in self.modified:
-            self._dump_dircache(self.dircaches[cachepath], cachepath)
-            # unlock 
+        if not self.modified:
+            return
+
+        file_rows = []
+        trace_rows = []
+        for abspath in self.modified:
+            tfile = self._get_dircache_for(abspath).get(abspath, None)
+            if tfile is None:
+                continue
+
+            file_rows.append((abspath, os.path.dirname(abspath), tfile.format,
+                              tfile.mtime))
+            for itr, tr in enumerate(tfile.traces):
+                trace_rows.append(self._trace_row(abspath, itr, tr))
+
+        with self._conn:
+            self._conn.executemany('DELETE FROM traces WHERE path = ?', 
+                                   [ (abspath,) for abspath in self.modified ])
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', file_rows)
+            self._conn.executemany(
+                'INSERT INTO traces VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)', 
+                trace_rows)
             
         self.modified = set()
 
     def clean(self):
-        '''Weed out missing files from the disk caches.'''
+        '''Weed out missing files from the disk cache.'''
         
         self.dump_modified()
-        
+       
+        missing = [ (abspath,) for (abspath,) in 
+                    self._conn.execute('SELECT path FROM files') 
+                    if not os.path.isfile(abspath) ]
+
+        with self._conn:
+            self._conn.executemany('DELETE FROM traces WHERE path = ?', 
+                                   missing)
+            self._conn.executemany('DELETE FROM files WHERE path = ?', missing)
+
+        for abspath, in missing:
+            dircache = self.dircaches.get(os.path.dirname(abspath), {})
+            dircache.pop(abspath, None)
+
+        # remove cache files of the former per-directory pickle format
         for fn in os.listdir(self.cachedir):
             try:
-                i = int(fn) # valid filenames are integers
-                cache = self._load_dircache(pjoin(self.cachedir, fn))
-                self._dump_dircache(cache, pjoin(self.cachedir, fn))
-                
+                i = int(fn) # old cache filenames are integers
+                os.remove(pjoin(self.cachedir, fn))
             except ValueError:
                 pass
 
+    def query(self, tmin=None, tmax=None, nslc_id=None):
+        '''Get paths of cached files holding traces in a time span.
+        
+        The selection is done on the database, without loading any of the
+        cached objects.
+
+        :param tmin: start of time span or None
+        :param tmax: end of time span or None
+        :param nslc_id: (network, station, location, channel) tuple to 
+            restrict the selection to, or None
+
+        :returns: sorted list of absolute paths
+        '''
+
+        conditions = []
+        args = []
+        if tmin is not None:
+            conditions.append('tmax >= ?')
+            args.append(float(tmin))
+        if tmax is not None:
+            conditions.append('tmin <= ?')
+            args.append(float(tmax))
+        if nslc_id is not None:
+            conditions.append(
+                'network = ? AND station = ? AND location = ? AND channel = ?')
+            args.extend(nslc_id)
+        
+        sql = 'SELECT DISTINCT path FROM traces'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+
+        return sorted( abspath for (abspath,) in 
+                       self._conn.execute(sql + ' ORDER BY path', args) )
+
+    def _init_db(self):
+        version, = self._conn.execute('PRAGMA user_version').fetchone()
+        if version not in (0, self.schema_version):
+            with self._conn:
+                self._conn.execute('DROP TABLE IF EXISTS files')
+                self._conn.execute('DROP TABLE IF EXISTS traces')
+
+        with self._conn:
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, dirname TEXT, format TEXT, 
+                mtime REAL)''')
+            self._conn.execute('''CREATE TABLE IF NOT EXISTS traces (
+                path TEXT, itrace INTEGER, network TEXT, station TEXT, 
+                location TEXT, channel TEXT, tmin REAL, tmin_frac REAL, 
+                tmax REAL, tmax_frac REAL, deltat REAL, mtime REAL, 
+                meta BLOB)''')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS files_dirname ON files (dirname)')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS traces_path ON traces (path)')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS traces_tmin ON traces (tmin)')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS traces_tmax ON traces (tmax)')
+            self._conn.execute('PRAGMA user_version = %i' % 
+                               self.schema_version)
+
     def _get_dircache_for(self, abspath):
-        return self._get_dircache(self._dircachepath(abspath))
+        return self._get_dircache(os.path.dirname(abspath))
     
-    def _get_dircache(self, cachepath):
-        if cachepath not in self.dircaches:
-            if os.path.isfile(cachepath):
-                self.dircaches[cachepath] = self._load_dircache(cachepath)
-            else:
-                self.dircaches[cachepath] = {}
+    def _get_dircache(self, dirname):
+        if dirname not in self.dircaches:
+            self.dircaches[dirname] = self._load_dircache(dirname)
                 
-        return self.dircaches[cachepath]
+        return self.dircaches[dirname]
        
-    def _dircachepath(self, abspath):
-        cachefn = "%i" % abs(hash(os.path.dirname(abspath)))
-        return  pjoin(self.cachedir, cachefn)
-            
-    def _load_dircache(self, cachefilename):
+    def _load_dircache(self, dirname):
         
-        f = open(cachefilename,'r')
-        cache = pickle.load(f)
-        f.close()
-       
-        # weed out files which no longer exist
-        for fn in cache.keys():
-            if not os.path.isfile(fn):
-                del cache[fn]
-        
-        for v in cache.values():
-            v.trees_from_content(v.traces)
-            for tr in v.traces:
-                tr.file = v
+        cache = {}
+        lo_traces = {}
+        for row in self._conn.execute('''
+                SELECT traces.* FROM files JOIN traces 
+                ON files.path = traces.path 
+                WHERE files.dirname = ? ORDER BY traces.path, traces.itrace''',
+                (dirname,)):
+            lo_traces.setdefault(row[0], []).append(self._row_trace(row))
+
+        for abspath, format, mtime in self._conn.execute(
+                'SELECT path, format, mtime FROM files WHERE dirname = ?', 
+                (dirname,)):
+            # weed out files which no longer exist
+            if not os.path.isfile(abspath):
+                continue
+
+            cache[abspath] = TracesFile(None, abspath, format, mtime=mtime,
+                                        traces=lo_traces.get(abspath, []))
 
-            v.data_use_count = 0
-            v.data_loaded = False
         return cache
+
+    def _trace_row(self, abspath, itr, tr):
+        meta = None
+        if tr.meta:
+            meta = sqlite3.Binary(pickle.dumps(tr.meta, 2))
         
-    def _dump_dircache(self, cache, cachefilename):
-        
-        if not cache:
-            if os.path.exists(cachefilename):
-                os.remove(cachefilename)
-            return
-        
-        # make a copy without the parents and the binsearch trees
-        cache_copy = {}
-        for fn in cache.keys():
-            trf = copy.copy(cache[fn])
-            trf.parent = None
-            trf.by_tmin = None
-            trf.by_tmax = None
-            trf.by_tlen = None
-            trf.by_mtime = None
-            trf.data_use_count = 0
-            trf.data_loaded = False
-            trf.traces = [ tr.copy(data=False) for tr in trf.traces ]
-            for tr in trf.traces:
-                tr.file = trf
-            cache_copy[fn] = trf
-        
-        tmpfn = cachefilename+'.%i.tmp' % os.getpid()
-        f = open(tmpfn, 'w')
+        # keep the residual of high precision times
+        tmin, tmax = float(tr.tmin), float(tr.tmax)
+        return (abspath, itr, tr.network, tr.station, tr.location, tr.channel,
+                tmin, float(tr.tmin - tmin), tmax, float(tr.tmax - tmax), 
+                tr.deltat, tr.mtime, meta)
+
+    def _row_trace(self, row):
+        (abspath, itr, network, station, location, channel, tmin, tmin_frac, 
+            tmax, tmax_frac, deltat, mtime, meta) = row
         
-        pickle.dump(cache_copy, f)
-        f.close()
-        os.rename(tmpfn, cachefilename)
+        if tmin_frac or tmax_frac:
+            tmin = util.hpfloat(tmin) + util.hpfloat(tmin_frac)
+            tmax = util.hpfloat(tmax) + util.hpfloat(tmax_frac)
+
+        if meta is not None:
+            meta = pickle.loads(str(meta))
+
+        return trace.Trace(network, station, location, channel, tmin=tmin, 
+                           tmax=tmax, deltat=deltat, mtime=mtime, meta=meta)
 
 
 def get_cache(cachedir):
@@ -262,7 +412,31 @@ def get_cache(cachedir):
         
     return TracesFileCache.caches[cachedir]
     
-def loader(filenames, fileformat, cache, filename_attributes, show_progress=True, update_progress=None):
+def scan_headers(args):
+    '''Read the trace headers of a file (worker of the parallel loader).
+
+    Only the parent process uses the :py:class:`TracesFileCache`.
+    
+    :param args: tuple (abspath, fileformat, substitutions)
+    :returns: tuple (traces, None) or (None, error message)
+    '''
+    abspath, fileformat, substitutions = args
+    try:
+        traces = list(io.load(abspath, format=fileformat, getdata=False, substitutions=substitutions))
+        for tr in traces:
+            tr.file = None
+        return traces, None
+    
+    except (io.FileLoadError, OSError), xerror:
+        return None, str(xerror)
+
+def loader(filenames, fileformat, cache, filename_attributes, show_progress=True, update_progress=None, n_processes=1):
+    '''Generate TracesFile objects for the given files.
+
+    Headers of files which are not in the cache (or have been modified) are 
+    read, by a pool of *n_processes* processes unless it is 1.  None uses all
+    cpus.
+    '''
 
     class Progress:
         def __init__(self, label, n):
@@ -339,29 +513,57 @@ def loader(filenames, fileformat, cache, filename_attributes, show_progress=True
 
     if to_load:
         progress = Progress('Scanning files', nload)
+        
+        pool = None
+        to_scan = [ (abspath, fileformat, substitutions) for (mustload, mtime, abspath, substitutions, tfile) in to_load if mustload ]
+        if n_processes != 1 and len(to_scan) > 1:
+            if n_processes is None:
+                n_processes = multiprocessing.cpu_count()
+            pool = multiprocessing.Pool(processes=n_processes)
+            # results come in the order of to_scan
+            headers = pool.imap(scan_headers, to_scan, chunksize=max(1, len(to_scan)/(4*n_processes)))
+            
+        t0 = time.time()
+        try:
+            for (mustload, mtime, abspath, substitutions, tfile) in to_load:
+                try:
+                    if mustload:
+                        if pool is not None:
+                            traces, message = headers.next()
+                            if message is not None:
+                                raise io.FileLoadError(message)
+
+                            tfile = TracesFile(None, abspath, fileformat, substitutions=substitutions, mtime=mtime, traces=traces)
+                        else:
+                            tfile = TracesFile(None, abspath, fileformat, substitutions=substitutions, mtime=mtime)
+
+                        if cache and not substitutions:
+                            cache.put(abspath, tfile)
+                        
+                        if not count_all:
+                            iload += 1
 
-        for (mustload, mtime, abspath, substitutions, tfile) in to_load:
-            try:
-                if mustload:
-                    tfile = TracesFile(None, abspath, fileformat, substitutions=substitutions, mtime=mtime)
-                    if cache and not substitutions:
-                        cache.put(abspath, tfile)
-                    
-                    if not count_all:
+                    if count_all:
                         iload += 1
-
-                if count_all:
-                    iload += 1
-                    
-            except (io.FileLoadError, OSError), xerror:
-                failures.append(abspath)
-                logger.warn(xerror)
-            else:
-                yield tfile
-            
-            progress.update(iload+1)
+                        
+                except (io.FileLoadError, OSError), xerror:
+                    failures.append(abspath)
+                    logger.warn(xerror)
+                else:
+                    yield tfile
+                
+                progress.update(iload+1)
+        
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
         
         progress.update(nload)
+        
+        if to_scan:
+            tscan = max(time.time() - t0, 1e-6)
+            logger.info('Scanned headers of %i file%s in %.1f s (%.1f files/s)' % (len(to_scan), util.plural_s(len(to_scan)), tscan, len(to_scan)/tscan))
 
     if failures:
         logger.warn('The following file%s caused problems and will be ignored:\n' % util.plural_s(len(failures)) + '\n'.join(failures))
@@ -402,12 +604,14 @@ class TracesGroup(object):
         self.by_mtime = Sorted([], 'mtime')
         self.tmin, self.tmax = None, None
         self.deltatmin, self.deltatmax = None, None
+        self.time_index = None
     
     def trees_from_content(self, content):
         self.by_tmin = Sorted(content, 'tmin')
         self.by_tmax = Sorted(content, 'tmax')
         self.by_tlen = Sorted(content, tlen)
         self.by_mtime = Sorted(content, 'mtime')
+        self.time_index = None
         self.adjust_minmax()
 
     def add(self, content):
@@ -443,6 +647,7 @@ class TracesGroup(object):
                 self.by_tlen.insert(c)
                 self.by_mtime.insert(c)
 
+        self.time_index = None
         self.adjust_minmax()
 
         self.nupdates += 1
@@ -484,6 +689,7 @@ class TracesGroup(object):
                 self.by_tlen.remove(c)
                 self.by_mtime.remove(c)
 
+        self.time_index = None
         self.adjust_minmax()
 
         self.nupdates += 1
@@ -497,7 +703,11 @@ class TracesGroup(object):
         if not self.by_tmin or not self.is_relevant(tmin, tmax, group_selector):
             return []
         
-        return [ tr for tr in self.by_tmin.with_key_in(tmin-self.tlenmax, tmax) 
+        if self.time_index is None:
+            # rebuilt lazily after modifications
+            self.time_index = TimeIndex(self.by_tmin)
+
+        return [ tr for tr in self.time_index.overlapping(tmin, tmax) 
                     if tr.is_relevant(tmin, tmax, trace_selector) ]
 
     def adjust_minmax(self):
@@ -595,7 +805,7 @@ class MemTracesFile(TracesGroup):
         return s
 
 class TracesFile(TracesGroup):
-    def __init__(self, parent, abspath, format, substitutions=None, mtime=None):
+    def __init__(self, parent, abspath, format, substitutions=None, mtime=None, traces=None):
         TracesGroup.__init__(self, parent)
         self.abspath = abspath
         self.format = format
@@ -603,7 +813,14 @@ class TracesFile(TracesGroup):
         self.data_loaded = False
         self.data_use_count = 0
         self.substitutions = substitutions
-        self.load_headers(mtime=mtime)
+        if traces is None:
+            self.load_headers(mtime=mtime)
+        else:
+            # headers known, e.g. from the cache
+            for tr in traces:
+                self.traces.append(tr)
+                tr.file = self
+            self.add(self.traces)
         self.mtime = mtime
         
     def load_headers(self, mtime=None):
@@ -621,12 +838,20 @@ class TracesFile(TracesGroup):
         self.data_loaded = False
         self.data_use_count = 0
         
-    def load_data(self, force=False):
+    def load_data(self, force=False, traces=None):
+        '''Load the data of the traces.
+
+        :param force: reload, even if the data is already loaded
+        :param traces: traces read from the file already, e.g. by a read-ahead
+            thread, or None to read them now
+        '''
         file_changed = False
         if not self.data_loaded or force:
-            logger.debug('loading data from file: %s' % self.abspath)
+            if traces is None:
+                logger.debug('loading data from file: %s' % self.abspath)
+                traces = io.load(self.abspath, format=self.format, getdata=True, substitutions=self.substitutions)
             
-            for itr, tr in enumerate(io.load(self.abspath, format=self.format, getdata=True, substitutions=self.substitutions)):
+            for itr, tr in enumerate(traces):
                 if itr < len(self.traces):
                     xtr = self.traces[itr]
                     if xtr.mtime != tr.mtime or xtr.tmin != tr.tmin or xtr.tmax != tr.tmax:
@@ -684,6 +909,9 @@ class TracesFile(TracesGroup):
         for trace in self.traces:
             yield trace
     
+    def get_data_nbytes(self):
+        return sum( tr.ydata.nbytes for tr in self.traces if tr.ydata is not None )
+    
     def gather_keys(self, gather, selector=None):
         keys = set()
         for trace in self.by_tmin:
@@ -707,6 +935,10 @@ class TracesFile(TracesGroup):
 
 
     
+def load_traces(abspath, format, substitutions=None):
+    '''Read all traces of a file including data (used for read-ahead).'''
+    return list(io.load(abspath, format=format, getdata=True, substitutions=substitutions))
+
 class FilenameAttributeError(Exception):
     pass
 
@@ -793,6 +1025,9 @@ class Pile(TracesGroup):
         self.open_files = {}
         self.listeners = []
         self.abspaths = set()
+        self.data_budget = 0
+        self.retained_files = OrderedDict()
+        self.retained_nbytes = 0
     
     def add_listener(self, obj):
         self.listeners.append(weakref.ref(obj))
@@ -803,8 +1038,8 @@ class Pile(TracesGroup):
             if obj:
                 obj.pile_changed(what)
     
-    def load_files(self, filenames, filename_attributes=None, fileformat='mseed', cache=None, show_progress=True, update_progress=None):
-        l = loader(filenames, fileformat, cache, filename_attributes, show_progress=show_progress, update_progress=update_progress)
+    def load_files(self, filenames, filename_attributes=None, fileformat='mseed', cache=None, show_progress=True, update_progress=None, n_processes=1):
+        l = loader(filenames, fileformat, cache, filename_attributes, show_progress=show_progress, update_progress=update_progress, n_processes=n_processes)
         self.add_files(l)
         
     def add_files(self, files):
@@ -822,6 +1057,7 @@ class Pile(TracesGroup):
             self.abspaths.add(file.abspath)
     
     def remove_file(self, file):
+        self._release_data(file)
         subpile = file.get_parent()
         subpile.remove_file(file)
         if file.abspath is not None:
@@ -830,6 +1066,7 @@ class Pile(TracesGroup):
     def remove_files(self, files):
         subpile_files = {}
         for file in files:
+            self._release_data(file)
             subpile = file.get_parent()
             if subpile not in subpile_files:
                 subpile_files[subpile] = []
@@ -881,6 +1118,53 @@ class Pile(TracesGroup):
 
         return chopped, used_files
 
+    def set_data_budget(self, nbytes):
+        '''Set number of bytes of trace data to keep loaded.
+
+        Files which are no longer needed by a chopper are not unloaded right
+        away but retained, least recently used first out, until the data of 
+        all retained files exceeds the budget.  A budget of 0 (default) 
+        unloads files as soon as they are not needed any more.
+        '''
+
+        self.data_budget = nbytes
+        self._evict_data()
+
+    def _retain_data(self, file):
+        if self.data_budget <= 0 or not getattr(file, 'data_loaded', False):
+            return
+
+        if file in self.retained_files:
+            # mark as most recently used
+            self.retained_files[file] = self.retained_files.pop(file)
+            return
+
+        nbytes = file.get_data_nbytes()
+        if nbytes > self.data_budget:
+            return
+
+        file.use_data()
+        self.retained_files[file] = nbytes
+        self.retained_nbytes += nbytes
+        self._evict_data()
+
+    def _release_data(self, file):
+        if file in self.retained_files:
+            self.retained_nbytes -= self.retained_files.pop(file)
+            file.drop_data()
+
+    def _evict_data(self):
+        while self.retained_files and self.retained_nbytes > self.data_budget:
+            file, nbytes = self.retained_files.popitem(last=False)
+            self.retained_nbytes -= nbytes
+            file.drop_data()
+
+    def _readahead(self, pool, pending, tmin, tmax, group_selector, trace_selector):
+        for tr in self.relevant(tmin, tmax, group_selector, trace_selector):
+            file = tr.file
+            if isinstance(file, TracesFile) and not file.data_loaded and file not in pending:
+                pending[file] = pool.apply_async(load_traces, (file.abspath, file.format, file.substitutions))
+
     def _process_chopped(self, chopped, degap, maxgap, maxlap, want_incomplete, wmax, wmin, tpad):
         chopped.sort(lambda a,b: cmp(a.full_id, b.full_id))
         if degap:
@@ -910,7 +1194,14 @@ class Pile(TracesGroup):
         return chopped
             
     def chopper(self, tmin=None, tmax=None, tinc=None, tpad=0., group_selector=None, trace_selector=None,
-                      want_incomplete=True, degap=True, maxgap=5, maxlap=None, keep_current_files_open=False, accessor_id=None, snap=(round,round), include_last=False, load_data=True):
+                      want_incomplete=True, degap=True, maxgap=5, maxlap=None, keep_current_files_open=False, accessor_id=None, snap=(round,round), include_last=False, load_data=True,
+                      readahead=0, nthreads=2):
+        '''Iterate over the pile in time windows.
+
+        With *readahead* > 0, the files needed by that many following windows
+        are read and decoded by a pool of *nthreads* threads, while the 
+        current window is processed.  See also :py:meth:`set_data_budget`.
+        '''
         
         if tmin is None:
             tmin = self.tmin+tpad
@@ -928,34 +1219,63 @@ class Pile(TracesGroup):
                 
         open_files = self.open_files[accessor_id]
         
-        iwin = 0
-        while True:
-            chopped = []
-            wmin, wmax = tmin+iwin*tinc, min(tmin+(iwin+1)*tinc, tmax)
-            eps = tinc*1e-6
-            if wmin >= tmax-eps: break
-            chopped, used_files = self.chop(wmin-tpad, wmax+tpad, group_selector, trace_selector, snap, include_last, load_data) 
-            for file in used_files - open_files:
-                # increment datause counter on newly opened files
-                file.use_data()
+        eps = tinc*1e-6
+        def window(iwin):
+            return tmin+iwin*tinc, min(tmin+(iwin+1)*tinc, tmax)
+
+        pool = None
+        pending = {}
+        if readahead > 0 and load_data:
+            pool = ThreadPool(processes=nthreads)
+        
+        try:
+            iwin = 0
+            while True:
+                chopped = []
+                wmin, wmax = window(iwin)
+                if wmin >= tmax-eps: break
                 
-            open_files.update(used_files)
-            
-            processed = self._process_chopped(chopped, degap, maxgap, maxlap, want_incomplete, wmax, wmin, tpad)
-            yield processed
-                        
-            unused_files = open_files - used_files
-            
-            while unused_files:
-                file = unused_files.pop()
-                file.drop_data()
-                open_files.remove(file)
+                if pool is not None:
+                    for jwin in xrange(iwin, iwin+readahead+1):
+                        amin, amax = window(jwin)
+                        if amin >= tmax-eps: break
+                        self._readahead(pool, pending, amin-tpad, amax+tpad, group_selector, trace_selector)
+                    
+                    # install data of this window read in the background
+                    for tr in self.relevant(wmin-tpad, wmax+tpad, group_selector, trace_selector):
+                        if tr.file in pending:
+                            tr.file.load_data(traces=pending.pop(tr.file).get())
+
+                chopped, used_files = self.chop(wmin-tpad, wmax+tpad, group_selector, trace_selector, snap, include_last, load_data) 
+                for file in used_files - open_files:
+                    # increment datause counter on newly opened files
+                    file.use_data()
+                    
+                open_files.update(used_files)
                 
-            iwin += 1
+                processed = self._process_chopped(chopped, degap, maxgap, maxlap, want_incomplete, wmax, wmin, tpad)
+                yield processed
+                            
+                unused_files = open_files - used_files
+                
+                while unused_files:
+                    file = unused_files.pop()
+                    self._retain_data(file)
+                    file.drop_data()
+                    open_files.remove(file)
+                    
+                iwin += 1
+        
+        finally:
+            if pool is not None:
+                # drop read-aheads still pending after an error or early exit
+                pool.terminate()
+                pool.join()
         
         if not keep_current_files_open:
             while open_files:
                 file = open_files.pop()
+                self._retain_data(file)
                 file.drop_data()
         
         
@@ -1076,7 +1396,7 @@ class Pile(TracesGroup):
 
 def make_pile( paths=None, selector=None, regex=None,
         fileformat = 'mseed',
-        cachedirname=config.cache_dir, show_progress=True ):
+        cachedirname=config.cache_dir, show_progress=True, n_processes=1 ):
     
     '''Create pile from given file and directory names.
     
@@ -1091,6 +1411,8 @@ def make_pile( paths=None, selector=None, regex=None,
     :param cachedirname: loader cache is stored under this directory. It is
         created as neccessary.
     :param show_progress: show progress bar and other progress information
+    :param n_processes: number of processes reading the headers of new files,
+        None to use all cpus
     '''
     if isinstance(paths, str):
         paths = [ paths ]
@@ -1102,7 +1424,7 @@ def make_pile( paths=None, selector=None, regex=None,
 
     cache = get_cache(cachedirname)
     p = Pile()
-    p.load_files( sorted(fns), cache=cache, fileformat=fileformat, show_progress=show_progress)
+    p.load_files( sorted(fns), cache=cache, fileformat=fileformat, show_progress=show_progress, n_processes=n_processes)
     return p
 
 
@@ -12,8 +12,12 @@ JP, 2013
 
 #=================================================================
 
+import multiprocessing
+import multiprocessing.sharedctypes
+
 import numpy as np
 import scipy.signal as sps
+import scipy.fftpack as spfft
 import matplotlib.pyplot as plt
 from matplotlib.ticker import MultipleLocator
 
@@ -300,19 +304,159 @@ def wvd_analytic_signal(fx):
     
     return fxa
 
+def stft_frames(fx, nh, tstep):
+    """
+    Returns a strided (read-only) view of all windows of length nh, taken
+    every tstep samples along the last axis of fx.  No data are copied.
+    
+    Arguments:
+    ----------
+        **fx** : np.ndarray(..., n)
+                 time series, multichannel data are stacked along the 
+                 first axes, e.g. np.array([ex, ey, hx, hy, hz])
+                 
+        **nh** : int
+                 window length
+                 
+        **tstep** : int
+                    number of samples between windows
+                    
+    Returns:
+    --------
+        **frames** : np.ndarray(..., len(tlst), nh)
+                     frames[..., ii, :] = fx[..., tlst[ii]:tlst[ii]+nh]
+                     
+        **tlst** : np.ndarray
+                   start index of each window
+    """
+    
+    fx = np.asarray(fx)
+    nx = fx.shape[-1]
+    
+    tlst = np.arange(start=0, stop=nx-nh+1, step=tstep)
+    
+    shape = fx.shape[:-1]+(len(tlst), nh)
+    strides = fx.strides[:-1]+(tstep*fx.strides[-1], fx.strides[-1])
+    frames = np.lib.stride_tricks.as_strided(fx, shape=shape, 
+                                             strides=strides,
+                                             writeable=False)
+    
+    return frames, tlst
+    
+def iter_windowed_frames(fx, window, tstep, nchunk=None):
+    """
+    Generator over chunks of windowed frames of fx, keeps the memory for 
+    long records bounded.
+    
+    Arguments:
+    ----------
+        **fx** : np.ndarray(..., n)
+                 time series (multichannel along the first axes)
+                 
+        **window** : np.ndarray(nh)
+                     window applied to each frame
+                     
+        **tstep** : int
+                    number of samples between windows
+                    
+        **nchunk** : int
+                     number of frames in each chunk
+                     *default* gives about 2**22 elements per chunk
+                         
+    Yields:
+    --------
+        **ii** : int
+                 index of the first frame in the chunk
+                 
+        **fxwin** : np.ndarray(..., nchunk, nh)
+                    windowed frames
+    """
+    
+    frames = stft_frames(fx, len(window), tstep)[0]
+    nt = frames.shape[-2]
+    if nchunk == None:
+        nchunk = 2**22/max(1, frames[..., 0, :].size)
+    nchunk = max(1, int(nchunk))
+    
+    for ii in range(0, nt, nchunk):
+        yield ii, frames[..., ii:ii+nchunk, :]*window
+    
+def _check_window_length(nh, nfbins):
+    """
+    Raises MTpyError_inputarguments, if a window of length nh does not fit 
+    into nfbins frequency bins.
+    """
+    
+    if nh > nfbins:
+        raise MTexceptions.MTpyError_inputarguments('window length nh={0} '\
+                        'is larger than the number of frequency bins '\
+                        'nfbins={1}'.format(nh, nfbins))
+    
+def windowed_fft(fx, window, tstep, nfbins, chunk_size=2**22):
+    """
+    Computes the Fourier transform of all windowed frames in one batched 
+    FFT per chunk, a real FFT is used for real input.  
+    
+    Arguments:
+    ----------
+        **fx** : np.ndarray(..., n)
+                 time series (multichannel along the first axes)
+                 
+        **window** : np.ndarray(nh)
+                     window applied to each frame
+                     
+        **tstep** : int
+                    number of samples between windows
+                    
+        **nfbins** : int (should be equal or larger than nh)
+                     number of frequency bins, frames are zero padded 
+                     
+        **chunk_size** : int
+                         approximate number of elements transformed at once
+                         
+    Returns:
+    --------
+        **FX** : np.ndarray(..., len(tlst), nfbins/2)
+                 Fourier coefficients of the positive frequencies 
+                 (np.fft.fftfreq(nfbins)[:nfbins/2]) for each window
+                 
+        **tlst** : np.ndarray
+                   start index of each window
+    """
+    
+    _check_window_length(len(window), nfbins)
+    
+    fx = np.asarray(fx)
+    tlst = stft_frames(fx, len(window), tstep)[1]
+    
+    nchunk = chunk_size/max(1, nfbins*np.prod(fx.shape[:-1], dtype=int))
+    
+    FX = np.zeros(fx.shape[:-1]+(len(tlst), nfbins/2), dtype='complex128')
+    for ii, fxwin in iter_windowed_frames(fx, window, tstep, nchunk=nchunk):
+        if np.iscomplexobj(fxwin):
+            #the windowed frames are a copy and can be overwritten
+            FXwin = spfft.fft(fxwin, n=nfbins, axis=-1, overwrite_x=True)
+        else:
+            FXwin = np.fft.rfft(fxwin, n=nfbins, axis=-1)
+        FX[..., ii:ii+fxwin.shape[-2], :] = FXwin[..., :nfbins/2]
+    
+    return FX, tlst
+    
 def stft(fx, nh=2**8, tstep=2**7, ng=1, df=1.0, nfbins=2**10):
     """
     calculate the spectrogam of the given function by calculating the fft of
     a window of length nh at each time instance with an interval of tstep. 
     The frequency resolution is nfbins.
     
-    Can compute the cross STFT by inputting fx as [fx1, fx2]
+    All windows are transformed together (see windowed_fft).  Multichannel
+    data can be input as [ex, ey, hx, hy, hz], in which case a spectrogram
+    is returned for each channel.
     
     Arguments:
     -----------
         **fx** : list or np.ndarray
                  the function to have a spectrogram computed for
-                 for cross-correlation input as [fx1, fx2]
+                 or np.ndarray(nchannels, n) for multiple channels
                  
         **nh** : int (should be power of 2)
                  window length for each time step
@@ -335,6 +479,8 @@ def stft(fx, nh=2**8, tstep=2**7, ng=1, df=1.0, nfbins=2**10):
     --------
         **tfarray** : np.ndarray(nfbins/2, len(fx)/tstep)
                       spectrogram in units of amplitude
+                      np.ndarray(nchannels, nfbins/2, len(fx)/tstep) for 
+                      multichannel input
                       
         **tlst** : np.array()
                    array of time instances for each window calculated
@@ -344,20 +490,14 @@ def stft(fx, nh=2**8, tstep=2**7, ng=1, df=1.0, nfbins=2**10):
                    the Fourier coeffients were calculated
        """
     
-    #get length of input time series if there is two columns
+    #put multiple channels along the first axis
     if type(fx) is list:
         fx = np.array(fx)
-    try:
-        fn, fm = fx.shape
-        if fm < fn:
-            fm, fn = fx.shape
-    except ValueError:
-        fn = fx.shape[0]
-        fm = 1
-    if fm > 1:
-        fx = fx.reshape(fn)
-    else:
-        fx = fx.reshape(fn)
+    if fx.ndim == 2:
+        if fx.shape[1] < fx.shape[0]:
+            fx = fx.T
+        if fx.shape[0] == 1:
+            fx = fx.reshape(fx.shape[1])
         
     #make a hanning window to minimize aliazing and Gibbs effect of short time 
     #windows
@@ -374,37 +514,29 @@ def stft(fx, nh=2**8, tstep=2**7, ng=1, df=1.0, nfbins=2**10):
     else:
         pass
     
-    #make time step list
-    tlst = np.arange(start=0, stop=fn-nh+1, step=tstep)
-
     df = float(df)
     
     #get only positive frequencies
     flst = np.fft.fftfreq(nfbins, 1/df)[0:nfbins/2] 
     
-    #initialize the TFD array
-    tfarray = np.zeros((nfbins/2, len(tlst)), dtype='complex128')
-    
     #calculate the analytic signal to fold negative frequencies onto the 
     #positive ones
     fa = sps.hilbert(dctrend(fx))
     
-    #compute the fft at each window instance
-    for place, ii in enumerate(tlst):
-        fxwin = fa[ii:ii+nh]*h
-        
-        #get only positive frequencies
-        FXwin = np.fft.fft(padzeros(fxwin, npad=nfbins))[:nfbins/2]
+    #compute the fft of all windows at once
+    FX, tlst = windowed_fft(fa, h, tstep, nfbins)
 
-        #smooth in frequency plane
-        if ng != 1:
-            FXwin = np.convolve(padzeros(FXwin, npad=len(FXwin)+ng-1), g, 
-                                'valid')
-        else:
-            pass
-        
-        #pull out only positive quadrant, flip array for plotting
-        tfarray[:, place] = FXwin[::-1]
+    #smooth in frequency plane
+    if ng != 1:
+        nf = FX.shape[-1]
+        FXpad = np.zeros(FX.shape[:-1]+(nf+ng-1,), dtype=FX.dtype)
+        FXpad[..., :nf] = FX
+        FX = np.zeros_like(FX)
+        for mm in range(ng):
+            FX += g[mm]*FXpad[..., ng-1-mm:ng-1-mm+nf]
+    
+    #pull out only positive quadrant, flip array for plotting
+    tfarray = np.swapaxes(FX, -1, -2)[..., ::-1, :]
         
     return tfarray, tlst, flst
     
@@ -482,42 +614,13 @@ def reassigned_stft(fx, nh=2**6-1, tstep=2**5, nfbins=2**10, df=1.0, alpha=4,
     #compute derivative of window
     dh = dwindow(h)
     
-    #make a time list of indexes
-    tlst = np.arange(start=0, stop=nx, step=tstep)
-    nt = len(tlst)
-    
     #make a frequency list
-    flst = np.fft.fftfreq(nfbins, 1./df)[nfbins/2:]
     return_flst = np.fft.fftfreq(nfbins, 1./df)[0:nfbins/2]
     
-    #initialize some time-frequency arrays
-    tfr = np.zeros((nfbins, nt), dtype='complex')
-    tf2 = np.zeros((nfbins, nt), dtype='complex')
-    tf3 = np.zeros((nfbins, nt), dtype='complex')
-    
     #compute components for reassignment
-    for ii, tt in enumerate(tlst):
-    	#create a time shift list
-        tau = np.arange(start=-min([np.round(nx/2.), lh, tt-1]),
-                        stop=min([np.round(nx/2.), lh, nx-tt-1])+1)
-    	#compute the frequency spots to be calculated
-        ff = np.remainder(nfbins+tau,nfbins)
-        xlst = tt+tau
-        hlst = lh+tau
-        normh = np.sqrt(np.sum(abs(h[hlst])**2))
-        tfr[ff, ii] = fx[xlst]*h[hlst].conj()/normh
-        tf2[ff, ii] = fx[xlst]*th[hlst].conj()/normh
-        tf3[ff, ii] = fx[xlst]*dh[hlst].conj()/normh
-    
-    #compute Fourier Transform
-    spec = np.fft.fft(tfr, axis=0)
-    spect = np.fft.fft(tf2, axis=0)
-    specd = np.fft.fft(tf3, axis=0)
-    
-    #get only positive frequencies
-    spec = spec[nfbins/2:, :]
-    spect = spect[nfbins/2:, :]
-    specd = specd[nfbins/2:, :]
+    tlst, spec, spect, specd = _reassignment_spectra(fx, [h, th, dh], tstep,
+                                                     nfbins)
+    nt = len(tlst)
     
     #check to make sure no spurious zeros floating around
     spec[np.where(abs(spec)<1.E-6)] = 0.0
@@ -534,27 +637,69 @@ def reassigned_stft(fx, nh=2**6-1, tstep=2**5, nfbins=2**10, df=1.0, alpha=4,
     if threshold == None:
         threshold = 1.E-4*np.mean(fx[tlst])
 
-    for nn in range(nt):
-        for kk in range(nfbins/2):
-            if abs(spec[kk, nn]) > threshold:
-                #get center of gravity index in time direction
-                nhat = int(nn+twspec[kk, nn])
-                nhat = int(min([max([nhat, 1]),nt-1]))
-                #get center of gravity index in frequency direction
-                khat = int(kk-dwspec[kk, nn])
-                khat = int(np.remainder(np.remainder(khat-1, nfbins/2)+nfbins/2,
-                                        nfbins/2))
-                #reassign energy
-                rtfarray[khat, nhat] = rtfarray[khat, nhat]+spec[kk, nn]
-                spect[kk, nn] = khat+1j*nhat
-            else:
-                spect[kk,nn] = np.inf*(1+1j)
-                rtfarray[kk, nn] = rtfarray[kk, nn]+spec[kk, nn]
+    reassign = abs(spec) > threshold
+    kk, nn = np.nonzero(reassign)
+    
+    #get center of gravity index in time direction
+    nhat = (nn+twspec[kk, nn]).astype('int')
+    nhat = np.minimum(np.maximum(nhat, 1), nt-1)
+    #get center of gravity index in frequency direction
+    khat = (kk-dwspec[kk, nn]).astype('int')
+    khat = np.remainder(np.remainder(khat-1, nfbins/2)+nfbins/2, nfbins/2)
+    
+    #reassign energy
+    np.add.at(rtfarray, (khat, nhat), spec[kk, nn])
+    rtfarray[~reassign] += spec[~reassign]
         
     return rtfarray, tlst, return_flst, spec
     
+def _reassignment_spectra(fx, lo_windows, tstep, nfbins):
+    """
+    Computes the spectra of fx for the windows in lo_windows (all of odd 
+    length nh) centered at every tstep-th sample, as needed for the 
+    reassignment methods.  The windows are truncated at the ends of fx and 
+    normalized by the L2 norm of the truncated first window.
     
-def wvd(fx, nh=2**8-1, tstep=2**5, nfbins=2**10, df=1.0):
+    Returns tlst and one np.ndarray(nfbins/2, len(tlst)) for each window.
+    """
+    
+    fx = np.asarray(fx)
+    nx = len(fx)
+    nh = len(lo_windows[0])
+    lh = (nh-1)/2
+    
+    #pad, so that every window centered on fx can be taken as frame
+    fxpad = np.zeros(nx+2*lh, dtype=np.result_type(fx, 'float'))
+    fxpad[lh:lh+nx] = fx
+    frames, tlst = stft_frames(fxpad, nh, tstep)
+    tlst = tlst[tlst < nx]
+    frames = frames[:len(tlst)]
+    
+    #time shifts available for each window
+    tau = np.arange(start=-lh, stop=lh+1, step=1)
+    taumin = -np.minimum(min(np.round(nx/2.), lh), tlst-1)
+    taumax = np.minimum(min(np.round(nx/2.), lh), nx-tlst-1)
+    valid = (tau >= taumin[:, np.newaxis]) & (tau <= taumax[:, np.newaxis])
+    
+    normh = np.sqrt(np.sum(valid*abs(lo_windows[0])**2, axis=1))
+    normh[normh == 0] = 1.
+    frames = frames*valid/normh[:, np.newaxis]
+    
+    #put time shift tau to position tau in the transformed array
+    ff = np.remainder(nfbins+tau, nfbins)
+    
+    lo_spec = []
+    for window in lo_windows:
+        tfr = np.zeros((len(tlst), nfbins), dtype='complex')
+        tfr[:, ff] = frames*np.conj(window)
+        #get only positive frequencies
+        lo_spec.append(np.fft.fft(tfr, axis=1)[:, nfbins/2:].T.copy())
+    
+    return [tlst]+lo_spec
+    
+    
+def wvd(fx, nh=2**8-1, tstep=2**5, nfbins=2**10, df=1.0, ntile=None,
+        outfile=None):
     """
     calculates the Wigner-Ville distribution of f. 
     
@@ -579,6 +724,17 @@ def wvd(fx, nh=2**8-1, tstep=2**5, nfbins=2**10, df=1.0):
         
         **nfbins** : int (should be power of 2 and equal or larger than nh)
                      number of frequency bins
+                     
+        **ntile** : int
+                    number of time instances computed at once, bounds the
+                    memory needed for long records
+                    *default* is None -> 2**20/nfbins
+                    
+        **outfile** : string
+                      file name to write tfarray to as memory mapped array 
+                      (np.memmap, complex128), so the output does not have
+                      to fit into memory
+                      *default* is None -> tfarray is held in memory
     
     Returns:
     --------
@@ -593,6 +749,8 @@ def wvd(fx, nh=2**8-1, tstep=2**5, nfbins=2**10, df=1.0):
                    the Fourier coeffients were calculated
                    
     """
+    _check_window_length(nh, nfbins)
+    
     #check to see if computing auto or cross-spectra
     if type(fx) is list:
         fx = np.array(fx)
@@ -605,16 +763,14 @@ def wvd(fx, nh=2**8-1, tstep=2**5, nfbins=2**10, df=1.0):
         fm = 1
     
     if fm > 1:
-        fn = fn[0]
         print 'computing cross spectra'
         #compute the analytic signal of function f and dctrend
         fa = wvd_analytic_signal(fx[0])
         fb = wvd_analytic_signal(fx[1])
     else:
         #compute the analytic signal of function f and dctrend
-        fa = wvd_analytic_signal(fx)        
         fa = sps.hilbert(dctrend(fx))
-        fb = fa.copy()
+        fb = fa
     
     fn = len(fa)
     #sampling period
@@ -627,33 +783,68 @@ def wvd(fx, nh=2**8-1, tstep=2**5, nfbins=2**10, df=1.0):
     tlst = np.arange(start=0, stop=fn-1, step=tstep, dtype='int')
       
     #create an empty array to put the tf in 
-    tfarray = np.zeros((nfbins, len(tlst)), dtype='complex')
+    tfarray = _tf_output((nfbins, len(tlst)), outfile)
     
     #create a frequency array with just positive frequencies
     flst = np.fft.fftfreq(nfbins, dt)[0:nfbins/2]
     
-    #calculate pseudo WV
-    for point, nn in enumerate(tlst):
-        #calculate the smallest timeshift possible
-        tau_min = min(nn, tau, fn-nn-1)
-        #make a timeshift array
-        tau_lst = np.arange(start=-tau_min, stop=tau_min+1, step=1, 
-                            dtype='int')
-        #calculate rectangular windowed correlation function of analytic signal
-        Rnn = 4*np.conjugate(fa[nn-tau_lst])*fb[nn+tau_lst]  
-        #calculate fft of windowed correlation function
-        #put into tfarray
-        tfarray[:, point] = padzeros(Rnn, npad=nfbins)[::-1]
-        
-    #compute Fourier Transform of array along the time axis
-    tfarray = np.fft.fft(tfarray,axis=0)
-    #normalize
-    tfarray=tfarray/nh
+    #calculate pseudo WV tile by tile
+    if ntile == None:
+        ntile = 2**20/nfbins
+    for tile in _iter_tiles(len(tlst), ntile):
+        #compute Fourier Transform along the time shift axis and normalize
+        tfarray[:, tile] = _wvd_tile(fa, fb, tlst[tile], tau, nfbins)/nh
+    
+    if outfile is not None:
+        tfarray.flush()
     
     return tfarray, tlst, flst
+    
+def _tf_output(shape, outfile=None, dtype='complex128'):
+    """
+    Returns an array of zeros for a time-frequency distribution, memory 
+    mapped to outfile if given.
+    """
+    
+    if outfile is None:
+        return np.zeros(shape, dtype=dtype)
+    
+    return np.memmap(outfile, dtype=dtype, mode='w+', shape=shape)
+    
+def _iter_tiles(nt, ntile):
+    """
+    Generator over slices of length ntile covering range(nt).
+    """
+    
+    ntile = max(1, int(ntile))
+    for ii in range(0, nt, ntile):
+        yield slice(ii, min(ii+ntile, nt))
+    
+def _wvd_tile(fa, fb, nlst, tau, nfbins):
+    """
+    Computes the columns of the pseudo WVD for the time instances nlst,
+    returns np.ndarray(nfbins, len(nlst)).
+    """
+    
+    fn = len(fa)
+    
+    #calculate the smallest timeshift possible
+    tau_min = np.minimum(np.minimum(nlst, tau), fn-nlst-1)
+    tau_lst = np.arange(start=-tau, stop=tau+1, step=1, dtype='int')
+    rows, cols = np.nonzero(abs(tau_lst) <= tau_min[:, np.newaxis])
+    nn = nlst[rows]
+    tt = tau_lst[cols]
+    
+    #calculate rectangular windowed correlation function of analytic signal
+    #and put it reversed into the array to transform
+    tfr = np.zeros((len(nlst), nfbins), dtype='complex')
+    tfr[rows, nfbins-1-(tt+tau_min[rows])] = 4*np.conjugate(fa[nn-tt])*\
+                                             fb[nn+tt]
+    
+    return np.fft.fft(tfr, axis=1).T
 
 def spwvd(fx, tstep=2**5, nfbins=2**10, df=1.0, nh=None, ng=None, sigmat=None,
-          sigmaf=None):
+          sigmaf=None, ntile=None, outfile=None):
     """
     Calculates the smoothed pseudo Wigner-Ville distribution for an array
     fx. Smoothed with Gaussians windows to get best localization.
@@ -690,6 +881,16 @@ def spwvd(fx, tstep=2**5, nfbins=2**10, df=1.0, nh=None, ng=None, sigmat=None,
         **sigmaf** : float
                      std of window g, ie full width half max of gaussian
                      *default* is None and sigmaf is calculate automatically
+                     
+        **ntile** : int
+                    number of time instances computed at once, bounds the
+                    memory needed for long records
+                    *default* is None -> 2**20/max(nfbins, ng)
+                    
+        **outfile** : string
+                      file name to write tfarray to as memory mapped array 
+                      (np.memmap, complex128)
+                      *default* is None -> tfarray is held in memory
     
     Returns:
     --------
@@ -703,6 +904,39 @@ def spwvd(fx, tstep=2**5, nfbins=2**10, df=1.0, nh=None, ng=None, sigmat=None,
                    frequency array containing only positive frequencies where
                    the Fourier coeffients were calculated
     """
+    fa, fb, fn, h, g = _spwvd_setup(fx, nh, ng, sigmat, sigmaf)
+    
+    #sampling period
+    df = float(df)
+    dt = 1/df
+    
+    #create a time array such that the first point is centered on time window
+    tlst = np.arange(start=0, stop=fn+1, step=tstep, dtype='int')
+    
+    #create an empty array to put the tf in 
+    #make sure data type is complex 
+    tfarray = _tf_output((nfbins, len(tlst)), outfile)
+    
+    #create a frequency array with just positive frequencies
+    flst = np.fft.fftfreq(nfbins, dt)[0:nfbins/2]
+    
+    #calculate pseudo WV tile by tile
+    if ntile == None:
+        ntile = 2**20/max(nfbins, len(g))
+    for tile in _iter_tiles(len(tlst), ntile):
+        tfarray[:, tile] = _spwvd_tile(fa, fb, fn, tlst[tile], h, g, nfbins)
+    
+    if outfile is not None:
+        tfarray.flush()
+    
+    return tfarray, tlst, flst
+    
+def _spwvd_setup(fx, nh, ng, sigmat, sigmaf):
+    """
+    Computes the analytic signals and the normalized gaussian windows for
+    the SPWVD, returns fa, fb, fn, h, g.
+    """
+    
     #check to see if calculating the auto or cross spectra
     if type(fx) is list:
         fx = np.array(fx)
@@ -722,15 +956,10 @@ def spwvd(fx, tstep=2**5, nfbins=2**10, df=1.0, nh=None, ng=None, sigmat=None,
 
     else:
         #compute the analytic signal of function f and dctrend
-        fa = wvd_analytic_signal(fx)        
         fa = sps.hilbert(dctrend(fx))
-        fb = fa.copy()
+        fb = fa
         print 'Computed Analytic signal'
     
-    #sampling period
-    df = float(df)
-    dt = 1/df
-    
     #create normalize windows in time (g) and frequency (h)
     #note window length should be odd so that h,g[0]=1,nh>ng
     if nh == None:
@@ -763,64 +992,80 @@ def spwvd(fx, tstep=2**5, nfbins=2**10, df=1.0, nh=None, ng=None, sigmat=None,
     g=sps.gaussian(ng,sigmag)
     g /= sum(g)
     
-    Lh = (nh-1)/2  #midpoint index of window h
-    Lg = (ng-1)/2   #midpoint index of window g
-    
-    #create a time array such that the first point is centered on time window
-    tlst = np.arange(start=0, stop=fn+1, step=tstep, dtype='int')
+    return fa, fb, fn, h, g
     
-    #create an empty array to put the tf in 
-    #make sure data type is complex 
-    tfarray = np.zeros((nfbins, len(tlst)), dtype='complex')
+def _spwvd_tile(fa, fb, fn, tlst, h, g, nfbins):
+    """
+    Computes the columns of the SPWVD for the time instances tlst, returns
+    np.ndarray(nfbins, len(tlst)) rotated for plotting.
+    """
     
-    #create a frequency array with just positive frequencies
-    flst = np.fft.fftfreq(nfbins, dt)[0:nfbins/2]
+    nh = len(h)
+    ng = len(g)
+    Lh = (nh-1)/2  #midpoint index of window h
+    Lg = (ng-1)/2   #midpoint index of window g
     
-    #calculate pseudo WV
-    for point, t in enumerate(tlst):
-        #find the smallest possible time shift
-        tau_max = min(t+Lg-1, fn-t+Lg, round(nfbins/2), Lh)
-        #create time lag list
-        taulst=np.arange(start=-min(Lg,fn-t), stop=min(Lg,t-1)+1, step=1,
-                         dtype='int')
-        #calculate windowed correlation function of analytic function for
-        #zero frequency 
-        tfarray[0, point] = sum(2*(g[Lg+taulst]/sum(g[Lg+taulst]))*
-                                   fa[t-taulst-1]*np.conjugate(fb[t-taulst-1]))
-        #calculate tfd by calculating convolution of window and correlation 
-        #function as sum of correlation function over the lag period times the
-        #window at that point. Calculate symmetrical segments for FFT later
-        for mm in range(tau_max):
-            taulst = np.arange(start=-min(Lg,fn-t-mm-1), stop=min(Lg,t-mm-1)+1,
-                             step=1,dtype='int')
-            #compute positive half
-            gm = 2*(g[Lg+taulst]/sum(g[Lg+taulst]))
-            Rmm = sum(gm*fa[t+mm-taulst-1]*np.conjugate(fb[t-mm-taulst]))
-            tfarray[mm,point] = h[Lh+mm-1]*Rmm
-            #compute negative half 
-            Rmm = sum(gm*fa[t-mm-taulst]*np.conjugate(fb[t+mm-taulst-1]))
-            tfarray[nfbins-mm-1,point] = h[Lh-mm]*Rmm
-        mm = round(nfbins/2)
-        
-        if t <= fn-mm and t >= mm and mm <= Lh:
-            print 'doing weird thing'
-            taulst = np.arange(start=-min(Lg,fn-t-mm), stop=min(Lg,fn-t,mm)+1,
-                               step=1, dtype='int')
-            gm = g[Lg+taulst]/sum(g[Lg+taulst])
-            tfarray[mm-1, point] = .5*\
-                                  (sum(h[Lh+mm]*(gm*fa[t+mm-taulst-1]*
+    tfr = np.zeros((len(tlst), nfbins), dtype='complex')
+    
+    #time lags of the smoothing window
+    ulst = np.arange(start=-Lg, stop=Lg+1, step=1, dtype='int')
+    tcol = tlst[:, np.newaxis]
+    
+    def lag_weights(umin, umax):
+        #normalized window g over the allowed lags umin<=u<=umax
+        gm = g*((ulst >= umin[:, np.newaxis]) & (ulst <= umax[:, np.newaxis]))
+        gsum = gm.sum(axis=1)
+        gsum[gsum == 0] = 1.
+        return 2*gm/gsum[:, np.newaxis]
+    
+    def take(f, idx):
+        #lags outside the allowed range have zero weight, just keep the index
+        #valid
+        return f[np.clip(idx, 0, len(f)-1)]
+    
+    #calculate windowed correlation function of analytic function for
+    #zero frequency 
+    gm = lag_weights(-np.minimum(Lg, fn-tlst), np.minimum(Lg, tlst-1))
+    tfr[:, 0] = np.sum(gm*take(fa, tcol-ulst-1)*
+                       np.conjugate(take(fb, tcol-ulst-1)), axis=1)
+    
+    #find the smallest possible time shift
+    tau_max = np.minimum(np.minimum(tlst+Lg-1, fn-tlst+Lg), 
+                         min(round(nfbins/2), Lh)).astype('int')
+    
+    #calculate tfd by calculating convolution of window and correlation 
+    #function as sum of correlation function over the lag period times the
+    #window at that point. Calculate symmetrical segments for FFT later
+    for mm in range(max(0, tau_max.max())):
+        active = mm < tau_max
+        gm = lag_weights(-np.minimum(Lg, fn-tlst-mm-1), 
+                         np.minimum(Lg, tlst-mm-1))
+        xp = take(fa, tcol+mm-ulst-1)*np.conjugate(take(fb, tcol-mm-ulst))
+        xn = take(fa, tcol-mm-ulst)*np.conjugate(take(fb, tcol+mm-ulst-1))
+        #compute positive half
+        tfr[active, mm] = h[Lh+mm-1]*np.sum(gm*xp, axis=1)[active]
+        #compute negative half 
+        tfr[active, nfbins-mm-1] = h[Lh-mm]*np.sum(gm*xn, axis=1)[active]
+    
+    mm = int(round(nfbins/2))
+    if mm <= Lh:
+        for point, t in enumerate(tlst):
+            if t <= fn-mm and t >= mm:
+                print 'doing weird thing'
+                taulst = np.arange(start=-min(Lg,fn-t-mm), 
+                                   stop=min(Lg,fn-t,mm)+1, step=1, dtype='int')
+                gm = g[Lg+taulst]/sum(g[Lg+taulst])
+                tfr[point, mm-1] = .5*\
+                                   (sum(h[Lh+mm]*(gm*fa[t+mm-taulst-1]*
                                     np.conjugate(fb[t-mm-taulst])))+\
                                    sum(h[Lh-mm]*(gm*fa[t-mm-taulst]*
                                     np.conjugate(fb[t+mm-taulst-1]))))
     
-    tfarray = np.fft.fft(tfarray, axis=0)
     #rotate for plotting purposes so that (t=0,f=0) is at the lower left
-    tfarray = np.rot90(tfarray.T, 1)
-    
-    return tfarray, tlst, flst
+    return np.fft.fft(tfr, axis=1).T[::-1]
     
 def robust_wvd(fx, nh=2**7-1, ng=2**4-1, tstep=2**4, nfbins=2**8, df=1.0,
-              sigmat=None, sigmaf=None):
+              sigmat=None, sigmaf=None, ntile=None, outfile=None):
     """
     Calculate the robust Wigner-Ville distribution for an array 
     fx. Smoothed with Gaussians windows to get best localization. 
@@ -856,6 +1101,15 @@ def robust_wvd(fx, nh=2**7-1, ng=2**4-1, tstep=2**4, nfbins=2**8, df=1.0,
         **sigmaf** : float
                      std of window g, ie full width half max of gaussian
                      *default* is None and sigmaf is calculate automatically
+                     
+        **ntile** : int
+                    number of time instances computed at once
+                    *default* is None -> about 2**22 elements per tile
+                    
+        **outfile** : string
+                      file name to write tfarray to as memory mapped array 
+                      (np.memmap, complex128)
+                      *default* is None -> tfarray is held in memory
     
     Returns:
     --------
@@ -888,9 +1142,8 @@ def robust_wvd(fx, nh=2**7-1, ng=2**4-1, tstep=2**4, nfbins=2**8, df=1.0,
 
     else:
         #compute the analytic signal of function f and dctrend
-        fa = wvd_analytic_signal(fx)        
         fa = sps.hilbert(dctrend(fx))
-        fb = fa.copy()
+        fb = fa
         print 'Computed Analytic signal'    
     
     #make sure window length is odd
@@ -934,27 +1187,45 @@ def robust_wvd(fx, nh=2**7-1, ng=2**4-1, tstep=2**4, nfbins=2**8, df=1.0,
     flstp = np.fft.fftfreq(nfbins, 2*dt)[0:nfbins/2]
     
     #create an empty array to put the tf in 
-    tfarray = np.zeros((nfbins/2, len(tlst)), dtype='complex')
+    tfarray = _tf_output((nfbins/2, len(tlst)), outfile)
 
+    modulation = np.exp(1j*4*np.pi*np.outer(flst, mlst)*dt)
     
-    for tpoint, nn in enumerate(tlst):
+    if ntile == None:
+        ntile = 2**22/(modulation.size+ng*nfbins/2)
+    for tile in _iter_tiles(len(tlst), ntile):
+        nn = tlst[tile][:, np.newaxis]
         #calculate windowed correlation function of analytic function
         fxwin = h*fa[nn+mlst]*fb[nn-mlst].conj()
-        for fpoint, mm in enumerate(flst):
-            fxmed = np.convolve(g, fxwin*np.exp(1j*4*np.pi*mlst*mm*dt),
-                                mode='same')/(nh*ng)
-            fxmedpoint = np.median(fxmed.real)
-            if fxmedpoint == 0.0:
-                tfarray[fpoint, tpoint] = 1E-10
-            else:
-                tfarray[fpoint, tpoint] = fxmedpoint
+        fxmed = _convolve_same(g, fxwin[:, np.newaxis, :]*modulation)/(nh*ng)
+        fxmedpoint = np.median(fxmed.real, axis=-1)
+        fxmedpoint[fxmedpoint == 0.0] = 1E-10
+        tfarray[:, tile] = (4.*nh/dt)*fxmedpoint.T
     
-    tfarray = (4.*nh/dt)*tfarray
+    if outfile is not None:
+        tfarray.flush()
 
     return tfarray, tlst, flstp
+    
+def _convolve_same(g, fx):
+    """
+    np.convolve(g, fx, mode='same') along the last axis of fx.
+    """
+    
+    ng = len(g)
+    nx = fx.shape[-1]
+    
+    fxconv = np.zeros(fx.shape[:-1]+(nx+ng-1,), dtype=np.result_type(g, fx))
+    for ii in range(ng):
+        fxconv[..., ii:ii+nx] += g[ii]*fx
+    
+    nstart = (min(ng, nx)-1)/2
+    
+    return fxconv[..., nstart:nstart+max(ng, nx)]
+
 
 def specwv(fx, tstep=2**5, nfbins=2**10, nhs=2**8, nhwv=2**9-1, ngwv=2**3-1,
-           df=1.0):
+           df=1.0, ntile=None, outfile=None):
     """
     Calculates the Wigner-Ville distribution mulitplied by the STFT windowed
     by the common gaussian window h for an array f.  Handy for removing cross
@@ -988,6 +1259,15 @@ def specwv(fx, tstep=2**5, nfbins=2**10, nhs=2**8, nhwv=2**9-1, ngwv=2**3-1,
         **nfbins** : int (should be power of 2 and equal or larger than nh)
                      number of frequency bins
                      
+        **ntile** : int
+                    number of time instances computed at once
+                    *default* is None -> 2**20/max(nfbins, ngwv)
+                    
+        **outfile** : string
+                      file name to write tfarray to as memory mapped array 
+                      (np.memmap, complex128)
+                      *default* is None -> tfarray is held in memory
+                     
     
     Returns:
     --------
@@ -1002,18 +1282,42 @@ def specwv(fx, tstep=2**5, nfbins=2**10, nhs=2**8, nhwv=2**9-1, ngwv=2**3-1,
                    the Fourier coeffients were calculated
     """
     
-    #calculate stft
-    pst, tlst, flst = stft(fx, nh=nhs, tstep=tstep, nfbins=nfbins, df=df)
+    fx = np.asarray(fx)
     
-    #calculate new time step so WVD and STFT will align
-    ntstep = len(fx)/(len(tlst)*2.)
+    #stft as in function stft, computed tile by tile below
+    h = normalize_L2(np.hanning(nhs))
+    fa = sps.hilbert(dctrend(fx))
+    tlst = stft_frames(fa, nhs, tstep)[1]
+    flst = np.fft.fftfreq(nfbins, 1/float(df))[0:nfbins/2] 
+    
+    #spwvd evaluated at the centers of the stft windows, so WVD and STFT
+    #align
+    fwa, fwb, fn, hwv, gwv = _spwvd_setup(fx, nhwv, ngwv, None, None)
+    twv = tlst+nhs/2
+    
+    tfarray = _tf_output((nfbins/2, len(tlst)), outfile)
+    
+    if ntile == None:
+        ntile = 2**20/max(nfbins, len(gwv))
+    ntile = max(1, int(ntile))
+    pstmax = []
+    pwvmax = []
+    for tile in _iter_tiles(len(tlst), ntile):
+        nstart = tlst[tile][0]
+        pst = windowed_fft(fa[nstart:tlst[tile][-1]+nhs], h, tstep, 
+                           nfbins)[0].T[::-1]
+        #only positive frequencies, in the same order as the stft
+        pwv = _spwvd_tile(fwa, fwb, fn, twv[tile], hwv, gwv, 
+                          nfbins)[nfbins/2:]
+        pstmax.append(pst.max())
+        pwvmax.append(pwv.max())
+        tfarray[:, tile] = pst*pwv
     
-    #calculate spwvd
-    pwv, twv, fwv = spwvd(fx, tstep=ntstep, nfbins=nfbins, df=df,
-                          nh=nhwv, ng=ngwv)
+    #normalize
+    tfarray /= np.max(pstmax)*np.max(pwvmax)
     
-    #multiply the two together normalize
-    tfarray = pst/pst.max()*pwv/pwv.max()
+    if outfile is not None:
+        tfarray.flush()
         
     return tfarray, tlst, flst
     
@@ -1154,14 +1458,6 @@ def robust_stft_median(fx, nh=2**8, tstep=2**5, df=1.0, nfbins=2**10):
                    the Fourier coeffients were calculated
     """
     
-    #get length of input time series 
-    nfx = len(fx)
-     
-    #compute time shift list
-    mlst = np.arange(start=-nh/2+1, stop=nh/2+1, step=1, dtype='int')
-    #compute time locations to take STFT
-    tlst = np.arange(start=0, stop=nfx-nh+1, step=tstep)
-    
     #make a frequency list for plotting exporting only positive frequencies
     flst = np.fft.fftfreq(nfbins, 1/df)
     flstc = flst[nfbins/2:]
@@ -1174,28 +1470,17 @@ def robust_stft_median(fx, nh=2**8, tstep=2**5, df=1.0, nfbins=2**10):
     h = sps.gaussian(nh,sigmanh)
     h = h/sum(h)
     
-    #create an empty array to put the tf in and initialize a complex value
-    tfarray = np.zeros((nfbins/2, len(tlst)), dtype='complex')
-    
     #take the hilbert transform of the signal to make complex and remove
     #negative frequencies
     fa = sps.hilbert(dctrend(fx))
     fa = fa/fa.std()
     
-    #make a frequency list for plotting exporting only positive frequencies
-    flst = np.fft.fftfreq(nfbins, 1/df)[nfbins/2:]#get only positive frequencies
+    def median_estimate(fxmed):
+        return np.median(fxmed.real, axis=-1)+1j*np.median(fxmed.imag, 
+                                                              axis=-1)
+    
+    tfarray, tlst = _robust_stft(fa, h, tstep, flstc/df, median_estimate)
     
-    for tpoint, nn in enumerate(tlst):
-        #calculate windowed correlation function of analytic function
-        fxwin = h*fa[nn:nn+nh]
-        for fpoint, mm in enumerate(flstc):
-            fxmed = fxwin*np.exp(1j*2*np.pi*mlst*mm/df)
-            fxmedreal = np.median(fxmed.real)
-            fxmedimag = np.median(fxmed.imag)
-            if fxmedreal+1j*fxmedimag == 0.0:
-                tfarray[fpoint, tpoint] = 1E-10
-            else:
-                tfarray[fpoint, tpoint] = fxmedreal+1j*fxmedimag
     #normalize tfarray
     tfarray = (4.*nh*df)*tfarray
         
@@ -1245,14 +1530,6 @@ def robust_stft_L(fx, alpha=.325, nh=2**8, tstep=2**5, df=1.0, nfbins=2**10):
 
     """
     
-    #get length of input time series 
-    nfx = len(fx)
-     
-    #compute time shift list
-    mlst = np.arange(start=-nh/2+1, stop=nh/2+1, step=1, dtype='int')
-    #compute time locations to take STFT
-    tlst = np.arange(start=0, stop=nfx-nh+1, step=tstep)
-    
     #make a frequency list for plotting exporting only positive frequencies
     flst = np.fft.fftfreq(nfbins, 1/df)
     flstc = flst[nfbins/2:]
@@ -1265,38 +1542,54 @@ def robust_stft_L(fx, alpha=.325, nh=2**8, tstep=2**5, df=1.0, nfbins=2**10):
     h = sps.gaussian(nh, sigmanh)
     h /= sum(h)
     
-    #create an empty array to put the tf in and initialize a complex value
-    tfarray = np.zeros((nfbins/2, len(tlst)), dtype='complex')
-    
     #take the hilbert transform of the signal to make complex and remove
     #negative frequencies
     fa = sps.hilbert(dctrend(fx))
     fa /= fa.std()
     
-    #make a frequency list for plotting exporting only positive frequencies
-    flst = np.fft.fftfreq(nfbins, 1/df)[nfbins/2:]#get only positive frequencies
-    
     #create list of coefficients
     a = np.zeros(nh)
-    a[(nh-2)*alpha:alpha*(2-nh)+nh-1] = 1./(nh*(1-2*alpha)+4*alpha)
+    a[int((nh-2)*alpha):int(alpha*(2-nh)+nh-1)] = 1./(nh*(1-2*alpha)+4*alpha)
+    
+    def L_estimate(fxelement):
+        fxreal = np.sort(fxelement.real, axis=-1)[..., ::-1]
+        fximag = np.sort(fxelement.imag, axis=-1)[..., ::-1]
+        return np.dot(fxreal, a)+1j*np.dot(fximag, a)
+    
+    tfarray, tlst = _robust_stft(fa, h, tstep, flstc/df, L_estimate)
     
-    for tpoint, nn in enumerate(tlst):
-        #calculate windowed correlation function of analytic function
-        fxwin = h*fa[nn:nn+nh]
-        for fpoint, mm in enumerate(flstc):
-            fxelement = fxwin*np.exp(1j*2*np.pi*mlst*mm/df)
-            fxreal = np.sort(fxelement.real)[::-1]
-            fximag = np.sort(fxelement.imag)[::-1]
-            tfpoint = sum(a*(fxreal+1j*fximag))
-            if tfpoint == 0.0:
-                tfarray[fpoint, tpoint] = 1E-10
-            else:
-                tfarray[fpoint, tpoint] = tfpoint
     #normalize tfarray
     tfarray = (4.*nh*df)*tfarray
         
     return tfarray, tlst, flstp
 
+def _robust_stft(fa, h, tstep, fnorm, estimator):
+    """
+    Applies estimator along the last axis of the modulated windowed frames 
+    h*fa[nn:nn+nh]*exp(2j*pi*mlst*f) for all frequencies f in fnorm 
+    (normalized by the sampling frequency), chunk by chunk of frames.
+    
+    Returns the tfarray np.ndarray(len(fnorm), len(tlst)) and tlst.
+    """
+    
+    nh = len(h)
+    
+    #compute time shift list
+    mlst = np.arange(start=-nh/2+1, stop=nh/2+1, step=1, dtype='int')
+    modulation = np.exp(1j*2*np.pi*np.outer(fnorm, mlst))
+    
+    tlst = stft_frames(fa, nh, tstep)[1]
+    tfarray = np.zeros((len(fnorm), len(tlst)), dtype='complex')
+    
+    #keep about 2**22 elements per chunk
+    nchunk = 2**22/modulation.size
+    for ii, fxwin in iter_windowed_frames(fa, h, tstep, nchunk=nchunk):
+        tfpoint = estimator(fxwin[:, np.newaxis, :]*modulation)
+        tfpoint[tfpoint == 0.0] = 1E-10
+        tfarray[:, ii:ii+len(fxwin)] = tfpoint.T
+    
+    return tfarray, tlst
+
 def smethod(fx, L=11, nh=2**8, tstep=2**7, ng=1, df=1.0, nfbins=2**10,
             sigmaL=None):
     """
@@ -1366,15 +1659,10 @@ def smethod(fx, L=11, nh=2**8, tstep=2**7, ng=1, df=1.0, nfbins=2**10,
         #compute the analytic signal of function f and dctrend
         #fa=sps.hilbert(dctrend(fx[0]))
         #fb=sps.hilbert(dctrend(fx[1]))
-        fa = fx[0]
-        fb = fx[1]
-        fa = fa.reshape(fn)
-        fb = fb.reshape(fn)
-        pxa, tlst, flst = stft(fa, nh=nh, tstep=tstep, ng=ng, df=df, 
-                               nfbins=nfbins)
-        pxb, tlst, flst = stft(fb, nh=nh, tstep=tstep, ng=ng, df=df,
-                               nfbins=nfbins)
-        pxx = pxa*pxb.conj()
+        fab = np.array([fx[0].reshape(fn), fx[1].reshape(fn)])
+        pxab, tlst, flst = stft(fab, nh=nh, tstep=tstep, ng=ng, df=df, 
+                                nfbins=nfbins)
+        pxx = pxab[0]*pxab[1].conj()
     else:
         #compute the analytic signal of function f and dctrend
         #fa=sps.hilbert(dctrend(fx))
@@ -1394,15 +1682,13 @@ def smethod(fx, L=11, nh=2**8, tstep=2**7, ng=1, df=1.0, nfbins=2**10,
     if sigmaL == None:
         sigmaL = L/(1*np.sqrt(2*np.log(2)))
     p = sps.gaussian(L,sigmaL)
-    #make a matrix of windows
-    pm = np.zeros((L,nt))
-    for kk in range(nt):
-        pm[:, kk] = p
-    
-    #loop over frequency and calculate the s-method    
-    for ff in range(L/2,nf-L/2):
-        tfarray[ff, :] = tfarray[ff, :]+2*np.real(np.sum(pm*pxx[ff+Llst, :]*
-                                               pxx[ff-Llst, :].conj(), axis=0))
+    
+    #calculate the s-method for all frequencies at once, looping over the 
+    #L frequency shifts
+    smsum = np.zeros((nf-2*(L/2), nt), dtype=pxx.dtype)
+    for pl, ll in zip(p, Llst):
+        smsum += pl*pxx[L/2+ll:nf-L/2+ll, :]*pxx[L/2-ll:nf-L/2-ll, :].conj()
+    tfarray[L/2:nf-L/2, :] += 2*np.real(smsum)
     #normalize
     tfarray[L/2:-L/2] /= L
     
@@ -1610,42 +1896,13 @@ def reassigned_smethod(fx, nh=2**7-1, tstep=2**4, nfbins=2**9, df=1.0, alpha=4,
     #compute derivative of window
     dh = dwindow(h)
     
-    #make a time list of indexes
-    tlst = np.arange(start=0, stop=nx, step=tstep)
-    nt = len(tlst)
-    
     #make frequency list for plotting
     flst = np.fft.fftfreq(nfbins, 1./df)[:nfbins/2]
     
-    #initialize some time-frequency arrays
-    tfh = np.zeros((nfbins,nt), dtype='complex')
-    tfth = np.zeros((nfbins,nt), dtype='complex')
-    tfdh = np.zeros((nfbins,nt), dtype='complex')
-    
     #compute components for reassignment
-    for ii, tt in enumerate(tlst):
-        #create a time shift list
-        tau = np.arange(start=-min([np.round(nx/2.), lh, tt-1]),
-                        stop=min([np.round(nx/2.), lh, nx-tt-1])+1)
-        #compute the frequency spots to be calculated
-        ff = np.remainder(nfbins+tau, nfbins)
-        #make lists of data points for each window calculation
-        xlst = tt+tau
-        hlst = lh+tau
-        normh = np.sqrt(np.sum(abs(h[hlst])**2))
-        tfh[ff, ii] = fx[xlst]*h[hlst].conj()/normh
-        tfth[ff, ii] = fx[xlst]*th[hlst].conj()/normh
-        tfdh[ff, ii] = fx[xlst]*dh[hlst].conj()/normh
-    
-    #compute Fourier Transform
-    spech = np.fft.fft(tfh, axis=0)
-    specth = np.fft.fft(tfth, axis=0)
-    specdh = np.fft.fft(tfdh, axis=0)
-    
-    #get only positive frequencies
-    spech = spech[nfbins/2:, :]
-    specth = specth[nfbins/2:, :]
-    specdh = specdh[nfbins/2:, :]
+    tlst, spech, specth, specdh = _reassignment_spectra(fx, [h, th, dh], 
+                                                        tstep, nfbins)
+    nt = len(tlst)
     
     #check to make sure no spurious zeros floating around
     szf = np.where(abs(spech) < 1.E-6)
@@ -1711,7 +1968,8 @@ def reassigned_smethod(fx, nh=2**7-1, tstep=2**4, nfbins=2**9, df=1.0, alpha=4,
         
 
 def stfbss(X,nsources=5,ng=2**5-1,nh=2**9-1,tstep=2**6-1,df=1.0,nfbins=2**10,
-          tftol=1.E-8,L=7,normalize=True,tftype='spwvd',alpha=.38):
+          tftol=1.E-8,L=7,normalize=True,tftype='spwvd',alpha=.38,
+          n_processes=1):
     """
     btfssX,nsources=5,ng=2**5-1,nh=2**9-1,tstep=2**6-1,df=1.0,nfbins=2**10,
           tftol=1.E-8,normalize=True) 
@@ -1733,6 +1991,10 @@ def stfbss(X,nsources=5,ng=2**5-1,nh=2**9-1,tstep=2**6-1,df=1.0,nfbins=2**10,
                 terms.
         normalization = True or False, True to normalize, False if already 
                         normalized
+        n_processes = number of processes computing the distributions of the
+                      channel pairs, the whitened signals and the 
+                      distributions are shared with the processes.
+                      None uses all cpus, 1 (default) computes serially
     
     Returns:
         
@@ -1804,80 +2066,60 @@ def stfbss(X,nsources=5,ng=2**5-1,nh=2**9-1,tstep=2**6-1,df=1.0,nfbins=2**10,
     Za=np.array(Z.copy())
     
     if tftype=='spwvd':
-        stfd=np.zeros((n,n,nfbins,ntbins+1),dtype='complex128')
-        #compute auto terms
-        for ii in range(n):
-            pswvd,tswvd,fswvd=spwvd(Za[ii].reshape(maxn),**tfkwargs)
-            stfd[ii,ii,:,:]=pswvd
-        
-        #compute cross terms
-        for jj in range(n):
-            for kk in range(jj,n):
-                pswvd,tswvd,fswvd=spwvd([Za[jj].reshape(maxn),
-                                         Za[kk].reshape(maxn)],
-                                         **tfkwargs)
-                stfd[jj,kk,:,:]=pswvd
-                stfd[kk,jj,:,:]=pswvd.conj()
-    
-    elif tftype=='smethod':
+        stfdshape=(n,n,nfbins,ntbins+1)
+    elif tftype in ['smethod','Lestimate']:
         nfbins=nfbins/2
-        stfd=np.zeros((n,n,nfbins,ntbins),dtype='complex128')
-        #compute auto terms
-        for ii in range(n):
-            psm,tsm,fsm,pst=smethod(Za[ii].reshape(maxn),**tfkwargs)
-            stfd[ii,ii,:,:]=psm
-        
-        #compute cross terms
-        for jj in range(n):
-            for kk in range(jj,n):
-                psm,tsm,fsm,pst=smethod([Za[jj].reshape(maxn),
-                                         Za[kk].reshape(maxn)],
-                                        **tfkwargs)
-                stfd[jj,kk,:,:]=psm
-                stfd[kk,jj,:,:]=psm.conj()
-                
-    elif tftype=='Lestimate':
-        nfbins=nfbins/2
-        stfd=np.zeros((n,n,nfbins,ntbins),dtype='complex128')
-        #compute auto terms
-        for ii in range(n):
-            psm,tsm,fsm,pst=robust_smethod(Za[ii].reshape(maxn),**tfkwargs)
-            stfd[ii,ii,:,:psm.shape[1]]=psm
-        
-        #compute cross terms
-        for jj in range(n):
-            for kk in range(jj,n):
-                psm,tsm,fsm,pst=robust_smethod([Za[jj].reshape(maxn),
-                                               Za[kk].reshape(maxn)],
-                                                **tfkwargs)
-                stfd[jj,kk,:,:psm.shape[1]]=psm
-                stfd[kk,jj,:,:psm.shape[1]]=psm.conj()
+        stfdshape=(n,n,nfbins,ntbins)
+    else:
+        raise NameError('tftype {0} undefined'.format(tftype))
+    
+    #compute cross terms, including the auto terms as pairs (jj,jj)
+    lo_pairs=[(jj,kk) for jj in range(n) for kk in range(jj,n)]
+    
+    if n_processes==1:
+        stfd=np.zeros(stfdshape,dtype='complex128')
+        for jj,kk in lo_pairs:
+            _stfbss_pair(stfd,Za,jj,kk,tftype,tfkwargs)
+    else:
+        if n_processes is None:
+            n_processes=multiprocessing.cpu_count()
+        #input and output are shared with the worker processes
+        za_shared=multiprocessing.sharedctypes.RawArray('d',Za.size)
+        np.frombuffer(za_shared)[:]=Za.ravel().real
+        stfd_shared=multiprocessing.sharedctypes.RawArray('d',
+                                                2*int(np.prod(stfdshape)))
+        pool=multiprocessing.Pool(processes=n_processes,
+                                  initializer=_stfbss_pool_init,
+                                  initargs=(za_shared,Za.shape,stfd_shared,
+                                            stfdshape,tftype,tfkwargs))
+        try:
+            pool.map(_stfbss_pool_worker,lo_pairs,chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+        stfd=np.frombuffer(stfd_shared,dtype='complex128').reshape(stfdshape)
     
     #===============================================================================
     # Compute criteria for cross terms 
     #===============================================================================
     
-    stfdTr=np.zeros((nfbins,ntbins))
     C=np.zeros((nfbins,ntbins))
     
-    for ff in range(nfbins):
-        for tt in range(ntbins):
-            #compensate for noise
-            stfd[:,:,ff,tt]=stfd[:,:,ff,tt]-sigman*np.matrix(W)*np.matrix(W.T)
-            #compute the trace
-            stfdTr[ff,tt]=abs(np.trace(stfd[:,:,ff,tt]))
+    #compensate for noise
+    stfd[:,:,:,:ntbins]-=(sigman*np.dot(W,W.T))[:,:,np.newaxis,np.newaxis]
+    #compute the trace
+    stfdTr=abs(np.trace(stfd[:,:,:,:ntbins]))
     #compute mean over entire t-f plane
     trmean=stfdTr.mean()
     
     #find t-f points that meet the criteria
     fspot,tspot=np.nonzero(stfdTr>trmean)
     
-    for ll in range(len(fspot)):
-        treig=abs(np.linalg.eig(stfd[:,:,fspot[ll],tspot[ll]])[0])
-        if sum(treig)!=0 and sum(treig)>tftol:
-            C[fspot[ll],tspot[ll]]=max(treig)/sum(treig)
-        else:
-            C[fspot[ll],tspot[ll]]=0
+    if len(fspot)>0:
+        treig=abs(np.linalg.eigvals(stfd[:,:,fspot,tspot].transpose(2,0,1)))
+        treigsum=treig.sum(axis=1)
+        crit=(treigsum!=0)&(treigsum>tftol)
+        C[fspot[crit],tspot[crit]]=treig.max(axis=1)[crit]/treigsum[crit]
     
     #compute gradients and jacobi matrices
     negjacobi=np.zeros((nfbins,ntbins))
@@ -1906,66 +2148,109 @@ def stfbss(X,nsources=5,ng=2**5-1,nh=2**9-1,tstep=2**6-1,df=1.0,nfbins=2**10,
     else:
         print 'Found '+str(ntfpoints)+' t-f points'
     
-    for rr in range(ntfpoints):
-        if rr==0:
-            Rjd=stfd[:,:,gfspot[rr],gtspot[rr]]
-        else:
-            Rjd=np.concatenate((Rjd,stfd[:,:,gfspot[rr],gtspot[rr]]),axis=1)
-    Rjd=np.array(Rjd)
-    
     #===============================================================================
     # Calculate Joint Diagonalization
     #===============================================================================
-    #get size of array of matrices to be diagonalized
-    mtf,nm=Rjd.shape #mtf is number of t-f points, nm is number of matrices
-    #set up some initial parameters
+    V,updates=joint_diagonalization(stfd[:,:,gfspot,gtspot].transpose(2,0,1),
+                                    tol=tftol)
+    print 'Updated '+str(updates)+' times.'
+    
+    #compute estimated signal matrix
+    Se=np.dot(V.T,Z)
+    #compute estimated mixing matrix
+    Ae=np.dot(np.linalg.pinv(W),V)
+    
+    return Se,Ae
+    
+def joint_diagonalization(Rjd, tol=1.E-8):
+    """
+    Computes the orthogonal matrix V that jointly diagonalizes the set of 
+    matrices Rjd by Jacobi sweeps of Givens rotations (Cardoso and 
+    Souloumiac, 1996).  Each rotation is applied to all matrices at once.
+    
+    Arguments:
+    ----------
+        **Rjd** : np.ndarray(nm, mtf, mtf)
+                  stack of nm matrices to diagonalize
+                  
+        **tol** : float
+                  smallest Givens angle to still rotate
+                  
+    Returns:
+    --------
+        **V** : np.ndarray(mtf, mtf)
+                joint diagonalizer, V.T*Rjd[ii]*V is close to diagonal
+                
+        **updates** : int
+                      number of rotations
+    """
+    
+    Rjd=np.array(Rjd,dtype=np.result_type(Rjd,'float'))
+    nm,mtf,mtf=Rjd.shape
+    
     V=np.eye(mtf)
     
     #update boolean
     encore=True 
     #Total number of rotations
     updates=0
-    sweep=0
-    #print 'Computing Joint Diagonalization'
-    # Joint diagonalization proper
-    # ============================
     while encore:
-        #reset some parameters
         encore=False
-        sweep+=1 
-        upds=0
-        Vkeep=V
         for p in range(mtf):
-            
             for q in range(p+1,mtf):
-                #set up indices
-                qi=np.arange(start=q,stop=nm,step=mtf)
-                pi=np.arange(start=p,stop=nm,step=mtf)
                 # computation of Givens angle
-                g=np.array([Rjd[p,pi]-Rjd[q,qi],Rjd[p,qi],Rjd[q,pi]])
+                g=np.array([Rjd[:,p,p]-Rjd[:,q,q],Rjd[:,p,q],Rjd[:,q,p]])
                 gg=np.real(np.dot(g,g.T))
                 ton=gg[0,0]-gg[1,1] 
                 toff=gg[0,1]+gg[1,0]
                 theta=0.5*np.arctan2(toff,ton+np.sqrt(ton**2+toff**2))
                 # Givens update
-                if abs(theta) > tftol:
+                if abs(theta) > tol:
                     encore=True
-                    upds+=1
+                    updates+=1
                     c=np.cos(theta) 
                     s=np.sin(theta)
-                    G=np.matrix([[c,-s],[s,c]])
-                    pair =np.array([p,q])
-                    V[:,pair]=V[:,pair]*G
-                    Rjd[pair,:]=G.T*Rjd[pair,:]
-                    Rjd[:,np.concatenate([pi,qi])]=np.append(
-                                                c*Rjd[:,pi]+s*Rjd[:,qi],
-                                                -s*Rjd[:,pi]+c*Rjd[:,qi],axis=1)
-        updates+=upds
-    print 'Updated '+str(updates)+' times.'
+                    Vp=V[:,p].copy()
+                    V[:,p]=c*Vp+s*V[:,q]
+                    V[:,q]=-s*Vp+c*V[:,q]
+                    Rp=Rjd[:,p,:].copy()
+                    Rjd[:,p,:]=c*Rp+s*Rjd[:,q,:]
+                    Rjd[:,q,:]=-s*Rp+c*Rjd[:,q,:]
+                    Rp=Rjd[:,:,p].copy()
+                    Rjd[:,:,p]=c*Rp+s*Rjd[:,:,q]
+                    Rjd[:,:,q]=-s*Rp+c*Rjd[:,:,q]
+    
+    return V,updates
+    
+def _stfbss_pair(stfd,Za,jj,kk,tftype,tfkwargs):
+    """
+    Computes the cross time-frequency distribution of the whitened signals
+    jj and kk and puts it into stfd[jj,kk] and its conjugate into stfd[kk,jj].
+    """
     
-    #compute estimated signal matrix
-    Se=np.dot(V.T,Z)
-    #compute estimated mixing matrix
-    Ae=np.dot(np.linalg.pinv(W),V)
+    maxn=Za.shape[1]
+    fxpair=[Za[jj].reshape(maxn),Za[kk].reshape(maxn)]
+    if tftype=='spwvd':
+        ptf=spwvd(fxpair,**tfkwargs)[0]
+    elif tftype=='smethod':
+        ptf=smethod(fxpair,**tfkwargs)[0]
+    elif tftype=='Lestimate':
+        ptf=robust_smethod(fxpair,**tfkwargs)[0]
     
-    return Se,Ae
+    nt=min(ptf.shape[1],stfd.shape[3])
+    stfd[jj,kk,:,:nt]=ptf[:,:nt]
+    stfd[kk,jj,:,:nt]=ptf[:,:nt].conj()
+
+_stfbss_shared={}
+
+def _stfbss_pool_init(za_shared,za_shape,stfd_shared,stfdshape,tftype,
+                      tfkwargs):
+    _stfbss_shared['Za']=np.frombuffer(za_shared).reshape(za_shape)
+    _stfbss_shared['stfd']=np.frombuffer(stfd_shared,
+                                         dtype='complex128').reshape(stfdshape)
+    _stfbss_shared['tftype']=tftype
+    _stfbss_shared['tfkwargs']=tfkwargs
+
+def _stfbss_pool_worker(pair):
+    _stfbss_pair(_stfbss_shared['stfd'],_stfbss_shared['Za'],pair[0],pair[1],
+                 _stfbss_shared['tftype'],_stfbss_shared['tfkwargs'])
@@ -0,0 +1,336 @@
+import unittest
+import glob
+import os.path as op
+import shutil
+import tempfile
+
+import numpy as np
+
+import mtpy.analysis.pt as MTpt
+import mtpy.analysis.geometry as MTge
+import mtpy.analysis.niblettbostick as MTnb
+import mtpy.analysis.distortion as MTdis
+import mtpy.analysis.staticshift as MTss
+import mtpy.core.edi as MTedi
+import mtpy.core.z as MTz
+import mtpy.utils.calculator as MTcc
+
+
+def _random_z_cube(n_station, n_freq, seed=0):
+    rng = np.random.RandomState(seed)
+    shape = (n_station, n_freq, 2, 2)
+    z = rng.normal(size=shape) + 1j * rng.normal(size=shape)
+    zerr = np.abs(rng.normal(scale=0.1, size=shape))
+    freq = np.logspace(-3, 3, n_freq)
+    return z, zerr, freq
+
+
+class TestPhaseTensorArray(unittest.TestCase):
+
+    def setUp(self):
+        self.z, self.zerr, self.freq = _random_z_cube(3, 12)
+
+    def test_z2pt_array_matches_single_matrix(self):
+        pt, pterr = MTpt.z2pt_array(self.z, self.zerr)
+
+        for idx_s in range(self.z.shape[0]):
+            for idx_f in range(self.z.shape[1]):
+                pt_1, pterr_1 = MTpt.z2pt(self.z[idx_s, idx_f],
+                                          self.zerr[idx_s, idx_f])
+                self.assertTrue(np.allclose(pt[idx_s, idx_f], pt_1))
+                self.assertTrue(np.allclose(pterr[idx_s, idx_f], pterr_1))
+
+    def test_invariants_reference_values(self):
+        #values of the former PhaseTensor implementation, station 1 at the
+        #frequency indices 0, 5 and 11
+        reference = {
+            'trace': ([0.8258535832, -5.568675974, -7.558339346],
+                      [0.6140343327, 2.600786167, 7.448330588]),
+            'skew': ([-0.480117091, 2.081681563, 8.362639975],
+                      [0.5056471437, 1.6111872, 14.01081778]),
+            'det': ([-0.7583231201, 4.925415216, -9.428412229],
+                      [0.5272575963, 5.340171067, 66.07721225]),
+            'alpha': ([61.15540501, -11.7728345, 42.34098448],
+                      [0.1204794478, 0.1963812525, 0.2113253273]),
+            'beta': ([-15.08597339, 79.75162972, 66.05398692],
+                      [0.2800783451, 0.1482462551, 0.4834586339]),
+            'azimuth': ([76.2413784, -91.52446423, -23.71300244],
+                      [0.6328963524, 0.587049834, 0.8335370185]),
+            'phimin': ([-27.27428711, 44.8572846, -38.03104788],
+                      [52.88952879, 80.08354197, 88.3011279]),
+            'phimax': ([55.78891859, 78.57884409, 85.2577372],
+                      [52.88952879, 80.08354197, 88.3011279]),
+            'ellipticity': ([2.913002953, 0.2731903523, 2.610574377],
+                      [1.110872386, 0.1062855984, 0.7866433069]),
+            }
+        pt_dict = MTpt.z2pt_invariants(self.z, self.zerr)
+        pt_obj = MTpt.PhaseTensor(z_array=self.z[1], zerr_array=self.zerr[1],
+                                  freq=self.freq)
+        for key, (value, error) in reference.items():
+            self.assertTrue(np.allclose(pt_dict[key][0][1, [0, 5, 11]],
+                                        value))
+            self.assertTrue(np.allclose(pt_dict[key][1][1, [0, 5, 11]],
+                                        error))
+            value_obj, error_obj = getattr(pt_obj, key)
+            self.assertTrue(np.allclose(value_obj[[0, 5, 11]], value))
+            self.assertTrue(np.allclose(error_obj[[0, 5, 11]], error))
+
+    def test_singular_gives_zero(self):
+        z = self.z.copy()
+        z[0, 0] = np.array([[1, 1], [1, 1 + 1j]])
+        pt, pterr = MTpt.z2pt_array(z, self.zerr)
+        self.assertTrue(np.all(pt[0, 0] == 0))
+        self.assertTrue(np.all(pterr[0, 0] == 0))
+
+
+def _rho_minmax_loop(z, period, rotsteps, te_only=False):
+    #rotation sweep of one Z, as in the original calculate_rho_minmax, 
+    #te_only takes the maximum and minimum from TE on ties of the maxima
+    rotangles = np.arange(rotsteps) * 180. / rotsteps
+    vals = np.zeros((rotsteps, 4))
+    for j, angle in enumerate(rotangles):
+        z_rot = np.asarray(MTcc.rotatematrix_incl_errors(z, angle)[0])
+        for k, (ii, jj) in enumerate([(0, 1), (1, 0)]):
+            vals[j, 2*k+1], vals[j, 2*k] = MTnb.rhophi2rhodepth(
+                            0.2 * period * abs(z_rot[ii, jj])**2,
+                            np.degrees(np.angle(z_rot[ii, jj])) % 360, period)
+    column = np.argmax([vals[:, 1].max(), vals[:, 3].max()]) * 2 + 1
+    min_column = np.argmin([vals[:, 1].max(), vals[:, 3].max()]) * 2 + 1
+    if te_only:
+        column = min_column = 1
+    maxidx = np.argmax(vals[:, column])
+    max_ang = rotangles[maxidx]
+    min_ang = max_ang + 90 if max_ang <= 90 else max_ang - 90
+    minidx = np.argmin(np.abs(rotangles - min_ang))
+    return ([vals[maxidx, column-1], vals[maxidx, column], max_ang],
+            [vals[minidx, min_column-1], vals[minidx, min_column]])
+
+
+class TestNiblettBostickArray(unittest.TestCase):
+
+    def setUp(self):
+        self.z, self.zerr, self.freq = _random_z_cube(3, 12)
+        #mostly 2D: large off-diagonal elements of opposite sign
+        self.z[..., 0, 1] *= 10
+        self.z[..., 1, 0] *= -10
+        self.periods = 1. / self.freq
+
+    def test_geometry_matches_single_station(self):
+        dims = MTge.dimensionality_array(z_array=self.z)
+        strikes = MTge.strike_angle_array(z_array=self.z)
+        for idx_s in range(self.z.shape[0]):
+            self.assertTrue(np.all(dims[idx_s] ==
+                                   MTge.dimensionality(z_array=self.z[idx_s])))
+            self.assertTrue(np.allclose(strikes[idx_s],
+                                MTge.strike_angle(z_array=self.z[idx_s]),
+                                equal_nan=True))
+
+    def test_interpolate_strike_angles(self):
+        angles = np.array([np.nan, 10., np.nan, np.nan, 40., np.nan])
+        periods = np.arange(1., 7.)
+        new_angles = MTnb.interpolate_strike_angles_array(
+                                    np.array([angles, angles[::-1]]),
+                                    np.array(periods))
+        self.assertTrue(np.allclose(new_angles[0], [0, 10, 20, 30, 40, 0]))
+        self.assertTrue(np.allclose(new_angles[1],
+                        MTnb.interpolate_strike_angles(angles[::-1].copy(),
+                                                       periods)))
+
+        #unsorted periods, for which the former version mixed up the order
+        perm = np.array([3, 0, 5, 1, 4, 2])
+        new_angles = MTnb.interpolate_strike_angles_array(angles[perm],
+                                                          periods[perm])
+        self.assertTrue(np.allclose(new_angles, 
+                                    np.array([0, 10, 20, 30, 40, 0])[perm]))
+        #no 2D angle after a 1D period, the former version indexed past the 
+        #end
+        new_angles = MTnb.interpolate_strike_angles_array(
+                                np.array([10., np.nan, np.nan]), periods[:3])
+        self.assertTrue(np.allclose(new_angles, [10, 5, 0]))
+
+    def test_rho_minmax_matches_loop(self):
+        #odd number of steps, TE and TM maxima are not the same
+        nb_max, nb_min = MTnb.rho_minmax_array(self.z, self.periods,
+                                               rotsteps=31)
+        dims = MTge.dimensionality_array(z_array=self.z)
+        for idx_s in range(self.z.shape[0]):
+            for idx_f in range(self.z.shape[1]):
+                if dims[idx_s, idx_f] == 3:
+                    self.assertTrue(np.isnan(nb_max[idx_s, idx_f]).all())
+                    continue
+                ref_max, ref_min = _rho_minmax_loop(self.z[idx_s, idx_f],
+                                                    self.periods[idx_f], 31)
+                self.assertTrue(np.allclose(nb_max[idx_s, idx_f], ref_max))
+                self.assertTrue(np.allclose(nb_min[idx_s, idx_f], ref_min))
+
+    def test_rho_minmax_even_rotsteps(self):
+        #TE and TM maxima are equal up to the rounding, which the former
+        #loop compared exactly: with min and max from different modes, 
+        #rho min was rho max (TM at 90 degrees from the maximum of TE)
+        nb_max, nb_min = MTnb.rho_minmax_array(self.z, self.periods,
+                                               rotsteps=360)
+        dims = MTge.dimensionality_array(z_array=self.z)
+        n_tie = 0
+        for idx_s in range(self.z.shape[0]):
+            for idx_f in range(self.z.shape[1]):
+                if dims[idx_s, idx_f] == 3:
+                    continue
+                ref_max, ref_min = _rho_minmax_loop(self.z[idx_s, idx_f],
+                                                    self.periods[idx_f], 360,
+                                                    te_only=True)
+                self.assertTrue(np.allclose(nb_max[idx_s, idx_f], ref_max))
+                self.assertTrue(np.allclose(nb_min[idx_s, idx_f], ref_min))
+                self.assertTrue(nb_min[idx_s, idx_f, 1] <
+                                nb_max[idx_s, idx_f, 1])
+
+                loop_max, loop_min = _rho_minmax_loop(self.z[idx_s, idx_f],
+                                                      self.periods[idx_f], 
+                                                      360)
+                #same maximum, the angle may be the one of TM
+                self.assertTrue(np.allclose(nb_max[idx_s, idx_f, :2],
+                                            loop_max[:2]))
+                self.assertEqual((nb_max[idx_s, idx_f, 2]-loop_max[2]) % 90,
+                                 0)
+                if np.allclose(loop_min, loop_max[:2]):
+                    n_tie += 1
+        self.assertTrue(n_tie > 0)
+
+    def test_half_space_sections(self):
+        #100 Ohm m half space, phase 45 degrees
+        z = np.zeros(self.z.shape, dtype=complex)
+        z[..., 0, 1] = np.sqrt(100. / (0.2 * self.periods)) * np.exp(0.25j *
+                                                                     np.pi)
+        z[..., 1, 0] = -z[..., 0, 1]
+        z[1, 3] = np.nan
+        depths, znb_max, znb_min, rho_max, rho_min = MTnb.depth_sections(
+                                                z, self.periods, n_depths=20)
+        self.assertEqual(znb_max.shape, (3, 20))
+        for section in [znb_max, znb_min, rho_max, rho_min]:
+            self.assertTrue(np.allclose(section, 100.))
+
+
+class TestDistortionArray(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(4)
+        n_freq = 10
+        self.distortion = np.identity(2) + rng.normal(scale=0.2,
+                                                      size=(4, 2, 2))
+        #regional 1D (stations 0, 1) and 2D (stations 2, 3) impedances
+        z_reg = np.zeros((4, n_freq, 2, 2), dtype=complex)
+        z_reg[:, :, 0, 1] = np.exp(0.6j) * rng.uniform(1, 5, (4, n_freq))
+        z_reg[:, :, 1, 0] = -z_reg[:, :, 0, 1]
+        z_reg[2:, :, 1, 0] *= 10 * np.exp(0.5j)
+        self.z = np.einsum('sij,sfjk->sfik', self.distortion, z_reg)
+        self.zerr = np.abs(rng.normal(scale=0.05, size=self.z.shape))
+
+    def test_1d_distortion_recovered(self):
+        dims = MTge.dimensionality_array(z_array=self.z)
+        self.assertTrue((dims[:2] == 1).all() and (dims[2:] == 2).all())
+        dis, diserr = MTdis.find_distortion_array(self.z, self.zerr)
+        for idx in range(2):
+            d = self.distortion[idx]
+            self.assertTrue(np.allclose(dis[idx],
+                                        d / np.sqrt(np.linalg.det(d))))
+
+    def test_reference_values(self):
+        #values of the former per frequency implementation, with the error
+        #of the imaginary part in 2D computed from its own s (si)
+        rng = np.random.RandomState(7)
+        z = self.z.copy()
+        z[2:] += 0.05 * (rng.normal(size=(2, 10, 2, 2)) +
+                         1j * rng.normal(size=(2, 10, 2, 2)))
+        dis, diserr = MTdis.find_distortion_array(z, self.zerr)
+        dis_pool, diserr_pool = MTdis.find_distortion_array(z, self.zerr,
+                                                            n_processes=2)
+        self.assertTrue(np.allclose(dis, dis_pool))
+        self.assertTrue(np.allclose(diserr, diserr_pool))
+
+        #1D
+        self.assertTrue(np.allclose(dis[0],
+                            [[0.9337889090922302, 0.09243506705464073],
+                             [-0.18413173984553968, 1.052678780727948]]))
+        self.assertTrue(np.allclose(diserr[0],
+                            [[0.0007549399243889011, 0.00126481385032956],
+                             [0.0002808786227314587, 0.000610552762085332]]))
+        #2D with errors
+        self.assertTrue(np.allclose(dis[2],
+                            [[0.71995394813733, -0.3231360515035985],
+                             [0.18363990870746244, 1.3643383508783806]]))
+        self.assertTrue(np.allclose(diserr[2],
+                            [[0.0006860332073245469, 0.00030553040635349126],
+                             [0.004799827328935354, 0.0006860332073245469]]))
+        self.assertTrue(np.allclose(diserr[3],
+                            [[0.00043859940126494447, 0.00014685638375622393],
+                             [0.0022704957499161496, 0.00043859940126494447]]))
+        #the former errors with the s of the real part (sr)
+        self.assertFalse(np.allclose(diserr[2],
+                            [[0.0006698995831123296, 0.0003015476308617318],
+                             [0.004583491003975704, 0.0006698995831123296]]))
+        #2D without errors, evenly weighted
+        dis, diserr = MTdis.find_distortion_array(z)
+        self.assertTrue(np.allclose(dis[2],
+                            [[0.7171960327478872, -0.3162837126557775],
+                             [0.0907937336730579, 1.367096266267823]]))
+        self.assertTrue(np.allclose(diserr[2], np.sqrt(0.05)))
+
+        #single station
+        z_obj = MTz.Z(z_array=z[2], zerr_array=self.zerr[2],
+                      freq=np.logspace(-2, 2, 10))
+        dis_1, diserr_1 = MTdis.find_distortion(z_obj)
+        self.assertTrue(np.allclose(dis_1,
+                            [[0.71995394813733, -0.3231360515035985],
+                             [0.18363990870746244, 1.3643383508783806]]))
+
+
+class TestStaticShiftSurvey(unittest.TestCase):
+
+    def setUp(self):
+        edi_dir = op.join(op.dirname(op.dirname(op.abspath(__file__))),
+                          'utils', 'gui', 'occam2d', 'v1', 'edi')
+        self.tmp_dir = tempfile.mkdtemp()
+        for fn in sorted(glob.glob(op.join(edi_dir, '*.edi')))[:5]:
+            shutil.copy(fn, self.tmp_dir)
+        self.edi_fns = sorted(glob.glob(op.join(self.tmp_dir, '*.edi')))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_half_space(self):
+        #100 Ohm-m half space, the first station shifted by a factor of 4
+        lo_edi = MTedi.read_edifiles(self.edi_fns)
+        for ii, edi in enumerate(lo_edi):
+            rho = np.where(ii == 0, 400., 100.)
+            z = np.sqrt(rho*edi.freq/0.2)*(1+1j)/np.sqrt(2)
+            edi.Z.z = np.array([[0*z, z], [-z, 0*z]]).transpose(2, 0, 1)
+        ss_x, ss_y, n_nb = MTss.median_ss_array(lo_edi,
+                                                distance_radius=1e6)
+        self.assertTrue(np.allclose(ss_x, [4., 1., 1., 1., 1.]))
+        self.assertTrue(np.allclose(ss_y, ss_x))
+        self.assertTrue((n_nb == 4).all())
+
+        ss_x, ss_y, n_nb = MTss.median_ss_array(lo_edi, distance_radius=0.)
+        self.assertTrue((ss_x == 1).all() and (n_nb == 0).all())
+        self.assertRaises(MTss.MTex.MTpyError_inputarguments,
+                          MTss.median_ss_array, [])
+
+    def test_survey_matches_station(self):
+        ss_x, ss_y, new_fns = MTss.compute_survey_median_ss(
+                                    self.edi_fns, distance_radius=20000,
+                                    n_processes=2)
+        self.assertEqual(len(glob.glob(op.join(self.tmp_dir, 'SS', '*'))),
+                         len(self.edi_fns))
+        for ii in [0, 3]:
+            ssx, ssy, new_fn = MTss.compute_spatial_median_ss(
+                            self.edi_fns[ii], distance_radius=20000,
+                            write_new_edi='n')
+            self.assertAlmostEqual(ssx, ss_x[ii])
+            self.assertAlmostEqual(ssy, ss_y[ii])
+            edi = MTedi.Edi(self.edi_fns[ii])
+            edi_ss = MTedi.Edi(new_fns[ii])
+            self.assertTrue(np.allclose(edi_ss.Z.z[:, 0, 1]*np.sqrt(ssx),
+                                        edi.Z.z[:, 0, 1], rtol=1e-4))
+
+
+if __name__ == '__main__':
+    unittest.main()
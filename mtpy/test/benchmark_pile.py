@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+"""
+Benchmark of the window selection in mtpy.processing.pile.
+
+Compares the overlap query of the AVL trees (with_key_in over tmin,
+shifted by the longest trace length) with the TimeIndex used by
+Pile.relevant, on a synthetic pile of 100 channels with 1000 traces each.
+A few long traces are added, as they widen the AVL candidate range.
+
+Usage:
+    python benchmark_pile.py [n_traces] [n_windows]
+
+"""
+
+import sys
+import time
+
+import numpy as np
+
+#stand-ins for the pyrocko modules the pile needs
+import mtpy.test.pyrocko_stub
+import mtpy.processing.pile as MTpile
+import mtpy.processing.trace as MTtrace
+
+
+def synthetic_pile(n_traces=100000, n_channels=100, tlen=3600., seed=0):
+    rng = np.random.RandomState(seed)
+    n_per_channel = n_traces / n_channels
+    pile = MTpile.Pile()
+    for ii in range(n_channels):
+        tmins = np.arange(n_per_channel) * tlen + rng.uniform(0, 60.,
+                                                              n_per_channel)
+        traces = [MTtrace.Trace('XX', 'S%03i' % ii, '', 'EX', tmin=tmin,
+                                tmax=tmin + tlen - 1., deltat=1.)
+                  for tmin in tmins]
+        pile.add_file(MTpile.MemTracesFile(None, traces))
+
+    #a few channels recorded in one piece
+    long_traces = [MTtrace.Trace('XX', 'L%03i' % ii, '', 'EX', tmin=0.,
+                                 tmax=n_per_channel * tlen, deltat=1.)
+                   for ii in range(3)]
+    pile.add_file(MTpile.MemTracesFile(None, long_traces))
+
+    return pile
+
+
+def relevant_avl(pile, tmin, tmax):
+    return [tr for tr in pile.by_tmin.with_key_in(tmin - pile.tlenmax, tmax)
+            if tr.is_relevant(tmin, tmax)]
+
+
+def main(n_traces=100000, n_windows=2000):
+    t0 = time.time()
+    pile = synthetic_pile(n_traces)
+    print 'built pile of {0} traces in {1:.2f} s'.format(len(pile.by_tmin),
+                                                        time.time() - t0)
+
+    tinc = 60.
+    wmins = pile.tmin + np.arange(n_windows) * \
+            (pile.tmax - pile.tmin - tinc) / n_windows
+
+    t0 = time.time()
+    pile.relevant(wmins[0], wmins[0] + tinc)
+    print 'built time index in {0:.2f} s'.format(time.time() - t0)
+
+    lo_timings = []
+    for label, query in [('avl', lambda a, b: relevant_avl(pile, a, b)),
+                         ('time index', pile.relevant)]:
+        t0 = time.time()
+        n_found = sum(len(query(wmin, wmin + tinc)) for wmin in wmins)
+        lo_timings.append(time.time() - t0)
+        print '{0:>12}: {1} windows, {2} traces, {3:.3f} ms/window'.format(
+                    label, n_windows, n_found, 1000 * lo_timings[-1] / n_windows)
+
+    for wmin in wmins[::max(1, n_windows / 50)]:
+        if relevant_avl(pile, wmin, wmin + tinc) != \
+           pile.relevant(wmin, wmin + tinc):
+            raise ValueError('time index and avl query disagree')
+
+    print 'speedup: {0:.1f}'.format(lo_timings[0] / lo_timings[1])
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,259 @@
+import unittest
+import math, cmath
+import os.path as op
+import glob
+import shutil
+import tempfile
+
+import numpy as np
+
+import mtpy.core.z as MTz
+import mtpy.core.edi as MTedi
+import mtpy.core.survey as MTsurvey
+import mtpy.utils.calculator as MTcc
+
+
+def _random_z(n_freq, seed=0):
+    rng = np.random.RandomState(seed)
+    z = rng.normal(size=(n_freq, 2, 2)) + 1j * rng.normal(size=(n_freq, 2, 2))
+    zerr = np.abs(rng.normal(scale=0.3, size=(n_freq, 2, 2)))
+    freq = np.logspace(-3, 3, n_freq)
+    return z, zerr, freq
+
+
+class TestZResPhase(unittest.TestCase):
+
+    def setUp(self):
+        self.z, self.zerr, self.freq = _random_z(25)
+        #include an exactly zero element and a huge error
+        self.z[3, 0, 0] = 0
+        self.zerr[4, 1, 1] = 100.
+
+    def test_res_phase_matches_scalar(self):
+        z_obj = MTz.Z(z_array=self.z, zerr_array=self.zerr, freq=self.freq)
+
+        for idx_f in range(len(self.z)):
+            for i in range(2):
+                for j in range(2):
+                    z_ij = self.z[idx_f, i, j]
+                    res = np.abs(z_ij)**2 / self.freq[idx_f] * 0.2
+                    phase = math.degrees(cmath.phase(z_ij)) % 360
+                    r_err, phi_err = MTcc.zerror2r_phi_error(
+                                            np.real(z_ij), self.zerr[idx_f, i, j],
+                                            np.imag(z_ij), self.zerr[idx_f, i, j])
+                    res_err = 0.4 * np.abs(z_ij) / self.freq[idx_f] * r_err
+
+                    self.assertAlmostEqual(z_obj.resistivity[idx_f, i, j], res)
+                    self.assertAlmostEqual(z_obj.phase[idx_f, i, j], phase)
+                    self.assertAlmostEqual(z_obj.resistivity_err[idx_f, i, j],
+                                           res_err)
+                    self.assertAlmostEqual(z_obj.phase_err[idx_f, i, j],
+                                           phi_err)
+
+    def test_no_error(self):
+        z_obj = MTz.Z(z_array=self.z, freq=self.freq)
+        self.assertEqual(z_obj.resistivity.shape, self.z.shape)
+        self.assertTrue(z_obj.resistivity_err is None)
+
+
+class TestTipperAmpPhase(unittest.TestCase):
+
+    def test_rect2polar_array_matches_scalar(self):
+        rng = np.random.RandomState(2)
+        x = rng.normal(size=200)
+        y = rng.normal(size=200)
+        err = np.abs(rng.normal(scale=0.5, size=200))
+        #points close to the positive x-axis and with the origin in the box
+        x[:10] = 1.
+        y[:10] = np.linspace(-0.1, 0.1, 10)
+        err[10:15] = 10.
+
+        rho_err, phi_err = MTcc.propagate_error_rect2polar_array(x, err, y,
+                                                                 err)
+        for idx in range(len(x)):
+            r, p = MTcc.propagate_error_rect2polar(x[idx], err[idx], y[idx],
+                                                   err[idx])
+            self.assertAlmostEqual(rho_err[idx], r)
+            self.assertAlmostEqual(phi_err[idx], p)
+
+
+class TestRotation(unittest.TestCase):
+
+    def setUp(self):
+        self.z, self.zerr, self.freq = _random_z(10, seed=1)
+        self.angles = np.linspace(0, 170, 10)
+
+    def test_z_rotate_matches_scalar(self):
+        z_obj = MTz.Z(z_array=self.z.copy(), zerr_array=self.zerr.copy(),
+                      freq=self.freq)
+        z_obj.rotate(self.angles)
+
+        for idx_f in range(len(self.z)):
+            z_rot, zerr_rot = MTcc.rotatematrix_incl_errors(self.z[idx_f],
+                                                            self.angles[idx_f],
+                                                            self.zerr[idx_f])
+            self.assertTrue(np.allclose(z_obj.z[idx_f], z_rot))
+            self.assertTrue(np.allclose(z_obj.zerr[idx_f], zerr_rot))
+
+    def test_tipper_rotate_matches_scalar(self):
+        tipper = self.z[:, 0:1, :].copy()
+        tippererr = self.zerr[:, 0:1, :].copy()
+        t_obj = MTz.Tipper(tipper_array=tipper.copy(),
+                           tippererr_array=tippererr.copy(), freq=self.freq)
+        t_obj.rotate(30.)
+
+        for idx_f in range(len(tipper)):
+            t_rot, terr_rot = MTcc.rotatevector_incl_errors(tipper[idx_f], 30.,
+                                                            tippererr[idx_f])
+            self.assertTrue(np.allclose(t_obj.tipper[idx_f], t_rot))
+            self.assertTrue(np.allclose(t_obj.tippererr[idx_f], terr_rot))
+
+    def test_rotate_stack_broadcast(self):
+        #one station rotated through many angles at once
+        sweep = np.arange(0, 180, 1.)
+        z_rot, zerr_rot = MTcc.rotatematrices_incl_errors(
+                                                    self.z[np.newaxis],
+                                                    sweep[:, np.newaxis],
+                                                    self.zerr[np.newaxis])
+        self.assertEqual(z_rot.shape, (len(sweep),) + self.z.shape)
+        z_45, zerr_45 = MTcc.rotatematrices_incl_errors(self.z, 45., self.zerr)
+        self.assertTrue(np.allclose(z_rot[45], z_45))
+        self.assertTrue(np.allclose(zerr_rot[45], zerr_45))
+
+
+def _sample_edifiles(n_files):
+    edi_dir = op.join(op.dirname(op.dirname(op.abspath(__file__))),
+                      'utils', 'gui', 'occam2d', 'v1', 'edi')
+    return sorted(glob.glob(op.join(edi_dir, '*.edi')))[:n_files]
+
+
+class TestReadEdifiles(unittest.TestCase):
+
+    def setUp(self):
+        self.edi_fns = _sample_edifiles(4)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pool_and_cache(self):
+        lo_ref = [MTedi.Edi(fn) for fn in self.edi_fns]
+        lo_pool = MTedi.read_edifiles(self.edi_fns, n_processes=2)
+        MTedi.read_edifiles(self.edi_fns, cache_dir=self.tmp_dir)
+        self.assertEqual(len(glob.glob(op.join(self.tmp_dir, '*.pkl'))), 4)
+        lo_cached = MTedi.read_edifiles(self.edi_fns, cache_dir=self.tmp_dir)
+
+        for ref, pool, cached in zip(lo_ref, lo_pool, lo_cached):
+            self.assertEqual(ref.station, pool.station)
+            self.assertEqual(ref.station, cached.station)
+            self.assertTrue(np.allclose(ref.Z.z, pool.Z.z))
+            self.assertTrue(np.allclose(ref.Z.z, cached.Z.z))
+
+        cache = MTedi.EdiCache(self.tmp_dir, max_entries=2)
+        cache.evict()
+        self.assertEqual(len(glob.glob(op.join(self.tmp_dir, '*.pkl'))), 2)
+
+
+def _read_block_line_by_line(block_string):
+    #values of a data block, parsed token by token as the former readers did
+    lo_values = []
+    for line in block_string.strip().split('\n')[1:]:
+        for token in line.strip().split():
+            try:
+                lo_values.append(float(token))
+            except ValueError:
+                pass
+    return np.array(lo_values)
+
+
+class TestEdiSections(unittest.TestCase):
+
+    def setUp(self):
+        self.edi_fn = _sample_edifiles(1)[0]
+        self.edistring = open(self.edi_fn).read()
+
+    def test_data_blocks(self):
+        lo_head = ['FREQ']
+        for comp in ['ZXX', 'ZXY', 'ZYX', 'ZYY']:
+            lo_head.extend([comp+'R', comp+'I', comp+'.VAR'])
+        for comp in ['TX', 'TY']:
+            lo_head.extend([comp+'R.EXP', comp+'I.EXP', comp+'VAR.EXP'])
+
+        dict_values = {}
+        for head in lo_head:
+            block = MTedi._cut_sectionstring(self.edistring, head)
+            n_entries, values = MTedi._read_data_block(block)
+            self.assertEqual(n_entries, 36)
+            self.assertTrue(np.array_equal(values,
+                                           _read_block_line_by_line(block)))
+            dict_values[head] = values
+
+        edi = MTedi.Edi(self.edi_fn)
+        self.assertTrue(np.array_equal(edi.freq, dict_values['FREQ']))
+        self.assertTrue(np.array_equal(edi.Z.z[:, 0, 1].real,
+                                       dict_values['ZXYR']))
+        self.assertTrue(np.array_equal(edi.Z.z[:, 1, 0].imag,
+                                       dict_values['ZYXI']))
+        self.assertTrue(np.array_equal(edi.Z.zerr[:, 1, 1],
+                                       np.sqrt(dict_values['ZYY.VAR'])))
+        self.assertTrue(np.array_equal(edi.Tipper.tipper[:, 0, 1].imag,
+                                       dict_values['TYI.EXP']))
+
+        #several lines, a missing count and invalid tokens
+        block = 'ZXXR\n 1.0 2.5E+01\n-3 abc 4.\n\n 5e-1 *\n'
+        n_entries, values = MTedi._read_data_block(block)
+        self.assertTrue(n_entries is None)
+        self.assertTrue(np.array_equal(values,
+                                       _read_block_line_by_line(block)))
+        self.assertEqual(list(values), [1., 25., -3., 4., 0.5])
+        self.assertEqual(len(MTedi._read_data_block('FREQ // 0')[1]), 0)
+
+    def test_header_only(self):
+        edi = MTedi.Edi(self.edi_fn)
+        edi_head = MTedi.Edi()
+        edi_head.readfile(self.edi_fn, header_only=True)
+
+        self.assertEqual(edi_head.head, edi.head)
+        self.assertEqual(edi_head.info_dict, edi.info_dict)
+        self.assertEqual(edi_head.definemeas, edi.definemeas)
+        self.assertEqual(edi_head.hmeas_emeas, edi.hmeas_emeas)
+        self.assertEqual(edi_head.mtsect, edi.mtsect)
+        self.assertTrue(edi_head.freq is None)
+        self.assertTrue(edi_head.Z.z is None)
+        #read up to the first data block only
+        self.assertTrue(len(edi_head.infile_string) < 
+                        self.edistring.index('>FREQ')+100)
+        self.assertEqual(MTedi.read_edifile(self.edi_fn, 
+                                            header_only=True).head, edi.head)
+
+
+class TestSurvey(unittest.TestCase):
+
+    def setUp(self):
+        self.edi_fns = _sample_edifiles(4)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_roundtrip(self):
+        MTsurvey.edifiles2survey(self.edi_fns, op.join(self.tmp_dir, 's'))
+        survey = MTsurvey.Survey(op.join(self.tmp_dir, 's'))
+        self.assertEqual(len(survey), len(self.edi_fns))
+        self.assertEqual(survey.offsets[-1], len(survey.z))
+
+        for fn in self.edi_fns:
+            edi_object = MTedi.Edi(fn)
+            edi_survey = survey.get_edi(edi_object.station)
+            self.assertTrue(np.allclose(edi_object.Z.z, edi_survey.Z.z))
+            self.assertTrue(np.allclose(edi_object.Z.zerr, edi_survey.Z.zerr))
+            self.assertTrue(np.allclose(edi_object.freq, edi_survey.freq))
+            self.assertEqual(edi_object.head, edi_survey.head)
+
+        lo_fn = survey.write_edifiles(op.join(self.tmp_dir, 'edi'))
+        edi_object = MTedi.Edi(lo_fn[0])
+        self.assertTrue(np.allclose(edi_object.Z.z, survey.get_z(0).z))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import unittest
+import os
+import os.path as op
+import glob
+import shutil
+import stat
+import sys
+import tempfile
+
+import numpy as np
+
+import mtpy.modeling.forward1d as MTf1d
+import mtpy.modeling.occam1d as MTo1d
+
+
+#stands in for the Occam1D executable: writes 2 iterations with a model of 
+#100 Ohm-m and the data as response, fails for station names with 'bad'
+_fake_occam1d = '''#!{0}
+import os, sys
+startup_fn, mode = sys.argv[1:3]
+if 'bad' in os.getcwd():
+    sys.exit(1)
+slines = open(startup_fn).readlines()
+data_fn = [ll[21:].strip() for ll in slines if ll.startswith('Data File:')][0]
+header = [ll for ll in slines if ':' in ll and not ll.startswith('Iteration')]
+n_params = len(slines)-len(header)-1
+dlines = open(data_fn).readlines()
+idata = [ii for ii, ll in enumerate(dlines) if ll.startswith('# Data:')][0]
+for iteration in [1, 2]:
+    ifid = open('{{0}}_{{1}}.iter'.format(mode, iteration), 'w')
+    ifid.writelines(header)
+    ifid.write('{{0:<21}}{{1}}\\n'.format('Iteration:', iteration))
+    ifid.write('   2.0\\n'*n_params)
+    ifid.close()
+    rfid = open('{{0}}_{{1}}.resp'.format(mode, iteration), 'w')
+    rfid.writelines(dlines[:idata+2])
+    for ll in dlines[idata+2:]:
+        rfid.write('{{0}} {{1}} 0.5\\n'.format(ll.strip(), ll.split()[4]))
+    rfid.close()
+print 'done'
+'''.format(sys.executable)
+
+
+class TestForward1D(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.freq = np.logspace(-3, 3, 20)
+        self.res = 10**rng.uniform(0, 3, (4, 8))
+        self.thickness = rng.uniform(50, 2000, (4, 7))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_half_space(self):
+        z = MTf1d.impedance_1d([30.], [], self.freq)
+        res, phase = MTf1d.z2resphase(z, self.freq)
+        self.assertTrue(np.allclose(res, 30.))
+        self.assertTrue(np.allclose(phase, 45.))
+
+    def test_models_at_once(self):
+        z = MTf1d.impedance_1d(self.res, self.thickness, self.freq)
+        self.assertEqual(z.shape, (4, 20))
+        for idx in range(4):
+            self.assertTrue(np.allclose(z[idx], MTf1d.impedance_1d(
+                        self.res[idx], self.thickness[idx], self.freq)))
+
+    def test_jacobian(self):
+        z, dz = MTf1d.impedance_1d(self.res[0], self.thickness[0], self.freq,
+                                   return_jacobian=True)
+        self.assertEqual(dz.shape, (20, 8))
+        log_res = np.log10(self.res[0])
+        for idx in range(8):
+            step = 1e-6 * np.eye(8)[idx]
+            dz_fd = (MTf1d.impedance_1d(10**(log_res + step), 
+                                        self.thickness[0], self.freq) -
+                     MTf1d.impedance_1d(10**(log_res - step),
+                                        self.thickness[0], self.freq)) / 2e-6
+            self.assertTrue(np.allclose(dz[:, idx], dz_fd, 
+                                        atol=1e-6 * abs(dz).max()))
+
+    def test_occam1d_model(self):
+        model = MTo1d.Model()
+        model.write_model_file(save_path=self.tmp_dir, n_layers=20)
+        model.read_model_file(op.join(self.tmp_dir, 'Model1D'))
+        #iteration values are log10(resistivity)
+        model.model_res[:, 1] = np.where(model.model_res[:, 0] == -1, 2., 0.)
+        res, phase = MTf1d.occam1d_model_response(model, self.freq)
+        self.assertTrue(np.allclose(res, 100.))
+        self.assertTrue(np.allclose(phase, 45.))
+
+        #conductive layers have negative log10 values
+        model.model_res[:, 1] = np.where(model.model_res[:, 0] == -1, -1., 0.)
+        resistivity, thickness = MTf1d.occam1d_layers(model)
+        self.assertTrue(np.allclose(resistivity, 0.1))
+        self.assertRaises(MTf1d.MTex.MTpyError_value, MTf1d.occam1d_layers,
+                          model, mode=0)
+
+
+class TestOccam1DSurvey(unittest.TestCase):
+
+    def setUp(self):
+        edi_dir = op.join(op.dirname(op.dirname(op.abspath(__file__))),
+                          'utils', 'gui', 'occam2d', 'v1', 'edi')
+        self.tmp_dir = tempfile.mkdtemp()
+        self.edi_fns = sorted(glob.glob(op.join(edi_dir, '*.edi')))[:3]
+        bad_fn = op.join(self.tmp_dir, 'bad.edi')
+        shutil.copy(self.edi_fns[0], bad_fn)
+        self.edi_fns.append(bad_fn)
+
+        self.occam_path = op.join(self.tmp_dir, 'occam1d')
+        with open(self.occam_path, 'w') as ofid:
+            ofid.write(_fake_occam1d)
+        os.chmod(self.occam_path, stat.S_IRWXU)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_run_survey(self):
+        cwd = os.getcwd()
+        for n_processes in [1, 2]:
+            save_path = op.join(self.tmp_dir, 'survey{0}'.format(n_processes))
+            rs = MTo1d.RunSurvey(self.edi_fns, self.occam_path,
+                                 save_path=save_path, mode='TE',
+                                 n_processes=n_processes,
+                                 data_kwargs={'res_err':10, 'phase_err':5},
+                                 model_kwargs={'n_layers':30})
+            rs.run()
+            self.assertEqual(os.getcwd(), cwd)
+            self.assertEqual(rs.failed.keys(), ['bad'])
+            self.assertTrue(np.isnan(rs.rms[-1]))
+            self.assertTrue((rs.iteration[:-1] == 2).all())
+            #air layer and 31 ground layers
+            self.assertEqual(rs.model_res.shape, (4, 32))
+            self.assertTrue((rs.model_res[:-1, 1:] == 2.0).all())
+            self.assertTrue(np.allclose(rs.res[:-1, 2], rs.res[:-1, 0]))
+
+            for ii, station in enumerate(rs.station_list[:-1]):
+                data = MTo1d.Data()
+                data.read_resp_file(op.join(rs.get_station_path(station),
+                                            'TE_2.resp'),
+                                    op.join(rs.get_station_path(station),
+                                            'Occam1d_DataFile_TE.dat'))
+                nf = len(data.freq)
+                self.assertTrue(np.allclose(rs.res[ii, :, :nf], data.res_te))
+                self.assertTrue(np.allclose(rs.phase[ii, :, :nf],
+                                            data.phase_te))
+                self.assertTrue(np.allclose(rs.freq[ii, :nf], data.freq))
+
+
+if __name__ == '__main__':
+    unittest.main()
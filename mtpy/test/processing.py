@@ -0,0 +1,612 @@
+import unittest
+import os
+import os.path as op
+import shutil
+import tempfile
+import threading
+import multiprocessing
+
+import numpy as np
+import scipy.signal as sps
+
+import mtpy.processing.coherence as MTcoh
+import mtpy.processing.decimation as MTde
+import mtpy.processing.filter as MTfi
+import mtpy.processing.instrument as MTin
+import mtpy.processing.tf as MTtf
+#stand-ins for the pyrocko modules the pile needs
+import mtpy.test.pyrocko_stub
+import mtpy.processing.pile as MTpile
+import mtpy.processing.trace as MTtrace
+
+
+def _highpass_response(freqmin, freqmax, n_freq=60):
+    freqs = np.logspace(np.log10(freqmin), np.log10(freqmax), n_freq)
+    response = 1. / (1 + 1j * 0.5 / freqs)
+    return np.column_stack([freqs, response.real, response.imag])
+
+
+class TestInstrumentResponse(unittest.TestCase):
+
+    def setUp(self):
+        self.samplingrate = 100.
+        self.responsedata = _highpass_response(0.01, 50.)
+        self.data = np.random.RandomState(0).normal(size=100000)
+
+    def test_flat_response(self):
+        #constant gain of 2 in the response band halves the data
+        responsedata = self.responsedata.copy()
+        responsedata[:, 1] = 2.
+        responsedata[:, 2] = 0.
+        corrected = MTin.correct_for_instrument_response(self.data,
+                                                         self.samplingrate,
+                                                         responsedata)
+        self.assertEqual(corrected.shape, self.data.shape)
+        self.assertTrue(np.allclose(corrected[20000:-20000],
+                                    self.data[20000:-20000] / 2., atol=0.05))
+
+    def test_inverse_response_cached(self):
+        inv1 = MTin.get_inverse_response(1000, self.samplingrate,
+                                         self.responsedata)
+        inv2 = MTin.get_inverse_response(1000, self.samplingrate,
+                                         self.responsedata.copy())
+        self.assertTrue(inv1 is inv2)
+        self.assertEqual(len(inv1), 501)
+        self.assertEqual(inv1[0], 0)
+        self.assertAlmostEqual(inv1[100], 1 + 0.5j / 10., places=3)
+
+    def test_chunked_matches_full(self):
+        full = MTin.correct_for_instrument_response(self.data,
+                                                    self.samplingrate,
+                                                    self.responsedata)
+        chunked = MTin.correct_for_instrument_response_chunked(
+                                self.data, self.samplingrate,
+                                self.responsedata, chunk_length=30000,
+                                filter_length=2**15)
+        self.assertEqual(chunked.shape, self.data.shape)
+        interior = slice(30000, -30000)
+        self.assertTrue(np.abs(full[interior] - chunked[interior]).max() <
+                        0.1 * np.abs(full[interior]).max())
+
+    def test_next_fft_length(self):
+        self.assertEqual(MTin.next_fft_length(1000), 1000)
+        self.assertEqual(MTin.next_fft_length(1025), 1080)
+        self.assertEqual(MTin.next_fft_length(2**16), 2**16)
+
+
+class TestStft(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        time = np.arange(4096) / 256.
+        self.ex = np.sin(2 * np.pi * 20 * time) + 0.3 * rng.normal(size=4096)
+        self.hy = np.cos(2 * np.pi * 7 * time) + 0.3 * rng.normal(size=4096)
+
+    def test_windowed_fft_matches_single_windows(self):
+        window = np.hanning(100)
+        FX, tlst = MTtf.windowed_fft(self.ex, window, 30, 128, chunk_size=2**10)
+        self.assertEqual(FX.shape, (len(tlst), 64))
+        self.assertEqual(tlst[-1], 3990)
+        for idx_t in [0, 7, len(tlst) - 1]:
+            fxwin = self.ex[tlst[idx_t]:tlst[idx_t] + 100] * window
+            self.assertTrue(np.allclose(FX[idx_t],
+                                        np.fft.fft(fxwin, 128)[:64]))
+
+    def test_stft_multichannel(self):
+        tf_ex, tlst, flst = MTtf.stft(self.ex, nh=128, tstep=64, nfbins=256)
+        tf_hy = MTtf.stft(self.hy, nh=128, tstep=64, nfbins=256)[0]
+        tf_all = MTtf.stft(np.array([self.ex, self.hy]), nh=128, tstep=64,
+                           nfbins=256)[0]
+        self.assertEqual(tf_all.shape, (2,) + tf_ex.shape)
+        self.assertEqual(tf_ex.shape, (128, len(tlst)))
+        self.assertTrue(np.allclose(tf_all[0], tf_ex))
+        self.assertTrue(np.allclose(tf_all[1], tf_hy))
+
+
+class TestWvdTiles(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(2)
+        time = np.arange(600) / 100.
+        self.fx = np.sin(2 * np.pi * (5 + 3 * time) * time) + \
+                  0.3 * rng.normal(size=600)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_tiled_memmap_output(self):
+        for tf_function, kwargs in [(MTtf.wvd, dict(nh=63, tstep=8)),
+                                    (MTtf.spwvd, dict(nh=63, ng=15, tstep=16)),
+                                    (MTtf.robust_wvd, dict(nh=31, ng=7,
+                                                           tstep=32))]:
+            tf_full = tf_function(self.fx, nfbins=128, **kwargs)
+            tf_tiled = tf_function(self.fx, nfbins=128, ntile=5,
+                                   outfile=op.join(self.tmp_dir, 'tf.dat'),
+                                   **kwargs)
+            self.assertTrue(isinstance(tf_tiled[0], np.memmap))
+            self.assertTrue(np.allclose(tf_full[0], tf_tiled[0]))
+            self.assertTrue(np.array_equal(tf_full[1], tf_tiled[1]))
+            del tf_tiled
+
+    def test_window_longer_than_nfbins(self):
+        for tf_function in [MTtf.wvd, MTtf.stft]:
+            self.assertRaises(MTtf.MTexceptions.MTpyError_inputarguments,
+                              tf_function, self.fx, nh=63, nfbins=32)
+        self.assertEqual(MTtf.wvd(self.fx, nh=63, tstep=8, nfbins=63)[0].shape,
+                         (63, 75))
+
+
+class TestStfbss(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        time = np.arange(2000) / 100.
+        sources = np.array([np.sin(2 * np.pi * (3 + 2 * time) * time),
+                            np.sign(np.sin(2 * np.pi * 1.3 * time)),
+                            np.sin(2 * np.pi * 17 * time) *
+                            np.exp(-((time - 10) / 4.)**2)])
+        self.X = np.dot(rng.normal(size=(5, 3)), sources) + \
+                 0.05 * rng.normal(size=(5, 2000))
+
+    def test_pool_matches_serial(self):
+        kwargs = dict(nsources=3, ng=15, nh=63, tstep=32, nfbins=128,
+                      df=100., tftol=1e-3)
+        Se, Ae = MTtf.stfbss(self.X.copy(), **kwargs)
+        Se_pool, Ae_pool = MTtf.stfbss(self.X.copy(), n_processes=2, **kwargs)
+        self.assertEqual(Se.shape, (3, 2000))
+        self.assertTrue(np.allclose(Se, Se_pool))
+        self.assertTrue(np.allclose(Ae, Ae_pool))
+
+    def test_joint_diagonalization(self):
+        rng = np.random.RandomState(1)
+        Q = np.linalg.qr(rng.normal(size=(4, 4)))[0]
+        Rjd = np.array([np.dot(Q, np.dot(np.diag(rng.normal(size=4)), Q.T))
+                        for ii in range(6)])
+        V, updates = MTtf.joint_diagonalization(Rjd, tol=1e-12)
+        D = np.einsum('ji,kjl,lm->kim', V, Rjd, V)
+        offdiag = D - D * np.eye(4)
+        self.assertTrue(updates > 0)
+        self.assertTrue(np.abs(offdiag).max() < 1e-8)
+
+
+class TestDecimation(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(3)
+        self.data = rng.normal(size=(3, 64 * 100 + 5))
+
+    def test_stages(self):
+        self.assertEqual(MTde.decimation_stages(4096), [8, 8, 8, 8])
+        self.assertEqual(MTde.decimation_stages(1000), [8, 5, 5, 5])
+        self.assertRaises(MTde.MTex.MTpyError_inputarguments,
+                          MTde.decimation_stages, 22)
+
+    def test_single_stage_matches_lfilter(self):
+        stage = MTde.DecimationStage(5, 3)
+        padded = np.concatenate((self.data, np.zeros((3, stage.delay))),
+                                axis=1)
+        reference = sps.lfilter(stage.coefficients, 1, padded,
+                                axis=1)[:, stage.delay::5]
+        decimated = MTde.decimate(self.data, 5)
+        self.assertEqual(decimated.shape, (3, 1281))
+        self.assertTrue(np.allclose(decimated, reference[:, :1281]))
+
+    def test_chunked_matches_whole(self):
+        decimated = MTde.decimate(self.data, 64)
+        decimator = MTde.Decimator(64, 3)
+        lo_chunks = [decimator.process(self.data[:, idx:idx + 999])
+                     for idx in range(0, self.data.shape[1], 999)]
+        lo_chunks.append(decimator.flush())
+        chunked = np.concatenate(lo_chunks, axis=1)
+        self.assertTrue(np.allclose(decimated,
+                                    chunked[:, :decimated.shape[1]]))
+        self.assertTrue(np.allclose(MTde.decimate(self.data[1], 64),
+                                    decimated[1]))
+
+
+class TestCoherence(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(4)
+        source = rng.normal(size=20000)
+        self.data = np.array([source + 0.5 * rng.normal(size=20000),
+                              np.convolve(source, [0.5, 0.3, 0.2], 'same') +
+                              rng.normal(size=20000),
+                              rng.normal(size=20000)])
+
+    def test_matches_scipy(self):
+        freqs, coherence = MTcoh.coherence(self.data, 10., nperseg=256,
+                                           chunk_length=3001)
+        freqs_scipy, coherence_scipy = sps.coherence(self.data[0],
+                                                     self.data[1], fs=10.,
+                                                     nperseg=256)
+        self.assertTrue(np.allclose(freqs, freqs_scipy))
+        self.assertTrue(np.allclose(coherence[:, 0, 1], coherence_scipy))
+        self.assertTrue(np.allclose(coherence[:, 2, 2], 1.))
+
+    def test_windowed_csm(self):
+        freqs, starts, csm = MTcoh.windowed_csm(self.data, 10., 2560,
+                                                nperseg=256)
+        self.assertEqual(csm.shape, (7, 129, 3, 3))
+        spectra = MTcoh.CrossSpectra(3, 10., nperseg=256)
+        spectra.add(self.data[:, starts[2]:starts[3]])
+        self.assertTrue(np.allclose(csm[2], spectra.get_csm()))
+
+
+class TestNotchFilter(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(5)
+        time = np.arange(256 * 60) / 256.
+        powerline = sum(np.sin(2 * np.pi * 16 * k * time + k) / k
+                        for k in range(1, 5))
+        self.data = np.array([rng.normal(size=len(time)) + powerline,
+                              rng.normal(size=len(time)) + 0.5 * powerline])
+
+    def test_notch_all_channels(self):
+        notches = [16., 32., 48., 64.]
+        filtered, filtlst = MTfi.adaptive_notch_filter(self.data, df=256.,
+                                                       notches=notches)
+        self.assertEqual(filtered.shape, self.data.shape)
+        self.assertEqual([entry[0] for entry in filtlst], notches)
+        sos = MTfi.get_notch_sos(256., notches)
+        self.assertTrue(sos is MTfi.get_notch_sos(256., notches))
+        self.assertEqual(sos.shape, (4, 6))
+        for idx in range(2):
+            single = MTfi.adaptive_notch_filter(self.data[idx], df=256.,
+                                                notches=notches)[0]
+            self.assertTrue(np.allclose(single, filtered[idx]))
+        spectrum = abs(np.fft.rfft(filtered[0]))
+        self.assertTrue(spectrum[16 * 60] < 0.02 *
+                        abs(np.fft.rfft(self.data[0]))[16 * 60])
+
+    def test_short_record(self):
+        #frequency resolution of 2 Hz, coarser than the search radius
+        rng = np.random.RandomState(7)
+        time = np.arange(300) / 1024.
+        data = rng.normal(size=300) + 10 * np.sin(2 * np.pi * 60 * time)
+        filtered, filtlst = MTfi.adaptive_notch_filter(data, df=1024.,
+                                                       notches=[60.])
+        self.assertEqual(filtered.shape, data.shape)
+        self.assertEqual(len(filtlst), 1)
+
+    def test_edges_match_notch_by_notch(self):
+        #long enough for the cascade to be used in the interior
+        rng = np.random.RandomState(6)
+        time = np.arange(256 * 200) / 256.
+        data = rng.normal(size=(2, len(time))) + \
+               sum(np.sin(2 * np.pi * 16 * k * time) for k in range(1, 4))
+        notches = [16., 32., 48.]
+        #the filters as applied one after another by the former version
+        notch_by_notch = data.copy()
+        for notch in notches:
+            wp = 2 * np.array([notch - 1., notch + 1.]) / 256.
+            ws = 2 * np.array([notch - .5, notch + .5]) / 256.
+            ford, wn = sps.cheb1ord(wp, ws, 1, 40.)
+            b, a = sps.cheby1(1, .2, wn, btype='bandstop')
+            notch_by_notch = sps.filtfilt(b, a, notch_by_notch)
+
+        sos = MTfi.get_notch_sos(256., notches, rp=.2)
+        self.assertTrue(np.allclose(MTfi.notch_filtfilt(sos, data),
+                                    notch_by_notch, atol=1e-4))
+        self.assertFalse(np.allclose(sps.sosfiltfilt(sos, data, axis=-1), 
+                                     notch_by_notch, atol=1e-3))
+        filtered = MTfi.adaptive_notch_filter(data[0], df=256., 
+                                              notches=notches, rp=.2)[0]
+        self.assertTrue(np.allclose(filtered, notch_by_notch[0], atol=1e-4))
+
+    def test_streaming_matches_whole(self):
+        sos = MTfi.get_notch_sos(256., [16., 32.])
+        whole = sps.sosfiltfilt(sos, self.data, axis=-1)
+        notch = MTfi.StreamingNotchFilter(sos)
+        lo_chunks = [notch.process(self.data[:, idx:idx + 1000])
+                     for idx in range(0, self.data.shape[1], 1000)]
+        lo_chunks.append(notch.flush())
+        streamed = np.concatenate(lo_chunks, axis=-1)
+        self.assertEqual(streamed.shape, whole.shape)
+        self.assertTrue(np.allclose(streamed, whole, atol=1e-4))
+
+
+def _write_trace_file(fn, lo_header):
+    """
+    write a trace file of the format read by _load_trace_file, one line of
+    station, tmin, deltat and number of samples per trace
+    """
+
+    ofid = open(fn, 'w')
+    for header in lo_header:
+        ofid.write('{0} {1} {2} {3}\n'.format(*header))
+    ofid.close()
+
+
+def _load_trace_file(filename, format='mseed', getdata=True, 
+                     substitutions=None):
+    """
+    stand-in for mtpy.processing.io.load, the samples are tmin+sample index
+    """
+
+    if op.basename(filename).startswith('unreadable'):
+        raise MTpile.io.FileLoadError('cannot read file: '+filename)
+    if getdata and op.basename(filename).startswith('broken'):
+        raise MTpile.io.FileLoadError('cannot read data: '+filename)
+
+    mtime = os.stat(filename)[8]
+    lo_trace = []
+    for line in open(filename):
+        station, tmin, deltat, n_samples = line.split()
+        tmin, deltat, n_samples = float(tmin), float(deltat), int(n_samples)
+        ydata = None
+        if getdata:
+            ydata = tmin+np.arange(n_samples, dtype=np.float)
+        lo_trace.append(MTtrace.Trace('XX', station, '', 'Z', tmin=tmin, 
+                                      tmax=tmin+(n_samples-1)*deltat,
+                                      deltat=deltat, ydata=ydata, 
+                                      mtime=mtime))
+    return lo_trace
+
+
+class TestTracesFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        data_dir = op.join(self.tmp_dir, 'data')
+        os.mkdir(data_dir)
+        self.fns = [op.join(data_dir, 'f{0}'.format(ii)) for ii in range(3)]
+        for fn in self.fns:
+            open(fn, 'w').close()
+        self.cache_dir = op.join(self.tmp_dir, 'cache')
+
+        #high precision times, as used for deltat < 0.001
+        self.t0 = np.float128(1400000000)+np.float128(1)/3
+        self.lo_tfile = []
+        for ii, fn in enumerate(self.fns):
+            tmin = self.t0+100*ii
+            traces = [MTtrace.Trace('XX', 'S{0}'.format(jj), '', 'Z',
+                                    tmin=tmin, tmax=tmin+50, deltat=1e-4,
+                                    mtime=10., meta=({'gain':jj} if jj 
+                                                     else None))
+                      for jj in range(2)]
+            self.lo_tfile.append(MTpile.TracesFile(None, fn, 'mseed', 
+                                                   mtime=10., traces=traces))
+
+        cache = MTpile.TracesFileCache(self.cache_dir)
+        for tfile in self.lo_tfile:
+            cache.put(tfile.abspath, tfile)
+        cache.dump_modified()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_roundtrip(self):
+        cache = MTpile.TracesFileCache(self.cache_dir)
+        for tfile in self.lo_tfile:
+            cached = cache.get(tfile.abspath)
+            self.assertEqual(cached.mtime, 10.)
+            self.assertEqual(len(cached.traces), 2)
+            for tr, tr_cached in zip(tfile.traces, cached.traces):
+                self.assertTrue(isinstance(tr_cached.tmin, np.float128))
+                self.assertEqual(tr_cached.tmin, tr.tmin)
+                self.assertEqual(tr_cached.tmax, tr.tmax)
+                self.assertEqual(tr_cached.nslc_id, tr.nslc_id)
+                self.assertEqual(tr_cached.meta, tr.meta)
+                self.assertTrue(tr_cached.file is cached)
+        self.assertTrue(cache.get(self.fns[0]+'x') is None)
+
+    def test_query(self):
+        cache = MTpile.TracesFileCache(self.cache_dir)
+        t0 = float(self.t0)
+        self.assertEqual(cache.query(), sorted(self.fns))
+        self.assertEqual(cache.query(t0+120, t0+160), [self.fns[1]])
+        self.assertEqual(cache.query(tmin=t0+160), [self.fns[2]])
+        self.assertEqual(cache.query(tmax=t0+160), self.fns[0:2])
+        self.assertEqual(cache.query(nslc_id=('XX', 'S1', '', 'Z')), 
+                         sorted(self.fns))
+        self.assertEqual(cache.query(nslc_id=('XX', 'S5', '', 'Z')), [])
+
+    def test_clean(self):
+        #file of the former pickle format
+        open(op.join(self.cache_dir, '12345'), 'w').close()
+        os.remove(self.fns[0])
+
+        #missing files are skipped when read, but stay in the database
+        cache = MTpile.TracesFileCache(self.cache_dir)
+        self.assertTrue(cache.get(self.fns[0]) is None)
+        self.assertEqual(cache.query(), sorted(self.fns))
+
+        cache.clean()
+        self.assertEqual(cache.query(), self.fns[1:])
+        self.assertEqual(os.listdir(self.cache_dir), ['traces.sqlite'])
+        cache = MTpile.TracesFileCache(self.cache_dir)
+        self.assertTrue(cache.get(self.fns[1]) is not None)
+
+
+class TestTimeIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        tmins = np.sort(rng.uniform(0, 1000., 500))
+        #mostly short traces and a few long ones
+        tlens = rng.exponential(5., 500)
+        tlens[rng.randint(0, 500, 5)] = 300.
+        self.traces = [MTtrace.Trace('XX', 'S', '', 'Z', tmin=tmin, 
+                                     tmax=tmin+tlen, deltat=1.)
+                       for tmin, tlen in zip(tmins, tlens)]
+        self.index = MTpile.TimeIndex(self.traces)
+        self.windows = [(-10., -5.), (-10., 0.), (1200., 1300.), (0., 1000.)]
+        self.windows.extend(sorted(rng.uniform(-50., 1100., 2)) 
+                            for ii in range(200))
+
+    def test_overlapping(self):
+        self.assertEqual(len(self.index), 500)
+        for tmin, tmax in self.windows:
+            brute_force = [tr for tr in self.traces 
+                           if tr.tmin <= tmax and tr.tmax >= tmin]
+            self.assertEqual(self.index.overlapping(tmin, tmax), brute_force)
+
+    def test_empty(self):
+        index = MTpile.TimeIndex([])
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.overlapping(0., 1.), [])
+
+
+class TestChopper(unittest.TestCase):
+
+    def setUp(self):
+        self.io_load = MTpile.io.load
+        MTpile.io.load = _load_trace_file
+
+        #3 stations, 6 files of 100 s each
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fns = []
+        for ii in range(6):
+            fn = op.join(self.tmp_dir, 'f{0}'.format(ii))
+            _write_trace_file(fn, [('S{0}'.format(jj), 100.*ii+jj, 1., 100)
+                                   for jj in range(3)])
+            self.fns.append(fn)
+
+        self.pile = MTpile.Pile()
+        self.pile.load_files(self.fns, cache=None, show_progress=False)
+
+    def tearDown(self):
+        MTpile.io.load = self.io_load
+        shutil.rmtree(self.tmp_dir)
+
+    def _windows(self, **kwargs):
+        return [[(tr.nslc_id, tr.tmin, tr.wmin, list(tr.ydata)) 
+                 for tr in traces]
+                for traces in self.pile.chopper(tmin=0., tmax=600., 
+                                                tinc=70., **kwargs)]
+
+    def _files(self):
+        return list(self.pile.iter_files())
+
+    def test_readahead(self):
+        windows = self._windows()
+        self.assertEqual(len(windows), 9)
+        self.assertEqual(windows[0][0][3], list(np.arange(70.)))
+        self.assertEqual(self._windows(readahead=1), windows)
+        self.assertEqual(self._windows(readahead=3, nthreads=3), windows)
+        self.assertEqual(self._windows(readahead=3, tpad=5.), 
+                         self._windows(tpad=5.))
+        for tfile in self._files():
+            self.assertFalse(tfile.data_loaded)
+
+    def test_data_budget(self):
+        #all files fit into the budget and are retained
+        self.pile.set_data_budget(10**6)
+        windows = self._windows(readahead=2)
+        self.assertEqual(len(self.pile.retained_files), 6)
+        self.assertEqual(self.pile.retained_nbytes, 6*3*100*8)
+        for tfile in self._files():
+            self.assertTrue(tfile.data_loaded)
+        self.assertEqual(self._windows(), windows)
+
+        #only the most recently used files
+        self.pile.set_data_budget(2*3*100*8)
+        self.assertEqual(self.pile.retained_files.keys(), 
+                         [tfile for tfile in self._files() 
+                          if tfile.abspath in self.fns[4:]])
+        
+        self.pile.set_data_budget(0)
+        self.assertEqual(len(self.pile.retained_files), 0)
+        self.assertEqual(self.pile.retained_nbytes, 0)
+        for tfile in self._files():
+            self.assertFalse(tfile.data_loaded)
+        
+        self.assertEqual(self._windows(readahead=2), windows)
+        self.assertEqual(self.pile.retained_nbytes, 0)
+        for tfile in self._files():
+            self.assertFalse(tfile.data_loaded)
+
+    def test_readahead_error(self):
+        fn = op.join(self.tmp_dir, 'broken')
+        _write_trace_file(fn, [('S0', 350., 1., 100)])
+        self.pile.load_files([fn], cache=None, show_progress=False)
+        n_threads = threading.active_count()
+
+        chopper = self.pile.chopper(tmin=0., tmax=600., tinc=70., 
+                                    readahead=3)
+        self.assertEqual(len(chopper.next()), 3)
+        self.assertRaises(MTpile.io.FileLoadError, list, chopper)
+        self.assertEqual(threading.active_count(), n_threads)
+
+        #stopped before the end
+        chopper = self.pile.chopper(tmin=0., tmax=600., tinc=70., 
+                                    readahead=3)
+        chopper.next()
+        chopper.close()
+        self.assertEqual(threading.active_count(), n_threads)
+
+
+def _query_cache(cache, queue):
+    queue.put(cache.query())
+
+
+class TestLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.io_load = MTpile.io.load
+        MTpile.io.load = _load_trace_file
+
+        self.tmp_dir = tempfile.mkdtemp()
+        data_dir = op.join(self.tmp_dir, 'data')
+        os.mkdir(data_dir)
+        self.fns = []
+        for ii in range(10):
+            fn = op.join(data_dir, 'f{0}'.format(ii))
+            _write_trace_file(fn, [('S{0}'.format(jj), 100.*ii, 0.5, 20*ii+1)
+                                   for jj in range(ii%3+1)])
+            self.fns.append(fn)
+        fn = op.join(data_dir, 'unreadable')
+        _write_trace_file(fn, [('S0', 0., 1., 10)])
+        self.fns.insert(4, fn)
+        self.cache_dir = op.join(self.tmp_dir, 'cache')
+
+    def tearDown(self):
+        MTpile.io.load = self.io_load
+        shutil.rmtree(self.tmp_dir)
+
+    def _load(self, cache=None, n_processes=1):
+        return [(tfile.abspath, tfile.mtime, tfile.format,
+                 [(tr.nslc_id, tr.tmin, tr.tmax, tr.deltat, tr.mtime,
+                   tr.file is tfile) for tr in tfile.traces])
+                for tfile in MTpile.loader(self.fns, 'mseed', cache, None,
+                                           show_progress=False,
+                                           n_processes=n_processes)]
+
+    def test_pool(self):
+        lo_serial = self._load()
+        self.assertEqual(len(lo_serial), 10)
+        self.assertEqual(sorted(tfile[0] for tfile in lo_serial),
+                         sorted(fn for fn in self.fns 
+                                if not fn.endswith('unreadable')))
+        self.assertEqual(self._load(n_processes=3), lo_serial)
+        self.assertEqual(self._load(n_processes=None), lo_serial)
+
+    def test_pool_cache(self):
+        lo_serial = self._load()
+
+        #connection of the parent open before the pool forks
+        cache = MTpile.TracesFileCache(self.cache_dir)
+        self.assertEqual(cache.query(), [])
+        self.assertEqual(self._load(cache, n_processes=3), lo_serial)
+        lo_fn = cache.query()
+        self.assertEqual(len(lo_fn), 10)
+
+        #read from the cache
+        cache = MTpile.TracesFileCache(self.cache_dir)
+        self.assertEqual(self._load(cache), lo_serial)
+
+        #a child process opens its own connection
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_query_cache,
+                                          args=(cache, queue))
+        process.start()
+        self.assertEqual(queue.get(timeout=60), lo_fn)
+        process.join()
+        self.assertEqual(cache.query(), lo_fn)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+Minimal stand-ins for the pyrocko modules needed to import
+mtpy.processing.trace and mtpy.processing.pile (util, config, avl, evalresp,
+need_python_2_5.trace and pyrocko.model/orthodrome), for the tests and the
+benchmark of the pile.
+
+Importing this module installs a stand-in for each of these modules which
+cannot be imported.  The stand-ins provide only what the pile uses, avl is
+a sorted list with the same interface as the AVL tree.
+
+"""
+
+import sys
+import os
+import types
+import tempfile
+
+import numpy as np
+
+
+def _missing(name):
+    """
+    True if neither mtpy.processing.name nor the top level module name can
+    be imported, as the pile imports them relative to mtpy.processing
+    """
+
+    for module_name in ['mtpy.processing.'+name, name]:
+        try:
+            __import__(module_name)
+            return False
+        except ImportError:
+            pass
+    return True
+
+def _install(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules[name] = module
+    return module
+
+def ensuredir(dirname):
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+def plural_s(n):
+    if n == 1:
+        return ''
+    return 's'
+
+def time_to_str(t, format=None):
+    return '%.6f' % float(t)
+
+class ProgressBar(object):
+    def __init__(self, label, n):
+        pass
+
+    def update(self, i):
+        pass
+
+    def finish(self):
+        pass
+
+class SortedList(object):
+    """
+    list kept sorted by a compare function, with the interface of the
+    avl tree used by mtpy.processing.pile.Sorted
+    """
+
+    def __init__(self, values=(), cmp=cmp):
+        self._cmp = cmp
+        self._values = sorted(values, cmp=cmp)
+
+    def _bisect(self, value, right):
+        lo, hi = 0, len(self._values)
+        while lo < hi:
+            mid = (lo+hi)//2
+            c = self._cmp(self._values[mid], value)
+            if c < 0 or (right and c == 0):
+                lo = mid+1
+            else:
+                hi = mid
+        return lo
+
+    def insert(self, value):
+        self._values.insert(self._bisect(value, True), value)
+
+    def remove_at(self, index):
+        del self._values[index]
+
+    def span(self, lo, hi=None):
+        if hi is None:
+            hi = lo
+        return self._bisect(lo, False), self._bisect(hi, True)
+
+    def min(self):
+        return self._values[0]
+
+    def max(self):
+        return self._values[-1]
+
+    def iter(self):
+        return iter(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+    def __getslice__(self, ilo, ihi):
+        return self._values[ilo:ihi]
+
+    def __len__(self):
+        return len(self._values)
+
+def avl_new(values=(), cmp=cmp):
+    return SortedList(values, cmp)
+
+def avl_from_iter(iterable, n, cmp=cmp):
+    return SortedList(list(iterable), cmp)
+
+class States(object):
+    """
+    stand-in for pyrocko.trace.States, keeps a state per trace
+    """
+
+    def __init__(self):
+        self._states = {}
+
+    def get(self, tr):
+        return self._states.get(tr.nslc_id, (None, None))[-1]
+
+    def set(self, tr, value):
+        self._states[tr.nslc_id] = (tr, value)
+
+
+if _missing('util'):
+    _install('mtpy.processing.util', ensuredir=ensuredir,
+             reuse=lambda x: x, hpfloat=np.float128, plural_s=plural_s,
+             time_to_str=time_to_str, progressbar=ProgressBar)
+if _missing('config'):
+    _install('mtpy.processing.config',
+             cache_dir=os.path.join(tempfile.gettempdir(), 'mtpy_pile_cache'))
+if _missing('avl'):
+    _install('mtpy.processing.avl', new=avl_new, from_iter=avl_from_iter)
+if _missing('evalresp'):
+    _install('mtpy.processing.evalresp')
+if _missing('need_python_2_5.trace'):
+    _install('mtpy.processing.need_python_2_5', __path__=[],
+             trace=_install('mtpy.processing.need_python_2_5.trace',
+                            States=States, __all__=['States']))
+if _missing('pyrocko.model'):
+    _install('pyrocko', model=_install('pyrocko.model'),
+             orthodrome=_install('pyrocko.orthodrome'))
@@ -0,0 +1,244 @@
+import unittest
+import sys
+import types
+import time
+import calendar
+import os.path as op
+import shutil
+import tempfile
+
+import numpy as np
+
+#zen imports win32api for the sd card tools only
+try:
+    import win32api
+except ImportError:
+    sys.modules['win32api'] = types.ModuleType('win32api')
+
+import mtpy.usgs.zen as MTzen
+
+
+_stamp_dtype = np.dtype([('gps', '<i4'), ('time', '<i4'), ('lat', '<f8'),
+                         ('lon', '<f8'), ('status', '<u4'),
+                         ('gps_accuracy', '<i4'), ('temperature', '<f4')])
+
+
+def _write_z3d(fn, df=16, n_blocks=12, t0=100000, seed=0, ch_cmp='ex'):
+    """
+    write a synthetic Z3D file: 512 bytes header, 512 bytes meta data, a few
+    bytes of junk and n_blocks of gps stamp + df int32 samples.  Returns the
+    samples and the locations of the gps stamps.
+    """
+
+    rng = np.random.RandomState(seed)
+    #schedule time is gps time, the first stamp is the scheduled start
+    start = calendar.timegm((1980, 1, 6, 0, 0, 0, 0, 0, 0))+1740*604800+t0
+    sched = time.strftime('%Y-%m-%d,%H:%M:%S', time.gmtime(start)).split(',')
+    header = ('a/d rate:{0}\na/d gain:1\ngpsweek:1740\n'
+              'schedule for this file:{1}\n{2}\nserial:0x01\n').format(
+              df, sched[0], sched[1])
+    meta = ('|ch.number,1|ch.cmp,{0}|ch.varasp,100|rx.stn,5|tx.id,none|'
+            '\n').format(ch_cmp)
+    lo_str = [header.ljust(512, '\x00'), meta.ljust(512, '\x00'),
+              rng.randint(0, 100, 3).astype('<i4').tostring()]
+
+    samples = rng.randint(-2**20, 2**20, (n_blocks, df)).astype('<i4')
+    #-1 is '\xff\xff\xff\xff' and looks like a gps stamp
+    samples[4, 3] = -1
+    samples[7, 8:10] = -1
+    #not exact as np.float32
+    samples[2, 5] = 2**30+1
+    stamps = np.zeros(n_blocks, dtype=_stamp_dtype)
+    stamps['gps'] = -1
+    stamps['time'] = (t0+np.arange(n_blocks))*1024
+    stamps['lat'] = 0.7
+    stamps['lon'] = -2.
+    stamps['status'] = 1
+    stamps['temperature'] = 20.
+    for bb in range(n_blocks):
+        lo_str.append(stamps[bb:bb+1].tostring()+samples[bb].tostring())
+
+    ofid = open(fn, 'wb')
+    ofid.write(''.join(lo_str))
+    ofid.close()
+
+    gps_lst = 1024+12+np.arange(n_blocks)*(_stamp_dtype.itemsize+df*4)
+    return samples.ravel(), gps_lst
+
+
+def _scan_gps_stamps(raw_data, start_index):
+    """
+    sequential search for gps stamps as done by the string based reader
+    """
+
+    lo_index = []
+    gps_index = raw_data.find('\xff'*4, start_index)
+    while gps_index != -1:
+        for kk in range(4):
+            if raw_data[gps_index+4:gps_index+5] == '\xff':
+                gps_index += 1
+        lo_index.append(gps_index)
+        gps_index = raw_data.find('\xff'*4, gps_index+7)
+
+    return np.array(lo_index)
+
+
+class TestZen3D(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fn = op.join(self.tmp_dir, 'test.Z3D')
+        self.samples, self.gps_lst = _write_z3d(self.fn)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_gps_stamp_locations(self):
+        zt = MTzen.Zen3D(self.fn)
+        zt.verbose = False
+        zt.read_3d(load_data=False)
+
+        raw_data = open(self.fn, 'rb').read()
+        scan = _scan_gps_stamps(raw_data, 1024)
+        self.assertTrue(np.array_equal(zt.get_gps_stamp_locations(), scan))
+        self.assertTrue(np.array_equal(
+                        zt.get_gps_stamp_locations(chunk_size=50), scan))
+
+        #the runs of '\xff' in the data are dropped
+        self.assertEqual(len(scan), len(self.gps_lst)+2)
+        self.assertTrue(np.array_equal(zt.gps_lst, self.gps_lst))
+        self.assertTrue(np.allclose(zt.gps_time, 100000+np.arange(12)))
+        self.assertTrue(zt.time_series is None)
+        self.assertEqual(zt.start_dt, zt.date_time[0])
+
+    def test_samples(self):
+        zt = MTzen.Zen3D(self.fn)
+        zt.verbose = False
+        zt.read_3d()
+        #the last stamp has no following stamp
+        n_samples = 11*16
+        samples = self.samples[:n_samples]
+        self.assertTrue(np.array_equal(zt.ts_blocks.ravel(), samples))
+        #time_series is np.float32
+        self.assertTrue(np.array_equal(zt.time_series,
+                                       samples.astype(np.float32)))
+        self.assertTrue(np.array_equal(
+                        np.concatenate([ts for date_time, ts in
+                                        zt.iter_time_series(n_blocks=4)]),
+                        samples.astype(np.float32)))
+
+
+class TestZenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.fn_lst = [op.join(self.tmp_dir, 'test_ex.Z3D'),
+                       op.join(self.tmp_dir, 'test_hy.Z3D')]
+        #hy starts one second later
+        self.ex, gps_lst = _write_z3d(self.fn_lst[0], df=256, n_blocks=8)
+        self.hy, gps_lst = _write_z3d(self.fn_lst[1], df=256, n_blocks=8,
+                                      t0=100001, seed=1, ch_cmp='hy')
+        self.cache_fn = op.join(self.tmp_dir, 'test.cac')
+
+        self.zc = MTzen.ZenCache()
+        self.zc.verbose = False
+        self.zc.write_cache_file(self.fn_lst, self.cache_fn)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get_samples(self):
+        zt = self.zc.zt_lst[1]
+        self.assertTrue(zt.time_series is None)
+        self.assertTrue(np.array_equal(zt.get_samples(20, 500, gps_index=1),
+                                       self.ex[276:756]))
+        self.assertEqual(len(zt.get_samples(1700, 3000)), 7*256-1700)
+
+    def test_write_read(self):
+        zc = MTzen.ZenCache()
+        zc.read_cache(self.cache_fn)
+        #channels in the order hy, ex, both start at the start of hy
+        ts_len = 6*256
+        self.assertEqual(zc.ts.shape, (ts_len, 2))
+        self.assertTrue(np.array_equal(zc.ts[:, 0], self.hy[:ts_len]))
+        self.assertTrue(np.array_equal(zc.ts[:, 1],
+                                       self.ex[256:256+ts_len]))
+        self.assertEqual(zc.meta_data['CH.CMP'], ['HY', 'EX'])
+        self.assertEqual(zc.meta_data['TS.NPNT'], [str(ts_len)])
+        self.assertEqual(zc.meta_data['DATA.TIME0'],
+                         [self.zc.zt_lst[0].date_time[0].split(',')[1]])
+
+        zc.rewrite_cache_file()
+        zc_rw = MTzen.ZenCache()
+        zc_rw.read_cache(zc.save_fn_rw)
+        self.assertTrue(np.array_equal(zc_rw.ts, zc.ts))
+        self.assertEqual(zc_rw.meta_data, zc.meta_data)
+
+    def test_metadata_stripped(self):
+        zc = MTzen.ZenCache()
+        zc.read_cache(self.cache_fn)
+        date0 = zc.meta_data['DATA.DATE0'][0]
+        #padded and carriage return terminated values
+        zc.meta_data['TS.ADFREQ'] = [' 256 \r']
+        zc.meta_data['DATA.DATE0'] = [' '+date0+'\r']
+        zc.meta_data['CH.CMP'] = [' HY', 'EX \r']
+        zc.rewrite_cache_file()
+
+        zc_meta = MTzen.ZenCache()
+        zc_meta.read_cache_metadata(zc.save_fn_rw)
+        self.assertEqual(zc_meta.meta_data['TS.ADFREQ'], ['256'])
+        self.assertEqual(zc_meta.meta_data['DATA.DATE0'], [date0])
+        self.assertEqual(zc_meta.meta_data['CH.CMP'], ['HY', 'EX'])
+
+        #read_cache keeps the values as written
+        zc_rw = MTzen.ZenCache()
+        zc_rw.read_cache(zc.save_fn_rw)
+        self.assertEqual(zc_rw.meta_data['TS.ADFREQ'], [' 256 \r'])
+        self.assertEqual(zc_rw.meta_data['CH.CMP'], [' HY', 'EX \r'])
+        self.assertTrue(np.array_equal(zc_rw.ts, zc.ts))
+
+    def test_cache_blocks(self):
+        cfid = open(self.cache_fn, 'rb')
+        block_dict = self.zc._read_cache_blocks(cfid, ['nav', 'meta'])
+        self.assertEqual(sorted(block_dict.keys()), ['meta', 'nav'])
+        block_dict = self.zc._read_cache_blocks(cfid, ['ts'])
+        cfid.close()
+        self.assertEqual(block_dict['nav'], (10, 41))
+        self.assertEqual(block_dict['meta'][0], 10+41+4+10)
+        ii, nn = block_dict['ts']
+        self.assertEqual(nn, 6*256*2*4)
+        self.assertEqual(ii+nn+4, op.getsize(self.cache_fn))
+
+        #damaged length at the end of the time series block
+        cfid = open(self.cache_fn, 'r+b')
+        cfid.seek(ii+nn)
+        cfid.write('\x00'*4)
+        cfid.close()
+        self.assertRaises(MTzen.CacheTimeSeriesError, self.zc.read_cache,
+                          self.cache_fn)
+        self.zc.read_cache_metadata(self.cache_fn)
+        self.assertEqual(self.zc.meta_data['TS.ADFREQ'], ['256'])
+
+    def test_time_window(self):
+        zc = MTzen.ZenCache()
+        zc.read_cache(self.cache_fn)
+        ts = np.array(zc.ts)
+        date0 = zc.meta_data['DATA.DATE0'][0]
+        time0 = zc.meta_data['DATA.TIME0'][0]
+        t0 = calendar.timegm(time.strptime(date0+','+time0,
+                                           MTzen.datetime_fmt))
+        start_dt, end_dt = [time.strftime(MTzen.datetime_fmt,
+                                          time.gmtime(t0+dt))
+                            for dt in [2, 4]]
+
+        zc.read_cache(self.cache_fn, start_dt=start_dt, end_dt=end_dt)
+        self.assertTrue(np.array_equal(zc.ts, ts[512:1024]))
+        zc.read_cache(self.cache_fn, start_dt=start_dt)
+        self.assertTrue(np.array_equal(zc.ts, ts[512:]))
+        zc.read_cache(self.cache_fn, end_dt=time.strftime(
+                                MTzen.datetime_fmt, time.gmtime(t0+100)))
+        self.assertTrue(np.array_equal(zc.ts, ts))
+
+
+if __name__ == '__main__':
+    unittest.main()
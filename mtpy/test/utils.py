@@ -1,8 +1,12 @@
 import unittest
 from mtpy.utils import *
 import tempfile
+import shutil
+import os.path as op
 import numpy as np
 
+import mtpy.utils.filehandling as MTfh
+
 class TestFilehandling(unittest.TestCase):
 
     def setUp(self):
@@ -74,5 +78,44 @@ class TestFilehandling(unittest.TestCase):
 
 
 
+class TestBinaryTsFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.data = np.random.RandomState(0).normal(size=1000)
+        self.ts_tuple = ('STA', 'ex', 500., 1380000000.5, len(self.data),
+                         'counts', -30.1, 140.2, 100., self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_ascii2binary(self):
+        asciifile = MTfh.write_ts_file_from_tuple(
+                                op.join(self.tmp_dir, 'STA.ex'), self.ts_tuple)
+        binaryfile = MTfh.convert_ts_file_ascii2binary(asciifile)
+
+        self.assertTrue(MTfh.is_binary_ts_file(binaryfile))
+        self.assertFalse(MTfh.is_binary_ts_file(asciifile))
+        self.assertEqual(MTfh.read_ts_header(binaryfile),
+                         MTfh.read_ts_header(asciifile))
+
+        ascii_tuple = MTfh.read_ts_file(asciifile)
+        binary_tuple = MTfh.read_ts_file(binaryfile)
+        self.assertEqual(ascii_tuple[:-1], binary_tuple[:-1])
+        self.assertTrue(isinstance(binary_tuple[-1], np.memmap))
+        self.assertTrue(np.array_equal(ascii_tuple[-1], binary_tuple[-1]))
+        self.assertTrue(MTfh.validate_ts_file(binaryfile))
+
+    def test_binary_columns(self):
+        data = np.arange(10).reshape(5, 2)
+        binaryfile = MTfh.write_ts_file_binary(op.join(self.tmp_dir, 'STA.bx'),
+                                               self.ts_tuple[:-1] + (data,),
+                                               dtype=np.int32)
+        ts_tuple = MTfh.read_ts_file_binary(binaryfile, mmap_mode=None)
+        self.assertEqual(ts_tuple[4], 5)
+        self.assertEqual(ts_tuple[-1].dtype, np.dtype('<i4'))
+        self.assertTrue(np.array_equal(ts_tuple[-1], data))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -23,6 +23,7 @@ import datetime
 import os
 import struct
 import string
+import calendar
 import win32api
 import shutil
 from collections import Counter
@@ -69,6 +70,15 @@ class Zen3D(object):
                            computer is busy switchin sampling rate.
                      
     get_gps_stamp_location locates the gps stamp location
+    
+    get_gps_stamps         locates and reads all gps stamps of the file in 
+                           one vectorized pass over the memory mapped file
+                           
+    get_ts_blocks          zero-copy view of the data blocks between the 
+                           gps stamps
+                           
+    iter_time_series       iterates over the time series in chunks of 
+                           seconds, for files larger than memory
         
     get_gps_time           converts the gps counts to relative epoch seconds
                            according to gps week.      
@@ -102,6 +112,8 @@ class Zen3D(object):
     temperature         np.ndarray of temperature measurements at each time 
                         stamp
     time_series         np.ndarray of time series data in counts
+    ts_blocks           np.ndarray((n_blocks, df)) zero-copy view of the data
+                        blocks in counts, None if blocks are not complete
     tx_id               name of transmitter if used
     units               [ 'counts' | 'mv' ] units of time series *default* is
                         counts. Plotting will convert to mV. 
@@ -114,7 +126,7 @@ class Zen3D(object):
     _gps_stamp          string of gps_stamp 
     _header_len         length of header string in bytes. (512)
     _meta_len           length of meta data in bytes. (512)
-    _raw_data           data in binary format
+    _raw_data           data in binary format (np.memmap of the file)
     _seconds_diff       difference in seconds from start time to look for 
                          gps stamp. *default* is 5
     _stamp_len          length of gps time stamp in bits
@@ -178,6 +190,8 @@ class Zen3D(object):
         self.gps_diff = None
         self.gps_time = None
         self.gps_lst = None
+        self.ts_blocks = None
+        self._gps_locations = None
         self.temperature = None
         self.lat = None
         self.lon = None
@@ -325,7 +339,7 @@ class Zen3D(object):
         
         
     
-    def read_3d(self):
+    def read_3d(self, load_data=True):
         """
         read in the time series and gps time stamps.
         
@@ -337,11 +351,24 @@ class Zen3D(object):
         time stamp has the correct number of points, and stops where the first
         incorrect number of points occurs.  A corresponding time,date array
         is created.
+        
+        The file is opened as a np.memmap and all gps stamps are located in 
+        one vectorized pass (see get_gps_stamps), nothing is read into a 
+        string.
+        
+        Arguments:
+        ----------
+            **load_data**: [ True | False ]
+                           if False only the gps stamps are read and 
+                           time_series is not filled, the data can then be 
+                           accessed by ts_blocks or iter_time_series without
+                           loading the whole file into memory.
+                           *default* is True
 
         """
-        #read in as a binary file.
-        raw_data = open(self.fn, 'rb').read()
-        self._raw_data = raw_data
+        #open as memory map, the data are only read from disk when needed
+        self._raw_data = np.memmap(self.fn, dtype=np.uint8, mode='r')
+        self._gps_locations = None
         
         try:
             self.log_lines[0] != '-'*72+'\n'
@@ -349,21 +376,17 @@ class Zen3D(object):
             self.log_lines.append('-'*72+'\n')
             self.log_lines.append('--> Reading File: {0}\n'.format(self.fn))
         
-        #number of bytes in the file
-        num_bytes = len(raw_data)
-        
         #beginning index of data blocks
         ds = self._header_len+self._meta_len
         
         #----read in header information----------------------------------------
-        header_string = raw_data[0:self._header_len]
+        header_string = self._raw_data[0:self._header_len].tostring()
         self.read_header(header_string)
         
         #---read in meta raw_data----------------------------------------------
-        meta_string = raw_data[self._header_len-1:ds]
+        meta_string = self._raw_data[self._header_len-1:ds].tostring()
         self.read_metadata(meta_string)
         
-                
         #---read in gps raw_data-----------------------------------------------
         #sampling rate times 4 bytes for 32 bit measurement
         df = int(self.df)      
@@ -372,94 +395,51 @@ class Zen3D(object):
         #length of data block plus gps stamp
         block_len = self._stamp_len+dt
         
-        #number of data blocks
-        num_blocks = int(np.ceil(num_bytes/float(block_len)))
-        
-        #get position of gps stamps
-        gps_lst = np.zeros(num_blocks, dtype=np.int)
-        
-        gps_dict = dict([(key, np.zeros(num_blocks, dtype=dtp)) 
-                          for key, dtp in zip(self._stamp_lst, 
-                                              self._data_types)])
-        #make the time array floats instead of ints so can get the decimal 
-        #place if it isn't 0.
-        gps_dict['time'] = gps_dict['time'].astype(np.float32)
-        
-        #get gps information from the data
-        #get first time stamp that matches the starting time
-        s1 = 0
-        gps_lst[0] = self.get_gps_stamp_location()
-        gps_info = np.fromstring(raw_data[gps_lst[0]:gps_lst[0]+self._stamp_len], 
-                                 dtype=self._data_type)
-        gps_info['time'] = gps_info['time'].astype(np.float32)
-        gps_info['time'] = self.get_gps_time(gps_info['time'])
-        start_test = self.get_date_time(self.gps_week, gps_info['time'])
-        
-        #--> test to make sure the first time corresponds to the scheduled 
-        #start time
-        time_stop = 0
-        while start_test != self.start_dt and s1 <= self._seconds_diff and \
-                time_stop <= self._seconds_diff:
-            s1 += 1
-            gps_lst[0] = self.get_gps_stamp_location(gps_lst[0]+7)
-            gps_info = np.fromstring(raw_data[gps_lst[0]:gps_lst[0]+\
-                                                self._stamp_len], 
-                                     dtype=self._data_type)
-                                     
-            gps_info['time'] = gps_info['time'].astype(np.float32)
-            gps_info['time'], gps_dweek = self.get_gps_time(gps_info['time'])
-            start_test = self.get_date_time(self.gps_week+gps_dweek, 
-                                            gps_info['time'])
-            if s1 == self._seconds_diff:
-                s1 = 0
-                self.start_dt = self.start_dt[:-2]+\
-                                 '{0:02}'.format(int(self.start_dt[-2:])+1)
-                gps_lst[0] = self.get_gps_stamp_location()
-                time_stop += 1  
+        #get position and information of all gps stamps
+        gps_lst, gps_dict = self.get_gps_stamps()
+        if len(gps_lst) == 0:
+            raise ZenGPSError('No gps stamps found in {0}'.format(self.fn))
+        
+        date_time = self.get_date_time(self.gps_week+gps_dict['gps_week'], 
+                                       gps_dict['time'])
+        
+        #--> find the first time stamp that corresponds to the scheduled 
+        #    start time, allowing for up to _seconds_diff seconds later
+        s1 = None
+        start_seconds = calendar.timegm(time.strptime(self.start_dt, 
+                                                      datetime_fmt))
+        for time_stop in range(self._seconds_diff+1):
+            start_test = time.strftime(datetime_fmt, 
+                                       time.gmtime(start_seconds+time_stop))
+            s_find = np.where(date_time[0:self._seconds_diff+1] == 
+                                                            start_test)[0]
+            if len(s_find) > 0:
+                s1 = s_find[0]
+                break
        
-       #----Raise an error if the first gps stamp is more than allowed time
+        #----Raise an error if the first gps stamp is more than allowed time
         #    difference.
-        if time_stop >= self._seconds_diff:
-#            raise ZenGPSError('GPS start time is more than '+\
-#                           '{0} '.format(self._seconds_diff)+\
-#                           'seconds different than scheduled start time of '+\
-#                           '{0}. \n '.format(self.start_dt)+\
-#                           'Estimated start time is {0} +/- {1} sec'.format(
-#                           start_test, self._seconds_diff))
+        if s1 is None:
+            s1 = 0
             print ('GPS start time is more than '+\
                            '{0} '.format(self._seconds_diff)+\
                            'seconds different than scheduled start time of '+\
                            '{0}. \n '.format(self.start_dt)+\
                            'Estimated start time is {0} +/- {1} sec'.format(
-                           start_test, self._seconds_diff))
-                     
-        #put the information into the correct arrays via dictionary                         
-        for jj, key in enumerate(self._stamp_lst):
-            gps_dict[key][0] = gps_info[0][jj]
-  
-        #find the next time stamp
-        for ii in range(s1,num_blocks-1):
-            sfind = self.get_gps_stamp_location(gps_lst[ii-1]+7)
-            #make sure it isn't the same time stamp as before
-            if sfind != gps_lst[ii-1] and sfind != -1:
-                gps_info, gps_index, gps_week = self.get_gps_stamp(sfind)
-                gps_lst[ii] = gps_index
-                
-                if gps_info is not None:
-                    for jj, key in enumerate(self._stamp_lst):
-                        gps_dict[key][ii] = gps_info[0][jj]
+                           date_time[0], self._seconds_diff))
+                           
+        gps_lst = gps_lst[s1:]
+        date_time = date_time[s1:]
+        for key in gps_dict.keys():
+            gps_dict[key] = gps_dict[key][s1:]
         
-        #get only the values that are non zero
-        gps_dict['time'] = gps_dict['time'][np.nonzero(gps_dict['time'])] 
-
-        num_samples = len(gps_dict['time'])
+        num_samples = len(gps_lst)
         
         #calculate the difference between time stamps
-        gps_diff = np.array([gps_dict['time'][ii+1]-gps_dict['time'][ii] 
-                             for ii in range(num_samples-1)])
+        gps_diff = np.diff(gps_dict['time'])
         
         #check for any spots where gps was not locked or mised a sampling interval
-        bad_lock = np.where(gps_diff[np.nonzero(gps_diff)] != 1.0)[0]
+        bad_lock = np.where(gps_diff != 1.0)[0]
         
         if len(bad_lock) > 0:
             for bb in bad_lock:
@@ -473,8 +453,7 @@ class Zen3D(object):
         #need to be sure that the number of data points between time stamps is 
         #equal to the sampling rate, if it is not then remove that interval.  
         #Most likely it is at the beginning or end of time series.
-        dsamples = np.array([(gps_lst[nn+1]-gps_lst[nn]-self._stamp_len-df*4)/4 
-                              for nn in range(num_samples)])
+        dsamples = (np.diff(gps_lst)-block_len)/4
         
         bad_interval = np.where(abs(dsamples)>self._skip_sample_tolerance)[0]
         bmin = 0
@@ -485,9 +464,12 @@ class Zen3D(object):
                 if bb <= 10:
                     bmin = bb+1
                 if bb > num_samples-10:
-                    bmax = bb
+                    bmax = min(bmax, bb+1)
         
-            gps_lst = gps_lst[bmin:bmax]
+        gps_lst = gps_lst[bmin:bmax]
+        date_time = date_time[bmin:bmax]
+        for key in gps_dict.keys():
+            gps_dict[key] = gps_dict[key][bmin:bmax]
             
         num_samples = len(gps_lst)
         if self.verbose:
@@ -498,18 +480,7 @@ class Zen3D(object):
                             'Found {0} gps time stamps, '.format(num_samples)+\
                   'with equal intervals of {0} samples\n'.format(int(self.df)))
         
-        #read in data
-        data_array = np.zeros((num_samples+1)*df, dtype=np.float32)
-        for ll, kk in enumerate(gps_lst[0:-1]):
-            pdiff = ((gps_lst[ll+1]-(kk+self._stamp_len))-(df*4))/4
-            self.sample_diff_lst.append(pdiff)
-            dblock = raw_data[kk+self._stamp_len:gps_lst[ll+1]] 
-            try:
-                data_array[ll*df:(ll+1)*df+pdiff] = np.fromstring(dblock, 
-                                                                dtype=np.int32)
-            except ValueError:
-                print 'samples between time step {0} is off by {1} samples'.format(ll,
-                                                                   abs(pdiff))
+        self.sample_diff_lst = list((np.diff(gps_lst)-block_len)/4)
                           
         if sum(self.sample_diff_lst) != 0:
             if self.verbose:
@@ -517,29 +488,24 @@ class Zen3D(object):
                                            float(sum(self.sample_diff_lst))/df)
                 self.log_lines.append('time series is off by {0} seconds'.format(
                                           float(sum(self.sample_diff_lst))/df))
-                                           
-        #get only the non-zero data bits, this is dangerous if there is 
-        #actually an exact 0 in the data, but rarely happens 
-        self.time_series = data_array[np.nonzero(data_array)]
-        
-        #need to cut all the data arrays to have the same length and corresponding 
-        #data points
-        for key in gps_dict.keys():
-            gps_dict[key] = gps_dict[key][bmin:bmax]
         
         #make attributes of imporant information
-        self.gps_diff = gps_diff[bmin:bmax]
+        self.gps_diff = np.diff(gps_dict['time'])
         self.gps_time = gps_dict['time']
         self.gps_lst = gps_lst
         self.temperature = gps_dict['temperature']
         self.lat = gps_dict['lat']
         self.lon = gps_dict['lon']
+        self.date_time = date_time
         
+        #zero-copy view of the data blocks, if they are all complete
+        self.ts_blocks = self.get_ts_blocks()
         
-        self.date_time = np.zeros_like(gps_dict['time'], dtype='|S24')
-
-        for gg, gtime in enumerate(gps_dict['time']):
-            self.date_time[gg]= self.get_date_time(self.gps_week, gtime)
+        #read in data
+        if load_data:
+            self.time_series = self._read_data_blocks(self.gps_lst)
+        else:
+            self.time_series = None
         
         try:
             self.start_dt = self.date_time[0]
@@ -557,9 +523,141 @@ class Zen3D(object):
             self.start_date = None
             self.start_time = None
             
-        if self.units == 'mv':
+        if self.units == 'mv' and self.time_series is not None:
             self.time_series = self.convert_counts()
+            
+    def get_ts_blocks(self):
+        """
+        get a zero-copy view of the data between the gps stamps in gps_lst
+        as an np.ndarray((n_blocks, df), dtype=np.int32) in counts.
         
+        Only possible if all blocks have exactly df samples, otherwise None
+        is returned.  The view is backed by the memory mapped file, the data
+        are read from disk when accessed.
+        
+        """
+        
+        if self.gps_lst is None or len(self.gps_lst) < 2:
+            return None
+            
+        df = int(self.df)
+        block_len = self._stamp_len+df*4
+        if not np.all(np.diff(self.gps_lst) == block_len):
+            return None
+            
+        return np.ndarray((len(self.gps_lst)-1, df), dtype=np.int32, 
+                          buffer=self._raw_data, 
+                          offset=int(self.gps_lst[0])+self._stamp_len,
+                          strides=(block_len, 4))
+        
+    def _read_data_blocks(self, gps_lst, dtype=np.float32):
+        """
+        read the data between the given gps stamps into one array of 
+        dtype in counts.
+        
+        """
+        
+        df = int(self.df)
+        block_len = self._stamp_len+df*4
+        if len(gps_lst) < 2:
+            return np.zeros(0, dtype=dtype)
+        
+        if np.all(np.diff(gps_lst) == block_len):
+            blocks = np.ndarray((len(gps_lst)-1, df), dtype=np.int32, 
+                                buffer=self._raw_data, 
+                                offset=int(gps_lst[0])+self._stamp_len,
+                                strides=(block_len, 4))
+            return blocks.astype(dtype).ravel()
+        
+        #blocks of different length, only full samples are used
+        lo_blocks = []
+        for kk, ll in zip(gps_lst[0:-1], gps_lst[1:]):
+            nbytes = ((ll-kk-self._stamp_len)/4)*4
+            lo_blocks.append(self._raw_data[kk+self._stamp_len:
+                                            kk+self._stamp_len+nbytes])
+            
+        return np.concatenate(lo_blocks).view(np.int32).astype(dtype)
+        
+    def get_samples(self, start, stop, gps_index=0):
+        """
+        read the samples start to stop (excluding) of the time series in
+        counts, counted from the gps stamp gps_lst[gps_index].  Only the 
+        needed part of the memory mapped file is read.
+        
+        Arguments:
+        ----------
+            **start**: int
+                       index of first sample
+                       
+            **stop**: int
+                      index after the last sample, is limited to the end of 
+                      the time series
+                      
+            **gps_index**: int
+                           index of the gps stamp in gps_lst the samples are
+                           counted from. *default* is 0
+                           
+        Returns:
+        --------
+            **samples**: np.ndarray(dtype=np.int32)
+                         samples in counts
+        
+        """
+        
+        gps_lst = self.gps_lst[gps_index:]
+        block_samples = (np.diff(gps_lst)-self._stamp_len)/4
+        sample_index = np.concatenate(([0], np.cumsum(block_samples)))
+        
+        stop = min(stop, sample_index[-1])
+        if stop <= start:
+            return np.zeros(0, dtype=np.int32)
+        
+        b_start = np.searchsorted(sample_index, start, side='right')-1
+        b_stop = np.searchsorted(sample_index, stop, side='left')
+        samples = self._read_data_blocks(gps_lst[b_start:b_stop+1], 
+                                         dtype=np.int32)
+        
+        return samples[start-sample_index[b_start]:stop-sample_index[b_start]]
+        
+    def iter_time_series(self, n_blocks=600):
+        """
+        iterate over the time series in chunks of n_blocks gps seconds, 
+        without reading the whole file into memory.
+        
+        Reads the gps stamps first if that has not been done yet.
+        
+        Arguments:
+        ----------
+            **n_blocks**: int
+                          number of blocks (seconds) per chunk
+                          *default* is 600
+                          
+        Returns:
+        --------
+            generator of (date_time, time_series) with date_time the time 
+            of the first sample of the chunk and time_series an np.ndarray
+            of np.float32 in units of self.units
+            
+        :Example: ::
+            
+            >>> zt = zen.Zen3D(fn)
+            >>> for date_time, ts in zt.iter_time_series(n_blocks=3600):
+            >>> ...     print date_time, ts.std()
+            
+        """
+        
+        if self.gps_lst is None:
+            self.read_3d(load_data=False)
+            
+        for ii in range(0, len(self.gps_lst)-1, n_blocks):
+            time_series = self._read_data_blocks(
+                                           self.gps_lst[ii:ii+n_blocks+1])
+            if self.units == 'mv':
+                time_series *= self.counts_to_mv_conversion
+                
+            yield self.date_time[ii], time_series
+        
+    
     def convert_counts(self):
         """
         convert the time series from counts to millivolts
@@ -645,6 +743,131 @@ class Zen3D(object):
                                     
         return ndate_time
         
+    def get_gps_stamp_locations(self, chunk_size=2**24):
+        """
+        get the locations in the data file of all possible gps stamps in one
+        vectorized pass over the file. 
+        
+        A gps stamp starts with 4 bytes of '\\xff', if the preceding data 
+        also end with '\\xff' the stamp is shifted to the end of the run of
+        '\\xff' (by up to 4 bytes), same as in get_gps_stamp_location.  The
+        file is scanned in chunks of chunk_size bytes, so files larger than
+        memory can be scanned.
+        
+        Returns:
+        ---------
+            **gps_locations**: np.ndarray(dtype=int)
+                               sorted indices in the file where a gps stamp
+                               might start.  These are not checked yet, see
+                               get_gps_stamps.
+        
+        """
+        
+        if type(self._raw_data) is str:
+            raw_data = np.frombuffer(self._raw_data, dtype=np.uint8)
+        else:
+            raw_data = self._raw_data
+        num_bytes = raw_data.shape[0]
+        
+        #gps stamps are only in the data part
+        ds = self._header_len+self._meta_len
+        
+        lo_locations = []
+        for c_start in range(ds, num_bytes, chunk_size):
+            c_stop = min(c_start+chunk_size, num_bytes)
+            #one byte before to see if a run starts at c_start and 8 bytes 
+            #after to get the length of runs at the end of the chunk
+            r_start = max(c_start-1, 0)
+            is_ff = np.asarray(raw_data[r_start:min(c_stop+8, num_bytes)]) \
+                                                                    == 0xff
+            edges = np.diff(np.concatenate(([0], is_ff.view(np.int8), [0])))
+            run_start = np.where(edges == 1)[0]
+            run_len = np.where(edges == -1)[0]-run_start
+            
+            run_start += r_start
+            use = (run_len >= 4) & (run_start >= c_start) & \
+                  (run_start < c_stop)
+            lo_locations.append(run_start[use]+
+                                np.minimum(run_len[use]-4, 4))
+        
+        if len(lo_locations) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        return np.concatenate(lo_locations).astype(np.int64)
+        
+    def get_gps_stamps(self):
+        """
+        locate, read and check all gps stamps in the data file at once.
+        
+        Stamps are checked like in get_gps_stamp, in addition a stamp has to
+        have a neighbouring stamp at the distance of one data block (within
+        _skip_sample_tolerance samples) with a gps time up to _seconds_diff
+        seconds later/earlier.  This removes '\\xff' in the data which 
+        look like gps stamps.
+        
+        Returns:
+        --------
+            **gps_lst**: np.ndarray(dtype=int)
+                         indices in the file where the gps stamps start
+                         
+            **gps_dict**: dictionary
+                          keys are _stamp_lst and 'gps_week', values are 
+                          arrays with lat and lon in decimal degrees, time in 
+                          seconds of the relative gps week.
+        
+        """
+        
+        df = int(self.df)
+        block_len = self._stamp_len+df*4
+        tolerance = 4*self._skip_sample_tolerance
+        
+        gps_lst = self.get_gps_stamp_locations()
+        gps_lst = gps_lst[gps_lst+self._stamp_len <= len(self._raw_data)]
+        
+        #read stamps as one array of bytes (in pieces to limit the memory)
+        gps_info = np.zeros(len(gps_lst), dtype=self._data_type)
+        raw_data = np.asarray(self._raw_data)
+        stamp_bytes = np.arange(self._stamp_len)
+        for ii in range(0, len(gps_lst), 2**16):
+            index = gps_lst[ii:ii+2**16, np.newaxis]+stamp_bytes
+            gps_info[ii:ii+2**16] = raw_data[index].view(self._data_type)[:, 0]
+        
+        with np.errstate(invalid='ignore'):
+            good = (gps_info['time'] >= 0) & \
+                   (gps_info['status'] >= 0) & \
+                   (abs(gps_info['temperature']) <= 80) & \
+                   (abs(gps_info['lat']) <= np.pi)
+        gps_lst = gps_lst[good]
+        gps_info = gps_info[good]
+        
+        #check for a neighbouring stamp one block later or earlier
+        n_stamps = len(gps_lst)
+        has_neighbour = np.zeros(n_stamps, dtype=np.bool)
+        for direction in [1, -1]:
+            if n_stamps == 0:
+                break
+            n_index = np.searchsorted(gps_lst, 
+                                    gps_lst+direction*block_len-tolerance)
+            n_index = np.minimum(n_index, n_stamps-1)
+            n_time_diff = direction*(gps_info['time'][n_index].astype(np.int64)-
+                                     gps_info['time'])
+            has_neighbour |= (abs(gps_lst[n_index]-gps_lst-
+                                  direction*block_len) <= tolerance) & \
+                             (n_time_diff > 0) & \
+                             (n_time_diff <= 1024*self._seconds_diff)
+        gps_lst = gps_lst[has_neighbour]
+        gps_info = gps_info[has_neighbour]
+        
+        gps_dict = dict([(key, gps_info[key]) for key in self._stamp_lst])
+        
+        #convert lat and lon into decimal degrees
+        gps_dict['lat'] = self.get_degrees(gps_dict['lat'])
+        gps_dict['lon'] = self.get_degrees(gps_dict['lon'])
+        gps_dict['time'], gps_dict['gps_week'] = \
+                                        self.get_gps_time(gps_dict['time'])
+        
+        return gps_lst, gps_dict
+        
     def get_gps_stamp_location(self, start_index=None):
         """
         get the location in the data file where there is a gps stamp.  Makes
@@ -660,22 +883,23 @@ class Zen3D(object):
         ---------
             **gps_index**: int
                            the index in the file where the start of the 
-                           time stamp is.
+                           time stamp is, -1 if there is none.
         
         """
         
-        gps_index = self._raw_data.find(self._gps_stamp, start_index)
-        if self._raw_data[gps_index+4] == '\xff':
-            gps_index += 1
-            if self._raw_data[gps_index+4] == '\xff':
-                gps_index += 1
-                if self._raw_data[gps_index+4] == '\xff':
-                    gps_index += 1
-                    if self._raw_data[gps_index+4] == '\xff':
-                        gps_index += 1
+        if self._gps_locations is None:
+            self._gps_locations = self.get_gps_stamp_locations()
+            
+        if start_index is None:
+            start_index = 0
+        
+        ii = np.searchsorted(self._gps_locations, start_index)
+        if ii == len(self._gps_locations):
+            return -1
                         
-        return gps_index
+        return int(self._gps_locations[ii])
         
+    
     def get_gps_stamp(self, gps_index):
         """
         get the gps stamp data
@@ -684,40 +908,41 @@ class Zen3D(object):
         #get numbers from binary format
         try:
             
-            gps_info = np.fromstring(self._raw_data[gps_index:gps_index+self._stamp_len], 
+            gps_info = np.frombuffer(self._raw_data[gps_index:gps_index+self._stamp_len], 
                                      dtype=self._data_type)
             while gps_info['time'] < 0:
                 gps_index = self.get_gps_stamp_location(start_index=gps_index+7)
                 print 'time', gps_index
-                gps_info = np.fromstring(self._raw_data[gps_index:gps_index+self._stamp_len], 
+                gps_info = np.frombuffer(self._raw_data[gps_index:gps_index+self._stamp_len], 
                                          dtype=self._data_type)
             
             while gps_info['status'] < 0:
                 gps_index = self.get_gps_stamp_location(start_index=gps_index+7)
                 print 'status', gps_index                
-                gps_info = np.fromstring(self._raw_data[gps_index:gps_index+self._stamp_len], 
+                gps_info = np.frombuffer(self._raw_data[gps_index:gps_index+self._stamp_len], 
                                          dtype=self._data_type)
             
             while abs(gps_info['temperature']) > 80:
                 gps_index = self.get_gps_stamp_location(start_index=gps_index+7)
                 print 'temperature', gps_index    
-                gps_info = np.fromstring(self._raw_data[gps_index:gps_index+self._stamp_len], 
+                gps_info = np.frombuffer(self._raw_data[gps_index:gps_index+self._stamp_len], 
                                          dtype=self._data_type)
                 
             while abs(gps_info['lat']) > np.pi:
                 gps_index = self.get_gps_stamp_location(start_index=gps_index+7)
                 print 'lat', gps_index
-                gps_info = np.fromstring(self._raw_data[gps_index:gps_index+self._stamp_len], 
+                gps_info = np.frombuffer(self._raw_data[gps_index:gps_index+self._stamp_len], 
                                          dtype=self._data_type)
                 
 #            while np.log10(abs(gps_info['lat'])) < -3:
 #                gps_index = self.get_gps_stamp_location(start_index=gps_index+7)
 #                print 'lat_log', gps_index    
-#                gps_info = np.fromstring(self._raw_data[gps_index:gps_index+self._stamp_len], 
+#                gps_info = np.frombuffer(self._raw_data[gps_index:gps_index+self._stamp_len], 
 #                                         dtype=self._data_type)
 
             
             #convert lat and lon into decimal degrees
+            gps_info = gps_info.copy()
             gps_info['lat'] = self.get_degrees(gps_info['lat'])
             gps_info['lon'] = self.get_degrees(gps_info['lon'])
             gps_info['time'] = gps_info['time'].astype(np.float32)
@@ -745,7 +970,7 @@ class Zen3D(object):
         
         Arguments:
         ----------
-            **gps_int**: int
+            **gps_int**: int or np.ndarray
                          integer from the gps time stamp line
                          
             **gps_week**: int
@@ -755,9 +980,12 @@ class Zen3D(object):
                           
         Returns:
         ---------
-            **gps_time**: int
+            **gps_time**: int or np.ndarray
                           number of seconds from the beginning of the relative
                           gps week.
+                          
+            **gps_week**: int or np.ndarray
+                          relative gps week
         
         """
             
@@ -765,11 +993,11 @@ class Zen3D(object):
         
         gps_ms = (gps_seconds-np.floor(gps_int/1024.))*(1.024)
         
-        cc = 0
-        if gps_seconds > self._week_len:
-            gps_week += 1
-            cc = gps_week*self._week_len
-            gps_seconds -= self._week_len
+        #works for single values and arrays of values
+        next_week = gps_seconds > self._week_len
+        gps_week = gps_week+next_week*1
+        cc = next_week*gps_week*self._week_len
+        gps_seconds = gps_seconds-next_week*self._week_len
         
         gps_time = np.floor(gps_seconds)+gps_ms+cc
         
@@ -783,10 +1011,10 @@ class Zen3D(object):
         
         Arguments:
         ----------
-            **gps_week**: int
+            **gps_week**: int or np.ndarray
                           integer value of gps_week that the data was collected
             
-            **gps_time**: int
+            **gps_time**: int or np.ndarray
                           number of seconds from beginning of gps_week
             
             **leap_seconds**: int
@@ -796,7 +1024,8 @@ class Zen3D(object):
         Returns:
         --------
             **date_time**: YYYY-MM-DD,HH:MM:SS
-                           formated date and time from gps seconds.
+                           formated date and time from gps seconds, an 
+                           np.ndarray(dtype='|S24') for arrays of gps_time.
         
         
         """
@@ -811,6 +1040,12 @@ class Zen3D(object):
         #receiver accounts for that so we will leave leap seconds to be 0        
         gps_seconds = epoch_seconds+(gps_week*self._week_len)+gps_time-\
                                                         self._leap_seconds
+                                                        
+        #for arrays convert all at once via np.datetime64
+        if np.ndim(gps_seconds) > 0:
+            date_time = np.datetime_as_string(
+                   np.floor(gps_seconds).astype(np.int64).astype('M8[s]'))
+            return np.char.replace(date_time.astype('|S24'), 'T', ',')
 
         #compute date and time from seconds
         (year, month, day, hour, minutes, seconds, dow, jday, dls) = \
@@ -825,6 +1060,7 @@ class Zen3D(object):
                                                  0, 0, 0))
         return date_time
         
+    
     def get_degrees(self, radian_value):
         """
         convert lat or lon into decimal degrees
@@ -1102,13 +1338,15 @@ class ZenCache(object):
     meta_data           dictionary of meta data key words and values
     nav_data            list of navigation data, as is from file
     save_fn             file to save merged file to
-    ts                  np.ndarray(len(ts), num_channels) of time series
+    ts                  np.ndarray(len(ts), num_channels) of time series,
+                        np.memmap of the file after read_cache
     verbose             [ True | False ] True prints information to console
     zt_lst              list of class: Zen3D objects
     _ch_factor          scaling factor for the channels, got this from Zonge
     _ch_gain            gain on channel, not sure of the format
     _ch_lowpass_dict    dictionary of values for lowpass filter, not sure how
                         they get the values
+    _chunk_len          number of samples written at once
     _data_type          np.dtype of data type for cache block
     _flag               flag for new data block
     _nav_len            length of navigation information in bytes
@@ -1124,9 +1362,15 @@ class ZenCache(object):
         * *check_time_series* : makes sure all time series start at the same
                                 time and have the same length.
                                 
+        * *align_time_series* : finds common start and length of time 
+                                series from the gps stamps only.
+                                
         * *write_cache_file* : writes a cache file for given filenames.
         
-        * *read_cache* : reads in a cache file.
+        * *read_cache* : reads in a cache file, optionally only a time 
+                         window, the time series is memory mapped.
+                         
+        * *read_cache_metadata* : reads only the meta data of a cache file.
         
     :Example: ::
     
@@ -1168,6 +1412,7 @@ class ZenCache(object):
                                     ('input_type', np.int16)])
         self._stamp_len = 10
         self._nav_len = 43
+        self._chunk_len = 2**20
         
         self.nav_data = None
         self.cal_data = None
@@ -1294,7 +1539,7 @@ class ZenCache(object):
         #change data by amount needed        
         for ii, zt in zip(skip_dict.keys(), zt_lst):
             if skip_dict[ii] != 0:
-                skip_points = skip_dict[ii]*zt.df
+                skip_points = int(skip_dict[ii]*zt.df)
                 print 'Skipping {0} points for {1}'.format(skip_points,
                                                             zt.ch_cmp)
                 zt.time_series = zt.time_series[skip_points:]
@@ -1351,12 +1596,18 @@ class ZenCache(object):
         """
         write a cache file from given filenames
         
+        The Z3D files are only read for their gps stamps, the time series are
+        copied in chunks of _chunk_len samples from the memory mapped files 
+        into the interleaved cache block, so the channels are never loaded
+        completely into memory.  Only for decimate > 1 the full time series
+        are read and resampled.
+        
         """
         #sort the files so they are in order
         fn_sort_lst = []
         for cs in self.chn_order:
             for fn in fn_lst:
-                if cs in fn.lower():
+                if cs in os.path.basename(fn).lower():
                     fn_sort_lst.append(fn)
 
         fn_lst = fn_sort_lst
@@ -1368,10 +1619,10 @@ class ZenCache(object):
             zt1 = Zen3D(fn=fn)
             zt1.verbose = self.verbose
             try:
-                zt1.read_3d()
+                zt1.read_3d(load_data=decimate != 1)
             except ZenGPSError:
                 zt1._seconds_diff = 59
-                zt1.read_3d()
+                zt1.read_3d(load_data=decimate != 1)
             self.zt_lst.append(zt1)
         
             #fill in meta data from the time series file
@@ -1395,8 +1646,16 @@ class ZenCache(object):
         self.check_sampling_rate(self.zt_lst)
         
         #make sure the length of time series is the same for all channels
-        self.ts, ts_len = self.check_time_series(self.zt_lst,
-                                                 decimate=decimate)
+        if decimate != 1:
+            self.ts, ts_len = self.check_time_series(self.zt_lst,
+                                                     decimate=decimate)
+        else:
+            self.ts = None
+            skip_lst, ts_len = self.align_time_series(self.zt_lst)
+            start_dt = self.zt_lst[0].date_time[skip_lst[0]]
+            self.meta_data['DATA.DATE0'] = ','+start_dt.split(',')[0]
+            self.meta_data['DATA.TIME0'] = ','+start_dt.split(',')[1]
+            n_fn = len(self.zt_lst)
         
         self.meta_data['TS.NPNT'] = ',{0}'.format(ts_len)
         
@@ -1418,68 +1677,42 @@ class ZenCache(object):
                     os.mkdir(save_fn)
             self.save_fn = os.path.join(save_fn, general_fn)
                 
-                
-            
-        cfid = file(self.save_fn, 'wb+')
-        #--> write navigation records first        
-        cfid.write(struct.pack('<i', self._nav_len))
-        cfid.write(struct.pack('<i', self._flag))
-        cfid.write(struct.pack('<h', self._type_dict['nav']))
-        for nd in range(self._nav_len-2):
-            cfid.write(struct.pack('<b', 0))
-        cfid.write(struct.pack('<i', self._nav_len))
-        
-        #--> write meta data
+        #--> meta data
         meta_str = ''.join([key+self.meta_data[key]+'\n' 
                              for key in np.sort(self.meta_data.keys())])
         
-        meta_len = len(meta_str)
-        
-        cfid.write(struct.pack('<i', meta_len+2))
-        cfid.write(struct.pack('<i', self._flag))
-        cfid.write(struct.pack('<h', self._type_dict['meta']))
-        cfid.write(meta_str)
-        cfid.write(struct.pack('<i', meta_len+2))
-        
-        #--> write calibrations
+        #--> calibrations
         cal_data1 = 'HEADER.TYPE,Calibrate\nCAL.VER,019\nCAL.SYS,0000,'+\
                    ''.join([' 0.000000: '+'0.000000      0.000000,'*3]*27)
         cal_data2 = '\nCAL.SYS,0000,'+\
                     ''.join([' 0.000000: '+'0.000000      0.000000,'*3]*27)
                     
         cal_data = cal_data1+(cal_data2*(n_fn-1))
-        cal_len = len(cal_data)
-        
-        cfid.write(struct.pack('<i', cal_len+2))
-        cfid.write(struct.pack('<i', self._flag))
-        cfid.write(struct.pack('<h', self._type_dict['cal']))
-        cfid.write(cal_data[:-1]+'\n')
-        cfid.write(struct.pack('<i', cal_len+2))
+            
+        cfid = file(self.save_fn, 'wb+')
+        self._write_cache_header(cfid, meta_str, cal_data[:-1]+'\n')
         
         #--> write data
-        
         ts_block_len = int(ts_len)*n_fn*4+2
+        self._write_block_stamp(cfid, ts_block_len, 'ts')
         
-        #--> Need to scale the time series into counts cause that is apparently
-        #    what MTFT24 expects
-        self.ts = self.ts.astype(np.int32)
-        
-        #--> make sure none of the data is above the allowed level
-        self.ts[np.where(self.ts>2.14e9)] = 2.14e9
-        self.ts[np.where(self.ts<-2.14e9)] = -2.14e9
-        
-        #--> write time series block
-        cfid.write(struct.pack('<i', ts_block_len))
-        cfid.write(struct.pack('<i', self._flag))
-        cfid.write(struct.pack('<h', self._type_dict['ts']))
-        
-        #--> need to pack the data as signed integers
-        for zz in range(ts_len):
-            cfid.write(struct.pack('<'+'i'*n_fn, *self.ts[zz]))
+        if self.ts is not None:
+            #--> Need to scale the time series into counts cause that is 
+            #    apparently what MTFT24 expects
+            self._write_ts(cfid, self.ts)
+        else:
+            #--> copy the channels chunk by chunk into interleaved samples
+            for ii in range(0, ts_len, self._chunk_len):
+                nn = min(self._chunk_len, ts_len-ii)
+                ts_chunk = np.zeros((nn, n_fn), dtype='<i4')
+                for jj, zt in enumerate(self.zt_lst):
+                    ts_chunk[:, jj] = zt.get_samples(ii, ii+nn, 
+                                                     gps_index=skip_lst[jj])
+                #--> make sure none of the data is above the allowed level
+                np.clip(ts_chunk, -2140000000, 2140000000, out=ts_chunk)
+                cfid.write(ts_chunk.tostring())
                                 
         cfid.write(struct.pack('<i', ts_block_len))
-         
-        
         cfid.close()
         
         if self.verbose:
@@ -1489,6 +1722,103 @@ class ZenCache(object):
         self.log_lines.append(' '*4+'{0}\n'.format(self.save_fn))
         self.log_lines.append('='*72+'\n')
         
+    def align_time_series(self, zt_lst):
+        """
+        find the common start time and length of the time series, using only
+        the gps stamps (the time series do not need to be read in).
+        
+        Arguments:
+        -----------
+            **zt_lst** : list of Zen3D instances
+            
+        Outputs:
+        --------
+            **skip_lst** : list of indices of the common starting gps stamp
+                           in gps_lst for each Zen3D instance
+                           
+            **ts_len** : number of samples common to all time series
+            
+        """
+        
+        #test start time
+        st_lst = np.array([int(zt.gps_time[0]) for zt in zt_lst])
+        time_max = max(st_lst)
+        
+        #get the number of seconds each time series is off by
+        skip_lst = []
+        for zt in list(zt_lst):
+            try:
+                skip_lst.append(np.where(zt.gps_time==time_max)[0][0])
+            except IndexError:
+                zt_lst.remove(zt)
+                print '***SKIPPING {0} '.format(zt.fn)
+                print '   because it does not contain correct gps time'
+                print '   {0} --> {1}'.format(time_max, 
+                                             zt.get_date_time(zt.gps_week, 
+                                                             time_max))
+                
+        ts_len_lst = []
+        for skip, zt in zip(skip_lst, zt_lst):
+            if skip != 0:
+                print 'Skipping {0} points for {1}'.format(int(skip*zt.df),
+                                                            zt.ch_cmp)
+            block_samples = (np.diff(zt.gps_lst[skip:])-zt._stamp_len)/4
+            ts_len_lst.append(int(block_samples.sum()))
+            
+        ts_len = min(ts_len_lst)
+        for zt in zt_lst:
+            if self.verbose:
+                print 'TS length for channel {0} '.format(zt.ch_number)+\
+                      '({0}) '.format(zt.ch_cmp)+\
+                      '= {0}'.format(ts_len)
+            self.log_lines.append(' '*4+\
+                                  'TS length for channel {0} '.format(zt.ch_number)+\
+                                  '({0}) '.format(zt.ch_cmp)+\
+                                  '= {0}'.format(ts_len))
+            
+        return skip_lst, ts_len
+        
+    def _write_block_stamp(self, cfid, block_len, block_type):
+        """
+        write the stamp of a cache block
+        """
+        
+        cfid.write(struct.pack('<i', block_len))
+        cfid.write(struct.pack('<i', self._flag))
+        cfid.write(struct.pack('<h', self._type_dict[block_type]))
+        
+    def _write_cache_header(self, cfid, meta_str, cal_str):
+        """
+        write navigation, meta data and calibration blocks
+        """
+        
+        #--> write navigation records first        
+        self._write_block_stamp(cfid, self._nav_len, 'nav')
+        cfid.write('\x00'*(self._nav_len-2))
+        cfid.write(struct.pack('<i', self._nav_len))
+        
+        #--> write meta data
+        meta_len = len(meta_str)
+        self._write_block_stamp(cfid, meta_len+2, 'meta')
+        cfid.write(meta_str)
+        cfid.write(struct.pack('<i', meta_len+2))
+        
+        #--> write calibrations
+        cal_len = len(cal_str)
+        self._write_block_stamp(cfid, cal_len+2, 'cal')
+        cfid.write(cal_str)
+        cfid.write(struct.pack('<i', cal_len+2))
+        
+    def _write_ts(self, cfid, ts):
+        """
+        write time series as interleaved signed integers in chunks, making
+        sure none of the data is above the allowed level
+        """
+        
+        for ii in range(0, ts.shape[0], self._chunk_len):
+            ts_chunk = np.clip(ts[ii:ii+self._chunk_len], -2.14e9, 2.14e9)
+            cfid.write(ts_chunk.astype('<i4').tostring())
+        
     def rewrite_cache_file(self):
         """
         rewrite a cache file if parameters changed
@@ -1502,222 +1832,183 @@ class ZenCache(object):
         
         n_fn = self.ts.shape[1]
         
-        #--> write navigation records first        
-        cfid.write(struct.pack('<i', self._nav_len))
-        cfid.write(struct.pack('<i', self._flag))
-        cfid.write(struct.pack('<h', self._type_dict['nav']))
-        for nd in range(self._nav_len-2):
-            cfid.write(struct.pack('<b', 0))
-        cfid.write(struct.pack('<i', self._nav_len))
-        
-        #--> write meta data
+        #--> meta data
         meta_str = ''.join([key+','+','.join(self.meta_data[key])+'\n' 
                              for key in np.sort(self.meta_data.keys())
                              if key != ''])
         
-        meta_len = len(meta_str)
-        
-        cfid.write(struct.pack('<i', meta_len+2))
-        cfid.write(struct.pack('<i', self._flag))
-        cfid.write(struct.pack('<h', self._type_dict['meta']))
-        cfid.write(meta_str)
-        cfid.write(struct.pack('<i', meta_len+2))
-        
-        #--> write calibrations
+        #--> calibrations
         cal_data1 = 'HEADER.TYPE,Calibrate\nCAL.VER,019\nCAL.SYS,0000,'+\
                    ''.join([' 0.000000: '+'0.000000      0.000000,'*3]*1)
         cal_data2 = '\nCAL.SYS,0000,'+\
                     ''.join([' 0.000000: '+'0.000000      0.000000,'*3]*1)
                     
         cal_data = cal_data1+(cal_data2*(self.ts.shape[1]-1))
-        cal_len = len(cal_data)
         
-        cfid.write(struct.pack('<i', cal_len+2))
-        cfid.write(struct.pack('<i', self._flag))
-        cfid.write(struct.pack('<h', self._type_dict['cal']))
-        cfid.write(cal_data[:-1]+'\n')
-        cfid.write(struct.pack('<i', cal_len+2))
+        self._write_cache_header(cfid, meta_str, cal_data[:-1]+'\n')
         
         #--> write data
         ts_block_len = self.ts.shape[0]*n_fn*4+2
         
-        #--> make sure none of the data is above the allowed level
-        self.ts[np.where(self.ts>2.14e9)] = 2.14e9
-        self.ts[np.where(self.ts<-2.14e9)] = -2.14e9
-        
         #--> write time series block
-        cfid.write(struct.pack('<i', ts_block_len))
-        cfid.write(struct.pack('<i', self._flag))
-        cfid.write(struct.pack('<h', self._type_dict['ts']))
-        for zz in range(self.ts.shape[0]):
-            cfid.write(struct.pack('<'+'i'*n_fn, *self.ts[zz]))
-                                
+        self._write_block_stamp(cfid, ts_block_len, 'ts')
+        self._write_ts(cfid, self.ts)
         cfid.write(struct.pack('<i', ts_block_len))
                  
         cfid.close()
         
         print 'Rewrote {0}\n to {1}'.format(self.save_fn, self.save_fn_rw)        
         
-    def read_cache_metadata(self, cache_fn):
-        """
-        read only the meta data from the cache file
+    def _read_cache_blocks(self, cfid, block_types):
         """
+        read the stamps of the blocks in an open cache file up to the last
+        of the given block types, without reading the block contents.
         
-        self.save_fn = cache_fn
-        #open cache file to read in as a binary file
-        cfid = file(cache_fn, 'rb')
-        
-        #read into a long string
-        cdata = cfid.read(1050)
+        Returns a dictionary with block type as key and (index of the block 
+        content in the file, length of the content) as value.
+        """
         
-        #--> read navigation data
-        nav_block = np.fromstring(cdata[0:self._stamp_len], 
+        type_dict = dict([(value, key) for key, value 
+                                       in self._type_dict.items()])
+        block_dict = {}
+        cfid.seek(0, 2)
+        file_len = cfid.tell()
+        ii = 0
+        while ii+self._stamp_len <= file_len:
+            cfid.seek(ii)
+            block = np.fromstring(cfid.read(self._stamp_len), 
                                   dtype=self._data_type)
+            block_len = int(block['len'][0])
+            try:
+                block_type = type_dict[int(block['input_type'][0])]
+            except KeyError:
+                raise CacheTimeSeriesError('Unknown block type {0} '.format(
+                                           block['input_type'][0])+\
+                                           'at index {0}'.format(ii))
+            
+            block_dict[block_type] = (ii+self._stamp_len, block_len-2)
+            
+            #check length at the end of the block
+            jj = ii+self._stamp_len+block_len-2
+            cfid.seek(jj)
+            len_check = np.fromstring(cfid.read(4), dtype=np.int32)
+            if len(len_check) != 1 or len_check[0] != block_len:
+                if self.verbose:
+                    print 'Index for second {0} length is {1}'.format(
+                                                             block_type, jj)
+                error = {'nav':CacheNavigationError, 
+                         'meta':CacheMetaDataError,
+                         'cal':CacheCalibrationError}.get(block_type, 
+                                                      CacheTimeSeriesError)
+                raise error('{0} length in data blocks are not '.format(
+                            block_type)+'equal: {0} != {1}'.format(
+                            block_len, len_check))
+                            
+            ii = jj+4
+            if len([bt for bt in block_types if bt not in block_dict]) == 0:
+                break
+                
+        return block_dict
         
-        #get starting and ending indices for navigation block
-        ii = int(self._stamp_len)
-        jj = self._stamp_len+nav_block['len']-2
-        self.nav_data = np.fromstring(cdata[ii:jj], dtype=np.int8)
+    def _read_cache_header(self, cfid, block_dict, strip=False):
+        """
+        read navigation, meta data and calibration blocks, with strip=True
+        the meta data values are stripped of white space
+        """
         
-        #get indicies for length of block
-        ii = int(jj)
-        jj = ii+4
-        nav_len_check = np.fromstring(cdata[ii:jj], np.int32)
-        if nav_len_check != nav_block['len']:
-            if self.verbose:
-                print 'Index for second navigation length is {0}'.format(ii)
-            raise CacheNavigationError('Navigation length in data block are'
-                                       'not equal: {0} != {1}'.format(
-                                       nav_block['len'], nav_len_check))
-        
-        #--> read meta data
-        ii = int(jj)
-        jj = ii+self._stamp_len
-        
-        meta_block = np.fromstring(cdata[ii:jj], dtype=self._data_type)
-        ii = int(jj)
-        jj = ii+meta_block['len']-2
+        ii, nn = block_dict['nav']
+        cfid.seek(ii)
+        self.nav_data = np.fromstring(cfid.read(nn), dtype=np.int8)
+        
+        ii, nn = block_dict['meta']
+        cfid.seek(ii)
         self.meta_data = {}
-        meta_lst = cdata[ii:jj].split('\n')
+        meta_lst = cfid.read(nn).split('\n')
         for mm in meta_lst:
             mfind = mm.find(',')
-            self.meta_data[mm[0:mfind]] = [ms.strip() for ms in 
-                                            mm[mfind+1:].split(',')]
-        
-        #get index for second length test
-        ii = int(jj)
-        jj = ii+4
-        meta_len_check = np.fromstring(cdata[ii:jj], dtype=np.int32)
-        if meta_len_check != meta_block['len']:
-            if self.verbose:
-                print 'Index for second meta length is {0}'.format(ii)
-            raise CacheMetaDataError('Meta length in data blocks are not '
-                                     'equal: {0} != {1}'.format(
-                                     meta_block['len'], meta_len_check))
-        cfid.close()
+            if strip:
+                self.meta_data[mm[0:mfind]] = [ms.strip() for ms in 
+                                               mm[mfind+1:].split(',')]
+            else:
+                self.meta_data[mm[0:mfind]] = mm[mfind+1:].split(',')
         
-    def read_cache(self, cache_fn):
-        """
-        read a cache file
+        if 'cal' in block_dict:
+            ii, nn = block_dict['cal']
+            cfid.seek(ii)
+            self.cal_data = cfid.read(nn)
         
+    def read_cache_metadata(self, cache_fn):
+        """
+        read only the meta data from the cache file
         """
         
         self.save_fn = cache_fn
         #open cache file to read in as a binary file
         cfid = file(cache_fn, 'rb')
+        block_dict = self._read_cache_blocks(cfid, ['nav', 'meta'])
+        self._read_cache_header(cfid, block_dict, strip=True)
+        cfid.close()
         
-        #read into a long string
-        cdata = cfid.read()
-        
-        #--> read navigation data
-        nav_block = np.fromstring(cdata[0:self._stamp_len], 
-                                  dtype=self._data_type)
-        
-        #get starting and ending indices for navigation block
-        ii = int(self._stamp_len)
-        jj = self._stamp_len+nav_block['len']-2
-        self.nav_data = np.fromstring(cdata[ii:jj], dtype=np.int8)
-        
-        #get indicies for length of block
-        ii = int(jj)
-        jj = ii+4
-        nav_len_check = np.fromstring(cdata[ii:jj], np.int32)
-        if nav_len_check != nav_block['len']:
-            if self.verbose:
-                print 'Index for second navigation length is {0}'.format(ii)
-            raise CacheNavigationError('Navigation length in data block are'
-                                       'not equal: {0} != {1}'.format(
-                                       nav_block['len'], nav_len_check))
-        
-        #--> read meta data
-        ii = int(jj)
-        jj = ii+self._stamp_len
-        
-        meta_block = np.fromstring(cdata[ii:jj], dtype=self._data_type)
-        ii = int(jj)
-        jj = ii+meta_block['len']-2
-        self.meta_data = {}
-        meta_lst = cdata[ii:jj].split('\n')
-        for mm in meta_lst:
-            mfind = mm.find(',')
-            self.meta_data[mm[0:mfind]] = mm[mfind+1:].split(',')
+    def read_cache(self, cache_fn, start_dt=None, end_dt=None):
+        """
+        read a cache file
         
-        #get index for second length test
-        ii = int(jj)
-        jj = ii+4
-        meta_len_check = np.fromstring(cdata[ii:jj], dtype=np.int32)
-        if meta_len_check != meta_block['len']:
-            if self.verbose:
-                print 'Index for second meta length is {0}'.format(ii)
-            raise CacheMetaDataError('Meta length in data blocks are not'
-                                     'equal: {0} != {1}'.format(
-                                     meta_block['len'], meta_len_check))
-        
-        #--> read calibrations
-        ii = int(jj)
-        jj = ii+self._stamp_len
-        cal_block = np.fromstring(cdata[ii:jj], dtype=self._data_type)
-        
-        ii = int(jj)
-        jj = ii+cal_block['len']-2
-        self.cal_data = cdata[ii:jj]
-                
+        The time series is not read into memory, ts is a np.memmap of the
+        time series block of shape (n_samples, n_channels) in counts. 
         
-        ii = int(jj)
-        jj = ii+4
-        cal_len_check = np.fromstring(cdata[ii:jj], dtype=np.int32)
-        if cal_len_check != cal_block['len']:
-            if self.verbose:
-                print 'Index for second cal length is {0}'.format(ii)
-            raise CacheCalibrationError('Cal length in data blocks are not'
-                                        'equal: {0} != {1}'.format(
-                                        cal_block['len'], cal_len_check))
+        Arguments:
+        -----------
+            **cache_fn** : string
+                           full path to cache file
+                           
+            **start_dt** : YYYY-MM-DD,hh:mm:ss
+                           start of the time window to read, ts then only
+                           contains samples from this time on.
+                           *default* is None (start of the time series)
+                           
+            **end_dt** : YYYY-MM-DD,hh:mm:ss
+                         end of the time window (excluding)
+                         *default* is None (end of the time series)
         
-        #--> read data
-        ii = int(jj)
-        jj = ii+self._stamp_len
+        """
         
-        ts_block = np.fromstring(cdata[ii:jj], dtype=self._data_type)
+        self.save_fn = cache_fn
+        #open cache file to read in as a binary file
+        cfid = file(cache_fn, 'rb')
+        block_dict = self._read_cache_blocks(cfid, ['nav', 'meta', 'cal', 
+                                                    'ts'])
+        self._read_cache_header(cfid, block_dict)
+        cfid.close()
         
         #get time series data
-        ii = int(jj)
-        jj = ii+ts_block['len']-2
-        self.ts = np.fromstring(cdata[ii:jj], dtype=self._ts_dtype)
-        #resize time series to be length of each channel
+        ii, nn = block_dict['ts']
         num_chn = len(self.meta_data['ch.cmp'.upper()])
-        if self.ts.shape[0]%num_chn != 0:
-            print 'Trimming TS by {0} points'.format(self.ts.shape[0]%num_chn)
-        self.ts = np.resize(self.ts, (int(self.ts.shape[0]/num_chn), num_chn))
-        
-        ii = int(jj)
-        jj = ii+4
-        ts_len_check = np.fromstring(cdata[ii:jj], dtype=np.int32)
-        if ts_len_check != ts_block['len']:
-            if self.verbose:
-                print 'Index for second ts length is {0}'.format(ii)
-            raise CacheTimeSeriesError('ts length in data blocks are not'
-                                       'equal: {0} != {1}'.format(
-                                       ts_block['len'], ts_len_check))
+        if (nn/4)%num_chn != 0:
+            print 'Trimming TS by {0} points'.format((nn/4)%num_chn)
+        num_samples = (nn/4)/num_chn
+        self.ts = np.memmap(cache_fn, dtype=self._ts_dtype, mode='r',
+                            offset=ii, shape=(num_samples, num_chn))
+                            
+        #--> cut the time window
+        if start_dt is not None or end_dt is not None:
+            df = float(self.meta_data['TS.ADFREQ'][0])
+            t0 = calendar.timegm(time.strptime(
+                                     self.meta_data['DATA.DATE0'][0].strip()+
+                                     ','+
+                                     self.meta_data['DATA.TIME0'][0].strip(),
+                                     datetime_fmt))
+            s_start = 0
+            s_stop = num_samples
+            if start_dt is not None:
+                s_start = int((calendar.timegm(time.strptime(start_dt, 
+                                                    datetime_fmt))-t0)*df)
+                s_start = min(max(s_start, 0), num_samples)
+            if end_dt is not None:
+                s_stop = int((calendar.timegm(time.strptime(end_dt, 
+                                                    datetime_fmt))-t0)*df)
+                s_stop = min(max(s_stop, s_start), num_samples)
+            self.ts = self.ts[s_start:s_stop]
+            
 
 #==============================================================================
 # read and write a zen schedule 
@@ -375,10 +375,8 @@ class ZongeMTFT():
                             #read in cache file
                             local_zc.read_cache(os.path.join(self.cache_path,
                                                   ts_dict['LocalFile']))
-                            #resize local ts accordingly
-                            local_zc.ts = np.resize(local_zc.ts, 
-                                                    (remote_npts,
-                                                     local_zc.ts.shape[1]))
+                            #resize local ts accordingly, is only shorter
+                            local_zc.ts = local_zc.ts[:remote_npts]
 
                             #reset some meta data 
                             local_zc.meta_data['TS.NPNT'] = \
@@ -421,10 +419,8 @@ class ZongeMTFT():
                             
                             remote_zc.read_cache(os.path.join(self.Remote_Path,
                                                               rrfn))
-                            #resize remote ts accordingly
-                            remote_zc.ts = np.resize(remote_zc.ts, 
-                                                      (local_npts,
-                                                       remote_zc.ts.shape[1]))
+                            #resize remote ts accordingly, is only shorter
+                            remote_zc.ts = remote_zc.ts[:local_npts]
                             #reset some meta data 
                             remote_zc.meta_data['TS.NPNT'] = \
                                             [str(remote_zc.ts.shape[0])]
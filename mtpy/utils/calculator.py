@@ -190,6 +190,60 @@ def propagate_error_rect2polar(x,x_error,y, y_error):
 
 
 
+def propagate_error_rect2polar_array(x, x_error, y, y_error):
+    """
+        Array version of 'propagate_error_rect2polar'.
+
+        Same approximation as the scalar version, but evaluated element-wise
+        on arrays of arbitrary (but identical) shape in one go.
+
+        Input:
+        x, x_error, y, y_error - Numpy arrays (real)
+
+        Output:
+        rho_err - array of uncertainties in amplitude
+        phi_err - array of uncertainties in phase angle (degrees)
+    """
+
+    x = np.real(np.asarray(x, dtype='complex'))
+    y = np.real(np.asarray(y, dtype='complex'))
+    x_error = np.real(np.asarray(x_error, dtype='complex'))
+    y_error = np.real(np.asarray(y_error, dtype='complex'))
+
+    #same 8 points as in the scalar version, stacked along a new last axis
+    x_steps = np.array([1, -1, 0, 0, -1, 1, 1, -1])
+    y_steps = np.array([0, 0, -1, 1, -1, -1, 1, 1])
+
+    points = (x[..., np.newaxis] + x_steps * x_error[..., np.newaxis]) + \
+             1j * (y[..., np.newaxis] + y_steps * y_error[..., np.newaxis])
+
+    lo_rho = np.abs(points)
+    lo_phi = np.degrees(np.angle(points)) % 360
+
+    rho_err = 0.5 * (lo_rho.max(axis=-1) - lo_rho.min(axis=-1))
+
+    max_phi = lo_phi.max(axis=-1)
+    min_phi = lo_phi.min(axis=-1)
+    phi_err = 0.5 * (max_phi - min_phi)
+
+    #points on both sides of the positive x-axis
+    wrapped = (270 < max_phi) & (max_phi < 360) & (0 < min_phi) & (min_phi < 90)
+    max_1 = np.where((0 < lo_phi) & (lo_phi < 90), lo_phi, -np.inf).max(axis=-1)
+    min_4 = np.where((270 < lo_phi) & (lo_phi < 360), lo_phi, np.inf).min(axis=-1)
+    with np.errstate(invalid='ignore'):
+        #(max_1 - min_4) is only finite, where it is actually used
+        phi_err = np.where(wrapped, 0.5 * ((max_1 - min_4) % 360), phi_err)
+
+    phi_err = np.where(phi_err > 180, (-phi_err) % 360, phi_err)
+
+    origin_in_box = (x_error >= np.abs(x)) & (y_error >= np.abs(y))
+    rho_err = np.where(origin_in_box, 2 * rho_err + lo_rho.min(axis=-1), 
+                       rho_err)
+    phi_err = np.where(origin_in_box, 180., phi_err)
+
+    return rho_err, phi_err
+
+
 def zerror2r_phi_error(x,x_error,y, y_error):
     """
         Error estimation from rect to polar, but with small variation needed for 
@@ -255,7 +309,46 @@ def zerror2r_phi_error(x,x_error,y, y_error):
     return rho_err, phi_err
 
 
+def zerror2r_phi_error_array(x, x_error, y, y_error):
+    """
+        Array version of 'zerror2r_phi_error'.
 
+        Same approximation as the scalar version, but evaluated element-wise
+        on arrays of arbitrary (but identical) shape in one go.
+
+        Input:
+        x, x_error, y, y_error - Numpy arrays (real)
+
+        Output:
+        rho_err - array of uncertainties in amplitude
+        phi_err - array of uncertainties in phase angle (degrees)
+    """
+
+    x = np.real(np.asarray(x, dtype='complex'))
+    y = np.real(np.asarray(y, dtype='complex'))
+    x_error = np.real(np.asarray(x_error, dtype='complex'))
+    y_error = np.real(np.asarray(y_error, dtype='complex'))
+
+    #same 8 points (corners and midpoints of edges of the box) as in the
+    #scalar version, stacked along a new last axis
+    x_steps = np.array([1, -1, 0, 0, -1, 1, 1, -1])
+    y_steps = np.array([0, 0, -1, 1, -1, -1, 1, 1])
+
+    lo_rho = np.hypot(x[..., np.newaxis] + x_steps * x_error[..., np.newaxis],
+                      y[..., np.newaxis] + y_steps * y_error[..., np.newaxis])
+
+    rho_err = 0.5 * (lo_rho.max(axis=-1) - lo_rho.min(axis=-1))
+
+    rho = np.hypot(x, y)
+    rel_error_rho = np.zeros_like(rho)
+    nonzero = rho != 0
+    rel_error_rho[nonzero] = rho_err[nonzero] / rho[nonzero]
+
+    #relative amplitude errors >50% are equivalent to 90 degrees uncertainty
+    phi_err = np.degrees(np.arcsin(np.clip(rel_error_rho, 0, 0.5)))
+    phi_err[rel_error_rho > 0.5] = 90.
+
+    return rho_err, phi_err
 
 
 #rotation:
@@ -369,6 +462,151 @@ def rotatevector_incl_errors(invector, angle, invector_err = None):
     return rotated_vector, errvec
 
 
+def _rotation_matrices(angles):
+    """
+        Return stack of rotation matrices ([cos , sin ],[-sin, cos]) for an
+        array of angles (in degrees) - shape (angles.shape + (2,2)).
+    """
+
+    try:
+        phi = np.radians(np.asarray(angles, dtype='float') % 360)
+    except:
+        raise MTex.MTpyError_inputarguments('"Angles" must be valid numbers (in degrees)')
+
+    cphi = np.cos(phi)
+    sphi = np.sin(phi)
+
+    rotmats = np.empty(phi.shape + (2, 2))
+    rotmats[..., 0, 0] = cphi
+    rotmats[..., 0, 1] = sphi
+    rotmats[..., 1, 0] = -sphi
+    rotmats[..., 1, 1] = cphi
+
+    return rotmats
+
+
+def rotatematrices_incl_errors(inmatrices, angles, inmatrices_err = None):
+    """
+        Batched version of 'rotatematrix_incl_errors'.
+
+        Rotate a stack of 2x2 matrices, e.g. of shape (n_freq, 2, 2) or
+        (n_station, n_freq, 2, 2), in one array operation.
+
+        Input:
+        - inmatrices : Numpy array of shape (..., 2, 2)
+        - angles : rotation angle(s) in degrees, clockwise from North -
+                   scalar or array, broadcastable against
+                   inmatrices.shape[:-2] (e.g. shape (n_angles, 1) for
+                   rotating one (n_freq, 2, 2) array by many angles)
+
+        Optional:
+        - inmatrices_err : Numpy array of same shape as inmatrices
+
+        Output:
+        - rotated matrices (..., 2, 2)
+        - rotated error matrices (or None)
+    """
+
+    if inmatrices is None :
+        raise MTex.MTpyError_inputarguments('Matrix must be defined')
+
+    inmatrices = np.asarray(inmatrices)
+    if inmatrices.shape[-2:] != (2,2):
+        raise MTex.MTpyError_inputarguments('Matrices must be of shape (...,2,2)')
+
+    if (inmatrices_err is not None) and (inmatrices.shape != inmatrices_err.shape):
+        raise MTex.MTpyError_inputarguments('Matrix and err-matrix shapes do not match: %s - %s'%(str(inmatrices.shape), str(inmatrices_err.shape)))
+
+    rotmats = _rotation_matrices(angles)
+    try:
+        shape = np.broadcast(inmatrices[..., 0, 0], rotmats[..., 0, 0]).shape
+    except ValueError:
+        raise MTex.MTpyError_inputarguments('Number of angles does not match the number of matrices: %s - %s'%(str(np.shape(angles)), str(inmatrices.shape[:-2])))
+    rotmats = np.broadcast_to(rotmats, shape + (2,2))
+    inmatrices = np.broadcast_to(inmatrices, shape + inmatrices.shape[-2:])
+    if inmatrices_err is not None:
+        inmatrices_err = np.broadcast_to(inmatrices_err, inmatrices.shape)
+
+    # R * M * R^T   (R^T is the inverse of R)
+    rotated_matrices = np.einsum('...ij,...jk,...lk->...il', rotmats,
+                                 inmatrices, rotmats)
+
+    errmats = None
+    if inmatrices_err is not None:
+        err_orig = np.real(inmatrices_err)
+        errmats = np.zeros_like(inmatrices_err)
+
+        c2 = rotmats[..., 0, 0]**2
+        s2 = rotmats[..., 0, 1]**2
+        cs = np.abs(rotmats[..., 0, 0] * rotmats[..., 0, 1])
+
+        errmats[..., 0, 0] = c2 * err_orig[..., 0, 0] + cs * (err_orig[..., 0, 1] + err_orig[..., 1, 0]) + s2 * err_orig[..., 1, 1]
+        errmats[..., 0, 1] = c2 * err_orig[..., 0, 1] + cs * (err_orig[..., 1, 1] + err_orig[..., 0, 0]) + s2 * err_orig[..., 1, 0]
+        errmats[..., 1, 0] = c2 * err_orig[..., 1, 0] + cs * (err_orig[..., 1, 1] + err_orig[..., 0, 0]) + s2 * err_orig[..., 0, 1]
+        errmats[..., 1, 1] = c2 * err_orig[..., 1, 1] + cs * (err_orig[..., 0, 1] + err_orig[..., 1, 0]) + s2 * err_orig[..., 0, 0]
+
+    return rotated_matrices, errmats
+
+
+def rotatevectors_incl_errors(invectors, angles, invectors_err = None):
+    """
+        Batched version of 'rotatevector_incl_errors'.
+
+        Rotate a stack of row vectors (..., 1, 2) - e.g. Tipper - or column
+        vectors (..., 2, 1) in one array operation.
+
+        Input:
+        - invectors : Numpy array of shape (..., 1, 2) or (..., 2, 1)
+        - angles : rotation angle(s) in degrees, clockwise from North -
+                   scalar or array, broadcastable against
+                   invectors.shape[:-2]
+
+        Optional:
+        - invectors_err : Numpy array of same shape as invectors
+
+        Output:
+        - rotated vectors
+        - rotated error vectors (or None)
+    """
+
+    if invectors is None :
+        raise MTex.MTpyError_inputarguments('Vector must be defined')
+
+    invectors = np.asarray(invectors)
+    if invectors.shape[-2:] not in [(1,2), (2,1)]:
+        raise MTex.MTpyError_inputarguments('Vectors must be of shape (...,1,2) or (...,2,1)')
+
+    if (invectors_err is not None) and (invectors.shape != invectors_err.shape):
+        raise MTex.MTpyError_inputarguments('Vector and errror-vector shapes do not match: %s - %s'%(str(invectors.shape), str(invectors_err.shape)))
+
+    rotmats = _rotation_matrices(angles)
+    try:
+        shape = np.broadcast(invectors[..., 0, 0], rotmats[..., 0, 0]).shape
+    except ValueError:
+        raise MTex.MTpyError_inputarguments('Number of angles does not match the number of vectors: %s - %s'%(str(np.shape(angles)), str(invectors.shape[:-2])))
+    rotmats = np.broadcast_to(rotmats, shape + (2,2))
+    invectors = np.broadcast_to(invectors, shape + invectors.shape[-2:])
+    if invectors_err is not None:
+        invectors_err = np.broadcast_to(invectors_err, invectors.shape)
+
+    if invectors.shape[-2:] == (1,2):
+        # v * R^T
+        rotated_vectors = np.einsum('...ij,...kj->...ik', invectors, rotmats)
+    else:
+        # R * v
+        rotated_vectors = np.einsum('...ij,...jk->...ik', rotmats, invectors)
+
+    errvecs = None
+    if invectors_err is not None:
+        err_orig = np.real(invectors_err)
+        if invectors_err.shape[-2:] == (1,2):
+            errvecs = np.einsum('...ij,...kj->...ik', err_orig, np.abs(rotmats))
+        else:
+            errvecs = np.einsum('...ij,...jk->...ik', np.abs(rotmats), err_orig)
+
+    return rotated_vectors, errvecs
+
+
 
 def multiplymatrices_incl_errors(inmatrix1, inmatrix2, inmatrix1_err = None,inmatrix2_err = None ):
 
@@ -46,6 +46,12 @@ epsilon = 1e-9
 lo_headerelements = ['station', 'channel','samplingrate','t_min',
                     'nsamples','unit','lat','lon','elev']
 
+#binary MTpy TS files: 2 ASCII header lines, padded to a multiple of 
+#'binary_ts_blocksize' bytes, followed by the little-endian data array
+binary_ts_magic = 'MTpyTSbin'
+binary_ts_version = 1
+binary_ts_blocksize = 512
+
 #=================================================================
 
 def make_unique_filename(infn):
@@ -83,7 +89,8 @@ def get_sampling_interval_fromdatafile(filename, length = 3600):
 
 
 
-def EDL_make_dayfiles(inputdir, sampling , stationname = None, outputdir = None):
+def EDL_make_dayfiles(inputdir, sampling , stationname = None, outputdir = None,
+                      binary_output = False):
     """
 
     Concatenate ascii time series to dayfiles (calendar day, UTC reference).
@@ -104,6 +111,8 @@ def EDL_make_dayfiles(inputdir, sampling , stationname = None, outputdir = None)
     Output data consists of a single column float data array. The data are 
     stored into one directory. If 'outputdir' is not specified, a subdirectory 
     'dayfiles' will be created witihn the current working directory. 
+    With 'binary_output' the dayfiles are written in the binary MTpy TS 
+    format (see write_ts_file_binary).
 
     Note: 
     Midnight cannot be in the middle of a file, because only file starts are 
@@ -225,7 +234,7 @@ def EDL_make_dayfiles(inputdir, sampling , stationname = None, outputdir = None)
             file_start = time.gmtime(file_start_time)
             
             #read in raw data
-            data_in = np.loadtxt(f)
+            data_in = read_ts_data_ascii(f)
 
             no_samples = len(data_in)
 
@@ -262,9 +271,6 @@ def EDL_make_dayfiles(inputdir, sampling , stationname = None, outputdir = None)
                 
                 new_file = op.abspath(op.join(outpath,new_fn))
                 
-                #open output file 
-                F = open(new_file,'w')
-                
                 fileopen = 1
 
 
@@ -344,20 +350,28 @@ def EDL_make_dayfiles(inputdir, sampling , stationname = None, outputdir = None)
             #check, if the file has to be closed and written now
             if incomplete == 1 :
 
-                #define header info
-                headerline = '# {0} {1} {2:.1f} {3} {4} \n'.format(
+                if binary_output is True:
+                    new_file = write_ts_file_binary(new_file, 
+                                    (stationname, comp.lower(), 1./sampling, 
+                                    outfile_timeaxis[0], len(outfile_timeaxis),
+                                    None, None, None, None, 
+                                    np.array(outfile_data)))
+                else:
+                    #define header info
+                    headerline = '# {0} {1} {2:.1f} {3} {4} \n'.format(
                                     stationname, comp.lower(), 1./sampling, 
                                     outfile_timeaxis[0], len(outfile_timeaxis))
 
-                F.write(headerline)
+                    F = open(new_file,'w')
+                    F.write(headerline)
 
-                #outfile_array = np.zeros((len(outfile_timeaxis),2))
-                #outfile_array[:,0] = outfile_timeaxis
-                #outfile_array[:,1] = outfile_data
+                    #outfile_array = np.zeros((len(outfile_timeaxis),2))
+                    #outfile_array[:,0] = outfile_timeaxis
+                    #outfile_array[:,1] = outfile_data
 
-                np.savetxt(F, np.array(outfile_data))
+                    np.savetxt(F, np.array(outfile_data))
 
-                F.close()
+                    F.close()
                 print '\t wrote file %s'%(new_file)
 
                 fileopen = 0
@@ -541,7 +555,10 @@ def validate_ts_file(tsfile):
         t0 = float(header['t_min'])
         ns = int(float(header['nsamples']))
         
-        data = np.loadtxt(tsfile)
+        if is_binary_ts_file(tsfile):
+            data = read_ts_file_binary(tsfile)[-1]
+        else:
+            data = np.loadtxt(tsfile)
         
         if len(data) != ns:
             #print 'data length'
@@ -582,6 +599,9 @@ def read_ts_header(tsfile):
                 firstline = F.readline().strip()
                 if firstline == '#':
                     firstline = ''
+                #binary files have the header in the second line
+                if firstline.startswith(binary_ts_magic):
+                    firstline = F.readline().strip()
         if firstline[0] != '#':
             raise
     except:
@@ -674,6 +694,9 @@ def read_ts_file(mtdatafile):
         (station, channel,samplingrate,t_min,nsamples,unit,lat,lon,elev, data)
         If header information is incomplete, the tuple is filled up with 'None'
 
+        Binary MTpy TS files are recognised and read with 
+        read_ts_file_binary (data as memory mapped array).
+
     """
 
     infile = op.abspath(mtdatafile)
@@ -681,12 +704,15 @@ def read_ts_file(mtdatafile):
         raise MTex.MTpyError_inputarguments('ERROR - Data file not '
                                                 'existing: {0}'.format(infile))
 
+    if is_binary_ts_file(infile):
+        return read_ts_file_binary(infile)
+
     header = read_ts_header(infile)
     if len(header) == 0 :
         raise MTex.MTpyError_inputarguments('ERROR - Data file not valid - '
                                         'header is missing : {0}'.format(infile))
 
-    data = np.loadtxt(infile)
+    data = read_ts_data_ascii(infile)
     if len(data) != int(float(header['nsamples'])):
         raise MTex.MTpyError_inputarguments('ERROR - Data file not valid '
                                     '- wrong number of samples in data ({1} '
@@ -707,6 +733,242 @@ def read_ts_file(mtdatafile):
     return tuple(lo_header_contents)
 
 
+def read_ts_data_ascii(tsfile):
+    """
+        Read the data columns of an ASCII time series file, skipping 
+        header lines starting with '#'. 
+
+        Faster than np.loadtxt for the large single column files. Falls back
+        to np.loadtxt, if comments appear within the data.
+
+    """
+
+    with open(tsfile, 'r') as F:
+        content = F.read()
+
+    #cut off header lines
+    idx = 0
+    while True:
+        line_end = content.find('\n', idx)
+        if line_end < 0:
+            line_end = len(content)
+        line = content[idx:line_end].strip()
+        if len(line) > 0 and line[0] != '#':
+            break
+        if line_end == len(content):
+            return np.zeros(0)
+        idx = line_end + 1
+
+    if content.find('#', idx) >= 0:
+        return np.loadtxt(tsfile)
+
+    n_columns = len(line.split())
+    data = np.fromstring(content[idx:], dtype=np.float64, sep=' ')
+    if n_columns == 1:
+        return data
+
+    if len(data) % n_columns != 0:
+        raise MTex.MTpyError_ts_data('ERROR - inconsistent number of columns'
+                                    ' in file: {0}'.format(tsfile))
+
+    return data.reshape(-1, n_columns)
+
+
+def is_binary_ts_file(tsfile):
+    """
+        Return True, if the file is a binary MTpy TS data file.
+    """
+
+    try:
+        with open(tsfile, 'rb') as F:
+            return F.read(len(binary_ts_magic)) == binary_ts_magic
+    except IOError:
+        return False
+
+
+def read_ts_binary_preamble(tsfile):
+    """
+        Read the format line of a binary MTpy TS data file.
+
+        Return tuple (dtype, number of columns, offset of the data in bytes).
+
+    """
+
+    with open(tsfile, 'rb') as F:
+        formatline = F.readline(binary_ts_blocksize).split()
+
+    try:
+        if formatline[0] != binary_ts_magic:
+            raise
+        if int(formatline[1]) > binary_ts_version:
+            raise
+        dtype = np.dtype(formatline[2])
+        n_columns = int(formatline[3])
+        data_offset = int(formatline[4])
+    except:
+        raise MTex.MTpyError_ts_data('Not a valid binary MTpy TS data file'
+                                        ': {0}'.format(tsfile))
+
+    return dtype, n_columns, data_offset
+
+
+def write_ts_file_binary(outfile, ts_tuple, dtype='<f8'):
+    """
+        Write a binary MTpy TS data file, where the content is provided as 
+        tuple (as for write_ts_file_from_tuple):
+
+        (station, channel,samplingrate,t_min,nsamples,unit,lat,lon,elev, data)
+
+        The file starts with a format line and the standard MTpy TS header 
+        line, padded to a multiple of 512 bytes:
+
+        MTpyTSbin <version> <dtype> <n_columns> <data offset>
+        # station channel samplingrate t_min nsamples unit lat lon elev
+
+        followed by the data as little-endian array (C order).
+        nsamples is taken from the data.
+
+        Return the name of the file written.
+
+    """
+
+    data = np.asarray(ts_tuple[-1])
+    if data.ndim not in [1, 2]:
+        raise MTex.MTpyError_inputarguments('ERROR - data must be 1 or 2 '
+                                            'dimensional')
+
+    dtype = np.dtype(dtype).newbyteorder('<')
+    if dtype.kind not in 'iuf':
+        raise MTex.MTpyError_inputarguments('ERROR - data type must be '
+                                    'integer or float: {0}'.format(dtype))
+
+    header_dict = {}
+    for i in range(len(ts_tuple) -1):
+        if ts_tuple[i] is not None:
+            header_dict[lo_headerelements[i]] = ts_tuple[i]
+    header_dict['nsamples'] = len(data)
+
+    n_columns = 1
+    if data.ndim == 2:
+        n_columns = data.shape[1]
+
+    header_string = get_ts_header_string(header_dict)
+    formatline_length = len('{0} {1} {2} {3} {4:08d}\n'.format(
+                                binary_ts_magic, binary_ts_version, dtype.str,
+                                n_columns, 0))
+    data_offset = (formatline_length + len(header_string)) 
+    data_offset = (data_offset/binary_ts_blocksize + 1) * binary_ts_blocksize
+    formatline = '{0} {1} {2} {3} {4:08d}\n'.format(binary_ts_magic, 
+                                                binary_ts_version, dtype.str,
+                                                n_columns, data_offset)
+    preamble = formatline + header_string
+    preamble += ' ' * (data_offset - len(preamble) - 1) + '\n'
+
+    outfilename = make_unique_filename(outfile)
+
+    try:
+        with open(outfilename, 'wb') as outF:
+            outF.write(preamble)
+            #write in chunks to limit the memory for the type conversion
+            chunk_length = max(1, 2**20 / n_columns)
+            for idx in range(0, len(data), chunk_length):
+                outF.write(np.ascontiguousarray(
+                            data[idx:idx + chunk_length], dtype=dtype).tostring())
+    except IOError:
+        raise MTex.MTpyError_inputarguments('ERROR - could not write content'
+                            ' of TS tuple to file : {0}'.format(outfilename))
+
+    return outfilename
+
+
+def read_ts_file_binary(mtdatafile, mmap_mode='r'):
+    """
+        Read a binary MTpy TS data file and provide the content as tuple:
+
+        (station, channel,samplingrate,t_min,nsamples,unit,lat,lon,elev, data)
+        If header information is incomplete, the tuple is filled up with 'None'
+
+        data is a memory mapped array (mmap_mode as for np.memmap), with 
+        mmap_mode=None it is read into memory.
+
+    """
+
+    infile = op.abspath(mtdatafile)
+    if not op.isfile(infile):
+        raise MTex.MTpyError_inputarguments('ERROR - Data file not '
+                                                'existing: {0}'.format(infile))
+
+    dtype, n_columns, data_offset = read_ts_binary_preamble(infile)
+    header = read_ts_header(infile)
+
+    nsamples = int(float(header['nsamples']))
+    data_length = (op.getsize(infile) - data_offset) / dtype.itemsize 
+    if data_length != nsamples * n_columns:
+        raise MTex.MTpyError_inputarguments('ERROR - Data file not valid '
+                                    '- wrong number of samples in data ({1} '
+                                    'instead of {2}): {0}'.format(
+                                    infile, data_length/n_columns, nsamples))
+
+    shape = (nsamples,)
+    if n_columns > 1:
+        shape = (nsamples, n_columns)
+
+    if nsamples == 0:
+        data = np.zeros(shape, dtype=dtype)
+    elif mmap_mode is None:
+        with open(infile, 'rb') as F:
+            F.seek(data_offset)
+            data = np.fromfile(F, dtype=dtype, 
+                               count=nsamples * n_columns).reshape(shape)
+    else:
+        data = np.memmap(infile, dtype=dtype, mode=mmap_mode, 
+                         offset=data_offset, shape=shape)
+
+    lo_header_contents = []
+
+    for i in lo_headerelements:
+        if i in header:
+            lo_header_contents.append(header[i])
+        else:
+            lo_header_contents.append(None)
+ 
+    lo_header_contents.append(data)
+
+    return tuple(lo_header_contents)
+
+
+def convert_ts_file_ascii2binary(tsfile, outdir=None, dtype='<f8'):
+    """
+        Convert an ASCII MTpy TS data file into the binary MTpy TS format.
+
+        The file name is kept, the output is stored into 'outdir' - default
+        is the subdirectory 'binary' of the input file's directory.
+
+        Return the name of the file written.
+
+    """
+
+    infile = op.abspath(tsfile)
+    if not op.isfile(infile):
+        raise MTex.MTpyError_inputarguments('ERROR - Data file not '
+                                                'existing: {0}'.format(infile))
+
+    if outdir is None:
+        outdir = op.join(op.dirname(infile), 'binary')
+    outdir = op.abspath(outdir)
+    if not op.isdir(outdir):
+        try:
+            os.makedirs(outdir)
+        except OSError:
+            raise MTex.MTpyError_inputarguments('Cannot generate output'
+                                        ' directory {0} '.format(outdir))
+
+    ts_tuple = read_ts_file(infile)
+
+    return write_ts_file_binary(op.join(outdir, op.basename(infile)), 
+                                ts_tuple, dtype=dtype)
+
+
 def reorient_files(lo_files, configfile, lo_stations = None, outdir = None):
 
     #read config file